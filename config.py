@@ -105,6 +105,8 @@ def defPaths(customSavePath):
     # saveddata db location modifier, shouldn't ever need to touch this
     eos.config.saveddata_connectionstring = "sqlite:///" + saveDB + "?check_same_thread=False"
     eos.config.gamedata_connectionstring = "sqlite:///" + gameDB + "?check_same_thread=False"
+    eos.config.gamedataSnapshot = os.path.join(pyfaPath, "eve.snapshot")
+    eos.config.gamedataSearchIndex = os.path.join(pyfaPath, "eve.searchindex")
 
     # initialize the settings
     from service.settings import EOSSettings
@@ -0,0 +1,169 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Headless evaluation of many saved fits at once.
+
+Fits are spread over a pool of worker processes. Every worker opens its own
+read-only connections to the gamedata and saveddata databases, loads the fits
+it was given all together, calculates them and sends back a FitResult per fit.
+Results are yielded in the order they are finished, so callers can stream them
+out without waiting for the whole batch.
+
+    from eos.batch import evaluateFits
+    for result in evaluateFits(where=Fit.booster == False):
+        print result.name, result.dps, result.ehp
+
+Nothing is ever written to the databases, and the settings of the GUI services
+are not involved, everything a calculation needs is passed in explicitly.
+"""
+
+import multiprocessing
+from collections import namedtuple
+
+from logbook import Logger
+from sqlalchemy import event
+
+import eos.db
+from eos.saveddata.fitStats import FitStats
+
+pyfalog = Logger(__name__)
+
+FitResult = namedtuple("FitResult", (
+    "fitID",
+    "name",
+    "shipName",
+    "dps",
+    "volley",
+    "ehp",
+    "capStable",
+    "capState",
+    "maxSpeed",
+    "alignTime",
+    "price",
+    "error",
+))
+
+# Options of the calculation, set up per worker by initWorker
+options = {"factorReload": False}
+
+
+def setQueryOnly(dbapiConnection, connectionRecord):
+    dbapiConnection.execute("PRAGMA query_only = ON")
+
+
+def initWorker(factorReload):
+    """
+    Prepare a worker process: drop connections inherited from the parent and
+    make sure all new ones are read only.
+    """
+    options["factorReload"] = factorReload
+    for engine, session in (
+            (eos.db.gamedata_engine, eos.db.gamedata_session),
+            (getattr(eos.db, "saveddata_engine", None), getattr(eos.db, "saveddata_session", None)),
+    ):
+        if engine is None:
+            continue
+        session.close()
+        engine.dispose()
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", setQueryOnly)
+
+
+def evaluateChunk(fitIDs):
+    """Calculate fits loaded together, a FitResult for every one of fitIDs in the same order"""
+    fits = dict((fit.ID, fit) for fit in eos.db.loadFits(fitIDs))
+    return [evaluateLoadedFit(fitID, fits.get(fitID)) for fitID in fitIDs]
+
+
+def evaluateLoadedFit(fitID, fit):
+    """Calculate a loaded fit, always returns a FitResult, even if calculation fails"""
+    if fit is None:
+        return FitResult(fitID, None, None, None, None, None, None, None, None, None, None, "Fit does not exist")
+    if fit.isInvalid:
+        return FitResult(fitID, fit.name, None, None, None, None, None, None, None, None, None, "Fit is invalid")
+
+    try:
+        fit.factorReload = options["factorReload"]
+        # Nobody asks what affects what here
+        fit.recordAffectedBy = False
+        fit.clear()
+        fit.calculateModifiedAttributes()
+
+        return FitResult(
+            fitID,
+            fit.name,
+            fit.ship.item.name,
+            fit.totalDPS,
+            fit.totalVolley,
+            sum(fit.ehp.itervalues()),
+            fit.capStable,
+            fit.capState,
+            fit.maxSpeed,
+            fit.alignTime,
+            FitStats.knownPrice(fit),
+            None,
+        )
+    except Exception as e:
+        pyfalog.error("Failed to evaluate fit {0}", fitID)
+        pyfalog.error(e)
+        return FitResult(fitID, fit.name, fit.ship.item.name, None, None, None, None, None, None, None, None,
+                         "{0}: {1}".format(type(e).__name__, e))
+
+
+def evaluateFits(fitIDs=None, where=None, processes=None, chunksize=20, factorReload=False):
+    """
+    Evaluate fits and yield a FitResult for each of them, in order of completion.
+
+    fitIDs -- IDs of fits to evaluate, if None all fits matching where are used
+    where -- SQLAlchemy clause (or list of them) on Fit, used when fitIDs is None
+    processes -- number of worker processes, defaults to the number of CPUs. With
+    0, fits are evaluated in the calling process using its own sessions.
+    chunksize -- number of fits sent to a worker at once, they are loaded together
+    factorReload -- take reload time into account for DPS
+    """
+    if fitIDs is None:
+        fitIDs = eos.db.getFitIDs(where)
+    else:
+        fitIDs = list(fitIDs)
+
+    pyfalog.info("Evaluating {0} fits", len(fitIDs))
+
+    chunks = [fitIDs[start:start + chunksize] for start in xrange(0, len(fitIDs), chunksize)]
+
+    if processes == 0:
+        options["factorReload"] = factorReload
+        for chunk in chunks:
+            for result in evaluateChunk(chunk):
+                yield result
+        return
+
+    # Workers read through connections of their own, and must not inherit an open transaction
+    if getattr(eos.db, "saveddata_engine", None) is not None:
+        eos.db.sync()
+    pool = multiprocessing.Pool(processes, initWorker, (factorReload,))
+    try:
+        for results in pool.imap_unordered(evaluateChunk, chunks):
+            for result in results:
+                yield result
+        pool.close()
+    finally:
+        # Also stops the workers when the caller stops iterating early
+        pool.terminate()
+        pool.join()
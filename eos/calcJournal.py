@@ -0,0 +1,281 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Incremental fit calculation support.
+
+A full fit calculation runs every effect of every skill, implant, module, drone
+and fighter. Most of those effects end up doing exactly the same thing as they
+did during the previous calculation, because the things they depend on did not
+change.
+
+The journal keeps, for every calculation step (one item at one runTime), a
+record of everything the step read (modified attribute values, scanned item
+lists and skill levels) and every modification it issued (boost, multiply,
+increase, force, ...). On the next calculation a step whose item state and
+reads are unchanged simply replays its recorded modifications in their original
+order instead of running its effect handlers. Since the calls are identical and
+happen in the same sequence as during a full calculation, the result matches a
+full recalculation exactly, including "Affected By" information.
+
+Steps which read an attribute of a dict they have already modified themselves
+are flagged as volatile and are always executed, as there is no way to verify
+their reads before running them.
+"""
+
+import threading
+from functools import wraps
+
+from logbook import Logger
+
+pyfalog = Logger(__name__)
+
+
+class RecorderState(threading.local):
+    # Recorder for the step currently being executed, if any
+    recorder = None
+
+
+state = RecorderState()
+
+# Attributes which describe state of an item that its effects depend on
+SIGNATURE_ATTRS = ("item", "charge", "state", "projected", "amount", "amountActive", "active", "level")
+
+
+def stateSignature(thing):
+    signature = tuple(getattr(thing, attr, None) for attr in SIGNATURE_ATTRS)
+    abilities = getattr(thing, "abilities", None)
+    if abilities:
+        signature += tuple(ability.active for ability in abilities)
+    return signature
+
+
+def recorded(method):
+    """
+    Decorator for methods which modify calculation state. When executed within a
+    journaled step, the outermost call is recorded so it can be replayed later.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        recorder = state.recorder
+        if recorder is None or recorder.depth:
+            return method(self, *args, **kwargs)
+
+        recorder.depth += 1
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception:
+            # A failing call can't be replayed reliably, always execute this step
+            recorder.volatile = True
+            raise
+        finally:
+            recorder.depth -= 1
+
+        recorder.ops.append((method, self, args, kwargs))
+        recorder.written.add(id(self))
+        return result
+
+    return wrapper
+
+
+def sameValue(a, b):
+    return type(a) is type(b) and a == b
+
+
+def checkItem(attrs, key, value):
+    return sameValue(attrs[key], value)
+
+
+def checkContains(attrs, key, value):
+    return (key in attrs) == value
+
+
+def checkLevel(skill, key, value):
+    return sameValue(skill.level, value)
+
+
+def checkScan(elements, filter, matches):
+    known = dict((id(element), (element, signature, result)) for element, signature, result in matches)
+    for element in elements:
+        entry = known.get(id(element))
+        if entry is not None and entry[0] is element and entry[1] == stateSignature(element):
+            result = entry[2]
+        else:
+            result = evaluateFilter(filter, element)
+
+        if entry is None:
+            if result:
+                return False
+        elif result != entry[2]:
+            return False
+
+    # Elements that matched previously but are not there any more
+    current = set(id(element) for element in elements)
+    for element, _, result in matches:
+        if result and id(element) not in current:
+            return False
+
+    return True
+
+
+def evaluateFilter(filter, element):
+    try:
+        return bool(filter(element))
+    except AttributeError:
+        return False
+
+
+class Recorder(object):
+    """Collects reads and modifications of a single calculation step"""
+
+    def __init__(self):
+        self.depth = 0
+        self.reads = []
+        self.ops = []
+        self.written = set()
+        self.seen = set()
+        self.volatile = False
+
+    def recordRead(self, check, obj, key, value):
+        if self.depth:
+            # Reads done within recorded calls are repeated during replay
+            return
+        if id(obj) in self.written:
+            self.volatile = True
+            return
+        marker = (check, id(obj), key)
+        if marker in self.seen:
+            return
+        self.seen.add(marker)
+        self.reads.append((check, obj, key, value))
+
+    def recordScan(self, elements, filter):
+        """Evaluates filter over elements, remembering the outcome for every element"""
+        matches = []
+        matching = []
+        for element in elements:
+            result = evaluateFilter(filter, element)
+            matches.append((element, stateSignature(element), result))
+            if result:
+                matching.append(element)
+        if not self.depth:
+            self.reads.append((checkScan, elements, filter, matches))
+        return matching
+
+
+def recordRead(check, obj, key, value):
+    recorder = state.recorder
+    if recorder is not None:
+        recorder.recordRead(check, obj, key, value)
+
+
+class StepRecord(object):
+    __slots__ = ("item", "signature", "reads", "ops")
+
+    def __init__(self, item, signature, recorder):
+        self.item = item
+        self.signature = signature
+        self.reads = recorder.reads
+        self.ops = recorder.ops
+
+    def isValid(self):
+        for check, obj, key, value in self.reads:
+            if not check(obj, key, value):
+                return False
+        return True
+
+    def replay(self):
+        for method, obj, args, kwargs in self.ops:
+            method(obj, *args, **kwargs)
+
+
+class CalculationJournal(object):
+    """
+    Per-fit storage of recorded calculation steps. A fit which has a journal
+    assigned will replay unchanged steps instead of recalculating them.
+    """
+
+    def __init__(self):
+        self.__records = {}
+        self.__visited = set()
+        self.__fitSignature = None
+        self.executed = 0
+        self.replayed = 0
+
+    def reset(self):
+        self.__records.clear()
+        self.__visited.clear()
+        self.__fitSignature = None
+
+    @staticmethod
+    def fitSignature(fit):
+        from eos.modifiedAttributeDict import ModifiedAttributeDict
+        return (
+            fit.ship.item if fit.ship else None,
+            fit.mode.item if fit.mode else None,
+            fit.character,
+            fit.damagePattern,
+            fit.targetResists,
+            fit.factorReload,
+            fit.implantLocation,
+            ModifiedAttributeDict.OVERRIDES,
+        )
+
+    def begin(self, fit):
+        signature = self.fitSignature(fit)
+        if signature != self.__fitSignature:
+            pyfalog.debug("Fit signature changed, discarding calculation journal of {0}", fit)
+            self.__records.clear()
+            self.__fitSignature = signature
+        self.__visited.clear()
+        self.executed = 0
+        self.replayed = 0
+
+    def end(self):
+        # Forget steps of items which are no longer part of the fit
+        for key in self.__records.keys():
+            if key not in self.__visited:
+                del self.__records[key]
+        pyfalog.debug("Calculation journal: {0} steps replayed, {1} executed", self.replayed, self.executed)
+
+    def run(self, fit, item, runTime, calculate, *args):
+        key = (id(item), runTime)
+        self.__visited.add(key)
+        fit.register(item)
+
+        record = self.__records.pop(key, None)
+        signature = stateSignature(item)
+        if record is not None and record.item is item and record.signature == signature and record.isValid():
+            record.replay()
+            self.__records[key] = record
+            self.replayed += 1
+            return
+
+        recorder = Recorder()
+        previous = state.recorder
+        state.recorder = recorder
+        try:
+            calculate(*args)
+        finally:
+            state.recorder = previous
+
+        if not recorder.volatile:
+            self.__records[key] = StepRecord(item, signature, recorder)
+        self.executed += 1
@@ -0,0 +1,148 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Moving fit calculations from one copy of the fits onto another.
+
+A fit can be calculated as a copy of its own, loaded into a separate session
+on another thread, so the fit shown to the user is never seen half way through
+a calculation. takeCalculations then hands what was calculated over to the
+fits the user has: the modified attribute dicts of every item, along with what
+the calculation set on the items and the fits themselves. "Affected By" is
+taken over too, with the fits and items it refers to swapped for their
+counterparts.
+
+That only works while both copies hold the same items in the same states, as
+they do when the copy was loaded after the fits were last changed. When they
+don't, TransferError is raised and the fits have to be calculated instead.
+"""
+
+from eos.modifiedAttributeDict import ATTRIBUTE_DICTS
+from eos.saveddata.fit import Fit
+
+# Lists of items of a fit, paired item by item
+ITEM_LISTS = ("modules", "drones", "fighters", "cargo", "implants", "boosters", "projectedModules",
+              "projectedDrones", "projectedFighters")
+# State of an item its calculation depends on, see eos.calcJournal.SIGNATURE_ATTRS
+STATE_ATTRS = ("state", "projected", "amount", "amountActive", "active", "level")
+# Set on items by their calculation, besides their modified attribute dicts
+CALCULATED_ATTRS = ("commandBonus", "_Module__reloadTime", "_Module__reloadForce", "_Skill__suppressed")
+
+
+class TransferError(Exception):
+    pass
+
+
+def signature(thing):
+    """Type, items and state of thing, comparable between copies in different sessions"""
+    if isinstance(thing, Fit):
+        # The state of a fit is that of its items, paired one by one
+        return Fit, thing.ID
+    item = getattr(thing, "item", None)
+    charge = getattr(thing, "charge", None)
+    result = (type(thing), getattr(item, "ID", None), getattr(charge, "ID", None))
+    result += tuple(getattr(thing, attr, None) for attr in STATE_ATTRS)
+    abilities = getattr(thing, "abilities", None)
+    if abilities:
+        result += tuple(ability.active for ability in abilities)
+    return result
+
+
+class Twins(object):
+    """
+    Objects of the calculated fits paired with their counterparts. Called with
+    one of them, returns its counterpart.
+    """
+
+    def __init__(self):
+        # id(source) -> (source, target), holding on to source keeps its id from being reused
+        self.__twins = {}
+
+    def pair(self, source, target):
+        """Pair source with target, returns whether they weren't paired before"""
+        if source is None and target is None:
+            return False
+        known = self.__twins.get(id(source))
+        if known is not None:
+            if known[1] is not target:
+                raise TransferError("{0} has two counterparts".format(source))
+            return False
+        if source is None or target is None or signature(source) != signature(target):
+            raise TransferError("{0} doesn't match {1}".format(source, target))
+        self.__twins[id(source)] = (source, target)
+        return True
+
+    def pairs(self):
+        return self.__twins.values()
+
+    def __call__(self, source):
+        if source is None:
+            return None
+        known = self.__twins.get(id(source))
+        if known is not None:
+            return known[1]
+        if isinstance(source, Fit) and source.shadowOf is not None:
+            # A shadow which projected, ours stands in for the same fit
+            target = self(source.shadowOf).buildShadow()
+            self.__twins[id(source)] = (source, target)
+            return target
+        raise TransferError("{0} has no counterpart".format(source))
+
+
+def pairFits(twins, source, target):
+    """Pair source, a fit, with target, and everything calculated on them"""
+    twins.pair(source, target)
+    twins.pair(source.ship, target.ship)
+    twins.pair(source.mode, target.mode)
+    for name in ITEM_LISTS:
+        pairLists(twins, getattr(source, name), getattr(target, name))
+
+    if twins.pair(source.character, target.character):
+        for skill in source.character.skills:
+            twins.pair(skill, target.character.getSkill(skill.itemID))
+        pairLists(twins, source.character.implants, target.character.implants)
+
+
+def pairLists(twins, sources, targets):
+    if len(sources) != len(targets):
+        raise TransferError("{0} items don't match {1}".format(len(sources), len(targets)))
+    for source, target in zip(sources, targets):
+        twins.pair(source, target)
+
+
+def takeCalculations(sources, targets):
+    """
+    Hand the calculations of the fits sources over to targets, the same fits
+    in another session, in the same order. Sources are calculated together,
+    the fits projected onto or boosting others among them.
+    """
+    twins = Twins()
+    for source, target in zip(sources, targets):
+        pairFits(twins, source, target)
+
+    for target in targets:
+        target.clear(projected=True)
+    for source, target in twins.pairs():
+        for key, value in vars(source).iteritems():
+            if isinstance(value, ATTRIBUTE_DICTS):
+                vars(target)[key].takeCalculation(value, twins)
+            elif key in CALCULATED_ATTRS:
+                vars(target)[key] = value
+    for source, target in zip(sources, targets):
+        target.takeCalculated(source)
@@ -4,6 +4,12 @@ from math import sqrt, exp
 
 DAY = 24 * 60 * 60 * 1000
 
+# time it takes to reload a module, in milliseconds
+RELOAD_TIME = 10000
+
+# number of activations between checks of the time budget
+BUDGET_CHECK_INTERVAL = 1024
+
 
 def lcm(a, b):
     n = a * b
@@ -40,6 +46,14 @@ class CapSimulator(object):
         # relevant decimal digits of capacitor for LCM period optimization
         self.stability_precision = 1
 
+        # use full clip cycles (shots and reload) of reloading modules for the
+        # period optimization, instead of disabling it when reloads are active
+        self.reload_periods = True
+
+        # wall clock time in seconds after which the simulation is stopped and
+        # its outcome extrapolated. self.approximate tells if that happened.
+        self.time_budget = None
+
     def scale_activation(self, duration, capNeed):
         for res in self.scale_resolutions:
             mod = duration % res
@@ -100,10 +114,13 @@ class CapSimulator(object):
             else:
                 capNeed *= amount
 
-            period = lcm(period, duration)
-
-            # period optimization doesn't work when reloads are active.
-            if clipSize:
+            if not clipSize:
+                period = lcm(period, duration)
+            elif self.reload_periods:
+                # A reloading module repeats itself after a whole clip and a reload
+                period = lcm(period, duration * clipSize + RELOAD_TIME)
+            else:
+                period = lcm(period, duration)
                 disable_period = True
 
             heapq.heappush(self.state, [0, duration, capNeed, 0, clipSize])
@@ -117,6 +134,8 @@ class CapSimulator(object):
         """Run the simulation"""
 
         start = time.time()
+        deadline = start + self.time_budget if self.time_budget is not None else None
+        approximate = False
 
         self.reset()
 
@@ -147,17 +166,26 @@ class CapSimulator(object):
             if t_now >= t_max:
                 break
 
-            cap = ((1.0 + (sqrt(cap / capCapacity) - 1.0) * exp((t_last - t_now) / tau)) ** 2) * capCapacity
+            if deadline is not None and not iterations % BUDGET_CHECK_INTERVAL and time.time() > deadline:
+                approximate = True
+                break
 
             if t_now != t_last:
+                # closed form recharge since the previous activation, activations
+                # at the same time as the previous one get no recharge at all
+                cap = ((1.0 + (sqrt(cap / capCapacity) - 1.0) * exp((t_last - t_now) / tau)) ** 2) * capCapacity
+
                 if cap < cap_lowest_pre:
                     cap_lowest_pre = cap
                 if t_now == t_wrap:
                     # history is repeating itself, so if we have more cap now than last
-                    # time this happened, it is a stable setup.
-                    if cap >= cap_wrap:
+                    # time this happened, it is a stable setup. Both sides are
+                    # rounded, otherwise a cap value rounded up last time never
+                    # compares as equal.
+                    cap_rounded = round(cap, stability_precision)
+                    if cap_rounded >= cap_wrap:
                         break
-                    cap_wrap = round(cap, stability_precision)
+                    cap_wrap = cap_rounded
                     t_wrap += period
 
             cap -= capNeed
@@ -179,16 +207,36 @@ class CapSimulator(object):
             if clipSize:
                 if shot % clipSize == 0:
                     shot = 0
-                    t_now += 10000  # include reload time
+                    t_now += RELOAD_TIME  # include reload time
             activation[0] = t_now
             activation[3] = shot
 
             push(state, activation)
         push(state, activation)
 
+        if approximate:
+            # Out of time, judge stability by the average drain including reloads,
+            # and if it can't be sustained extrapolate when the capacitor runs out
+            avgDrain = 0.0
+            for _, duration, capNeed, _, clipSize in state:
+                if clipSize:
+                    avgDrain += float(capNeed) * clipSize / (duration * clipSize + RELOAD_TIME)
+                else:
+                    avgDrain += float(capNeed) / duration
+
+            peakRecharge = capCapacity / (2.0 * tau)
+            if avgDrain > peakRecharge:
+                loss = (capCapacity - cap) / t_last if t_last else 0
+                if loss <= 0:
+                    loss = avgDrain - peakRecharge
+                if t_last + cap / loss < t_max:
+                    t_last += int(cap / loss)
+                    cap = 0.0
+
         # update instance with relevant results.
         self.t = t_last
         self.iterations = iterations
+        self.approximate = approximate
 
         # calculate EVE's stability value
         try:
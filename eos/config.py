@@ -4,9 +4,52 @@ from os.path import realpath, join, dirname, abspath
 debug = False
 gamedataCache = True
 saveddataCache = True
+# Maximum number of results kept per cached query, None for unbounded
+gamedataCacheSize = 5000
+saveddataCacheSize = 1000
+# Seconds a cached saveddata query result stays valid, None to keep it until evicted or invalidated
+saveddataCacheTTL = None
+# Replay unchanged parts of previous fit calculations instead of running every effect again
+incrementalCalculation = False
+# Apply skills from bonuses compiled once per character instead of running their effects for every fit
+skillProfiles = True
+# Read skill requirements and valid charges from indexes built once over the whole gamedata, instead of item by item
+gamedataIndexes = True
+# Keep modified attributes in compact arrays instead of dicts, for holding many calculated fits in memory
+compactAttributes = False
+# Record "Affected By" during every calculation of a new fit, as the GUI shows it. When off, it's recorded for an
+# item once it's asked for, by calculating its fit again under the calculation lock. Only batch and background
+# stats calculations turn it off, for fits nobody asks what affects what
+recordAffectedBy = True
+# Seconds a capacitor simulation may take before its result is approximated, None for no limit
+capSimTimeBudget = None
+# Open gamedata connections read only, turn off for building the gamedata database
+gamedataReadOnly = True
+# Bytes of the gamedata database each connection reads through memory mapped I/O, 0 to read it the usual way
+gamedataMmapSize = 256 * 1024 * 1024
+# Seconds written changes to saveddata wait to be committed along with the ones after them, in one transaction,
+# through the scheduler the GUI gives eos.db.writeBehind. 0 commits every change right away, as does any delay
+# without a scheduler, None only when eos.db.sync() is called on close, exports and explicit saves
+saveddataCommitDelay = 1.0
+# SQLite journal_mode and synchronous pragmas of the saveddata database, None keeps SQLite's defaults. Those,
+# a rollback journal synced in full, keep every commit through crashes and power loss
+saveddataJournalMode = None
+saveddataSynchronous = None
 gamedata_version = ""
 gamedata_connectionstring = 'sqlite:///' + unicode(realpath(join(dirname(abspath(__file__)), "..", "eve.db")),
                                                    sys.getfilesystemencoding())
+# Preloaded gamedata, used instead of the database for item lookups while it matches the database's client build.
+# None to always use the database
+gamedataSnapshot = unicode(realpath(join(dirname(abspath(__file__)), "..", "eve.snapshot")),
+                           sys.getfilesystemencoding())
+# Search items and fits through in memory indexes with prefix and typo tolerant matching, instead of LIKE queries
+searchIndex = True
+# Prebuilt item search index, used while it matches the database's client build. Otherwise, or when None, it's
+# built from the database on the first search
+gamedataSearchIndex = unicode(realpath(join(dirname(abspath(__file__)), "..", "eve.searchindex")),
+                              sys.getfilesystemencoding())
+# Effect modules compiled into one file by effectRegistry.build(), None to import them one by one
+effectBundle = unicode(realpath(join(dirname(abspath(__file__)), "effects.bundle")), sys.getfilesystemencoding())
 saveddata_connectionstring = 'sqlite:///' + unicode(
     realpath(join(dirname(abspath(__file__)), "..", "saveddata", "saveddata.db")), sys.getfilesystemencoding())
 
@@ -17,13 +17,17 @@
 # along with eos.  If not, see <http://www.gnu.org/licenses/>.
 # ===============================================================================
 
+import atexit
+import thread
 import threading
 
-from sqlalchemy import MetaData, create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 import migration
 from eos import config
+from eos.db import cache
 from logbook import Logger
 
 pyfalog = Logger(__name__)
@@ -33,15 +37,46 @@ class ReadOnlyException(Exception):
     pass
 
 
+def saveddataConnection(dbapiConnection, connectionRecord):
+    cursor = dbapiConnection.cursor()
+    if config.saveddataJournalMode:
+        cursor.execute("PRAGMA journal_mode = {0}".format(config.saveddataJournalMode))
+    if config.saveddataSynchronous:
+        cursor.execute("PRAGMA synchronous = {0}".format(config.saveddataSynchronous))
+    cursor.close()
+
+
+def readOnlyConnection(dbapiConnection, connectionRecord):
+    cursor = dbapiConnection.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    if config.gamedataMmapSize:
+        cursor.execute("PRAGMA mmap_size = {0:d}".format(config.gamedataMmapSize))
+    cursor.close()
+
+
 gamedata_connectionstring = config.gamedata_connectionstring
 if callable(gamedata_connectionstring):
     gamedata_engine = create_engine("sqlite://", creator=gamedata_connectionstring, echo=config.debug)
+elif gamedata_connectionstring.startswith("sqlite:///") and ":memory:" not in gamedata_connectionstring:
+    # Threads reading gamedata at the same time get a connection each, past the limit one waits for another's read
+    gamedata_engine = create_engine(gamedata_connectionstring, echo=config.debug, poolclass=QueuePool,
+                                    pool_size=5, max_overflow=10, pool_timeout=30,
+                                    connect_args={"check_same_thread": False})
 else:
     gamedata_engine = create_engine(gamedata_connectionstring, echo=config.debug)
 
+if config.gamedataReadOnly and gamedata_engine.dialect.name == "sqlite":
+    event.listen(gamedata_engine, "connect", readOnlyConnection)
+
 gamedata_meta = MetaData()
 gamedata_meta.bind = gamedata_engine
-gamedata_session = sessionmaker(bind=gamedata_engine, autoflush=False, expire_on_commit=False)()
+# Every thread gets a session of its own, and only ever gets objects loaded through it: the query caches and the
+# snapshot keep theirs per session. Threads hand gamedata to one another by ID. Gamedata is only read, so sessions
+# autocommit: every read takes a connection from the pool and gives it back right away. Sessions are kept by thread
+# ident rather than thread local, so threads which are done remove theirs with removeGamedataSession.
+gamedata_session = scoped_session(sessionmaker(bind=gamedata_engine, autocommit=True, autoflush=False,
+                                               expire_on_commit=False),
+                                  scopefunc=thread.get_ident)
 
 # This should be moved elsewhere, maybe as an actual query. Current, without try-except, it breaks when making a new
 # game db because we haven't reached gamedata_meta.create_all()
@@ -58,9 +93,16 @@ saveddata_connectionstring = config.saveddata_connectionstring
 if saveddata_connectionstring is not None:
     if callable(saveddata_connectionstring):
         saveddata_engine = create_engine(creator=saveddata_connectionstring, echo=config.debug)
+    elif saveddata_connectionstring.startswith("sqlite://"):
+        # Transactions left open by write-behind take the changes of import threads too, on the same connection
+        saveddata_engine = create_engine(saveddata_connectionstring, echo=config.debug,
+                                         connect_args={"check_same_thread": False})
     else:
         saveddata_engine = create_engine(saveddata_connectionstring, echo=config.debug)
 
+    if saveddata_engine.dialect.name == "sqlite":
+        event.listen(saveddata_engine, "connect", saveddataConnection)
+
     saveddata_meta = MetaData()
     saveddata_meta.bind = saveddata_engine
     saveddata_session = sessionmaker(bind=saveddata_engine, autoflush=False, expire_on_commit=False)()
@@ -74,7 +116,7 @@ sd_lock = threading.Lock()
 # noinspection PyPep8
 from eos.db.gamedata import alphaClones, attribute, category, effect, group, icon, item, marketGroup, metaData, metaGroup, queries, traits, unit
 # noinspection PyPep8
-from eos.db.saveddata import booster, cargo, character, crest, damagePattern, databaseRepair, drone, fighter, fit, implant, implantSet, loadDefaultDatabaseValues, miscData, module, override, price, queries, skill, targetResists, user
+from eos.db.saveddata import booster, cargo, character, crest, damagePattern, databaseRepair, drone, fighter, fitStats, fit, implant, implantSet, loadDefaultDatabaseValues, miscData, module, override, price, queries, skill, targetResists, user
 
 # Import queries
 # noinspection PyPep8
@@ -82,6 +124,31 @@ from eos.db.gamedata.queries import *
 # noinspection PyPep8
 from eos.db.saveddata.queries import *
 
+
+def removeGamedataSession():
+    """
+    Close the gamedata session of the calling thread, for threads which are
+    done, and forget the query results cached for it. Objects loaded through
+    it aren't to be used anymore, they can't load their relations.
+    """
+    if not gamedata_session.registry.has():
+        return
+    cache.removeScope(gamedata_session(), "gamedata.")
+    gamedata_session.remove()
+
+
+def syncAtExit():
+    try:
+        sync()
+    except Exception as e:
+        pyfalog.critical("Unable to commit saved data on exit")
+        pyfalog.critical(e)
+
+
+# Changes still waiting to be committed would be lost otherwise
+if saveddata_meta is not None:
+    atexit.register(syncAtExit)
+
 # If using in memory saveddata, you'll want to reflect it so the data structure is good.
 if config.saveddata_connectionstring == "sqlite:///:memory:":
     saveddata_meta.create_all()
@@ -0,0 +1,215 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Query result caching shared by the gamedata and saveddata query modules.
+
+Every decorated query gets its own QueryCache, bounded in size with least
+recently used entries evicted first, and optionally expiring entries after a
+number of seconds. All caches are registered by name so they can be inspected
+(getStats) and invalidated (invalidate, removeCachedEntry) from anywhere.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from logbook import Logger
+
+pyfalog = Logger(__name__)
+
+# All query caches, by name
+caches = {}
+
+
+class QueryCache(object):
+    def __init__(self, name, size=None, ttl=None, type=None):
+        """
+        size -- maximum number of entries, None for unbounded
+        ttl -- seconds an entry stays valid, None for no expiry
+        type -- class of the cached objects. Results of caches with a type are
+        tracked by ID, so they can be dropped when one of those objects changes.
+        """
+        self.name = name
+        self.size = size
+        self.ttl = ttl
+        self.type = type
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (value, IDs, expiry time)
+        self.__entries = OrderedDict()
+        self.__lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key):
+        """Returns (True, value) for a cached key, (False, None) otherwise"""
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            if entry[2] is not None and entry[2] < time.time():
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            # Reinserting moves the entry to the most recently used end
+            self.__entries[key] = entry
+            self.hits += 1
+            return True, entry[0]
+
+    def set(self, key, value, IDs=None):
+        expiry = time.time() + self.ttl if self.ttl is not None else None
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (value, IDs, expiry)
+            if self.size is not None:
+                while len(self.__entries) > self.size:
+                    self.__entries.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def removeID(self, ID):
+        """Drop all entries which contain the object with this ID"""
+        with self.__lock:
+            for key, (_, IDs, _) in self.__entries.items():
+                if IDs is not None and ID in IDs:
+                    del self.__entries[key]
+
+    def removeScope(self, scope):
+        """Drop all entries cached within scope, see cachedQuery"""
+        with self.__lock:
+            for key in self.__entries.keys():
+                if key[-1] is scope:
+                    del self.__entries[key]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def getStats(self):
+        return {
+            "entries"    : len(self.__entries),
+            "size"       : self.size,
+            "ttl"        : self.ttl,
+            "hits"       : self.hits,
+            "misses"     : self.misses,
+            "evictions"  : self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def cachedQuery(amount, *keywords, **options):
+    """
+    Decorator caching results of a query function, keyed on its positional
+    arguments and the given keyword arguments. amount is the number of
+    arguments identifying a result, it is not a size bound; that is passed
+    as the size option, together with ttl, type and prefix (used in the name
+    of the cache). The scope option is called on every lookup, results are
+    only handed back to callers in the same scope (see removeScope). Calling
+    the query with useCache=False always refreshes the cached result.
+    """
+    size = options.get("size")
+    ttl = options.get("ttl")
+    type = options.get("type")
+    prefix = options.get("prefix", "")
+    scope = options.get("scope")
+
+    def deco(function):
+        name = "{0}{1}".format(prefix, function.__name__)
+        cache = caches[name] = QueryCache(name, size, ttl, type)
+
+        @wraps(function)
+        def checkAndReturn(*args, **kwargs):
+            useCache = kwargs.pop("useCache", True)
+            cacheKey = list(args)
+            for keyword in keywords:
+                cacheKey.append(kwargs.get(keyword))
+            if scope is not None:
+                cacheKey.append(scope())
+
+            cacheKey = tuple(cacheKey)
+            if useCache:
+                found, result = cache.get(cacheKey)
+                if found:
+                    return result
+
+            result = function(*args, **kwargs)
+            if type is None:
+                # Missing results are not cached, the data could show up later
+                if result is not None:
+                    cache.set(cacheKey, result)
+                return result
+
+            IDs = set()
+            for item in result if isinstance(result, list) else (result,):
+                ID = getattr(item, "ID", None)
+                if ID is None:
+                    # Some uncachable data, don't cache this query
+                    return result
+                IDs.add(ID)
+
+            cache.set(cacheKey, result, IDs)
+            return result
+
+        checkAndReturn.cache = cache
+        return checkAndReturn
+
+    return deco
+
+
+def removeCachedEntry(type, ID):
+    """Forget all cached results which contain the object of the given type and ID"""
+    for cache in caches.itervalues():
+        if cache.type is type:
+            cache.removeID(ID)
+
+
+def removeScope(scope, prefix=""):
+    """Forget all results cached within scope, in the caches whose name starts with prefix"""
+    for name, cache in caches.iteritems():
+        if name.startswith(prefix):
+            cache.removeScope(scope)
+
+
+def invalidate(prefix=""):
+    """Empty all caches whose name starts with prefix, all of them by default"""
+    for name, cache in caches.iteritems():
+        if name.startswith(prefix):
+            cache.clear()
+
+
+def getStats(prefix=""):
+    """Counters of all caches whose name starts with prefix"""
+    return dict((name, cache.getStats()) for name, cache in caches.iteritems() if name.startswith(prefix))
+
+
+def logStats():
+    for name, stats in sorted(getStats().iteritems()):
+        pyfalog.debug("Query cache {0}: {entries} entries, {hits} hits, {misses} misses, {evictions} evictions",
+                      name, **stats)
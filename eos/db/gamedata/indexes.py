@@ -0,0 +1,202 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Indexes over the whole gamedata.
+
+Skill requirements and charge compatibility are spread over attributes of
+every item, asking for them item by item means a query per item. GamedataIndexes
+reads all of them with a few queries the first time any is needed, and keeps
+
+- item => skills it requires directly, and all skills it requires, through the
+  requirements of those skills as well
+- skill => items requiring it directly
+- item with charge groups => charges fitting it, by the same rules as
+  Module.isValidCharge applies to the unmodified item
+
+Items and skills are kept as IDs, the callers turn them into items.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from logbook import Logger
+from sqlalchemy.sql import select
+
+from eos.db import gamedata_session
+from eos.db.gamedata.attribute import attributes_table, typeattributes_table
+from eos.db.gamedata.item import items_table
+
+pyfalog = Logger(__name__)
+
+# requiredSkillX => requiredSkillXLevel, in the order Item.requiredSkills always listed them
+REQUIRED_SKILL_ATTRIBUTES = {182: 277, 183: 278, 184: 279, 1285: 1286, 1289: 1287, 1290: 1288}
+# The charge group attributes Module.isValidCharge looks at
+CHARGE_GROUP_ATTRIBUTES = tuple("chargeGroup%d" % i for i in range(5))
+CHARGE_ATTRIBUTES = CHARGE_GROUP_ATTRIBUTES + ("chargeSize",)
+
+
+class GamedataIndexes(object):
+
+    def __init__(self, session=None):
+        session = session or gamedata_session
+        start = time.time()
+        self.__requiredSkills = {}
+        self.__allRequiredSkills = {}
+        self.__dependents = {}
+        self.__chargeHolders = {}
+        self.__charges = {}
+        self.__validCharges = {}
+
+        self.__buildRequirements(session)
+        self.__buildCharges(session)
+
+        pyfalog.debug("Built gamedata indexes in {0:.1f}ms: {1} items with required skills, {2} with charges",
+                      (time.time() - start) * 1000, len(self.__requiredSkills), len(self.__chargeHolders))
+
+    def __buildRequirements(self, session):
+        values = {}
+        attrIDs = tuple(REQUIRED_SKILL_ATTRIBUTES) + tuple(REQUIRED_SKILL_ATTRIBUTES.itervalues())
+        for typeID, attributeID, value in session.execute(
+                select((typeattributes_table.c.typeID, typeattributes_table.c.attributeID, typeattributes_table.c.value),
+                       typeattributes_table.c.attributeID.in_(attrIDs))):
+            values.setdefault(typeID, {})[attributeID] = value
+
+        for typeID, itemValues in values.iteritems():
+            requiredSkills = OrderedDict()
+            for skillAttr, levelAttr in REQUIRED_SKILL_ATTRIBUTES.iteritems():
+                if skillAttr in itemValues and levelAttr in itemValues:
+                    requiredSkills[int(itemValues[skillAttr])] = itemValues[levelAttr]
+            if requiredSkills:
+                self.__requiredSkills[typeID] = requiredSkills
+                for skillID in requiredSkills:
+                    self.__dependents.setdefault(skillID, []).append(typeID)
+
+    def __buildCharges(self, session):
+        attributeNames = dict(session.execute(
+            select((attributes_table.c.attributeID, attributes_table.c.attributeName),
+                   attributes_table.c.attributeName.in_(CHARGE_ATTRIBUTES))).fetchall())
+        if not attributeNames:
+            return
+
+        values = {}
+        for typeID, attributeID, value in session.execute(
+                select((typeattributes_table.c.typeID, typeattributes_table.c.attributeID, typeattributes_table.c.value),
+                       typeattributes_table.c.attributeID.in_(tuple(attributeNames)))):
+            values.setdefault(typeID, {})[attributeNames[attributeID]] = value
+
+        chargeGroups = set()
+        for typeID, itemValues in values.iteritems():
+            groups = tuple(itemValues[name] for name in CHARGE_GROUP_ATTRIBUTES if name in itemValues)
+            if groups:
+                # Charge groups, charge size and capacity are filled in below
+                self.__chargeHolders[typeID] = [groups, itemValues.get("chargeSize"), None]
+                chargeGroups.update(int(group) for group in groups)
+
+        # All of them, a list of the IDs needed would be longer than SQLite takes
+        for typeID, groupID, volume, capacity, published in session.execute(
+                select((items_table.c.typeID, items_table.c.groupID, items_table.c.volume, items_table.c.capacity,
+                        items_table.c.published))):
+            holder = self.__chargeHolders.get(typeID)
+            if holder is not None:
+                holder[2] = capacity
+            if groupID in chargeGroups:
+                chargeSize = values.get(typeID, {}).get("chargeSize")
+                self.__charges.setdefault(groupID, []).append((typeID, volume, chargeSize, published))
+
+    def getRequiredSkills(self, typeID):
+        """Skill ID => level of the skills typeID requires directly"""
+        return self.__requiredSkills.get(typeID, {})
+
+    def getAllRequiredSkills(self, typeID):
+        """Skill ID => highest level of every skill needed for typeID, directly or through other skills"""
+        allRequiredSkills = self.__allRequiredSkills.get(typeID)
+        if allRequiredSkills is None:
+            allRequiredSkills = {}
+            stack = [typeID]
+            seen = set(stack)
+            while stack:
+                for skillID, level in self.getRequiredSkills(stack.pop()).iteritems():
+                    if level > allRequiredSkills.get(skillID, 0):
+                        allRequiredSkills[skillID] = level
+                    if skillID not in seen:
+                        seen.add(skillID)
+                        stack.append(skillID)
+            self.__allRequiredSkills[typeID] = allRequiredSkills
+
+        return allRequiredSkills
+
+    def getDependents(self, skillID):
+        """IDs of the items requiring skillID directly"""
+        return self.__dependents.get(skillID, ())
+
+    def getChargeGroups(self, typeID):
+        """Values of the charge group attributes of typeID"""
+        holder = self.__chargeHolders.get(typeID)
+        return holder[0] if holder is not None else ()
+
+    def getValidCharges(self, typeID, published=False):
+        """IDs of the charges fitting unmodified typeID, only the published ones if published"""
+        validCharges = self.__validCharges.get(typeID)
+        if validCharges is None:
+            validCharges = self.__validCharges[typeID] = self.__findValidCharges(typeID)
+
+        return validCharges[1] if published else validCharges[0]
+
+    def __findValidCharges(self, typeID):
+        holder = self.__chargeHolders.get(typeID)
+        if holder is None:
+            return frozenset(), frozenset()
+
+        chargeGroups, itemChargeSize, capacity = holder
+        validCharges = []
+        publishedCharges = []
+        for group in set(int(group) for group in chargeGroups):
+            for chargeID, volume, chargeSize, published in self.__charges.get(group, ()):
+                if volume is not None and capacity is not None and volume > capacity:
+                    continue
+                if itemChargeSize > 0 and itemChargeSize != chargeSize:
+                    continue
+                validCharges.append(chargeID)
+                if published:
+                    publishedCharges.append(chargeID)
+
+        return frozenset(validCharges), frozenset(publishedCharges)
+
+
+_indexes = None
+_lock = threading.Lock()
+
+
+def getIndexes():
+    """The gamedata indexes, built on first use"""
+    global _indexes
+    if _indexes is None:
+        with _lock:
+            if _indexes is None:
+                _indexes = GamedataIndexes()
+    return _indexes
+
+
+def reset():
+    """Forget the indexes, they are built again on next use"""
+    global _indexes
+    with _lock:
+        _indexes = None
@@ -45,7 +45,10 @@ from .traits import traits_table  # noqa
 mapper(Item, items_table,
        properties={"group": relation(Group, backref="items"),
                    "icon": relation(Icon),
-                   "_Item__attributes": relation(Attribute, collection_class=attribute_mapped_collection('name')),
+                   # Attributes moved in by Item.moveAttrs are not to be saved, nor to pull the infos
+                   # they are made with, which may come from the session of another thread, into this one
+                   "_Item__attributes": relation(Attribute, collection_class=attribute_mapped_collection('name'),
+                                                 cascade="merge"),
                    "effects": relation(Effect, collection_class=attribute_mapped_collection('name')),
                    "metaGroup": relation(MetaType,
                                          primaryjoin=metatypes_table.c.typeID == items_table.c.typeID,
@@ -17,6 +17,8 @@
 # along with eos.  If not, see <http://www.gnu.org/licenses/>.
 # ===============================================================================
 
+from functools import wraps
+
 from sqlalchemy.orm import join, exc
 from sqlalchemy.sql import and_, or_, select
 
@@ -24,32 +26,21 @@ import eos.config
 from eos.db import gamedata_session
 from eos.db.gamedata.metaGroup import metatypes_table, items_table
 from eos.db.gamedata.group import groups_table
+# Re-exported as eos.db.getGamedataIndexes
+from eos.db.gamedata.indexes import getIndexes as getGamedataIndexes  # noqa: F401
+from eos.db.gamedata.search import getItemSearch
+from eos.db.gamedata.snapshot import getSnapshot
 from eos.db.util import processEager, processWhere
 from eos.gamedata import AlphaClone, Attribute, Category, Group, Item, MarketGroup, MetaGroup, AttributeInfo, MetaData
 
 configVal = getattr(eos.config, "gamedataCache", None)
 if configVal is True:
-    def cachedQuery(amount, *keywords):
-        def deco(function):
-            cache = {}
-
-            def checkAndReturn(*args, **kwargs):
-                useCache = kwargs.pop("useCache", True)
-                cacheKey = []
-                cacheKey.extend(args)
-                for keyword in keywords:
-                    cacheKey.append(kwargs.get(keyword))
-
-                cacheKey = tuple(cacheKey)
-                handler = cache.get(cacheKey)
-                if handler is None or not useCache:
-                    handler = cache[cacheKey] = function(*args, **kwargs)
+    from eos.db import cache
 
-                return handler
-
-            return checkAndReturn
-
-        return deco
+    def cachedQuery(amount, *keywords):
+        # Results are cached per gamedata session, every thread only gets objects loaded through its own back
+        return cache.cachedQuery(amount, *keywords, size=eos.config.gamedataCacheSize, prefix="gamedata.",
+                                 scope=gamedata_session)
 
 elif callable(configVal):
     cachedQuery = eos.config.gamedataCache
@@ -64,6 +55,25 @@ else:
         return deco
 
 
+def snapshotLookup(name, types=(int, basestring)):
+    """
+    Answer lookups by ID or name without eager loading from the snapshot, when
+    there is one, before the query cache is asked. The snapshot keeps the
+    objects it builds into the session of the calling thread itself.
+    """
+    def deco(function):
+        @wraps(function)
+        def lookup(lookfor, eager=None, **kwargs):
+            snapshot = getSnapshot() if eager is None else None
+            if snapshot is not None and isinstance(lookfor, types):
+                return getattr(snapshot, name)(lookfor)
+            return function(lookfor, eager, **kwargs)
+
+        return lookup
+
+    return deco
+
+
 def sqlizeString(line):
     # Escape backslashes first, as they will be as escape symbol in queries
     # Then escape percent and underscore signs
@@ -75,6 +85,7 @@ def sqlizeString(line):
 itemNameMap = {}
 
 
+@snapshotLookup("getItem")
 @cachedQuery(1, "lookfor")
 def getItem(lookfor, eager=None):
     if isinstance(lookfor, int):
@@ -98,6 +109,43 @@ def getItem(lookfor, eager=None):
     return item
 
 
+def getItemsByName(names, eager=None):
+    """name => item of the names there are items for, looked up together"""
+    names = set(names)
+    snapshot = getSnapshot()
+    if snapshot is not None:
+        items = dict((name, snapshot.getItem(name)) for name in names)
+        return dict((name, item) for name, item in items.iteritems() if item is not None)
+
+    items = {}
+    names = list(names)
+    # SQLite takes no more than 999 parameters
+    for start in xrange(0, len(names), 500):
+        for item in gamedata_session.query(Item).options(*processEager(eager)).filter(
+                Item.name.in_(names[start:start + 500])):
+            items[item.name] = item
+            itemNameMap[item.name] = item.ID
+    return items
+
+
+def getItemsByID(typeIDs, eager=None):
+    """typeID => item of the typeIDs there are items for, looked up together"""
+    typeIDs = set(typeIDs)
+    snapshot = getSnapshot()
+    if snapshot is not None:
+        items = dict((typeID, snapshot.getItem(typeID)) for typeID in typeIDs)
+        return dict((typeID, item) for typeID, item in items.iteritems() if item is not None)
+
+    items = {}
+    typeIDs = list(typeIDs)
+    # SQLite takes no more than 999 parameters
+    for start in xrange(0, len(typeIDs), 500):
+        for item in gamedata_session.query(Item).options(*processEager(eager)).filter(
+                Item.ID.in_(typeIDs[start:start + 500])):
+            items[item.ID] = item
+    return items
+
+
 @cachedQuery(1, "lookfor")
 def getAlphaClone(lookfor, eager=None):
     if isinstance(lookfor, int):
@@ -119,6 +167,7 @@ def getAlphaCloneList(eager=None):
 groupNameMap = {}
 
 
+@snapshotLookup("getGroup")
 @cachedQuery(1, "lookfor")
 def getGroup(lookfor, eager=None):
     if isinstance(lookfor, int):
@@ -145,6 +194,7 @@ def getGroup(lookfor, eager=None):
 categoryNameMap = {}
 
 
+@snapshotLookup("getCategory")
 @cachedQuery(1, "lookfor")
 def getCategory(lookfor, eager=None):
     if isinstance(lookfor, int):
@@ -174,6 +224,7 @@ def getCategory(lookfor, eager=None):
 metaGroupNameMap = {}
 
 
+@snapshotLookup("getMetaGroup")
 @cachedQuery(1, "lookfor")
 def getMetaGroup(lookfor, eager=None):
     if isinstance(lookfor, int):
@@ -200,6 +251,7 @@ def getMetaGroup(lookfor, eager=None):
     return metaGroup
 
 
+@snapshotLookup("getMarketGroup", int)
 @cachedQuery(1, "lookfor")
 def getMarketGroup(lookfor, eager=None):
     if isinstance(lookfor, int):
@@ -249,6 +301,28 @@ def searchItems(nameLike, where=None, join=None, eager=None):
     return items
 
 
+def findItems(text, categories=None, groups=None, limit=100, eager=None):
+    """
+    Items matching text through the search index, best first. When categories
+    or groups are given, only items in one of them by name.
+    """
+    if not isinstance(text, basestring):
+        raise TypeError("Need string as argument")
+
+    typeIDs = getItemSearch().search(text, categories, groups, limit)
+    if not typeIDs:
+        return []
+
+    snapshot = getSnapshot()
+    if snapshot is not None:
+        items = (snapshot.getItem(typeID) for typeID in typeIDs)
+    else:
+        found = dict((item.ID, item) for item in gamedata_session.query(Item).options(
+            *processEager(eager)).filter(Item.ID.in_(typeIDs)))
+        items = (found.get(typeID) for typeID in typeIDs)
+    return [item for item in items if item is not None]
+
+
 @cachedQuery(2, "where", "itemids")
 def getVariations(itemids, groupIDs=None, where=None, eager=None):
     for itemid in itemids:
@@ -276,6 +350,7 @@ def getVariations(itemids, groupIDs=None, where=None, eager=None):
         return vars
 
 
+@snapshotLookup("getAttributeInfo")
 @cachedQuery(1, "attr")
 def getAttributeInfo(attr, eager=None):
     if isinstance(attr, basestring):
@@ -309,6 +384,10 @@ def directAttributeRequest(itemIDs, attrIDs):
         if not isinstance(itemID, int):
             raise TypeError("All itemIDs must be integer")
 
+    snapshot = getSnapshot()
+    if snapshot is not None:
+        return snapshot.directAttributeRequest(itemIDs, attrIDs)
+
     q = select((Item.typeID, Attribute.attributeID, Attribute.value),
                and_(Attribute.attributeID.in_(attrIDs), Item.typeID.in_(itemIDs)),
                from_obj=[join(Attribute, Item)])
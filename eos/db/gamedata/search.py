@@ -0,0 +1,191 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Search index over item names and the paths of their market groups.
+
+scripts/buildSearchIndex.py writes it next to eve.db when the data is
+prepared, it's used while it matches the client build of the database. Without
+one, it's built from the database on the first search.
+"""
+
+import marshal
+import os
+import threading
+import time
+
+from logbook import Logger
+from sqlalchemy.sql import select
+
+from eos import config
+from eos.db import gamedata_session
+from eos.db.gamedata.category import categories_table
+from eos.db.gamedata.group import groups_table
+from eos.db.gamedata.item import items_table
+from eos.db.gamedata.marketGroup import marketgroups_table
+from eos.db.gamedata.metaData import metadata_table
+from eos.searchIndex import SearchIndex
+
+pyfalog = Logger(__name__)
+
+MAGIC = "PYFASRCH"
+# Bump whenever the layout of the file changes
+FORMAT_VERSION = 1
+
+
+class ItemSearch(object):
+    """The search index with what's needed to filter its results by category and group"""
+
+    def __init__(self, index, groups, groupNames):
+        self.index = index
+        # typeID => groupID
+        self.groups = groups
+        # groupID => (group name, category name)
+        self.groupNames = groupNames
+
+    def search(self, text, categories=None, groups=None, limit=100):
+        """
+        IDs of the items matching text, best first. When categories or groups
+        are given, only items in one of the categories or groups by name.
+        """
+        filtered = categories is not None or groups is not None
+        accept = self.__acceptor(categories, groups) if filtered else None
+        return self.index.search(text, accept, limit)
+
+    def __acceptor(self, categories, groups):
+        """Whether an item is in one of the categories or groups, by typeID"""
+        categories = frozenset(categories or ())
+        groups = frozenset(groups or ())
+
+        def accept(typeID):
+            groupName, categoryName = self.groupNames.get(self.groups.get(typeID), (None, None))
+            return categoryName in categories or groupName in groups
+
+        return accept
+
+    def dump(self):
+        return {"index": self.index.dump(), "groups": self.groups, "groupNames": self.groupNames}
+
+    @classmethod
+    def restore(cls, data):
+        return cls(SearchIndex.restore(data["index"]), data["groups"], data["groupNames"])
+
+
+def collect(session=None):
+    """Build the item search from the database behind session"""
+    session = session or gamedata_session
+    start = time.time()
+
+    marketGroups = dict((row[0], (row[1], row[2])) for row in session.execute(
+        select((marketgroups_table.c.marketGroupID, marketgroups_table.c.marketGroupName,
+                marketgroups_table.c.parentGroupID))).fetchall())
+    paths = {}
+
+    def path(marketGroupID):
+        if marketGroupID not in paths:
+            names = []
+            current = marketGroupID
+            while current in marketGroups and len(names) < len(marketGroups):
+                name, current = marketGroups[current]
+                names.append(name or u"")
+            paths[marketGroupID] = u" / ".join(reversed(names))
+        return paths[marketGroupID]
+
+    categoryNames = dict(session.execute(select((categories_table.c.categoryID, categories_table.c.categoryName))).fetchall())
+    groupNames = dict((groupID, (groupName, categoryNames.get(categoryID))) for groupID, groupName, categoryID in
+                      session.execute(select((groups_table.c.groupID, groups_table.c.groupName,
+                                              groups_table.c.categoryID))).fetchall())
+
+    index = SearchIndex()
+    groups = {}
+    for typeID, name, groupID, marketGroupID in session.execute(
+            select((items_table.c.typeID, items_table.c.typeName, items_table.c.groupID,
+                    items_table.c.marketGroupID))):
+        if not name:
+            continue
+        index.add(typeID, name, path(marketGroupID))
+        groups[typeID] = groupID
+
+    pyfalog.debug("Built item search index over {0} items in {1:.1f}ms", len(index), (time.time() - start) * 1000)
+    return ItemSearch(index, groups, groupNames)
+
+
+def build(path, session=None):
+    """Write the item search index of the database behind session to path"""
+    session = session or gamedata_session
+    clientBuild = session.execute(
+        select([metadata_table.c.field_value], metadata_table.c.field_name == "client_build")).scalar()
+    search = collect(session)
+
+    # Write next to the target and move it in place, so a reader never sees half an index
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "wb") as f:
+        marshal.dump((MAGIC, FORMAT_VERSION, clientBuild, search.dump()), f)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmpPath, path)
+    return clientBuild
+
+
+def load(path, clientBuild):
+    """The item search index at path, None if it is missing, broken or not made from clientBuild"""
+    if not path or not os.path.isfile(path):
+        pyfalog.debug("No item search index at {0}", path)
+        return None
+
+    start = time.time()
+    try:
+        with open(path, "rb") as f:
+            magic, formatVersion, indexBuild, data = marshal.load(f)
+        if magic != MAGIC or formatVersion != FORMAT_VERSION:
+            raise ValueError("{0} is no item search index of format version {1}".format(path, FORMAT_VERSION))
+        search = ItemSearch.restore(data)
+    except (EnvironmentError, ValueError, EOFError, KeyError, TypeError) as e:
+        pyfalog.warning("Unable to read item search index {0}, building it from the database", path)
+        pyfalog.warning(e)
+        return None
+
+    if clientBuild is None or indexBuild != clientBuild:
+        pyfalog.warning("Item search index {0} is of build {1}, the database is {2}. Building it from the database.",
+                        path, indexBuild, clientBuild)
+        return None
+
+    pyfalog.debug("Read item search index of build {0} in {1:.1f}ms", indexBuild, (time.time() - start) * 1000)
+    return search
+
+
+_search = None
+_lock = threading.Lock()
+
+
+def getItemSearch():
+    """The item search index, read or built on first use"""
+    global _search
+    if _search is None:
+        with _lock:
+            if _search is None:
+                _search = load(getattr(config, "gamedataSearchIndex", None), config.gamedata_version) or collect()
+    return _search
+
+
+def reset():
+    """Forget the item search index, it's read or built again on next use"""
+    global _search
+    with _lock:
+        _search = None
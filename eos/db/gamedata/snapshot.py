@@ -0,0 +1,463 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Preloaded gamedata snapshot.
+
+build() serialises the static gamedata (items with their attributes, effects,
+meta types and traits, plus attribute/effect infos, groups, categories, market
+groups, meta groups, units and icons) into a single file keyed by the client
+build of the database it was made from. The file starts with a small header
+holding all the small tables and an index of the items; each item is a
+separate record which is only decoded, from a memory map, when it is asked for.
+
+Snapshot builds the regular gamedata objects out of it without running any
+SQL. They are attached to the gamedata session of the thread asking for them,
+as if they were loaded from the database, so anything the snapshot doesn't
+hold (descriptions, reverse relations like Group.items) is still lazily loaded
+from SQLite, through that thread's own session. Every session keeps the
+objects built into it, they go along with it when the session is removed.
+"""
+
+import marshal
+import mmap
+import os
+import struct
+import threading
+import time
+
+from logbook import Logger
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import manager_of_class, set_committed_value
+from sqlalchemy.sql import select
+
+from eos import config
+from eos.db import gamedata_session
+from eos.db.gamedata.attribute import attributes_table, typeattributes_table
+from eos.db.gamedata.category import categories_table
+from eos.db.gamedata.effect import effects_table, typeeffects_table
+from eos.db.gamedata.group import groups_table
+from eos.db.gamedata.icon import icons_table
+from eos.db.gamedata.item import items_table
+from eos.db.gamedata.marketGroup import marketgroups_table
+from eos.db.gamedata.metaData import metadata_table
+from eos.db.gamedata.metaGroup import metagroups_table, metatypes_table
+from eos.db.gamedata.traits import traits_table
+from eos.db.gamedata.unit import groups_table as units_table
+from eos.gamedata import (Attribute, AttributeInfo, Category, Effect, EffectInfo, Group, Icon, Item, MarketGroup,
+                          MetaGroup, MetaType, Traits, Unit)
+
+pyfalog = Logger(__name__)
+
+MAGIC = "PYFASNAP"
+# Bump whenever the layout of the records below changes
+FORMAT_VERSION = 1
+# Magic, format version, header length
+PREFIX = struct.Struct("<8sII")
+
+# Columns stored for each table, the ID comes first and is used as key
+ICON_COLUMNS = ("iconID", "iconFile")
+UNIT_COLUMNS = ("unitID", "unitName", "displayName")
+ATTRIBUTE_INFO_COLUMNS = ("attributeID", "attributeName", "defaultValue", "maxAttributeID", "published",
+                          "displayName", "highIsGood", "iconID", "unitID")
+EFFECT_INFO_COLUMNS = ("effectID", "effectName", "published", "isAssistance", "isOffensive")
+CATEGORY_COLUMNS = ("categoryID", "categoryName", "published", "iconID")
+GROUP_COLUMNS = ("groupID", "groupName", "published", "categoryID", "iconID")
+MARKET_GROUP_COLUMNS = ("marketGroupID", "marketGroupName", "hasTypes", "parentGroupID", "iconID")
+META_GROUP_COLUMNS = ("metaGroupID", "metaGroupName")
+ITEM_COLUMNS = ("typeID", "typeName", "raceID", "factionID", "volume", "mass", "capacity", "published",
+                "marketGroupID", "iconID", "groupID")
+
+
+def _rows(session, table, columns):
+    return session.execute(select([table.c[column] for column in columns])).fetchall()
+
+
+def _table(session, table, columns):
+    return dict((row[0], tuple(row[1:])) for row in _rows(session, table, columns))
+
+
+def build(path, session=None):
+    """Write a snapshot of the gamedata database behind session to path"""
+    session = session or gamedata_session
+    start = time.time()
+
+    clientBuild = session.execute(
+        select([metadata_table.c.field_value], metadata_table.c.field_name == "client_build")).scalar()
+
+    attributes = {}
+    for typeID, attributeID, value in _rows(session, typeattributes_table, ("typeID", "attributeID", "value")):
+        attributes.setdefault(typeID, []).append((attributeID, value))
+
+    effects = {}
+    for typeID, effectID in _rows(session, typeeffects_table, ("typeID", "effectID")):
+        effects.setdefault(typeID, []).append(effectID)
+
+    metaTypes = _table(session, metatypes_table, ("typeID", "parentTypeID", "metaGroupID"))
+    traits = dict(_rows(session, traits_table, ("typeID", "traitText")))
+
+    records = []
+    types = {}
+    typeNames = {}
+    offset = 0
+    for row in _rows(session, items_table, ITEM_COLUMNS):
+        typeID = row[0]
+        record = marshal.dumps((
+            tuple(row[1:]),
+            tuple(attributes.get(typeID, ())),
+            tuple(effects.get(typeID, ())),
+            metaTypes.get(typeID),
+            traits.get(typeID),
+        ))
+        records.append(record)
+        types[typeID] = (offset, len(record))
+        offset += len(record)
+        if row[1] is not None:
+            typeNames[row[1]] = typeID
+
+    header = marshal.dumps({
+        "clientBuild"   : clientBuild,
+        "icons"         : _table(session, icons_table, ICON_COLUMNS),
+        "units"         : _table(session, units_table, UNIT_COLUMNS),
+        "attributeInfos": _table(session, attributes_table, ATTRIBUTE_INFO_COLUMNS),
+        "effectInfos"   : _table(session, effects_table, EFFECT_INFO_COLUMNS),
+        "categories"    : _table(session, categories_table, CATEGORY_COLUMNS),
+        "groups"        : _table(session, groups_table, GROUP_COLUMNS),
+        "marketGroups"  : _table(session, marketgroups_table, MARKET_GROUP_COLUMNS),
+        "metaGroups"    : _table(session, metagroups_table, META_GROUP_COLUMNS),
+        "types"         : types,
+        "typeNames"     : typeNames,
+    })
+
+    # Write next to the target and move it in place, so a reader never sees half a snapshot
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for record in records:
+            f.write(record)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmpPath, path)
+
+    pyfalog.info("Built gamedata snapshot of build {0} ({1} items) in {2:.2f}s", clientBuild, len(types),
+                 time.time() - start)
+    return clientBuild
+
+
+class Snapshot(object):
+    """
+    Read access to a snapshot file, building gamedata objects attached to
+    session, or to the gamedata session of the calling thread when there is
+    none. All lookups return None for anything which isn't in the snapshot,
+    just like the database queries do.
+    """
+
+    def __init__(self, path, session=None):
+        self.path = path
+        self.__session = session
+
+        with open(path, "rb") as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, formatVersion, headerLength = PREFIX.unpack(self.__map[:PREFIX.size])
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("{0} is not a gamedata snapshot".format(path))
+        if formatVersion != FORMAT_VERSION:
+            self.close()
+            raise ValueError("Gamedata snapshot {0} has format version {1}, expected {2}".format(
+                path, formatVersion, FORMAT_VERSION))
+
+        header = marshal.loads(self.__map[PREFIX.size:PREFIX.size + headerLength])
+        self.__dataOffset = PREFIX.size + headerLength
+        self.clientBuild = header["clientBuild"]
+
+        self.__rows = {}
+        self.__names = {}
+        for kind in ("icons", "units", "attributeInfos", "effectInfos", "categories", "groups", "marketGroups",
+                     "metaGroups"):
+            rows = self.__rows[kind] = header[kind]
+            self.__names[kind] = dict((row[0], ID) for ID, row in rows.iteritems())
+        self.__types = header["types"]
+        self.__names["types"] = header["typeNames"]
+
+        self.__lock = threading.RLock()
+
+    def close(self):
+        self.__map.close()
+
+    def __len__(self):
+        return len(self.__types)
+
+    @property
+    def session(self):
+        return self.__session or gamedata_session()
+
+    def __objects(self, kind):
+        """Objects of kind built into the current session so far, by ID"""
+        info = self.session.info
+        objects = info.get(self)
+        if objects is None:
+            objects = info[self] = dict((name, {}) for name in self.__rows)
+            objects["types"] = {}
+        return objects[kind]
+
+    def __instance(self, cls, values, relations=None):
+        """
+        Build an instance of a mapped class and add it to the session as a
+        persistent object, without any SQL. Returns the object the session
+        already has instead, if there is one.
+        """
+        obj = manager_of_class(cls).new_instance()
+        for key, value in values.iteritems():
+            set_committed_value(obj, key, value)
+
+        existing = self.__existing(cls, manager_of_class(cls).mapper.primary_key_from_instance(obj))
+        if existing is not None:
+            return existing
+
+        if relations:
+            for key, value in relations.iteritems():
+                set_committed_value(obj, key, value)
+
+        make_transient_to_detached(obj)
+        self.session.add(obj)
+        # Reconstructors only run for objects loaded by a query
+        init = getattr(obj, "init", None)
+        if init is not None:
+            init()
+        return obj
+
+    def __existing(self, cls, primaryKey):
+        mapper = manager_of_class(cls).mapper
+        return self.session.identity_map.get(mapper.identity_key_from_primary_key(primaryKey))
+
+    def __lookup(self, kind, lookfor):
+        """ID of lookfor, which is either an ID or a name"""
+        if isinstance(lookfor, basestring):
+            return self.__names[kind].get(lookfor)
+        return lookfor
+
+    def __get(self, kind, lookfor, create):
+        ID = self.__lookup(kind, lookfor)
+        if ID is None:
+            return None
+
+        objects = self.__objects(kind)
+        obj = objects.get(ID)
+        if obj is None:
+            # Only needed for a session given to the snapshot, the sessions of threads are their own
+            with self.__lock:
+                obj = objects.get(ID)
+                if obj is None:
+                    obj = create(ID)
+                    if obj is not None:
+                        objects[ID] = obj
+        return obj
+
+    def __values(self, kind, ID, columns):
+        row = self.__rows[kind].get(ID)
+        if row is None:
+            return None
+        return dict(zip(columns, (ID,) + row))
+
+    def getIcon(self, lookfor):
+        return self.__get("icons", lookfor, self.__createIcon)
+
+    def __createIcon(self, ID):
+        values = self.__values("icons", ID, ICON_COLUMNS)
+        return values and self.__instance(Icon, values)
+
+    def getUnit(self, lookfor):
+        return self.__get("units", lookfor, self.__createUnit)
+
+    def __createUnit(self, ID):
+        values = self.__values("units", ID, UNIT_COLUMNS)
+        return values and self.__instance(Unit, values)
+
+    def getAttributeInfo(self, lookfor):
+        return self.__get("attributeInfos", lookfor, self.__createAttributeInfo)
+
+    def __createAttributeInfo(self, ID):
+        values = self.__values("attributeInfos", ID, ATTRIBUTE_INFO_COLUMNS)
+        return values and self.__instance(AttributeInfo, values, {
+            "icon": self.getIcon(values["iconID"]),
+            "unit": self.getUnit(values["unitID"]),
+        })
+
+    def getEffectInfo(self, lookfor):
+        return self.__get("effectInfos", lookfor, self.__createEffectInfo)
+
+    def __createEffectInfo(self, ID):
+        values = self.__values("effectInfos", ID, EFFECT_INFO_COLUMNS)
+        return values and self.__instance(EffectInfo, values)
+
+    def getCategory(self, lookfor):
+        return self.__get("categories", lookfor, self.__createCategory)
+
+    def __createCategory(self, ID):
+        values = self.__values("categories", ID, CATEGORY_COLUMNS)
+        return values and self.__instance(Category, values, {"icon": self.getIcon(values["iconID"])})
+
+    def getGroup(self, lookfor):
+        return self.__get("groups", lookfor, self.__createGroup)
+
+    def __createGroup(self, ID):
+        values = self.__values("groups", ID, GROUP_COLUMNS)
+        return values and self.__instance(Group, values, {
+            "category": self.getCategory(values["categoryID"]),
+            "icon"    : self.getIcon(values["iconID"]),
+        })
+
+    def getMarketGroup(self, lookfor):
+        return self.__get("marketGroups", lookfor, self.__createMarketGroup)
+
+    def __createMarketGroup(self, ID):
+        values = self.__values("marketGroups", ID, MARKET_GROUP_COLUMNS)
+        return values and self.__instance(MarketGroup, values, {
+            "parent": self.getMarketGroup(values["parentGroupID"]),
+            "icon"  : self.getIcon(values["iconID"]),
+        })
+
+    def getMetaGroup(self, lookfor):
+        return self.__get("metaGroups", lookfor, self.__createMetaGroup)
+
+    def __createMetaGroup(self, ID):
+        values = self.__values("metaGroups", ID, META_GROUP_COLUMNS)
+        return values and self.__instance(MetaGroup, values)
+
+    def __record(self, typeID):
+        location = self.__types.get(typeID)
+        if location is None:
+            return None
+        offset, length = location
+        offset += self.__dataOffset
+        return marshal.loads(self.__map[offset:offset + length])
+
+    def getItem(self, lookfor):
+        return self.__get("types", lookfor, self.__createItem)
+
+    def __createItem(self, typeID):
+        record = self.__record(typeID)
+        if record is None:
+            return None
+        row, attributes, effectIDs, metaType, traitText = record
+        values = dict(zip(ITEM_COLUMNS, (typeID,) + row))
+
+        existing = self.__existing(Item, (typeID,))
+        if existing is not None:
+            return existing
+
+        attributeObjects = []
+        for attributeID, value in attributes:
+            attributeObjects.append(self.__instance(
+                Attribute, {"typeID": typeID, "attributeID": attributeID, "value": value},
+                {"info": self.getAttributeInfo(attributeID)}))
+
+        effectObjects = []
+        for effectID in effectIDs:
+            effectObjects.append(self.__instance(Effect, {"typeID": typeID, "effectID": effectID},
+                                                 {"info": self.getEffectInfo(effectID)}))
+
+        if metaType is not None:
+            parentTypeID, metaGroupID = metaType
+            metaType = self.__instance(MetaType, {"typeID": typeID, "parentTypeID": parentTypeID,
+                                                  "metaGroupID": metaGroupID}, {
+                "parent": self.getItem(parentTypeID),
+                "info"  : self.getMetaGroup(metaGroupID),
+            })
+
+        if traitText is not None:
+            traitText = self.__instance(Traits, {"typeID": typeID, "traitText": traitText})
+
+        item = self.__instance(Item, values, {
+            "group"            : self.getGroup(values["groupID"]),
+            "icon"             : self.getIcon(values["iconID"]),
+            "marketGroup"      : self.getMarketGroup(values["marketGroupID"]),
+            "metaGroup"        : metaType,
+            "traits"           : traitText,
+            "_Item__attributes": attributeObjects,
+            "effects"          : effectObjects,
+        })
+        return item
+
+    def directAttributeRequest(self, itemIDs, attrIDs):
+        """Same rows directAttributeRequest returns: (typeID, attributeID, value)"""
+        attrIDs = set(attrIDs)
+        result = []
+        for itemID in itemIDs:
+            record = self.__record(itemID)
+            if record is None:
+                continue
+            for attributeID, value in record[1]:
+                if attributeID in attrIDs:
+                    result.append((itemID, attributeID, value))
+        return result
+
+
+def load(path, clientBuild, session=None):
+    """Open the snapshot at path, None if it is missing, broken or not made from clientBuild"""
+    if not path or not os.path.isfile(path):
+        pyfalog.debug("No gamedata snapshot at {0}", path)
+        return None
+
+    start = time.time()
+    try:
+        snapshot = Snapshot(path, session)
+    except (EnvironmentError, ValueError, EOFError, KeyError, struct.error) as e:
+        pyfalog.warning("Unable to open gamedata snapshot {0}, falling back to the database", path)
+        pyfalog.warning(e)
+        return None
+
+    if clientBuild is None or snapshot.clientBuild != clientBuild:
+        pyfalog.warning("Gamedata snapshot {0} is of build {1}, the database is {2}. Falling back to the database.",
+                        path, snapshot.clientBuild, clientBuild)
+        snapshot.close()
+        return None
+
+    pyfalog.debug("Opened gamedata snapshot of build {0} ({1} items) in {2:.1f}ms", snapshot.clientBuild,
+                  len(snapshot), (time.time() - start) * 1000)
+    return snapshot
+
+
+_snapshot = None
+_checked = False
+_lock = threading.Lock()
+
+
+def getSnapshot():
+    """The configured snapshot, opened on first use. None when disabled, missing or stale."""
+    global _snapshot, _checked
+    if not _checked:
+        with _lock:
+            if not _checked:
+                _snapshot = load(getattr(config, "gamedataSnapshot", None), config.gamedata_version)
+                _checked = True
+    return _snapshot
+
+
+def reset():
+    """Forget the opened snapshot, it is opened again on next use"""
+    global _snapshot, _checked
+    with _lock:
+        if _snapshot is not None:
+            _snapshot.close()
+        _snapshot = None
+        _checked = False
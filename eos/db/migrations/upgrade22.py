@@ -0,0 +1,11 @@
+"""
+Migration 22
+
+- Characters only store skills at a level other than their default level, skills at the default level are created
+  when needed. Removes the skill rows stored at the default level of their character.
+"""
+
+
+def upgrade(saveddata_engine):
+    saveddata_engine.execute("DELETE FROM characterSkills WHERE _Skill__level IS "
+                             "(SELECT defaultLevel FROM characters WHERE characters.ID = characterSkills.characterID);")
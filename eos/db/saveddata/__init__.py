@@ -1,6 +1,7 @@
 __all__ = [
     "character",
     "fit",
+    "fitStats",
     "module",
     "user",
     "skill",
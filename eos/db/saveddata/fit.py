@@ -28,6 +28,7 @@ from eos.db import saveddata_session
 from eos.db.saveddata.cargo import cargo_table
 from eos.db.saveddata.drone import drones_table
 from eos.db.saveddata.fighter import fighters_table
+from eos.db.saveddata.fitStats import fitStats_table
 from eos.db.saveddata.implant import fitImplants_table
 from eos.db.saveddata.module import modules_table
 from eos.effectHandlerHelpers import HandledModuleList, HandledImplantBoosterList, HandledProjectedModList, \
@@ -37,6 +38,7 @@ from eos.saveddata.character import Character
 from eos.saveddata.user import User
 from eos.saveddata.fighter import Fighter
 from eos.saveddata.fit import Fit as es_Fit, ImplantLocation
+from eos.saveddata.fitStats import FitStats
 from eos.saveddata.drone import Drone
 from eos.saveddata.booster import Booster
 from eos.saveddata.module import Module
@@ -203,6 +205,12 @@ mapper(es_Fit, fits_table,
                backref="fits"),
            "_Fit__damagePattern": relation(DamagePattern),
            "_Fit__targetResists": relation(TargetResists),
+           "stats": relation(
+               FitStats,
+               uselist=False,
+               cascade='all, delete, delete-orphan',
+               single_parent=True,
+               primaryjoin=fitStats_table.c.fitID == fits_table.c.ID),
            "projectedOnto": relationship(
                ProjectedFit,
                primaryjoin=projectedFits_table.c.sourceID == fits_table.c.ID,
@@ -0,0 +1,108 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+from sqlalchemy import Table, Column, Integer, Float, ForeignKey, String, event, inspect as sqlalchemy_inspect
+from sqlalchemy.orm import mapper
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import select
+
+from eos.db import saveddata_meta, saveddata_session
+from eos.saveddata.fit import Fit
+from eos.saveddata.fitStats import FitStats
+
+fitStats_table = Table("fitStats", saveddata_meta,
+                       Column("fitID", Integer, ForeignKey("fits.ID"), primary_key=True),
+                       Column("contentHash", String, nullable=False),
+                       Column("characterHash", String, nullable=True),
+                       Column("gamedataVersion", String, nullable=False, index=True),
+                       Column("timestamp", Float, nullable=False),
+                       Column("dps", Float),
+                       Column("volley", Float),
+                       Column("ehp", Float),
+                       Column("maxSpeed", Float),
+                       Column("alignTime", Float),
+                       Column("price", Float))
+
+mapper(FitStats, fitStats_table)
+
+# Fit attributes which don't change how it calculates
+UNCALCULATED = frozenset(("name", "timestamp", "booster", "notes", "owner", "ownerID", "stats"))
+
+# fitID => number of times the stats of the fit were dropped, for telling stats calculated before a change
+changes = {}
+
+
+def changedFitIDs(session):
+    """IDs of the fits whose contents change with the flush of session"""
+    fitIDs = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, FitStats):
+            continue
+        if isinstance(obj, Fit):
+            state = sqlalchemy_inspect(obj)
+            if obj in session.new or obj in session.deleted or any(
+                    attr.history.has_changes() for attr in state.attrs if attr.key not in UNCALCULATED):
+                fitIDs.add(obj.ID)
+            continue
+        # Modules, drones, cargo and the rest of a fit, fighter abilities through their fighter, projections
+        # and boosts on the fit they apply to
+        owner = getattr(obj, "fighter", obj)
+        for name in ("fitID", "victimID", "boostedID"):
+            fitID = getattr(owner, name, None)
+            if fitID is not None:
+                fitIDs.add(fitID)
+                break
+
+    fitIDs.discard(None)
+    return fitIDs
+
+
+def affectedFitIDs(session, fitIDs):
+    """fitIDs with the fits they are projected onto or boost, and so on, as their stats depend on them"""
+    projectedFits = saveddata_meta.tables["projectedFits"]
+    commandFits = saveddata_meta.tables["commandFits"]
+    known = set(fitIDs)
+    new = set(known)
+    while new:
+        found = set()
+        for table, sourceColumn, targetColumn in ((projectedFits, "sourceID", "victimID"),
+                                                  (commandFits, "boosterID", "boostedID")):
+            found.update(ID for (ID,) in session.execute(
+                select([table.c[targetColumn]], table.c[sourceColumn].in_(list(new)))))
+        new = found - known
+        known |= new
+    return known
+
+
+@event.listens_for(saveddata_session, "before_flush")
+def dropChangedStats(session, flushContext, instances):
+    """Drop the stats of fits changed by the flush, they are calculated again in the background"""
+    fitIDs = changedFitIDs(session)
+    if not fitIDs:
+        return
+
+    for fitID in affectedFitIDs(session, fitIDs):
+        changes[fitID] = changes.get(fitID, 0) + 1
+        stats = session.query(FitStats).get(fitID)
+        if stats is None:
+            continue
+        session.delete(stats)
+        fit = session.identity_map.get(session.identity_key(Fit, fitID))
+        if fit is not None and "stats" in fit.__dict__:
+            set_committed_value(fit, "stats", None)
@@ -17,10 +17,14 @@
 # along with eos.  If not, see <http://www.gnu.org/licenses/>.
 # ===============================================================================
 
-from sqlalchemy.sql import and_
-
-from eos.db import saveddata_session, sd_lock
-from eos.db.saveddata.fit import projectedFits_table
+from sqlalchemy.orm import joinedload, sessionmaker, subqueryload
+from sqlalchemy.sql import and_, select
+
+from eos.db import saveddata_engine, saveddata_session, sd_lock
+from eos.db.saveddata.fit import commandFits_table, projectedFits_table
+from eos.db.saveddata.fitStats import changes as fitStatsChanges
+from eos.db.saveddata.search import getFitSearch
+from eos.db.writeBehind import WriteBehind
 from eos.db.util import processEager, processWhere
 from eos.saveddata.price import Price
 from eos.saveddata.user import User
@@ -30,6 +34,7 @@ from eos.saveddata.targetResists import TargetResists
 from eos.saveddata.character import Character
 from eos.saveddata.implantSet import ImplantSet
 from eos.saveddata.fit import Fit
+from eos.saveddata.fitStats import FitStats
 from eos.saveddata.miscData import MiscData
 from eos.saveddata.override import Override
 
@@ -37,86 +42,13 @@ import eos.config
 
 configVal = getattr(eos.config, "saveddataCache", None)
 if configVal is True:
-    import weakref
-
-    itemCache = {}
-    queryCache = {}
+    from eos.db import cache
+    from eos.db.cache import removeCachedEntry
 
-    def cachedQuery(type, amount, *keywords):
-        itemCache[type] = localItemCache = weakref.WeakValueDictionary()
-        queryCache[type] = typeQueryCache = {}
-
-        def deco(function):
-            localQueryCache = typeQueryCache[function] = {}
-
-            def setCache(cacheKey, args, kwargs):
-                items = function(*args, **kwargs)
-                IDs = set()
-                localQueryCache[cacheKey] = (isinstance(items, list), IDs)
-                stuff = items if isinstance(items, list) else (items,)
-                for item in stuff:
-                    ID = getattr(item, "ID", None)
-                    if ID is None:
-                        # Some uncachable data, don't cache this query
-                        del localQueryCache[cacheKey]
-                        break
-                    localItemCache[ID] = item
-                    IDs.add(ID)
-
-                return items
-
-            def checkAndReturn(*args, **kwargs):
-                useCache = kwargs.pop("useCache", True)
-                cacheKey = []
-                items = None
-                cacheKey.extend(args)
-                for keyword in keywords:
-                    cacheKey.append(kwargs.get(keyword))
-
-                cacheKey = tuple(cacheKey)
-                info = localQueryCache.get(cacheKey)
-                if info is None or not useCache:
-                    items = setCache(cacheKey, args, kwargs)
-                else:
-                    l, IDs = info
-                    if l:
-                        items = []
-                        for ID in IDs:
-                            data = localItemCache.get(ID)
-                            if data is None:
-                                # Fuck, some of our stuff isn't cached it seems.
-                                items = setCache(cacheKey, args, kwargs)
-                                break
-                            items.append(data)
-                    else:
-                        for ID in IDs:
-                            items = localItemCache.get(ID)
-                            if items is None:
-                                items = setCache(cacheKey, args, kwargs)
-                            break
-
-                return items
-
-            return checkAndReturn
-
-        return deco
-
-    def removeCachedEntry(type, ID):
-        if type not in queryCache:
-            return
-        functionCache = queryCache[type]
-        for _, localCache in functionCache.iteritems():
-            toDelete = set()
-            for cacheKey, info in localCache.iteritems():
-                IDs = info[1]
-                if ID in IDs:
-                    toDelete.add(cacheKey)
-
-            for cacheKey in toDelete:
-                del localCache[cacheKey]
-
-            if ID in itemCache[type]:
-                del itemCache[type][ID]
+    def cachedQuery(type, amount, *keywords, **options):
+        options.setdefault("size", eos.config.saveddataCacheSize)
+        options.setdefault("ttl", eos.config.saveddataCacheTTL)
+        return cache.cachedQuery(amount, *keywords, type=type, prefix="saveddata.", **options)
 
 elif callable(configVal):
     cachedQuery, removeCachedEntry = eos.config.gamedataCache
@@ -303,6 +235,116 @@ def getFitList(eager=None):
     return fits
 
 
+def getFitIDs(where=None):
+    """
+    Get IDs of all fits matching where, without loading the fits themselves.
+    Invalid fits are not filtered out, as that requires loading them.
+    """
+    if where is None:
+        where = ()
+    elif not isinstance(where, (list, tuple)):
+        where = (where,)
+
+    with sd_lock:
+        query = saveddata_session.query(Fit.ID).filter(*where)
+        IDs = [ID for (ID,) in query.order_by(Fit.ID)]
+
+    return IDs
+
+
+# Fits per query of loadFits, SQLite takes no more than 999 parameters
+LOAD_CHUNK = 500
+
+# What loadFits loads along with the fits, a query each
+FIT_RELATIONS = (
+    subqueryload("_Fit__modules"),
+    subqueryload("_Fit__projectedModules"),
+    subqueryload("_Fit__drones"),
+    subqueryload("_Fit__projectedDrones"),
+    subqueryload("_Fit__fighters").subqueryload("_Fighter__abilities"),
+    subqueryload("_Fit__projectedFighters").subqueryload("_Fighter__abilities"),
+    subqueryload("_Fit__cargo"),
+    subqueryload("_Fit__implants"),
+    subqueryload("_Fit__boosters").subqueryload("_Booster__activeSideEffectDummies"),
+    joinedload("stats"),
+    joinedload("_Fit__damagePattern"),
+    joinedload("_Fit__targetResists"),
+    joinedload("_Fit__character").subqueryload("_Character__skills"),
+    joinedload("_Fit__character").subqueryload("_Character__implants"),
+)
+
+# The projections and command bursts between fits, loaded once all the fits are, as they check the fits at both ends
+FIT_LINKS = (
+    subqueryload("projectedOnto"),
+    subqueryload("victimOf"),
+    subqueryload("boostedOnto"),
+    subqueryload("boostedOf"),
+)
+
+
+def _chunks(IDs):
+    IDs = list(IDs)
+    for start in xrange(0, len(IDs), LOAD_CHUNK):
+        yield IDs[start:start + LOAD_CHUNK]
+
+
+def _relatedFitIDs(fitIDs, session):
+    """IDs of the fits projected onto or boosting fitIDs, and the fits projected onto or boosting those"""
+    known = set(fitIDs)
+    new = set(known)
+    while new:
+        found = set()
+        for chunk in _chunks(new):
+            for table, sourceColumn, targetColumn in (
+                    (projectedFits_table, "sourceID", "victimID"),
+                    (commandFits_table, "boosterID", "boostedID")):
+                found.update(ID for (ID,) in session.execute(
+                    select([table.c[sourceColumn]], table.c[targetColumn].in_(chunk))))
+        new = found - known
+        known |= new
+
+    return known - set(fitIDs)
+
+
+def loadFits(fitIDs, session=None):
+    """
+    Load fitIDs with everything they hold, and the fits projected onto or
+    boosting them, in a fixed number of queries for every 500 fits instead of
+    queries for every fit. Returns the fits of fitIDs which exist, in that
+    order. Invalid fits are returned too, for the callers to deal with. Fits
+    are loaded into session, one from newSaveddataSession, or the shared one.
+    """
+    if session is None:
+        with sd_lock:
+            return _loadFits(list(fitIDs), saveddata_session)
+    return _loadFits(list(fitIDs), session)
+
+
+def _loadFits(fitIDs, session):
+    fits = {}
+    IDs = fitIDs + list(_relatedFitIDs(fitIDs, session))
+    for chunk in _chunks(IDs):
+        for fit in session.query(Fit).options(*FIT_RELATIONS).filter(Fit.ID.in_(chunk)):
+            fits[fit.ID] = fit
+    for chunk in _chunks(IDs):
+        session.query(Fit).options(*FIT_LINKS).filter(Fit.ID.in_(chunk)).all()
+
+    return [fits[fitID] for fitID in fitIDs if fitID in fits]
+
+
+# Other threads can't see an in memory database, they'd each open an empty one
+saveddataInMemory = saveddata_engine.url.database in (None, "", ":memory:")
+
+
+def newSaveddataSession():
+    """
+    A session of its own, for reading saveddata without touching the objects
+    of the shared session. It only sees what's committed. With an in memory
+    database it can only be used on the thread making it.
+    """
+    return sessionmaker(bind=saveddata_engine, autoflush=False, expire_on_commit=False)()
+
+
 @cachedQuery(Price, 1, "typeID")
 def getPrice(typeID):
     if isinstance(typeID, int):
@@ -412,6 +454,45 @@ def getImplantSet(lookfor, eager=None):
     return pattern
 
 
+def getFitStatsList(gamedataVersion, shipID=None):
+    """
+    Stats kept with gamedataVersion, each with the character ID of its fit, of
+    the fits of shipID or of all fits. Fits themselves are not loaded.
+    """
+    with sd_lock:
+        query = saveddata_session.query(FitStats, Fit.characterID).join(Fit, Fit.ID == FitStats.fitID).filter(
+            FitStats.gamedataVersion == gamedataVersion)
+        if shipID is not None:
+            query = query.filter(Fit.shipID == shipID)
+        stats = query.all()
+
+    return stats
+
+
+def getFitStatsChanges(fitIDs):
+    """fitID => how often the stats of the fit were dropped for a change, see eos.db.saveddata.fitStats"""
+    return dict((fitID, fitStatsChanges.get(fitID, 0)) for fitID in fitIDs)
+
+
+def mergeFitStats(stats):
+    """Save FitStats calculated in another session, returns them as they are in the shared session"""
+    with sd_lock:
+        return [saveddata_session.merge(fitStats) for fitStats in stats]
+
+
+def getFitContentHashes(shipIDs):
+    """(fitID, contentHash) of the fits of shipIDs, the hash is None for fits without stats"""
+    shipIDs = list(shipIDs)
+    if not shipIDs:
+        return []
+
+    with sd_lock:
+        hashes = saveddata_session.query(Fit.ID, FitStats.contentHash).outerjoin(
+            FitStats, FitStats.fitID == Fit.ID).filter(Fit.shipID.in_(shipIDs)).all()
+
+    return hashes
+
+
 def searchFits(nameLike, where=None, eager=None):
     if not isinstance(nameLike, basestring):
         raise TypeError("Need string as argument")
@@ -427,6 +508,30 @@ def searchFits(nameLike, where=None, eager=None):
     return fits
 
 
+def findFits(text, limit=None, eager=None):
+    """Fits matching text through the search index, best first"""
+    if not isinstance(text, basestring):
+        raise TypeError("Need string as argument")
+
+    fits = getFits(getFitSearch().search(text, limit=limit), eager)
+    with sd_lock:
+        fits = removeInvalid(fits)
+
+    return fits
+
+
+def getFits(fitIDs, eager=None):
+    """The fits of fitIDs which exist, in that order, with a query for every 500 fits"""
+    fitIDs = list(fitIDs)
+    found = {}
+    with sd_lock:
+        for chunk in _chunks(fitIDs):
+            for fit in saveddata_session.query(Fit).options(*processEager(eager)).filter(Fit.ID.in_(chunk)):
+                found[fit.ID] = fit
+
+    return [found[fitID] for fitID in fitIDs if fitID in found]
+
+
 def getProjectedFits(fitID):
     if isinstance(fitID, int):
         with sd_lock:
@@ -509,7 +614,27 @@ def remove(stuff):
     commit()
 
 
+writeBehind = WriteBehind(saveddata_session, sd_lock)
+
+
 def commit():
+    """Write the changes in the session, committed along with the next ones unless they are to be committed at once"""
+    writeBehind.commit(eos.config.saveddataCommitDelay)
+
+
+def sync():
+    """Commit everything written so far, for closing, exports and explicit saves"""
+    writeBehind.sync()
+
+
+def release(stuff):
+    """
+    Commit stuff and let go of it, it is loaded again the next time it's asked
+    for. For threads done with what they saved, as it holds their gamedata.
+    """
+    sync()
     with sd_lock:
-        saveddata_session.commit()
-        saveddata_session.flush()
+        for obj in stuff:
+            removeCachedEntry(type(obj), obj.ID)
+            if obj in saveddata_session:
+                saveddata_session.expunge(obj)
@@ -0,0 +1,84 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Search index over fit names.
+
+It's built from the fits table on the first search, and from then on kept up
+to date as fits are written: every insert, update and delete of a fit in a
+flush changes the index along with the table.
+"""
+
+import threading
+import time
+
+from logbook import Logger
+from sqlalchemy import event
+from sqlalchemy.sql import select
+
+from eos.db import saveddata_session, sd_lock
+from eos.db.saveddata.fit import fits_table
+from eos.saveddata.fit import Fit
+from eos.searchIndex import SearchIndex
+
+pyfalog = Logger(__name__)
+
+_search = None
+_lock = threading.Lock()
+
+
+def getFitSearch():
+    """The fit search index, built on first use"""
+    global _search
+    if _search is None:
+        with _lock:
+            if _search is None:
+                start = time.time()
+                search = SearchIndex()
+                with sd_lock:
+                    rows = saveddata_session.execute(select((fits_table.c.ID, fits_table.c.name))).fetchall()
+                for fitID, name in rows:
+                    search.add(fitID, name)
+                pyfalog.debug("Built fit search index over {0} fits in {1:.1f}ms", len(search),
+                              (time.time() - start) * 1000)
+                _search = search
+    return _search
+
+
+def reset():
+    """Forget the fit search index, it's built again on next use"""
+    global _search
+    with _lock:
+        _search = None
+
+
+# Flushes run with sd_lock held, the listeners only touch an index which is already built
+
+
+@event.listens_for(Fit, "after_insert")
+@event.listens_for(Fit, "after_update")
+def fitWritten(mapper, connection, fit):
+    if _search is not None:
+        _search.add(fit.ID, fit.name)
+
+
+@event.listens_for(Fit, "after_delete")
+def fitDeleted(mapper, connection, fit):
+    if _search is not None:
+        _search.remove(fit.ID)
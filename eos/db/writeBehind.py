@@ -0,0 +1,111 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+
+"""
+Write-behind commits of the saveddata session.
+
+Committing a SQLite transaction waits for the database to reach the disk, so
+committing every change makes clicking through a fit, or importing thousands
+of them, wait on the disk for each. Changes are flushed into the open
+transaction right away, so queries and IDs see them, and committed together
+a moment later, when sync() is called, or right away, as configured by
+eos.config.saveddataCommitDelay.
+
+Commits put off for a moment are made through the scheduler the application
+gives, on the thread making the changes, the GUI's; without one they are made
+right away. A commit which fails keeps its changes, they are committed again
+with the next.
+
+The journal of SQLite keeps each commit whole through crashes, one crashing
+before a commit loses the changes flushed since the last.
+"""
+
+import threading
+
+from logbook import Logger
+
+pyfalog = Logger(__name__)
+
+
+class WriteBehind(object):
+
+    def __init__(self, session, lock, schedule=None):
+        self.session = session
+        # The lock guarding session
+        self.lock = lock
+        # Calls a function with no arguments a number of seconds later, on the thread changing the session.
+        # It's called from any thread, like wx.CallAfter is.
+        self.schedule = schedule
+        self.__pendingLock = threading.Lock()
+        self.__scheduled = False
+        # Commits asked for since the last commit
+        self.__pending = 0
+
+    @property
+    def pending(self):
+        return self.__pending
+
+    def commit(self, delay):
+        """
+        Flush the changes in the session now, and commit them within delay
+        seconds. 0 commits right away, as does any delay without a schedule,
+        None leaves it to the next sync().
+        """
+        with self.lock:
+            self.session.flush()
+
+        with self.__pendingLock:
+            self.__pending += 1
+            schedule = delay and self.schedule is not None and not self.__scheduled
+            if schedule:
+                self.__scheduled = True
+
+        if schedule:
+            self.schedule(delay, self.__scheduledSync)
+        elif delay == 0 or (delay and self.schedule is None):
+            self.sync()
+
+    def sync(self):
+        """Commit all changes made so far"""
+        with self.__pendingLock:
+            pending, self.__pending = self.__pending, 0
+        try:
+            with self.lock:
+                self.session.commit()
+        except Exception:
+            # Still to be committed
+            with self.__pendingLock:
+                self.__pending += pending
+            raise
+        if pending > 1:
+            pyfalog.debug("Committed {0} changes together", pending)
+
+    def __scheduledSync(self):
+        with self.__pendingLock:
+            self.__scheduled = False
+            if not self.__pending:
+                # Committed by a sync() in the meantime
+                return
+        try:
+            self.sync()
+        except Exception as e:
+            # Just like sync(), the changes are kept for the next commit
+            pyfalog.error("Unable to commit saved data, trying again with the next change")
+            pyfalog.error(e)
@@ -19,96 +19,297 @@
 
 from logbook import Logger
 
+from eos import calcJournal
+
 pyfalog = Logger(__name__)
 
 
+def itemSkills(element):
+    return [skill.name for skill in element.item.requiredSkills]
+
+
+def chargeSkills(element):
+    return [skill.name for skill in element.charge.requiredSkills]
+
+
+def itemGroup(element):
+    return (element.item.group.name,)
+
+
+def chargeGroup(element):
+    return (element.charge.group.name,)
+
+
+# Index kind => function returning index keys of an element
+INDEX_KEYS = {
+    "itemSkill": itemSkills,
+    "chargeSkill": chargeSkills,
+    "group": itemGroup,
+    "chargeGroup": chargeGroup,
+}
+
+
+class IndexedFilter(object):
+    """
+    Filter which HandledList resolves through its indexes rather than by
+    testing every element. Calling it directly behaves like the equivalent
+    lambda, so it can be used anywhere a filter function is expected.
+    """
+
+    def __init__(self, kind, keys):
+        self.kind = kind
+        self.keys = keys
+
+    def __call__(self, element):
+        elementKeys = INDEX_KEYS[self.kind](element)
+        for key in self.keys:
+            if key in elementKeys:
+                return True
+        return False
+
+
+def requiresSkill(*skillNames):
+    """Fast path for lambda mod: mod.item.requiresSkill(name) [or ...]"""
+    return IndexedFilter("itemSkill", skillNames)
+
+
+def chargeRequiresSkill(*skillNames):
+    """Fast path for lambda mod: mod.charge.requiresSkill(name) [or ...]"""
+    return IndexedFilter("chargeSkill", skillNames)
+
+
+def inGroup(*groupNames):
+    """Fast path for lambda mod: mod.item.group.name == name [or ...]"""
+    return IndexedFilter("group", groupNames)
+
+
+def chargeInGroup(*groupNames):
+    """Fast path for lambda mod: mod.charge.group.name == name [or ...]"""
+    return IndexedFilter("chargeGroup", groupNames)
+
+
+def buildFilterTemplates():
+    """
+    Bytecode of the lambda shapes effects use most, mapped to the index they
+    can be answered from. Lambdas only differ by their constants, so comparing
+    code and referenced names is enough to recognize them.
+    """
+    templates = {}
+    shapes = (
+        ("itemSkill", "mod.item.requiresSkill(%r)"),
+        ("chargeSkill", "mod.charge.requiresSkill(%r)"),
+        ("group", "mod.item.group.name == %r"),
+        ("chargeGroup", "mod.charge.group.name == %r"),
+    )
+    for kind, term in shapes:
+        for count in xrange(1, 5):
+            code = eval("lambda mod: " + " or ".join(term % str(i) for i in xrange(count))).__code__
+            templates[(code.co_code, code.co_names)] = (kind, False)
+
+    # Constant tuples are folded by the compiler, which makes the code depend on their length
+    for kind, term in (("group", "mod.item.group.name in (%s,)"), ("chargeGroup", "mod.charge.group.name in (%s,)")):
+        for count in xrange(1, 9):
+            code = eval("lambda mod: " + term % ", ".join(repr(str(i)) for i in xrange(count))).__code__
+            templates[(code.co_code, code.co_names)] = (kind, True)
+
+    code = (lambda mod: True).__code__
+    templates[(code.co_code, code.co_names)] = ("all", False)
+    return templates
+
+
+filterTemplates = buildFilterTemplates()
+compiledFilters = {}
+
+
+def compileFilter(filter):
+    """
+    Returns (index kind, keys) if filter can be answered from HandledList
+    indexes, None if it has to be evaluated for every element
+    """
+    if isinstance(filter, IndexedFilter):
+        return filter.kind, filter.keys
+
+    code = getattr(filter, "__code__", None)
+    if code is None:
+        return None
+
+    try:
+        return compiledFilters[code]
+    except KeyError:
+        pass
+
+    compiled = None
+    template = filterTemplates.get((code.co_code, code.co_names))
+    if template is not None and not code.co_freevars:
+        kind, inTuple = template
+        consts = code.co_consts[1:]
+        if inTuple:
+            consts = consts[-1] if consts and isinstance(consts[-1], tuple) else (None,)
+        if kind == "all":
+            compiled = (kind, ())
+        elif all(isinstance(const, basestring) for const in consts):
+            compiled = (kind, tuple(consts))
+
+    compiledFilters[code] = compiled
+    return compiled
+
+
 class HandledList(list):
-    def filteredItemPreAssign(self, filter, *args, **kwargs):
+    # Use indexes for filters which support them
+    INDEXED = True
+
+    __indexes = None
+
+    def resetIndexes(self):
+        """Drop indexes, they are rebuilt on the next filtered operation"""
+        self.__indexes = None
+
+    def __getIndex(self, kind):
+        indexes = self.__indexes
+        if indexes is None:
+            indexes = self.__indexes = {}
+
+        index = indexes.get(kind)
+        if index is None:
+            index = indexes[kind] = {}
+            keysOf = INDEX_KEYS[kind]
+            for element in self:
+                try:
+                    keys = keysOf(element)
+                except AttributeError:
+                    continue
+                for key in keys:
+                    index.setdefault(key, []).append(element)
+
+        return index
+
+    def __lookup(self, kind, keys):
+        if kind == "all":
+            return list(self)
+
+        index = self.__getIndex(kind)
+        if len(keys) == 1:
+            return index.get(keys[0], ())
+
+        # Keep order of the list when combining several keys
+        matched = set()
+        for key in keys:
+            matched.update(id(element) for element in index.get(key, ()))
+        return [element for element in self if id(element) in matched]
+
+    def matching(self, filter):
+        """Elements of this list for which filter holds, filter errors count as a mismatch"""
+        recorder = calcJournal.state.recorder
+        if recorder is not None:
+            return recorder.recordScan(self, filter)
+
+        if self.INDEXED:
+            compiled = compileFilter(filter)
+            if compiled is not None:
+                return self.__lookup(*compiled)
+
+        matching = []
         for element in self:
             try:
                 if filter(element):
-                    element.preAssignItemAttr(*args, **kwargs)
+                    matching.append(element)
+            except AttributeError:
+                pass
+        return matching
+
+    def filteredItemPreAssign(self, filter, *args, **kwargs):
+        for element in self.matching(filter):
+            try:
+                element.preAssignItemAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredItemIncrease(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.increaseItemAttr(*args, **kwargs)
+                element.increaseItemAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredItemMultiply(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.multiplyItemAttr(*args, **kwargs)
+                element.multiplyItemAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredItemBoost(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.boostItemAttr(*args, **kwargs)
+                element.boostItemAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredItemForce(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.forceItemAttr(*args, **kwargs)
+                element.forceItemAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredChargePreAssign(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.preAssignChargeAttr(*args, **kwargs)
+                element.preAssignChargeAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredChargeIncrease(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.increaseChargeAttr(*args, **kwargs)
+                element.increaseChargeAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredChargeMultiply(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.multiplyChargeAttr(*args, **kwargs)
+                element.multiplyChargeAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredChargeBoost(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.boostChargeAttr(*args, **kwargs)
+                element.boostChargeAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
     def filteredChargeForce(self, filter, *args, **kwargs):
-        for element in self:
+        for element in self.matching(filter):
             try:
-                if filter(element):
-                    element.forceChargeAttr(*args, **kwargs)
+                element.forceChargeAttr(*args, **kwargs)
             except AttributeError:
                 pass
 
+    def append(self, thing):
+        self.__indexes = None
+        list.append(self, thing)
+
+    def insert(self, index, thing):
+        self.__indexes = None
+        list.insert(self, index, thing)
+
+    def __setitem__(self, index, thing):
+        self.__indexes = None
+        list.__setitem__(self, index, thing)
+
+    def __delitem__(self, index):
+        self.__indexes = None
+        list.__delitem__(self, index)
+
     def remove(self, thing):
         # We must flag it as modified, otherwise it not be removed from the database
         # @todo: flag_modified isn't in os x skel. need to rebuild to include
         # flag_modified(thing, "itemID")
         if thing.isInvalid:  # see GH issue #324
             thing.itemID = 0
+        self.__indexes = None
         list.remove(self, thing)
 
 
@@ -0,0 +1,223 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Registry of effect handler modules.
+
+Effect handlers normally live in one module per effect under eos.effects,
+each imported on first use. build() compiles all of them into a single bundle
+file of code objects, which is read in one go the first time any effect is
+needed; every effect module is then created from its code object in memory.
+Without a bundle (eos.config.effectBundle is None or the file is missing or
+made by another python version) the modules are imported one by one. The
+same goes for a bundle made from other effect sources than the ones next to
+it, so edits to eos/effects are never silently ignored.
+"""
+
+import hashlib
+import imp
+import marshal
+import os
+import sys
+import time
+from collections import namedtuple
+
+from logbook import Logger
+
+import eos.config
+import eos.effects
+
+pyfalog = Logger(__name__)
+
+PACKAGE = "eos.effects"
+MAGIC = "PYFAEFFECTS"
+
+EffectHandler = namedtuple("EffectHandler", ("module", "handler", "runTime", "activeByDefault", "type"))
+
+# Name -> EffectHandler for all effects looked up so far
+handlers = {}
+# Name -> code object, None until the bundle is read, False when it can't be used
+_bundle = None
+stats = {
+    "source"     : None,  # "bundle" or "files"
+    "bundleTime" : 0.0,  # seconds spent reading the bundle
+    "effects"    : 0,  # effects in the bundle
+    "loaded"     : 0,  # effect modules created so far
+    "loadTime"   : 0.0,  # seconds spent creating them
+}
+
+
+def effectsPath():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "effects")
+
+
+def sourcesStamp():
+    """
+    Digest of the names, sizes and modification times of the effect sources,
+    None when there are none to compare with, like in a frozen build
+    """
+    if getattr(sys, "frozen", False):
+        return None
+    try:
+        fileNames = sorted(os.listdir(effectsPath()))
+    except EnvironmentError:
+        return None
+
+    digest = hashlib.sha1()
+    found = False
+    for fileName in fileNames:
+        name, ext = os.path.splitext(fileName)
+        if ext != ".py" or name.startswith("_"):
+            continue
+        info = os.stat(os.path.join(effectsPath(), fileName))
+        digest.update("{0}:{1}:{2}\n".format(fileName, info.st_size, int(info.st_mtime)))
+        found = True
+    return digest.hexdigest() if found else None
+
+
+def build(path=None):
+    """Compile all effect modules into a bundle at path, eos.config.effectBundle by default"""
+    path = path or eos.config.effectBundle
+    start = time.time()
+    stamp = sourcesStamp()
+    codes = {}
+    for fileName in sorted(os.listdir(effectsPath())):
+        name, ext = os.path.splitext(fileName)
+        if ext != ".py" or name.startswith("_"):
+            continue
+        with open(os.path.join(effectsPath(), fileName), "rU") as f:
+            source = f.read()
+        # Relative file names, the bundle is made on another machine than it's used on
+        codes[name] = compile(source, os.path.join("eos", "effects", fileName), "exec")
+
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "wb") as f:
+        marshal.dump((MAGIC, imp.get_magic(), stamp, codes), f)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmpPath, path)
+
+    pyfalog.info("Built effect bundle of {0} effects in {1:.2f}s", len(codes), time.time() - start)
+    return len(codes)
+
+
+def _readBundle():
+    path = getattr(eos.config, "effectBundle", None)
+    if not path or not os.path.isfile(path):
+        pyfalog.debug("No effect bundle, importing effects one by one")
+        return False
+
+    start = time.time()
+    try:
+        with open(path, "rb") as f:
+            magic, pythonMagic, stamp, codes = marshal.load(f)
+    except (EnvironmentError, EOFError, ValueError, TypeError) as e:
+        pyfalog.warning("Unable to read effect bundle {0}, importing effects one by one", path)
+        pyfalog.warning(e)
+        return False
+
+    if magic != MAGIC or pythonMagic != imp.get_magic():
+        pyfalog.warning("Effect bundle {0} was not made by this python version, importing effects one by one", path)
+        return False
+
+    sources = sourcesStamp()
+    if sources is not None and sources != stamp:
+        pyfalog.warning("Effect bundle {0} is out of date with eos/effects, importing effects one by one", path)
+        return False
+
+    stats["bundleTime"] = time.time() - start
+    stats["effects"] = len(codes)
+    pyfalog.debug("Read effect bundle of {0} effects in {1:.1f}ms", len(codes), stats["bundleTime"] * 1000)
+    return codes
+
+
+def _moduleFromBundle(name):
+    code = _bundle.get(name)
+    if code is None:
+        raise ImportError("No module named {0}".format(name))
+
+    fullName = "{0}.{1}".format(PACKAGE, name)
+    module = sys.modules.get(fullName)
+    if module is not None:
+        return module
+
+    module = imp.new_module(fullName)
+    module.__file__ = code.co_filename
+    module.__package__ = PACKAGE
+    sys.modules[fullName] = module
+    try:
+        exec code in module.__dict__
+    except:
+        del sys.modules[fullName]
+        raise
+    # Same as an import would do
+    setattr(eos.effects, name, module)
+    return module
+
+
+def getModule(name):
+    """The module of effect name, raises ImportError for effects without one"""
+    global _bundle
+    if _bundle is None:
+        _bundle = _readBundle()
+        stats["source"] = "bundle" if _bundle else "files"
+
+    start = time.time()
+    if _bundle:
+        module = _moduleFromBundle(name)
+    else:
+        module = __import__("{0}.{1}".format(PACKAGE, name), fromlist=True)
+    stats["loaded"] += 1
+    stats["loadTime"] += time.time() - start
+    return module
+
+
+def getHandler(name):
+    """
+    Handler, runTime, activeByDefault and type of effect name, the handler is
+    None when the module has none. Raises ImportError when there is no such
+    effect module, anything else comes from running the module itself.
+    """
+    effectHandler = handlers.get(name)
+    if effectHandler is None:
+        module = getModule(name)
+        t = getattr(module, "type", None)
+        effectHandler = handlers[name] = EffectHandler(
+            module,
+            getattr(module, "handler", None),
+            getattr(module, "runTime", "normal"),
+            getattr(module, "activeByDefault", True),
+            t if isinstance(t, tuple) or t is None else (t,),
+        )
+    return effectHandler
+
+
+def logStats():
+    pyfalog.info("Effects loaded from {source}: {loaded} modules in {0:.1f}ms, bundle read in {1:.1f}ms",
+                 stats["loadTime"] * 1000, stats["bundleTime"] * 1000, **stats)
+
+
+def reset():
+    """Forget all loaded effects and the bundle, for switching eos.config.effectBundle"""
+    global _bundle
+    _bundle = None
+    handlers.clear()
+    for name in [name for name in sys.modules if name.startswith(PACKAGE + ".")]:
+        del sys.modules[name]
+    stats.update(source=None, bundleTime=0.0, effects=0, loaded=0, loadTime=0.0)
@@ -0,0 +1,125 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Canonical hashes of fit contents.
+
+Two fits with the same ship, mode and items in the same states hash the same,
+whatever their names, IDs or the order their items were added in. Fits
+projected onto or boosting a fit are part of its content with all of their
+own content, what is projected onto them in turn included. A fit reached
+again through a loop of projections only counts by its place in the loop.
+
+characterHash covers what a character brings to a calculation: its skill
+levels, alpha clone and implants. calculationHash puts both together, with
+the characters of the fits projected onto or boosting the fit, so fits with
+the same calculationHash calculate to the same results.
+"""
+
+import hashlib
+
+
+def amounts(pattern):
+    if pattern is None:
+        return None
+    return pattern.emAmount, pattern.thermalAmount, pattern.kineticAmount, pattern.explosiveAmount
+
+
+def items(fit, projected=False):
+    """Sorted contents of fit, without fits projected onto or boosting it"""
+    modules = fit.projectedModules if projected else fit.modules
+    drones = fit.projectedDrones if projected else fit.drones
+    fighters = fit.projectedFighters if projected else fit.fighters
+    return (
+        tuple(sorted((mod.itemID, mod.chargeID, mod.state) for mod in modules if not mod.isEmpty)),
+        tuple(sorted((drone.itemID, drone.amount, drone.amountActive) for drone in drones)),
+        tuple(sorted((fighter.itemID, fighter.amount, fighter.active,
+                      tuple(sorted(ability.effectID for ability in fighter.abilities if ability.active)))
+                     for fighter in fighters)),
+    )
+
+
+def sourceContent(source, characters, path):
+    """fitContent of a fit projected onto or boosting another, just its place in path when it's in there"""
+    if id(source) in path:
+        return path.index(id(source))
+    return fitContent(source, characters, path)
+
+
+def fitContent(fit, characters=False, path=()):
+    """
+    Everything about fit which decides how it calculates, as nested tuples.
+    With characters, the characterHash of fit and of the fits projected onto
+    or boosting it are part of it. path holds the fits already on the way to
+    fit, when it's projected onto or boosting one of them.
+    """
+    path += (id(fit),)
+    content = (
+        fit.shipID,
+        fit.modeID,
+        items(fit),
+        items(fit, projected=True),
+        tuple(sorted((implant.itemID, implant.active) for implant in fit.implants)),
+        tuple(sorted((booster.itemID, booster.active) for booster in fit.boosters)),
+        tuple(sorted((cargo.itemID, cargo.amount) for cargo in fit.cargo)),
+        fit.implantLocation or 0,  # None until the fit is saved
+        bool(fit.factorReload),
+        amounts(fit.damagePattern),
+        amounts(fit.targetResists),
+        tuple(sorted((sourceContent(source, characters, path), info.amount, info.active)
+                     for source, info in ((source, source.getProjectionInfo(fit.ID)) for source in fit.projectedFits)
+                     if info is not None)),
+        tuple(sorted((sourceContent(booster, characters, path), info.active)
+                     for booster, info in ((booster, booster.getCommandInfo(fit.ID)) for booster in fit.commandFits)
+                     if info is not None)),
+    )
+    if characters:
+        content += (characterHash(fit.character),)
+    return content
+
+
+def digest(content):
+    return hashlib.sha1(repr(content)).hexdigest()
+
+
+def fitHash(fit):
+    """Hash of fitContent(fit)"""
+    return digest(fitContent(fit))
+
+
+def characterHash(character):
+    """Hash of the skill levels, alpha clone and implants of character, None for no character"""
+    if character is None:
+        return None
+
+    # Unsaved levels count, they are what fits are calculated with
+    skills = dict((skill.itemID, skill.activeLevel) for skill in character.storedSkills)
+    skills.update((skill.itemID, skill.activeLevel) for skill in character.dirtySkills)
+    return digest((
+        character.ID,
+        character.defaultLevel,
+        character.alphaCloneID,
+        tuple(sorted(skills.iteritems())),
+        tuple(sorted((implant.itemID, implant.active) for implant in character.implants)),
+    ))
+
+
+def calculationHash(fit):
+    """Hash of fitContent(fit) with the characters of fit and the fits projected onto or boosting it"""
+    return digest(fitContent(fit, characters=True))
@@ -0,0 +1,193 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Calculation of fits together with the fits boosting and projected onto them.
+
+A FleetCalculation builds the graph of command and projection relations
+between the fits it is given and the fits around them, then
+
+1. calculates every fit involved exactly once, each one after the fits
+   boosting it. Fits which are only there to boost are calculated without
+   command bonuses of their own. The strongest bursts of a set of boosters
+   are resolved once and handed to every fit they boost.
+2. applies the projections onto the fits it was given, each projection in a
+   single pass over the items of its source. A fit projects onto others
+   before anything is projected onto it, so it always projects its own values.
+
+Fits boosting each other, or projecting onto each other, can't be ordered
+like that. These cycles are logged and kept in cycles. The fits of a command
+cycle are first calculated without the bonuses of the fits they're waiting
+for, and once more after all bonuses were collected. A fit which still has to
+project after it was projected onto projects from a shadow calculated without
+those projections, the same as a fit projecting onto itself.
+"""
+
+from logbook import Logger
+
+from eos.warfareBuffs import BuffResolution
+
+pyfalog = Logger(__name__)
+
+
+def dependencyOrder(nodes, dependencies):
+    """
+    Strongly connected components of a graph, each a list of nodes, with every
+    component coming after the components it depends on. dependencies(node)
+    returns the nodes node depends on.
+    """
+    index = {}
+    lowLink = {}
+    stack = []
+    onStack = set()
+    components = []
+
+    def visit(node):
+        index[node] = lowLink[node] = len(index)
+        stack.append(node)
+        onStack.add(node)
+        for other in dependencies(node):
+            if other not in index:
+                visit(other)
+                lowLink[node] = min(lowLink[node], lowLink[other])
+            elif other in onStack:
+                lowLink[node] = min(lowLink[node], index[other])
+
+        if lowLink[node] == index[node]:
+            component = []
+            while True:
+                other = stack.pop()
+                onStack.discard(other)
+                component.append(other)
+                if other is node:
+                    break
+            # Popped deepest first, which within a cycle is as close to their dependencies as it gets
+            components.append(component)
+
+    for node in nodes:
+        if node not in index:
+            visit(node)
+    return components
+
+
+def unique(fits):
+    seen = set()
+    return [fit for fit in fits if not (fit in seen or seen.add(fit))]
+
+
+class FleetCalculation(object):
+    """Calculation of fits with all their command and projected fits applied"""
+
+    def __init__(self, fits):
+        self.fits = unique(fit for fit in fits if not fit.isInvalid)
+        # (kind, fits) for every cycle found, kind being "command" or "projection"
+        self.cycles = []
+        # Fits calculated, counting fits of command cycles twice, and shadows calculated for projections
+        self.calculations = 0
+        self.shadows = 0
+        # Boosting fits => their BuffResolution
+        self.__buffs = {}
+
+    def run(self):
+        projections = self.__projections()
+        sources = [source for target in self.fits for source, _ in projections[target]]
+        self.__calculate(unique(self.fits + sources))
+        self.__project(projections)
+        return self
+
+    def __projections(self):
+        """Active projections onto every fit to calculate, as (source, amount), in the order of projectedFits"""
+        projections = {}
+        for target in self.fits:
+            projections[target] = edges = []
+            for source in target.projectedFits:
+                info = source.getProjectionInfo(target.ID)
+                if info.active:
+                    edges.append((source, info.amount))
+        return projections
+
+    def __calculate(self, fits):
+        """Calculate fits, which get command bonuses, along with the fits which only boost them"""
+        included = set(fits)
+        boosters = dict((fit, [booster for booster in fit.commandFits if booster is not fit]) for fit in fits)
+
+        for component in dependencyOrder(fits, lambda fit: [b for b in boosters[fit] if b in included]):
+            if len(component) > 1:
+                self.__reportCycle("command", component)
+                # Command bursts don't depend on command bonuses, so they can be collected from the
+                # fits calculated without the bonuses of the fits later in the cycle
+                for fit in component:
+                    self.__calculateFit(fit, [booster for booster in boosters[fit] if booster.isCalculated])
+                # Then again one by one, the fits still to go keep their first calculation to boost from
+                for fit in component:
+                    fit.clear(projected=True)
+                    self.__calculateFit(fit, boosters[fit])
+            else:
+                self.__calculateFit(component[0], boosters[component[0]])
+
+    def __calculateFit(self, fit, boosters):
+        if fit.isCalculated:
+            return
+
+        for booster in boosters:
+            if not booster.isCalculated:
+                self.__calculateLocal(booster)
+        if boosters:
+            fit.addCommandBonuses(self.__resolveBuffs(boosters))
+        self.__calculateLocal(fit)
+
+    def __resolveBuffs(self, boosters):
+        """Strongest bursts of boosters, collected once for every fit boosted by the same fits"""
+        key = tuple(boosters)
+        resolution = self.__buffs.get(key)
+        if resolution is None:
+            resolution = self.__buffs[key] = BuffResolution()
+            for booster in boosters:
+                booster.collectCommandBonuses(resolution)
+        return resolution
+
+    def __calculateLocal(self, fit):
+        fit.calculateLocal()
+        self.calculations += 1
+
+    def __project(self, projections):
+        targets = list(self.fits)
+        projectsOnto = dict((fit, []) for fit in targets)
+        for target in targets:
+            for source, _ in projections[target]:
+                if source is not target and source in projectsOnto:
+                    projectsOnto[source].append(target)
+
+        received = set()
+        for component in dependencyOrder(targets, lambda fit: projectsOnto[fit]):
+            if len(component) > 1:
+                self.__reportCycle("projection", component)
+
+            for target in component:
+                for source, amount in projections[target]:
+                    if source is target or source in received:
+                        source.projectShadowOnto(target, amount)
+                        self.shadows += 1
+                    else:
+                        source.projectOnto(target, amount)
+                received.add(target)
+
+    def __reportCycle(self, kind, fits):
+        pyfalog.warning("Fits in a {0} cycle: {1}", kind, ", ".join(repr(fit) for fit in fits))
+        self.cycles.append((kind, fits))
@@ -21,7 +21,9 @@ import re
 
 from sqlalchemy.orm import reconstructor
 
+import eos.config
 import eos.db
+from eos import effectRegistry
 from eqBase import EqBase
 
 try:
@@ -160,14 +162,12 @@ class Effect(EqBase):
         if it doesn't, set dummy values and add a dummy handler
         """
         try:
-            self.__effectModule = effectModule = __import__('eos.effects.' + self.handlerName, fromlist=True)
-            self.__handler = getattr(effectModule, "handler", effectDummy)
-            self.__runTime = getattr(effectModule, "runTime", "normal")
-            self.__activeByDefault = getattr(effectModule, "activeByDefault", True)
-            t = getattr(effectModule, "type", None)
-
-            t = t if isinstance(t, tuple) or t is None else (t,)
-            self.__type = t
+            effectHandler = effectRegistry.getHandler(self.handlerName)
+            self.__effectModule = effectHandler.module
+            self.__handler = effectHandler.handler or effectDummy
+            self.__runTime = effectHandler.runTime
+            self.__activeByDefault = effectHandler.activeByDefault
+            self.__type = effectHandler.type
         except (ImportError) as e:
             # Effect probably doesn't exist, so create a dummy effect and flag it with a warning.
             self.__handler = effectDummy
@@ -283,6 +283,11 @@ class Item(EqBase):
 
     @property
     def requiredSkills(self):
+        if self.__requiredSkills is None and eos.config.gamedataIndexes:
+            self.__requiredSkills = OrderedDict(
+                (eos.db.getItem(skillID), level)
+                for skillID, level in eos.db.getGamedataIndexes().getRequiredSkills(self.ID).iteritems())
+
         if self.__requiredSkills is None:
             requiredSkills = OrderedDict()
             self.__requiredSkills = requiredSkills
@@ -309,6 +314,17 @@ class Item(EqBase):
                     requiredSkills[item] = skillLvl
         return self.__requiredSkills
 
+    @property
+    def allRequiredSkills(self):
+        """Every skill needed to use the item, including the skills required by those, with the highest level"""
+        return dict((eos.db.getItem(skillID), level)
+                    for skillID, level in eos.db.getGamedataIndexes().getAllRequiredSkills(self.ID).iteritems())
+
+    @property
+    def requiredFor(self):
+        """Items requiring this skill directly"""
+        return [eos.db.getItem(typeID) for typeID in eos.db.getGamedataIndexes().getDependents(self.ID)]
+
     factionMap = {
         500001: "caldari",
         500002: "minmatar",
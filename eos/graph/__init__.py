@@ -19,9 +19,14 @@
 
 import itertools
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Graph(object):
-    def __init__(self, fit, function, data=None):
+    def __init__(self, fit, function, data=None, arrayFunction=None):
         self.fit = fit
         self.data = {}
         if data is not None:
@@ -29,6 +34,8 @@ class Graph(object):
                 self.setData(Data(name, d))
 
         self.function = function
+        # Evaluates the whole grid at once, receives and returns arrays instead of single values
+        self.arrayFunction = arrayFunction if numpy is not None else None
 
     def clearData(self):
         self.data.clear()
@@ -43,6 +50,9 @@ class Graph(object):
             pointNames.append(data.name)
             pointIterators.append(data)
 
+        if self.arrayFunction is not None:
+            return self._arrayIterator(pointNames, pointIterators)
+
         return self._iterator(pointNames, pointIterators)
 
     def _iterator(self, pointNames, pointIterators):
@@ -53,6 +63,37 @@ class Graph(object):
 
             yield point, self.function(point)
 
+    def getArrays(self):
+        """
+        Evaluate all points at once. Returns a dict of flat arrays with values of
+        every data set for each point and an array of results, in the same order
+        as getIterator produces them. Missing values are represented by NaN.
+        """
+        if self.arrayFunction is None:
+            raise ValueError("Graph has no array function, or numpy is not available")
+
+        datas = self.data.values()
+        grids = numpy.meshgrid(*[data.array() for data in datas], indexing="ij")
+        points = dict((data.name, grid.ravel()) for data, grid in zip(datas, grids))
+        # Points where a formula divides by zero end up as inf or NaN instead of raising
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            values = self.arrayFunction(points)
+        return points, values
+
+    def _arrayIterator(self, pointNames, pointIterators):
+        points, values = self.getArrays()
+        columns = []
+        for name in pointNames:
+            column = points[name]
+            columns.append([None if isNaN else value for value, isNaN in zip(column.tolist(), numpy.isnan(column))])
+
+        for pointValues, value in itertools.izip(itertools.izip(*columns), values.tolist()):
+            point = {}
+            for i in xrange(len(pointValues)):
+                point[pointNames[i]] = pointValues[i]
+
+            yield point, value
+
 
 class Data(object):
     def __init__(self, name, dataString, step=None):
@@ -79,6 +120,9 @@ class Data(object):
             for value in data:
                 yield value
 
+    def array(self):
+        return numpy.concatenate([data.array() for data in self.data])
+
     def isConstant(self):
         return len(self.data) == 1 and self.data[0].isConstant()
 
@@ -93,6 +137,9 @@ class Constant(object):
     def __iter__(self):
         yield self.value
 
+    def array(self):
+        return numpy.array([numpy.nan if self.value is None else self.value], dtype=float)
+
     @staticmethod
     def isConstant():
         return True
@@ -115,6 +162,12 @@ class Range(object):
             i += 1
             yield current
 
+    def array(self):
+        start = self.start
+        step = self.step or (self.end - start) / 50.0
+        # Same points as iteration, computed the same way to get the exact same values
+        return start + numpy.arange(1, sum(1 for _ in self) + 1) * step
+
     @staticmethod
     def isConstant():
         return False
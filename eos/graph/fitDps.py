@@ -19,12 +19,18 @@
 
 from math import log, sin, radians, exp
 
-from eos.graph import Graph
+from eos.graph import Graph, numpy
 from eos.saveddata.module import State, Hardpoint
 from logbook import Logger
 
 pyfalog = Logger(__name__)
 
+# Weapon kinds used by the array evaluation
+TURRET = 0
+MISSILE = 1
+DRONE = 2
+FIGHTER = 3
+
 
 class FitDpsGraph(Graph):
     defaults = {"angle": 0,
@@ -33,7 +39,7 @@ class FitDpsGraph(Graph):
                 "velocity": 0}
 
     def __init__(self, fit, data=None):
-        Graph.__init__(self, fit, self.calcDps, data if data is not None else self.defaults)
+        Graph.__init__(self, fit, self.calcDps, data if data is not None else self.defaults, self.calcDpsArray)
         self.fit = fit
 
     def calcDps(self, data):
@@ -188,3 +194,169 @@ class FitDpsGraph(Graph):
         rangeEq = ((max(0, distance - turretOptimal)) / turretFalloff) ** 2
 
         return 0.5 ** rangeEq
+
+    # Array evaluation. Everything below mirrors the scalar functions above, but
+    # reads the fit only once per sweep and then works on whole arrays of points.
+
+    @staticmethod
+    def getTurretParams(mod):
+        return (mod.getModifiedItemAttr("trackingSpeed"), mod.maxRange, mod.falloff,
+                mod.getModifiedItemAttr("optimalSigRadius"), mod.getModifiedItemAttr("turretDamageScalingRadius"))
+
+    def getWeapons(self):
+        """(kind, dps, parameters) of everything on the fit that deals damage"""
+        fit = self.fit
+        weapons = []
+
+        for mod in fit.modules:
+            dps, _ = mod.damageStats(fit.targetResists)
+            if mod.hardpoint == Hardpoint.TURRET:
+                if mod.state >= State.ACTIVE:
+                    weapons.append((TURRET, dps, self.getTurretParams(mod)))
+
+            elif mod.hardpoint == Hardpoint.MISSILE:
+                if mod.state >= State.ACTIVE and mod.maxRange is not None:
+                    weapons.append((MISSILE, dps, (
+                        mod.maxRange,
+                        mod.getModifiedChargeAttr("aoeCloudSize"),
+                        mod.getModifiedChargeAttr("aoeVelocity"),
+                        mod.getModifiedChargeAttr("aoeDamageReductionFactor"),
+                    )))
+
+        for drone in fit.drones:
+            dps, _ = drone.damageStats(fit.targetResists)
+            alwaysHits = drone.getModifiedItemAttr("maxVelocity") > 1
+            weapons.append((DRONE, dps, None if alwaysHits else self.getTurretParams(drone)))
+
+        for fighter in fit.fighters:
+            for ability in fighter.abilities:
+                if ability.dealsDamage and ability.active:
+                    prefix = ability.attrPrefix
+                    damageReductionFactor = fighter.getModifiedItemAttr("{}ReductionFactor".format(prefix))
+                    if damageReductionFactor is None:
+                        damageReductionFactor = fighter.getModifiedItemAttr("{}DamageReductionFactor".format(prefix))
+
+                    damageReductionSensitivity = fighter.getModifiedItemAttr("{}ReductionSensitivity".format(prefix))
+                    if damageReductionSensitivity is None:
+                        damageReductionSensitivity = fighter.getModifiedItemAttr(
+                            "{}DamageReductionSensitivity".format(prefix))
+
+                    dps, _ = ability.damageStats(fit.targetResists)
+                    weapons.append((FIGHTER, dps, (
+                        fighter.getModifiedItemAttr("{}ExplosionRadius".format(prefix)),
+                        fighter.getModifiedItemAttr("{}ExplosionVelocity".format(prefix)),
+                        log(damageReductionFactor) / log(damageReductionSensitivity),
+                    )))
+
+        return weapons
+
+    def calcDpsArray(self, data):
+        """
+        calcDps for many points at once. Every value of data is a flat array of
+        the same length, with NaN standing for a missing signature radius.
+        """
+        fit = self.fit
+        distance = data["distance"] * 1000
+        points = numpy.arange(len(distance))
+        ew = {'signatureRadius': [], 'velocity': []}
+
+        for mod in fit.modules:
+            if not mod.isEmpty and mod.state >= State.ACTIVE:
+                if "remoteTargetPaintFalloff" in mod.item.effects:
+                    ew['signatureRadius'].append(
+                        1 + (mod.getModifiedItemAttr("signatureRadiusBonus") / 100) *
+                        self.calculateModuleMultiplierArray(mod, distance))
+                if "remoteWebifierFalloff" in mod.item.effects:
+                    speedFactor = mod.getModifiedItemAttr("speedFactor") / 100
+                    if mod.getModifiedItemAttr("falloffEffectiveness") > 0:
+                        outOfRange = 1 + speedFactor * self.calculateModuleMultiplierArray(mod, distance)
+                    else:
+                        # Not applied at all, which is the same as a neutral bonus
+                        outOfRange = 1
+                    ew['velocity'].append(numpy.where(distance <= mod.getModifiedItemAttr("maxRange"),
+                                                      1 + speedFactor, outOfRange))
+
+        for attr, values in ew.iteritems():
+            if not values:
+                continue
+            values = numpy.array(values)
+            # Strongest bonus first for every point, like the stable sort of calcDps
+            order = numpy.argsort(-abs(values - 1), axis=0, kind="mergesort")
+            values = values[order, points]
+            val = data[attr]
+            for i in xrange(len(values)):
+                val = val * (1 + (values[i] - 1) * exp(- i ** 2 / 7.1289))
+            data[attr] = val
+
+        total = numpy.zeros(len(distance))
+        withinDroneRange = distance <= fit.extraAttributes["droneControlRange"]
+        for kind, dps, params in self.getWeapons():
+            if kind == TURRET:
+                total += dps * self.calculateTurretMultiplierArray(params, data)
+            elif kind == MISSILE:
+                total += numpy.where(params[0] >= distance, dps * self.calculateMissileMultiplierArray(params, data), 0)
+            elif kind == DRONE:
+                multiplier = 1 if params is None else self.calculateTurretMultiplierArray(params, data)
+                total += numpy.where(withinDroneRange, dps * multiplier, 0)
+            elif kind == FIGHTER:
+                total += dps * self.calculateFighterMissileMultiplierArray(params, data)
+
+        return total
+
+    @staticmethod
+    def calculateMissileMultiplierArray(params, data):
+        _, explosionRadius, explosionVelocity, damageReductionFactor = params
+        targetSigRad = data["signatureRadius"]
+        targetSigRad = numpy.where(numpy.isnan(targetSigRad), explosionRadius, targetSigRad)
+        targetVelocity = data["velocity"]
+
+        sigRadiusFactor = targetSigRad / explosionRadius
+        velocityFactor = numpy.where(
+            targetVelocity != 0,
+            (explosionVelocity / explosionRadius * targetSigRad / targetVelocity) ** damageReductionFactor,
+            1)
+
+        return numpy.minimum(numpy.minimum(sigRadiusFactor, velocityFactor), 1)
+
+    @staticmethod
+    def calculateFighterMissileMultiplierArray(params, data):
+        explosionRadius, explosionVelocity, exponent = params
+        targetSigRad = data["signatureRadius"]
+        targetSigRad = numpy.where(numpy.isnan(targetSigRad), explosionRadius, targetSigRad)
+        targetVelocity = data["velocity"]
+
+        sigRadiusFactor = targetSigRad / explosionRadius
+        velocityFactor = numpy.where(
+            targetVelocity != 0,
+            (explosionVelocity / explosionRadius * targetSigRad / targetVelocity) ** exponent,
+            1)
+
+        return numpy.minimum(numpy.minimum(sigRadiusFactor, velocityFactor), 1)
+
+    @staticmethod
+    def calculateTurretMultiplierArray(params, data):
+        chanceToHit = FitDpsGraph.calculateTurretChanceToHitArray(params, data)
+        multiplier = numpy.where(chanceToHit > 0.01, (chanceToHit ** 2 + chanceToHit + 0.0499) / 2, chanceToHit * 3)
+        dmgScaling = params[4]
+        if dmgScaling:
+            multiplier = numpy.minimum(1, (data["signatureRadius"] / dmgScaling) ** 2)
+        return multiplier
+
+    @staticmethod
+    def calculateTurretChanceToHitArray(params, data):
+        tracking, turretOptimal, turretFalloff, turretSigRes, _ = params
+        distance = data["distance"] * 1000
+        targetSigRad = data["signatureRadius"]
+        targetSigRad = numpy.where(numpy.isnan(targetSigRad), turretSigRes, targetSigRad)
+        transversal = numpy.sin(numpy.radians(data["angle"])) * data["velocity"]
+        trackingEq = (((transversal / (distance * tracking)) *
+                       (turretSigRes / targetSigRad)) ** 2)
+        rangeEq = ((numpy.maximum(0, distance - turretOptimal)) / turretFalloff) ** 2
+
+        return 0.5 ** (trackingEq + rangeEq)
+
+    @staticmethod
+    def calculateModuleMultiplierArray(mod, distance):
+        rangeEq = ((numpy.maximum(0, distance - mod.maxRange)) / mod.falloff) ** 2
+
+        return 0.5 ** rangeEq
@@ -18,11 +18,106 @@
 # ===============================================================================
 
 import collections
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
 from math import exp
 
+import eos.config
+from eos import calcJournal
+from eos.calcJournal import recorded
+
 defaultValuesCache = {}
 cappingAttrKeyCache = {}
 
+# Marks absent values in compact attribute dicts, where None is a valid value
+MISSING = object()
+# Accumulators per row of a compact attribute dict, and their initial values
+PRE_INCREASE, MULTIPLIER, POST_INCREASE = range(3)
+ACCUMULATORS = 3
+ACCUMULATOR_IDENTITY = (0.0, 1.0, 0.0)
+# Rarely used values of an attribute of a compact attribute dict
+INTERMEDIARY, FORCED, PRE_ASSIGN, PENALIZED = range(4)
+EXTRA_SLOTS = 4
+NO_EXTRAS = (MISSING,) * EXTRA_SLOTS
+
+# Factor the i-th most significant stacking penalized multiplier is applied with,
+# 1 + (multiplier - 1) * exp(-i ** 2 / 7.1289). Past the table they're too small to matter,
+# but are still computed for correctness.
+PENALTY_FACTORS = tuple(exp(- i ** 2 / 7.1289) for i in xrange(16))
+
+
+def penaltyFactor(i):
+    return PENALTY_FACTORS[i] if i < len(PENALTY_FACTORS) else exp(- i ** 2 / 7.1289)
+
+
+class PenaltyGroup(object):
+    """
+    Stacking penalized multipliers of one attribute and penalty group.
+    Bonuses and penalties are penalized separately, each kept sorted with
+    the most significant one first, as that one takes the smallest penalty.
+    """
+    __slots__ = ("bonuses", "bonusKeys", "maluses", "malusKeys")
+
+    def __init__(self):
+        self.bonuses = []
+        self.bonusKeys = []
+        self.maluses = []
+        self.malusKeys = []
+
+    def append(self, multiplier):
+        if multiplier > 1:
+            values, keys = self.bonuses, self.bonusKeys
+        elif multiplier < 1:
+            values, keys = self.maluses, self.malusKeys
+        else:
+            # Doesn't change anything, whatever its position
+            return
+        key = -abs(multiplier - 1)
+        # After equal ones, like a stable sort would put it
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        values.insert(i, multiplier)
+
+    def apply(self, val):
+        for values in (self.bonuses, self.maluses):
+            for i, multiplier in enumerate(values):
+                val *= 1 + (multiplier - 1) * penaltyFactor(i)
+        return val
+
+
+def getCappingKey(key):
+    """Name of the attribute capping the value of key, None if it isn't capped"""
+    try:
+        return cappingAttrKeyCache[key]
+    except KeyError:
+        from eos.db.gamedata.queries import getAttributeInfo
+        attrInfo = getAttributeInfo(key)
+        # see GH issue #620
+        cappingId = None if attrInfo is None else attrInfo.maxAttributeID
+        if cappingId is None:
+            cappingKey = None
+        else:
+            cappingAttrInfo = getAttributeInfo(cappingId)
+            cappingKey = None if cappingAttrInfo is None else cappingAttrInfo.name
+        cappingAttrKeyCache[key] = cappingKey
+        return cappingKey
+
+
+def getDefaultValue(key):
+    """Value of attribute key for items which don't have it"""
+    try:
+        return defaultValuesCache[key]
+    except KeyError:
+        from eos.db.gamedata.queries import getAttributeInfo
+        attrInfo = getAttributeInfo(key)
+        if attrInfo is None:
+            default = defaultValuesCache[key] = 0.0
+        else:
+            dv = attrInfo.defaultValue
+            default = defaultValuesCache[key] = dv if dv is not None else 0.0
+        return default
+
 
 class ItemAttrShortcut(object):
     def getModifiedItemAttr(self, key, default=None):
@@ -58,8 +153,12 @@ class ModifiedAttributeDict(collections.MutableMapping):
         self.__modified = {}
         # Affected by entities
         self.__affectedBy = {}
+        # Attributes whose affected by entities were left out of the calculation
+        self.__untraced = None
         # Overrides
         self.__overrides = {}
+        # Capping attribute -> attributes whose calculated value was capped by it
+        self.__cappedBy = {}
         # Dictionaries for various value modification types
         self.__forced = {}
         self.__preAssigns = {}
@@ -71,7 +170,9 @@ class ModifiedAttributeDict(collections.MutableMapping):
     def clear(self):
         self.__intermediary.clear()
         self.__modified.clear()
+        self.__cappedBy.clear()
         self.__affectedBy.clear()
+        self.__untraced = None
         self.__forced.clear()
         self.__preAssigns.clear()
         self.__preIncreases.clear()
@@ -87,6 +188,7 @@ class ModifiedAttributeDict(collections.MutableMapping):
     def original(self, val):
         self.__original = val
         self.__modified.clear()
+        self.__cappedBy.clear()
 
     @property
     def overrides(self):
@@ -96,24 +198,61 @@ class ModifiedAttributeDict(collections.MutableMapping):
     def overrides(self, val):
         self.__overrides = val
 
+    def overlay(self):
+        """Empty dict of the same type over the same original values and overrides"""
+        overlay = type(self)(parent=self.parent)
+        overlay.original = self.original
+        overlay.overrides = self.overrides
+        return overlay
+
+    def takeCalculation(self, other, twins):
+        """
+        Take what was calculated into other, the dict of the same item in a copy
+        of the fit, in place of calculating this one. twins gives our
+        counterparts of the fits and items other's afflictions refer to, see
+        eos.calcTransfer.
+        """
+        self.fit = twins(other.fit)
+        self.__intermediary = other.__intermediary
+        self.__modified = other.__modified
+        self.__cappedBy = other.__cappedBy
+        self.__forced = other.__forced
+        self.__preAssigns = other.__preAssigns
+        self.__preIncreases = other.__preIncreases
+        self.__multipliers = other.__multipliers
+        self.__penalizedMultipliers = other.__penalizedMultipliers
+        self.__postIncreases = other.__postIncreases
+        self.__untraced = other.__untraced
+        self.__affectedBy = {}
+        for key, affs in other.__affectedBy.iteritems():
+            self.__affectedBy[key] = dict(
+                (twins(fit), [(twins(modifier), operation, bonus, used)
+                              for modifier, operation, bonus, used in afflictions])
+                for fit, afflictions in affs.iteritems())
+
     def __getitem__(self, key):
         # Check if we have final calculated value
         if key in self.__modified:
             if self.__modified[key] == self.CalculationPlaceholder:
                 self.__modified[key] = self.__calculateValue(key)
-            return self.__modified[key]
+            val = self.__modified[key]
         # Then in values which are not yet calculated
         elif key in self.__intermediary:
-            return self.__intermediary[key]
+            val = self.__intermediary[key]
         # Original value is the least priority
         else:
-            return self.getOriginal(key)
+            val = self.getOriginal(key)
+
+        if calcJournal.state.recorder is not None:
+            calcJournal.recordRead(calcJournal.checkItem, self, key, val)
+        return val
 
     def __delitem__(self, key):
         if key in self.__modified:
             del self.__modified[key]
         if key in self.__intermediary:
             del self.__intermediary[key]
+        self.__invalidateCapped(key)
 
     def getOriginal(self, key):
         if self.OVERRIDES and key in self.__overrides:
@@ -124,20 +263,37 @@ class ModifiedAttributeDict(collections.MutableMapping):
 
         return val.value if hasattr(val, "value") else val
 
+    @recorded
     def __setitem__(self, key, val):
         self.__intermediary[key] = val
+        self.__invalidateCapped(key)
 
     def __iter__(self):
         all = dict(self.__original, **self.__modified)
         return (key for key in all)
 
     def __contains__(self, key):
-        return (self.__original is not None and key in self.__original) or \
+        contains = (self.__original is not None and key in self.__original) or \
             key in self.__modified or key in self.__intermediary
 
+        if calcJournal.state.recorder is not None:
+            calcJournal.recordRead(calcJournal.checkContains, self, key, contains)
+        return contains
+
     def __placehold(self, key):
         """Create calculation placeholder in item's modified attribute dict"""
         self.__modified[key] = self.CalculationPlaceholder
+        self.__invalidateCapped(key)
+
+    def __invalidateCapped(self, key):
+        """Values capped by key have to be calculated again when key changes"""
+        dependents = self.__cappedBy.pop(key, None)
+        if dependents:
+            for dependent in dependents:
+                if dependent in self.__modified:
+                    self.__placehold(dependent)
+                else:
+                    self.__invalidateCapped(dependent)
 
     def __len__(self):
         keys = set()
@@ -149,29 +305,22 @@ class ModifiedAttributeDict(collections.MutableMapping):
     def __calculateValue(self, key):
         # It's possible that various attributes are capped by other attributes,
         # it's defined by reference maxAttributeID
-        try:
-            cappingKey = cappingAttrKeyCache[key]
-        except KeyError:
-            from eos.db.gamedata.queries import getAttributeInfo
-            attrInfo = getAttributeInfo(key)
-            if attrInfo is None:
-                cappingId = cappingAttrKeyCache[key] = None
-            else:
-                # see GH issue #620
-                cappingId = cappingAttrKeyCache[key] = attrInfo.maxAttributeID
-            if cappingId is None:
-                cappingKey = None
-            else:
-                cappingAttrInfo = getAttributeInfo(cappingId)
-                cappingKey = None if cappingAttrInfo is None else cappingAttrInfo.name
-
+        cappingKey = getCappingKey(key)
         if cappingKey:
             if cappingKey in self.original:
                 #  some items come with their own caps (ie: carriers). If they do, use this
                 cappingValue = self.original.get(cappingKey).value
             else:
-                # If not, get info about the default value
-                cappingValue = self.__calculateValue(cappingKey)
+                # If not, use the calculated value of the cap, and remember we did, so we're
+                # calculated again when the cap changes
+                cappingValue = self.__modified.get(cappingKey)
+                if cappingValue is None:
+                    cappingValue = self.__calculateValue(cappingKey)
+                elif cappingValue == self.CalculationPlaceholder:
+                    cappingValue = self.__modified[cappingKey] = self.__calculateValue(cappingKey)
+                if cappingKey not in self.__cappedBy:
+                    self.__cappedBy[cappingKey] = set()
+                self.__cappedBy[cappingKey].add(key)
         else:
             cappingValue = None
 
@@ -190,16 +339,7 @@ class ModifiedAttributeDict(collections.MutableMapping):
 
         # Grab initial value, priorities are:
         # Results of ongoing calculation > preAssign > original > 0
-        try:
-            default = defaultValuesCache[key]
-        except KeyError:
-            from eos.db.gamedata.queries import getAttributeInfo
-            attrInfo = getAttributeInfo(key)
-            if attrInfo is None:
-                default = defaultValuesCache[key] = 0.0
-            else:
-                dv = attrInfo.defaultValue
-                default = defaultValuesCache[key] = dv if dv is not None else 0.0
+        default = getDefaultValue(key)
         val = self.__intermediary[key] if key in self.__intermediary else self.__preAssigns[
             key] if key in self.__preAssigns else self.getOriginal(key) if key in self.__original else default
 
@@ -210,22 +350,7 @@ class ModifiedAttributeDict(collections.MutableMapping):
         # Each group is penalized independently
         # Things in different groups will not be stack penalized between each other
         for penalizedMultipliers in penalizedMultiplierGroups.itervalues():
-            # A quick explanation of how this works:
-            # 1: Bonuses and penalties are calculated seperately, so we'll have to filter each of them
-            l1 = filter(lambda _val: _val > 1, penalizedMultipliers)
-            l2 = filter(lambda _val: _val < 1, penalizedMultipliers)
-            # 2: The most significant bonuses take the smallest penalty,
-            # This means we'll have to sort
-            abssort = lambda _val: -abs(_val - 1)
-            l1.sort(key=abssort)
-            l2.sort(key=abssort)
-            # 3: The first module doesn't get penalized at all
-            # Any module after the first takes penalties according to:
-            # 1 + (multiplier - 1) * math.exp(- math.pow(i, 2) / 7.1289)
-            for l in (l1, l2):
-                for i in xrange(len(l)):
-                    bonus = l[i]
-                    val *= 1 + (bonus - 1) * exp(- i ** 2 / 7.1289)
+            val = penalizedMultipliers.apply(val)
         val += postIncrease
 
         # Cap value if we have cap defined
@@ -254,16 +379,31 @@ class ModifiedAttributeDict(collections.MutableMapping):
         return skill.level
 
     def getAfflictions(self, key):
+        if self.__untraced and key in self.__untraced:
+            self.__traceAfflictions()
         return self.__affectedBy[key] if key in self.__affectedBy else {}
 
     def iterAfflictions(self):
+        if self.__untraced:
+            self.__traceAfflictions()
         return self.__affectedBy.__iter__()
 
+    def __traceAfflictions(self):
+        """Have the fit calculated again, this time recording what affects this item"""
+        self.__untraced = None
+        self.fit.traceAfflictions(self)
+
     def __afflict(self, attributeName, operation, bonus, used=True):
         """Add modifier to list of things affecting current item"""
         # Do nothing if no fit is assigned
         if self.fit is None:
             return
+        if not self.fit.recordAffectedBy and not self.fit.tracesAfflictions(self, attributeName):
+            # Left out, until someone asks for it
+            if self.__untraced is None:
+                self.__untraced = set()
+            self.__untraced.add(attributeName)
+            return
         # Create dictionary for given attribute and give it alias
         if attributeName not in self.__affectedBy:
             self.__affectedBy[attributeName] = {}
@@ -281,12 +421,14 @@ class ModifiedAttributeDict(collections.MutableMapping):
         # Add current affliction to list
         affs.append((modifier, operation, bonus, used))
 
+    @recorded
     def preAssign(self, attributeName, value):
         """Overwrites original value of the entity with given one, allowing further modification"""
         self.__preAssigns[attributeName] = value
         self.__placehold(attributeName)
         self.__afflict(attributeName, "=", value, value != self.getOriginal(attributeName))
 
+    @recorded
     def increase(self, attributeName, increase, position="pre", skill=None):
         """Increase value of given attribute by given number"""
         if skill:
@@ -306,6 +448,7 @@ class ModifiedAttributeDict(collections.MutableMapping):
         self.__placehold(attributeName)
         self.__afflict(attributeName, "+", increase, increase != 0)
 
+    @recorded
     def multiply(self, attributeName, multiplier, stackingPenalties=False, penaltyGroup="default", skill=None):
         """Multiply value of given attribute by given factor"""
         if multiplier is None:  # See GH issue 397
@@ -320,7 +463,7 @@ class ModifiedAttributeDict(collections.MutableMapping):
             if attributeName not in self.__penalizedMultipliers:
                 self.__penalizedMultipliers[attributeName] = {}
             if penaltyGroup not in self.__penalizedMultipliers[attributeName]:
-                self.__penalizedMultipliers[attributeName][penaltyGroup] = []
+                self.__penalizedMultipliers[attributeName][penaltyGroup] = PenaltyGroup()
             tbl = self.__penalizedMultipliers[attributeName][penaltyGroup]
             tbl.append(multiplier)
         # Non-penalized multiplication factors go to the single list
@@ -332,6 +475,7 @@ class ModifiedAttributeDict(collections.MutableMapping):
         self.__placehold(attributeName)
         self.__afflict(attributeName, "%s*" % ("s" if stackingPenalties else ""), multiplier, multiplier != 1)
 
+    @recorded
     def boost(self, attributeName, boostFactor, skill=None, remoteResists=False, *args, **kwargs):
         """Boost value by some percentage"""
         if skill:
@@ -352,6 +496,7 @@ class ModifiedAttributeDict(collections.MutableMapping):
         # We just transform percentage boost into multiplication factor
         self.multiply(attributeName, 1 + boostFactor / 100.0, *args, **kwargs)
 
+    @recorded
     def force(self, attributeName, value):
         """Force value to attribute and prohibit any changes to it"""
         self.__forced[attributeName] = value
@@ -359,6 +504,514 @@ class ModifiedAttributeDict(collections.MutableMapping):
         self.__afflict(attributeName, u"\u2263", value)
 
 
+# Attribute name <-> dense index, shared by all compact attribute dicts
+attributeIndexes = {}
+attributeNames = []
+attributeIndexLock = threading.Lock()
+
+
+def internAttribute(key):
+    """Dense index of attribute key, assigned on first use"""
+    try:
+        return attributeIndexes[key]
+    except KeyError:
+        with attributeIndexLock:
+            index = attributeIndexes.get(key)
+            if index is None:
+                index = attributeIndexes[key] = len(attributeNames)
+                attributeNames.append(key)
+            return index
+
+
+def newAttributeDict(fit=None, parent=None):
+    """Modified attribute dict for an item, the compact one when eos.config.compactAttributes is set"""
+    if eos.config.compactAttributes:
+        return CompactModifiedAttributeDict(fit, parent)
+    return ModifiedAttributeDict(fit, parent)
+
+
+class CompactModifiedAttributeDict(object):
+    """
+    ModifiedAttributeDict using a fraction of the memory, for keeping many
+    calculated fits around. Every attribute the item's calculation touches gets
+    a row: its interned index in a sorted array of ints, its final value in a
+    list and its increases and multiplier in an array of doubles.
+    Forced and pre-assigned values, values set during calculation and stacking
+    penalized multipliers are rare, they're kept in a dict of their own which
+    only exists when needed, like capping information. "Affected By" is a
+    single list of afflictions, grouped per attribute and fit when asked for.
+    """
+
+    __slots__ = ("parent", "fit", "__original", "__overrides", "__keys", "__modified", "__accumulators",
+                 "__extras", "__afflictions", "__untraced", "__cappedBy")
+
+    CalculationPlaceholder = ModifiedAttributeDict.CalculationPlaceholder
+
+    def __init__(self, fit=None, parent=None):
+        self.parent = parent
+        self.fit = fit
+        self.__original = None
+        self.__overrides = {}
+        self.clear()
+
+    def clear(self):
+        # Sorted attribute indexes, their position is the row
+        self.__keys = array("i")
+        # Final modified value, placeholder or MISSING of every row
+        self.__modified = []
+        # preIncrease, multiplier and postIncrease of every row
+        self.__accumulators = array("d")
+        # Attribute index -> [intermediary, forced, preAssign, penalized multipliers]
+        self.__extras = None
+        # (attribute index, fit, modifier, operation, bonus, used) in the order they happened
+        self.__afflictions = None
+        # Attributes whose afflictions were left out of the calculation
+        self.__untraced = None
+        self.__cappedBy = None
+
+    @property
+    def original(self):
+        return self.__original
+
+    @original.setter
+    def original(self, val):
+        self.__original = val
+        self.__modified = [MISSING] * len(self.__modified)
+        self.__cappedBy = None
+
+    @property
+    def overrides(self):
+        return self.__overrides
+
+    @overrides.setter
+    def overrides(self, val):
+        self.__overrides = val
+
+    def overlay(self):
+        """Empty dict of the same type over the same original values and overrides"""
+        overlay = type(self)(parent=self.parent)
+        overlay.original = self.original
+        overlay.overrides = self.overrides
+        return overlay
+
+    def takeCalculation(self, other, twins):
+        """Take what was calculated into other, see ModifiedAttributeDict.takeCalculation"""
+        self.fit = twins(other.fit)
+        self.__keys = other.__keys
+        self.__modified = other.__modified
+        self.__accumulators = other.__accumulators
+        self.__extras = other.__extras
+        self.__untraced = other.__untraced
+        self.__cappedBy = other.__cappedBy
+        if other.__afflictions is None:
+            self.__afflictions = None
+        else:
+            self.__afflictions = [(index, twins(fit), twins(modifier), operation, bonus, used)
+                                  for index, fit, modifier, operation, bonus, used in other.__afflictions]
+
+    def __row(self, key):
+        index = internAttribute(key)
+        keys = self.__keys
+        row = bisect_left(keys, index)
+        if row == len(keys) or keys[row] != index:
+            keys.insert(row, index)
+            self.__modified.insert(row, MISSING)
+            offset = row * ACCUMULATORS
+            self.__accumulators[offset:offset] = array("d", ACCUMULATOR_IDENTITY)
+        return row
+
+    def __findRow(self, key):
+        index = attributeIndexes.get(key)
+        if index is None:
+            return None
+        keys = self.__keys
+        row = bisect_left(keys, index)
+        return row if row < len(keys) and keys[row] == index else None
+
+    def __getExtra(self, key, slot):
+        if self.__extras is None:
+            return MISSING
+        extras = self.__extras.get(attributeIndexes.get(key))
+        return MISSING if extras is None else extras[slot]
+
+    def __setExtra(self, key, slot, value):
+        if self.__extras is None:
+            self.__extras = {}
+        index = internAttribute(key)
+        extras = self.__extras.get(index)
+        if extras is None:
+            extras = self.__extras[index] = [MISSING] * EXTRA_SLOTS
+        extras[slot] = value
+
+    def __isModified(self, key):
+        row = self.__findRow(key)
+        return row is not None and self.__modified[row] is not MISSING
+
+    def __getitem__(self, key):
+        val = MISSING
+        row = self.__findRow(key)
+        # Check if we have final calculated value
+        if row is not None:
+            val = self.__modified[row]
+            if val is self.CalculationPlaceholder:
+                val = self.__modified[row] = self.__calculateValue(key)
+        # Then in values which are not yet calculated
+        if val is MISSING:
+            val = self.__getExtra(key, INTERMEDIARY)
+        # Original value is the least priority
+        if val is MISSING:
+            val = self.getOriginal(key)
+
+        if calcJournal.state.recorder is not None:
+            calcJournal.recordRead(calcJournal.checkItem, self, key, val)
+        return val
+
+    def __delitem__(self, key):
+        row = self.__findRow(key)
+        if row is not None:
+            self.__modified[row] = MISSING
+        if self.__getExtra(key, INTERMEDIARY) is not MISSING:
+            self.__setExtra(key, INTERMEDIARY, MISSING)
+        self.__invalidateCapped(key)
+
+    def getOriginal(self, key):
+        if ModifiedAttributeDict.OVERRIDES and key in self.__overrides:
+            return self.__overrides.get(key).value
+        val = self.__original.get(key)
+        if val is None:
+            return None
+
+        return val.value if hasattr(val, "value") else val
+
+    @recorded
+    def __setitem__(self, key, val):
+        self.__setExtra(key, INTERMEDIARY, val)
+        self.__invalidateCapped(key)
+
+    def __modifiedKeys(self):
+        return (attributeNames[index] for index, value in zip(self.__keys, self.__modified) if value is not MISSING)
+
+    def __intermediaryKeys(self):
+        if self.__extras is None:
+            return ()
+        return (attributeNames[index] for index, extras in self.__extras.iteritems()
+                if extras[INTERMEDIARY] is not MISSING)
+
+    def __iter__(self):
+        keys = set(self.__original or ())
+        keys.update(self.__modifiedKeys())
+        return iter(keys)
+
+    def __contains__(self, key):
+        contains = (self.__original is not None and key in self.__original) or \
+            self.__isModified(key) or self.__getExtra(key, INTERMEDIARY) is not MISSING
+
+        if calcJournal.state.recorder is not None:
+            calcJournal.recordRead(calcJournal.checkContains, self, key, contains)
+        return contains
+
+    def __len__(self):
+        keys = set(self.__original.iterkeys())
+        keys.update(self.__modifiedKeys())
+        keys.update(self.__intermediaryKeys())
+        return len(keys)
+
+    def keys(self):
+        return list(self)
+
+    def iterkeys(self):
+        return iter(self)
+
+    def itervalues(self):
+        return (self[key] for key in self)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def iteritems(self):
+        return ((key, self[key]) for key in self)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __placehold(self, key):
+        """Create calculation placeholder in item's modified attribute dict"""
+        self.__modified[self.__row(key)] = self.CalculationPlaceholder
+        self.__invalidateCapped(key)
+
+    def __invalidateCapped(self, key):
+        """Values capped by key have to be calculated again when key changes"""
+        dependents = self.__cappedBy.pop(key, None) if self.__cappedBy else None
+        if dependents:
+            for dependent in dependents:
+                if self.__isModified(dependent):
+                    self.__placehold(dependent)
+                else:
+                    self.__invalidateCapped(dependent)
+
+    def __calculateValue(self, key):
+        # It's possible that various attributes are capped by other attributes,
+        # it's defined by reference maxAttributeID
+        cappingKey = getCappingKey(key)
+        if cappingKey:
+            if cappingKey in self.original:
+                #  some items come with their own caps (ie: carriers). If they do, use this
+                cappingValue = self.original.get(cappingKey).value
+            else:
+                # If not, use the calculated value of the cap, and remember we did, so we're
+                # calculated again when the cap changes
+                cappingRow = self.__findRow(cappingKey)
+                cappingValue = MISSING if cappingRow is None else self.__modified[cappingRow]
+                if cappingValue is MISSING:
+                    cappingValue = self.__calculateValue(cappingKey)
+                elif cappingValue is self.CalculationPlaceholder:
+                    cappingValue = self.__modified[cappingRow] = self.__calculateValue(cappingKey)
+                if self.__cappedBy is None:
+                    self.__cappedBy = {}
+                self.__cappedBy.setdefault(cappingKey, set()).add(key)
+        else:
+            cappingValue = None
+
+        extras = self.__extras.get(attributeIndexes.get(key)) if self.__extras else None
+        if extras is None:
+            extras = NO_EXTRAS
+
+        # If value is forced, we don't have to calculate anything,
+        # just return forced value instead
+        force = extras[FORCED]
+        if force is not MISSING and force is not None:
+            if cappingValue is not None:
+                force = min(force, cappingValue)
+            return force
+
+        # Grab initial value, priorities are:
+        # Results of ongoing calculation > preAssign > original > 0
+        if extras[INTERMEDIARY] is not MISSING:
+            val = extras[INTERMEDIARY]
+        elif extras[PRE_ASSIGN] is not MISSING:
+            val = extras[PRE_ASSIGN]
+        elif key in self.__original:
+            val = self.getOriginal(key)
+        else:
+            val = getDefaultValue(key)
+
+        # We'll do stuff in the following order:
+        # preIncrease > multiplier > stacking penalized multipliers > postIncrease
+        row = self.__findRow(key)
+        if row is not None:
+            accumulators = self.__accumulators
+            offset = row * ACCUMULATORS
+            preIncrease = accumulators[offset + PRE_INCREASE]
+            multiplier = accumulators[offset + MULTIPLIER]
+            postIncrease = accumulators[offset + POST_INCREASE]
+        else:
+            preIncrease, multiplier, postIncrease = ACCUMULATOR_IDENTITY
+        if preIncrease != 0:
+            val += preIncrease
+        if multiplier != 1:
+            val *= multiplier
+        # Each group is penalized independently
+        # Things in different groups will not be stack penalized between each other
+        if extras[PENALIZED] is not MISSING:
+            for penalizedMultipliers in extras[PENALIZED].itervalues():
+                val = penalizedMultipliers.apply(val)
+        if postIncrease != 0:
+            val += postIncrease
+
+        # Cap value if we have cap defined
+        if cappingValue is not None:
+            val = min(val, cappingValue)
+
+        return val
+
+    def __handleSkill(self, skillName):
+        """Register skillName as the affector, see ModifiedAttributeDict.__handleSkill"""
+        fit = self.fit
+        if not fit:
+            fit = self.parent.owner
+        skill = fit.character.getSkill(skillName)
+        fit.register(skill)
+        return skill.level
+
+    def getAfflictions(self, key):
+        if self.__untraced and key in self.__untraced:
+            self.__traceAfflictions()
+        afflictions = {}
+        index = attributeIndexes.get(key)
+        if self.__afflictions and index is not None:
+            for attributeIndex, fit, modifier, operation, bonus, used in self.__afflictions:
+                if attributeIndex == index:
+                    afflictions.setdefault(fit, []).append((modifier, operation, bonus, used))
+        return afflictions
+
+    def iterAfflictions(self):
+        if self.__untraced:
+            self.__traceAfflictions()
+        return self.__iterAfflictions()
+
+    def __iterAfflictions(self):
+        seen = set()
+        for affliction in self.__afflictions or ():
+            if affliction[0] not in seen:
+                seen.add(affliction[0])
+                yield attributeNames[affliction[0]]
+
+    def __traceAfflictions(self):
+        self.__untraced = None
+        self.fit.traceAfflictions(self)
+
+    def __afflict(self, attributeName, operation, bonus, used=True):
+        """Add modifier to list of things affecting current item"""
+        # Do nothing if no fit is assigned
+        if self.fit is None:
+            return
+        if not self.fit.recordAffectedBy and not self.fit.tracesAfflictions(self, attributeName):
+            if self.__untraced is None:
+                self.__untraced = set()
+            self.__untraced.add(attributeName)
+            return
+        if self.__afflictions is None:
+            self.__afflictions = []
+        origin = self.fit.getOrigin()
+        fit = origin if origin and origin != self.fit else self.fit
+        self.__afflictions.append((internAttribute(attributeName), fit, self.fit.getModifier(), operation, bonus, used))
+
+    @recorded
+    def preAssign(self, attributeName, value):
+        """Overwrites original value of the entity with given one, allowing further modification"""
+        self.__setExtra(attributeName, PRE_ASSIGN, value)
+        self.__placehold(attributeName)
+        self.__afflict(attributeName, "=", value, value != self.getOriginal(attributeName))
+
+    @recorded
+    def increase(self, attributeName, increase, position="pre", skill=None):
+        """Increase value of given attribute by given number"""
+        if skill:
+            increase *= self.__handleSkill(skill)
+
+        # Increases applied before multiplications and after them are
+        # kept separately
+        if position == "pre":
+            slot = PRE_INCREASE
+        elif position == "post":
+            slot = POST_INCREASE
+        else:
+            raise ValueError("position should be either pre or post")
+        self.__accumulators[self.__row(attributeName) * ACCUMULATORS + slot] += increase
+        self.__placehold(attributeName)
+        self.__afflict(attributeName, "+", increase, increase != 0)
+
+    @recorded
+    def multiply(self, attributeName, multiplier, stackingPenalties=False, penaltyGroup="default", skill=None):
+        """Multiply value of given attribute by given factor"""
+        if multiplier is None:  # See GH issue 397
+            return
+
+        if skill:
+            multiplier *= self.__handleSkill(skill)
+
+        # If we're asked to do stacking penalized multiplication, append values
+        # to per penalty group lists
+        if stackingPenalties:
+            groups = self.__getExtra(attributeName, PENALIZED)
+            if groups is MISSING:
+                groups = {}
+                self.__setExtra(attributeName, PENALIZED, groups)
+            if penaltyGroup not in groups:
+                groups[penaltyGroup] = PenaltyGroup()
+            groups[penaltyGroup].append(multiplier)
+        # Non-penalized multiplication factors go to the single multiplier
+        else:
+            self.__accumulators[self.__row(attributeName) * ACCUMULATORS + MULTIPLIER] *= multiplier
+
+        self.__placehold(attributeName)
+        self.__afflict(attributeName, "%s*" % ("s" if stackingPenalties else ""), multiplier, multiplier != 1)
+
+    @recorded
+    def boost(self, attributeName, boostFactor, skill=None, remoteResists=False, *args, **kwargs):
+        """Boost value by some percentage"""
+        if skill:
+            boostFactor *= self.__handleSkill(skill)
+
+        if remoteResists:
+            mod = self.fit.getModifier()
+            remoteResistID = mod.getModifiedItemAttr("remoteResistanceID") or None
+
+            # We really don't have a way of getting a ships attribute by ID. Fail.
+            resist = next((x for x in self.fit.ship.item.attributes.values() if x.ID == remoteResistID), None)
+
+            if remoteResistID and resist:
+                boostFactor *= resist.value
+
+        # We just transform percentage boost into multiplication factor
+        self.multiply(attributeName, 1 + boostFactor / 100.0, *args, **kwargs)
+
+    @recorded
+    def force(self, attributeName, value):
+        """Force value to attribute and prohibit any changes to it"""
+        self.__setExtra(attributeName, FORCED, value)
+        self.__placehold(attributeName)
+        self.__afflict(attributeName, u"\u2263", value)
+
+
+collections.MutableMapping.register(CompactModifiedAttributeDict)
+
+ATTRIBUTE_DICTS = (ModifiedAttributeDict, CompactModifiedAttributeDict)
+
+
+class AttributeOverlay(object):
+    """
+    Stand-in modified attribute dicts of an item. While applied, whatever is
+    calculated on the item goes into the overlay, restoring puts the item's own
+    dicts back as they were.
+    """
+    __slots__ = ("holder", "own", "overlay")
+
+    def __init__(self, holder):
+        self.holder = holder
+        self.own = dict((key, value) for key, value in vars(holder).iteritems() if isinstance(value, ATTRIBUTE_DICTS))
+        self.overlay = dict((key, value.overlay()) for key, value in self.own.iteritems())
+
+    def apply(self):
+        vars(self.holder).update(self.overlay)
+
+    def restore(self):
+        vars(self.holder).update(self.own)
+
+
+class AttributeOverlays(object):
+    """Overlays of a number of items, applied either to all of them or to a single one"""
+
+    def __init__(self, holders):
+        self.overlays = [AttributeOverlay(holder) for holder in holders if holder is not None]
+        # True when applied to all items, else the only item applied to, if any
+        self.applied = None
+
+    def applyAll(self):
+        if self.applied is not True:
+            for overlay in self.overlays:
+                overlay.apply()
+            self.applied = True
+
+    def applyOnly(self, holder):
+        if self.applied is not holder:
+            for overlay in self.overlays:
+                if overlay.holder is holder:
+                    overlay.apply()
+                else:
+                    overlay.restore()
+            self.applied = holder
+
+    def restoreAll(self):
+        if self.applied is not None:
+            for overlay in self.overlays:
+                overlay.restore()
+            self.applied = None
+
+
 class Affliction(object):
     def __init__(self, type, amount):
         self.type = type
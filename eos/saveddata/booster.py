@@ -23,7 +23,7 @@ from sqlalchemy.orm import reconstructor, validates
 
 import eos.db
 from eos.effectHandlerHelpers import HandledItem
-from eos.modifiedAttributeDict import ModifiedAttributeDict, ItemAttrShortcut
+from eos.modifiedAttributeDict import newAttributeDict, ItemAttrShortcut
 
 pyfalog = Logger(__name__)
 
@@ -59,7 +59,7 @@ class Booster(HandledItem, ItemAttrShortcut):
     def build(self):
         """ Build object. Assumes proper and valid item already set """
         self.__sideEffects = []
-        self.__itemModifiedAttributes = ModifiedAttributeDict()
+        self.__itemModifiedAttributes = newAttributeDict()
         self.__itemModifiedAttributes.original = self.__item.attributes
         self.__itemModifiedAttributes.overrides = self.__item.overrides
         self.__slot = self.__calculateSlot(self.__item)
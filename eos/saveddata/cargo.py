@@ -24,7 +24,7 @@ from sqlalchemy.orm import validates, reconstructor
 
 import eos.db
 from eos.effectHandlerHelpers import HandledItem
-from eos.modifiedAttributeDict import ModifiedAttributeDict, ItemAttrShortcut
+from eos.modifiedAttributeDict import newAttributeDict, ItemAttrShortcut
 
 pyfalog = Logger(__name__)
 
@@ -35,7 +35,7 @@ class Cargo(HandledItem, ItemAttrShortcut):
         self.__item = item
         self.itemID = item.ID if item is not None else None
         self.amount = 0
-        self.__itemModifiedAttributes = ModifiedAttributeDict()
+        self.__itemModifiedAttributes = newAttributeDict()
         self.__itemModifiedAttributes.original = item.attributes
         self.__itemModifiedAttributes.overrides = item.overrides
 
@@ -50,7 +50,7 @@ class Cargo(HandledItem, ItemAttrShortcut):
                 pyfalog.error("Item (id: {0}) does not exist", self.itemID)
                 return
 
-        self.__itemModifiedAttributes = ModifiedAttributeDict()
+        self.__itemModifiedAttributes = newAttributeDict()
         self.__itemModifiedAttributes.original = self.__item.attributes
         self.__itemModifiedAttributes.overrides = self.__item.overrides
 
@@ -22,51 +22,45 @@ from logbook import Logger
 from itertools import chain
 
 from sqlalchemy.orm import validates, reconstructor
+from sqlalchemy.orm.attributes import set_committed_value
 
 import eos
+import eos.config
 import eos.db
+from eos import calcJournal
 from eos.effectHandlerHelpers import HandledItem, HandledImplantBoosterList
+from eos.skillProfile import SkillProfile, SkillStep
 
 pyfalog = Logger(__name__)
 
 
 class Character(object):
-    __itemList = None
-    __itemIDMap = None
-    __itemNameMap = None
+    """
+    A character and its skill levels. Only skills at a level other than
+    defaultLevel are stored, the others are created on demand at defaultLevel
+    and stored once saved at another level.
+    """
+
+    @staticmethod
+    def __skillData(name, build):
+        # Gamedata is kept per thread, so are the skills, along with the thread's gamedata session
+        info = eos.db.gamedata_session().info
+        data = info.get(name)
+        if data is None:
+            data = info[name] = build()
+        return data
 
     @classmethod
     def getSkillList(cls):
-        if cls.__itemList is None:
-            cls.__itemList = eos.db.getItemsByCategory("Skill")
-
-        return cls.__itemList
-
-    @classmethod
-    def setSkillList(cls, list):
-        cls.__itemList = list
+        return cls.__skillData("skillList", lambda: eos.db.getItemsByCategory("Skill"))
 
     @classmethod
     def getSkillIDMap(cls):
-        if cls.__itemIDMap is None:
-            map = {}
-            for skill in cls.getSkillList():
-                map[skill.ID] = skill
-
-            cls.__itemIDMap = map
-
-        return cls.__itemIDMap
+        return cls.__skillData("skillIDMap", lambda: dict((skill.ID, skill) for skill in cls.getSkillList()))
 
     @classmethod
     def getSkillNameMap(cls):
-        if cls.__itemNameMap is None:
-            map = {}
-            for skill in cls.getSkillList():
-                map[skill.name] = skill
-
-            cls.__itemNameMap = map
-
-        return cls.__itemNameMap
+        return cls.__skillData("skillNameMap", lambda: dict((skill.name, skill) for skill in cls.getSkillList()))
 
     @classmethod
     def getAll5(cls):
@@ -91,18 +85,17 @@ class Character(object):
 
         return all0
 
-    def __init__(self, name, defaultLevel=None, initSkills=True):
+    def __init__(self, name, defaultLevel=None):
         self.savedName = name
         self.__owner = None
         self.defaultLevel = defaultLevel
         self.__skills = []
         self.__skillIdMap = {}
+        self.__defaultSkills = {}
+        self.__allSkills = None
         self.dirtySkills = set()
         self.alphaClone = None
-
-        if initSkills:
-            for item in self.getSkillList():
-                self.addSkill(Skill(item.ID, self.defaultLevel))
+        self.__skillProfile = None
 
         self.__implants = HandledImplantBoosterList()
         self.apiKey = None
@@ -113,7 +106,10 @@ class Character(object):
         self.__skillIdMap = {}
         for skill in self.__skills:
             self.__skillIdMap[skill.itemID] = skill
+        self.__defaultSkills = {}
+        self.__allSkills = None
         self.dirtySkills = set()
+        self.__skillProfile = None
 
         self.alphaClone = None
 
@@ -123,6 +119,9 @@ class Character(object):
     def apiUpdateCharSheet(self, skills):
         del self.__skills[:]
         self.__skillIdMap.clear()
+        self.__defaultSkills.clear()
+        self.__allSkills = None
+        self.invalidateSkillProfile()
         for skillRow in skills:
             self.addSkill(Skill(skillRow["typeID"], skillRow["level"]))
 
@@ -164,11 +163,41 @@ class Character(object):
     def alphaCloneID(self, cloneID):
         self.__alphaCloneID = cloneID
         self.alphaClone = eos.db.getAlphaClone(cloneID) if cloneID is not None else None
+        self.invalidateSkillProfile()
 
     @property
     def skills(self):
+        """Every skill in the order of the skill list, the ones not stored at defaultLevel"""
+        if self.__allSkills is None:
+            skills = [self.__skillIdMap.get(item.ID) or self.__getDefaultSkill(item) for item in self.getSkillList()]
+            # Stored skills no longer in the skill list, they get removed once their item is looked up
+            skillIDMap = self.getSkillIDMap()
+            skills.extend(skill for skill in self.__skills if skill.itemID not in skillIDMap)
+            self.__allSkills = skills
+
+        return self.__allSkills
+
+    @property
+    def storedSkills(self):
+        """Skills at a level of their own, the ones persisted"""
         return self.__skills
 
+    def __getDefaultSkill(self, item):
+        skill = self.__defaultSkills.get(item.ID)
+        if skill is None:
+            skill = self.__defaultSkills[item.ID] = Skill(item, self.defaultLevel, False, True)
+            # Not through the backref, which would store it along with the character
+            set_committed_value(skill, "character", self)
+
+        return skill
+
+    def storeSkill(self, skill):
+        """Store skill, one created at defaultLevel, when it was saved at another level"""
+        if self.__defaultSkills.get(skill.itemID) is skill and skill.activeLevel != self.defaultLevel:
+            del self.__defaultSkills[skill.itemID]
+            self.__skills.append(skill)
+            self.__skillIdMap[skill.itemID] = skill
+
     def addSkill(self, skill):
         if skill.itemID in self.__skillIdMap:
             oldSkill = self.__skillIdMap[skill.itemID]
@@ -180,10 +209,15 @@ class Character(object):
 
         self.__skills.append(skill)
         self.__skillIdMap[skill.itemID] = skill
+        self.__defaultSkills.pop(skill.itemID, None)
+        self.__allSkills = None
+        self.invalidateSkillProfile()
 
     def removeSkill(self, skill):
         self.__skills.remove(skill)
         del self.__skillIdMap[skill.itemID]
+        self.__allSkills = None
+        self.invalidateSkillProfile()
 
     def getSkill(self, item):
         if isinstance(item, basestring):
@@ -194,8 +228,7 @@ class Character(object):
         skill = self.__skillIdMap.get(item.ID)
 
         if skill is None:
-            skill = Skill(item, self.defaultLevel, False, True)
-            self.addSkill(skill)
+            skill = self.__getDefaultSkill(item)
 
         return skill
 
@@ -238,16 +271,31 @@ class Character(object):
             if filter(element):
                 element.boostItemAttr(*args, **kwargs)
 
+    def invalidateSkillProfile(self):
+        """Skill bonuses have to be compiled again, call whenever skills or their levels change"""
+        self.__skillProfile = None
+
+    def getSkillSteps(self, runTime, structure):
+        """SkillSteps applying the skills of this character to a fit at runTime"""
+        if not eos.config.skillProfiles:
+            return [SkillStep(skill) for skill in self.skills]
+
+        profile = self.__skillProfile
+        if profile is None:
+            profile = self.__skillProfile = SkillProfile(self)
+        return profile.getSteps(runTime, structure)
+
     def calculateModifiedAttributes(self, fit, runTime, forceProjected=False):
         if forceProjected:
             return
-        for skill in self.skills:
-            fit.register(skill)
-            skill.calculateModifiedAttributes(fit, runTime)
+        for step in self.getSkillSteps(runTime, fit.isStructure):
+            fit.register(step.skill)
+            step.run(fit, runTime)
 
     def clear(self):
         c = chain(
-            self.skills,
+            self.__skills,
+            self.__defaultSkills.itervalues(),
             self.implants
         )
         for stuff in c:
@@ -255,11 +303,12 @@ class Character(object):
                 stuff.clear()
 
     def __deepcopy__(self, memo):
-        copy = Character("%s copy" % self.name, initSkills=False)
+        copy = Character("%s copy" % self.name, self.defaultLevel)
         copy.apiKey = self.apiKey
         copy.apiID = self.apiID
 
-        for skill in self.skills:
+        # Skills changed but not saved are copied at their new level, the ones still at defaultLevel are left out
+        for skill in chain(self.__skills, (skill for skill in self.dirtySkills if skill.itemID not in self.__skillIdMap)):
             copy.addSkill(Skill(skill.itemID, skill.level, False, skill.learned))
 
         return copy
@@ -305,6 +354,7 @@ class Skill(HandledItem):
 
         if self in self.character.dirtySkills:
             self.character.dirtySkills.remove(self)
+        self.character.storeSkill(self)
 
     def revert(self):
         self.level = self.__level
@@ -320,9 +370,13 @@ class Skill(HandledItem):
     @property
     def level(self):
         if self.character.alphaClone:
-            return min(self.activeLevel, self.character.alphaClone.getSkillLevel(self)) or 0
+            level = min(self.activeLevel, self.character.alphaClone.getSkillLevel(self)) or 0
+        else:
+            level = self.activeLevel or 0
 
-        return self.activeLevel or 0
+        if calcJournal.state.recorder is not None:
+            calcJournal.recordRead(calcJournal.checkLevel, self, None, level)
+        return level
 
     @level.setter
     def level(self, level):
@@ -334,6 +388,7 @@ class Skill(HandledItem):
 
         self.activeLevel = level
         self.character.dirtySkills.add(self)
+        self.character.invalidateSkillProfile()
 
         if self.activeLevel == self.__level and self in self.character.dirtySkills:
             self.character.dirtySkills.remove(self)
@@ -23,7 +23,7 @@ from sqlalchemy.orm import validates, reconstructor
 
 import eos.db
 from eos.effectHandlerHelpers import HandledItem, HandledCharge
-from eos.modifiedAttributeDict import ModifiedAttributeDict, ItemAttrShortcut, ChargeAttrShortcut
+from eos.modifiedAttributeDict import newAttributeDict, ItemAttrShortcut, ChargeAttrShortcut
 
 pyfalog = Logger(__name__)
 
@@ -68,11 +68,11 @@ class Drone(HandledItem, HandledCharge, ItemAttrShortcut, ChargeAttrShortcut):
         self.__dps = None
         self.__volley = None
         self.__miningyield = None
-        self.__itemModifiedAttributes = ModifiedAttributeDict()
+        self.__itemModifiedAttributes = newAttributeDict()
         self.__itemModifiedAttributes.original = self.__item.attributes
         self.__itemModifiedAttributes.overrides = self.__item.overrides
 
-        self.__chargeModifiedAttributes = ModifiedAttributeDict()
+        self.__chargeModifiedAttributes = newAttributeDict()
         chargeID = self.getModifiedItemAttr("entityMissileTypeID")
         if chargeID is not None:
             charge = eos.db.getItem(int(chargeID))
@@ -17,17 +17,22 @@
 # along with eos.  If not, see <http://www.gnu.org/licenses/>.
 # ===============================================================================
 
+import threading
 import time
 from copy import deepcopy
 from itertools import chain
 from math import sqrt, log, asinh
 
 from sqlalchemy.orm import validates, reconstructor
+from sqlalchemy.orm.attributes import manager_of_class
 
 import eos.db
-from eos import capSim
+from eos import capSim, config, warfareBuffs
+from eos.calcJournal import CalculationJournal, recorded
 from eos.effectHandlerHelpers import HandledModuleList, HandledDroneCargoList, HandledImplantBoosterList, HandledProjectedDroneList, HandledProjectedModList
 from eos.enum import Enum
+from eos.fleetCalculation import FleetCalculation
+from eos.modifiedAttributeDict import AttributeOverlays
 from eos.saveddata.ship import Ship
 from eos.saveddata.character import Character
 from eos.saveddata.citadel import Citadel
@@ -37,6 +42,15 @@ from logbook import Logger
 
 pyfalog = Logger(__name__)
 
+# Held while a fit is calculated again for "Affected By", users calculating fits from several threads hold it too
+calculationLock = threading.RLock()
+
+# Attributes of the ship repairers add their repair amounts to. The sustainable tank needs to know
+# which repairers did, so "Affected By" is always recorded for them.
+REPAIR_ATTRIBUTES = frozenset(("shieldRepair", "armorRepair", "hullRepair"))
+
+RUNTIMES = ("early", "normal", "late")
+
 
 class ImplantLocation(Enum):
     FIT = 0
@@ -138,6 +152,25 @@ class Fit(object):
         self.gangBoosts = None
         self.ecmProjectedStr = 1
         self.commandBonuses = {}
+        self.calcJournal = CalculationJournal() if config.incrementalCalculation else None
+        # Without it, "Affected By" is only recorded when asked for, see traceAfflictions()
+        self.recordAffectedBy = config.recordAffectedBy
+        self.__tracedAttributes = set()
+        # Attribute overlays of the items and the fit stood in for, only set for the shadow of a fit
+        # projected onto itself, see buildShadow()
+        self.__overlays = None
+        self.shadowOf = None
+
+    @property
+    def incrementalCalculation(self):
+        return self.calcJournal is not None
+
+    @incrementalCalculation.setter
+    def incrementalCalculation(self, enabled):
+        if enabled and self.calcJournal is None:
+            self.calcJournal = CalculationJournal()
+        elif not enabled:
+            self.calcJournal = None
 
     @property
     def targetResists(self):
@@ -425,6 +458,19 @@ class Fit(object):
             if stuff is not None and stuff != self:
                 stuff.clear()
 
+        # Filter indexes are keyed on items and charges, which may have changed since last time
+        for handledList in (
+                self.modules,
+                self.drones,
+                self.fighters,
+                self.boosters,
+                self.implants,
+                self.projectedDrones,
+                self.projectedModules,
+                self.projectedFighters,
+        ):
+            handledList.resetIndexes()
+
         # If this is the active fit that we are clearing, not a projected fit,
         # then this will run and clear the projected ships and flag the next
         # iteration to skip this part to prevent recursion.
@@ -433,8 +479,22 @@ class Fit(object):
                 if stuff is not None and stuff != self:
                     stuff.clear(projected=True)
 
+    def takeCalculated(self, other):
+        """
+        Take the fit wide results of other, this fit calculated as a copy of
+        its own, once cleared. The items' results are taken one by one, see
+        eos.calcTransfer.
+        """
+        self.__calculated = other.__calculated
+        self.ecmProjectedStr = other.ecmProjectedStr
+        self.__extraDrains[:] = other.__extraDrains
+        # What the journal recorded is about the items as they were calculated last time here
+        if self.calcJournal is not None:
+            self.calcJournal.reset()
+
     # Methods to register and get the thing currently affecting the fit,
     # so we can correctly map "Affected By"
+    @recorded
     def register(self, currModifier, origin=None):
         self.__modifier = currModifier
         self.__origin = origin
@@ -448,15 +508,37 @@ class Fit(object):
     def getModifier(self):
         return self.__modifier
 
+    def tracesAfflictions(self, attributes, attributeName):
+        """Whether "Affected By" of attributeName is recorded for attributes when recordAffectedBy is off"""
+        if id(attributes) in self.__tracedAttributes:
+            return True
+        return attributeName in REPAIR_ATTRIBUTES and attributes is getattr(self, "extraAttributes", None)
+
+    def traceAfflictions(self, attributes):
+        """
+        Calculate the fit again, recording "Affected By" for the modified
+        attribute dict attributes, which the last calculation left out.
+        """
+        pyfalog.debug("Calculating {0} again for Affected By", self)
+        with calculationLock:
+            self.__tracedAttributes.add(id(attributes))
+            try:
+                self.clear()
+                self.calculateModifiedAttributes()
+            finally:
+                self.__tracedAttributes.discard(id(attributes))
+
     def getOrigin(self):
         return self.__origin
 
+    @recorded
     def addCommandBonus(self, warfareBuffID, value, module, effect, runTime="normal"):
-        # oh fuck this is so janky
-        # @todo should we pass in min/max to this function, or is abs okay?
-        # (abs is old method, ccp now provides the aggregate function in their data)
-        if warfareBuffID not in self.commandBonuses or abs(self.commandBonuses[warfareBuffID][1]) < abs(value):
-            self.commandBonuses[warfareBuffID] = (runTime, value, module, effect)
+        warfareBuffs.addBonus(self.commandBonuses, warfareBuffID, value, module, effect, runTime)
+
+    def addCommandBonuses(self, resolution):
+        """Add the bonuses of a warfareBuffs.BuffResolution, collected from the fits boosting this one"""
+        for warfareBuffID, (runTime, value, module, effect) in resolution.bonuses.iteritems():
+            warfareBuffs.addBonus(self.commandBonuses, warfareBuffID, value, module, effect, runTime)
 
     def __runCommandBoosts(self, runTime="normal"):
         pyfalog.debug("Applying gang boosts for {0}", self)
@@ -471,301 +553,181 @@ class Fit(object):
             # @todo: Check this
             if effect.isType("gang"):
                 self.register(thing)
-
-                if warfareBuffID == 10:  # Shield Burst: Shield Harmonizing: Shield Resistance
-                    for damageType in ("Em", "Explosive", "Thermal", "Kinetic"):
-                        self.ship.boostItemAttr("shield%sDamageResonance" % damageType, value)
-
-                if warfareBuffID == 11:  # Shield Burst: Active Shielding: Repair Duration/Capacitor
-                    self.modules.filteredItemBoost(
-                            lambda mod: mod.item.requiresSkill("Shield Operation") or mod.item.requiresSkill(
-                                    "Shield Emission Systems"), "capacitorNeed", value)
-                    self.modules.filteredItemBoost(
-                            lambda mod: mod.item.requiresSkill("Shield Operation") or mod.item.requiresSkill(
-                                    "Shield Emission Systems"), "duration", value)
-
-                if warfareBuffID == 12:  # Shield Burst: Shield Extension: Shield HP
-                    self.ship.boostItemAttr("shieldCapacity", value, stackingPenalties=True)
-
-                if warfareBuffID == 13:  # Armor Burst: Armor Energizing: Armor Resistance
-                    for damageType in ("Em", "Thermal", "Explosive", "Kinetic"):
-                        self.ship.boostItemAttr("armor%sDamageResonance" % damageType, value)
-
-                if warfareBuffID == 14:  # Armor Burst: Rapid Repair: Repair Duration/Capacitor
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Remote Armor Repair Systems") or
-                                                               mod.item.requiresSkill("Repair Systems"),
-                                                   "capacitorNeed", value)
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Remote Armor Repair Systems") or
-                                                               mod.item.requiresSkill("Repair Systems"),
-                                                   "duration", value)
-
-                if warfareBuffID == 15:  # Armor Burst: Armor Reinforcement: Armor HP
-                    self.ship.boostItemAttr("armorHP", value, stackingPenalties=True)
-
-                if warfareBuffID == 16:  # Information Burst: Sensor Optimization: Scan Resolution
-                    self.ship.boostItemAttr("scanResolution", value, stackingPenalties=True)
-
-                if warfareBuffID == 17:  # Information Burst: Electronic Superiority: EWAR Range and Strength
-                    groups = ("ECM", "Sensor Dampener", "Weapon Disruptor", "Target Painter")
-                    self.modules.filteredItemBoost(lambda mod: mod.item.group.name in groups, "maxRange", value,
-                                                   stackingPenalties=True)
-                    self.modules.filteredItemBoost(lambda mod: mod.item.group.name in groups,
-                                                   "falloffEffectiveness", value, stackingPenalties=True)
-
-                    for scanType in ("Magnetometric", "Radar", "Ladar", "Gravimetric"):
-                        self.modules.filteredItemBoost(lambda mod: mod.item.group.name == "ECM",
-                                                       "scan%sStrengthBonus" % scanType, value,
-                                                       stackingPenalties=True)
-
-                    for attr in ("missileVelocityBonus", "explosionDelayBonus", "aoeVelocityBonus", "falloffBonus",
-                                 "maxRangeBonus", "aoeCloudSizeBonus", "trackingSpeedBonus"):
-                        self.modules.filteredItemBoost(lambda mod: mod.item.group.name == "Weapon Disruptor",
-                                                       attr, value)
-
-                    for attr in ("maxTargetRangeBonus", "scanResolutionBonus"):
-                        self.modules.filteredItemBoost(lambda mod: mod.item.group.name == "Sensor Dampener",
-                                                       attr, value)
-
-                    self.modules.filteredItemBoost(lambda mod: mod.item.group.name == "Target Painter",
-                                                   "signatureRadiusBonus", value, stackingPenalties=True)
-
-                if warfareBuffID == 18:  # Information Burst: Electronic Hardening: Scan Strength
-                    for scanType in ("Gravimetric", "Radar", "Ladar", "Magnetometric"):
-                        self.ship.boostItemAttr("scan%sStrength" % scanType, value, stackingPenalties=True)
-
-                if warfareBuffID == 19:  # Information Burst: Electronic Hardening: RSD/RWD Resistance
-                    self.ship.boostItemAttr("sensorDampenerResistance", value)
-                    self.ship.boostItemAttr("weaponDisruptionResistance", value)
-
-                if warfareBuffID == 26:  # Information Burst: Sensor Optimization: Targeting Range
-                    self.ship.boostItemAttr("maxTargetRange", value)
-
-                if warfareBuffID == 20:  # Skirmish Burst: Evasive Maneuvers: Signature Radius
-                    self.ship.boostItemAttr("signatureRadius", value, stackingPenalties=True)
-
-                if warfareBuffID == 21:  # Skirmish Burst: Interdiction Maneuvers: Tackle Range
-                    groups = ("Stasis Web", "Warp Scrambler")
-                    self.modules.filteredItemBoost(lambda mod: mod.item.group.name in groups, "maxRange", value,
-                                                   stackingPenalties=True)
-
-                if warfareBuffID == 22:  # Skirmish Burst: Rapid Deployment: AB/MWD Speed Increase
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Afterburner") or
-                                                               mod.item.requiresSkill("High Speed Maneuvering"),
-                                                   "speedFactor", value, stackingPenalties=True)
-
-                if warfareBuffID == 23:  # Mining Burst: Mining Laser Field Enhancement: Mining/Survey Range
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Mining") or
-                                                               mod.item.requiresSkill("Ice Harvesting") or
-                                                               mod.item.requiresSkill("Gas Cloud Harvesting"),
-                                                   "maxRange", value, stackingPenalties=True)
-
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("CPU Management"),
-                                                   "surveyScanRange", value, stackingPenalties=True)
-
-                if warfareBuffID == 24:  # Mining Burst: Mining Laser Optimization: Mining Capacitor/Duration
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Mining") or
-                                                               mod.item.requiresSkill("Ice Harvesting") or
-                                                               mod.item.requiresSkill("Gas Cloud Harvesting"),
-                                                   "capacitorNeed", value, stackingPenalties=True)
-
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Mining") or
-                                                               mod.item.requiresSkill("Ice Harvesting") or
-                                                               mod.item.requiresSkill("Gas Cloud Harvesting"),
-                                                   "duration", value, stackingPenalties=True)
-
-                if warfareBuffID == 25:  # Mining Burst: Mining Equipment Preservation: Crystal Volatility
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Mining"),
-                                                   "crystalVolatilityChance", value, stackingPenalties=True)
-
-                if warfareBuffID == 60:  # Skirmish Burst: Evasive Maneuvers: Agility
-                    self.ship.boostItemAttr("agility", value, stackingPenalties=True)
-
-                # Titan effects
-
-                if warfareBuffID == 39:  # Avatar Effect Generator : Capacitor Recharge bonus
-                    self.ship.boostItemAttr("rechargeRate", value, stackingPenalties=True)
-
-                if warfareBuffID == 40:  # Avatar Effect Generator : Kinetic resistance bonus
-                    for attr in ("armorKineticDamageResonance", "shieldKineticDamageResonance", "kineticDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 41:  # Avatar Effect Generator : EM resistance penalty
-                    for attr in ("armorEmDamageResonance", "shieldEmDamageResonance", "emDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 42:  # Erebus Effect Generator : Armor HP bonus
-                    self.ship.boostItemAttr("armorHP", value, stackingPenalties=True)
-
-                if warfareBuffID == 43:  # Erebus Effect Generator : Explosive resistance bonus
-                    for attr in ("armorExplosiveDamageResonance", "shieldExplosiveDamageResonance", "explosiveDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 44:  # Erebus Effect Generator : Thermal resistance penalty
-                    for attr in ("armorThermalDamageResonance", "shieldThermalDamageResonance", "thermalDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 45:  # Ragnarok Effect Generator : Signature Radius bonus
-                    self.ship.boostItemAttr("signatureRadius", value, stackingPenalties=True)
-
-                if warfareBuffID == 46:  # Ragnarok Effect Generator : Thermal resistance bonus
-                    for attr in ("armorThermalDamageResonance", "shieldThermalDamageResonance", "thermalDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 47:  # Ragnarok Effect Generator : Explosive resistance penaly
-                    for attr in ("armorExplosiveDamageResonance", "shieldExplosiveDamageResonance", "explosiveDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 48:  # Leviathan Effect Generator : Shield HP bonus
-                    self.ship.boostItemAttr("shieldCapacity", value, stackingPenalties=True)
-
-                if warfareBuffID == 49:  # Leviathan Effect Generator : EM resistance bonus
-                    for attr in ("armorEmDamageResonance", "shieldEmDamageResonance", "emDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 50:  # Leviathan Effect Generator : Kinetic resistance penalty
-                    for attr in ("armorKineticDamageResonance", "shieldKineticDamageResonance", "kineticDamageResonance"):
-                        self.ship.boostItemAttr(attr, value, stackingPenalties=True)
-
-                if warfareBuffID == 51:  # Avatar Effect Generator : Velocity penalty
-                    self.ship.boostItemAttr("maxVelocity", value, stackingPenalties=True)
-
-                if warfareBuffID == 52:  # Erebus Effect Generator : Shield RR penalty
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Shield Emission Systems"), "shieldBonus", value, stackingPenalties=True)
-
-                if warfareBuffID == 53:  # Leviathan Effect Generator : Armor RR penalty
-                    self.modules.filteredItemBoost(lambda mod: mod.item.requiresSkill("Remote Armor Repair Systems"),
-                                                   "armorDamageAmount", value, stackingPenalties=True)
-
-                if warfareBuffID == 54:  # Ragnarok Effect Generator : Laser and Hybrid Optimal penalty
-                    groups = ("Energy Weapon", "Hybrid Weapon")
-                    self.modules.filteredItemBoost(lambda mod: mod.item.group.name in groups, "maxRange", value, stackingPenalties=True)
+                warfareBuffs.applyBuff(self, warfareBuffID, value)
 
             del self.commandBonuses[warfareBuffID]
 
-    def calculateModifiedAttributes(self, targetFit=None, withBoosters=False, dirtyStorage=None):
-        timer = Timer(u'Fit: {}, {}'.format(self.ID, self.name), pyfalog)
-        pyfalog.debug("Starting fit calculation on: {0}, withBoosters: {1}", self, withBoosters)
-
-        shadow = False
-        if targetFit and not withBoosters:
-            pyfalog.debug("Applying projections to target: {0}", targetFit)
-            projectionInfo = self.getProjectionInfo(targetFit.ID)
-            pyfalog.debug("ProjectionInfo: {0}", projectionInfo)
-            if self == targetFit:
-                copied = self  # original fit
-                shadow = True
-                # Don't inspect this, we genuinely want to reassign self
-                # noinspection PyMethodFirstArgAssignment
-                self = deepcopy(self)
-                pyfalog.debug("Handling self projection - making shadow copy of fit. {0} => {1}", copied, self)
-                # we delete the fit because when we copy a fit, flush() is
-                # called to properly handle projection updates. However, we do
-                # not want to save this fit to the database, so simply remove it
-                eos.db.saveddata_session.delete(self)
-
-        if self.commandFits and not withBoosters:
-            for fit in self.commandFits:
-                if self == fit:
-                    continue
+    def calculateModifiedAttributes(self):
+        """Calculate the fit, along with the fits boosting and projected onto it"""
+        FleetCalculation((self,)).run()
+
+    def __items(self):
+        # Items that are unrestricted. These items are run on the local fit
+        # first and then projected onto the target fit it one is designated
+        u = [
+            (self.character, self.ship),
+            self.drones,
+            self.fighters,
+            self.boosters,
+            self.appliedImplants,
+            self.modules
+        ] if not self.isStructure else [
+            # Ensure a restricted set for citadels
+            (self.character, self.ship),
+            self.fighters,
+            self.modules
+        ]
+
+        # Items that are restricted. These items are only run on the local
+        # fit. They are NOT projected onto the target fit. # See issue 354
+        r = [(self.mode,), self.projectedDrones, self.projectedFighters, self.projectedModules]
+
+        return u, r
 
-                fit.calculateModifiedAttributes(self, True)
+    @property
+    def isCalculated(self):
+        return self.__calculated
 
-        # If we're not explicitly asked to project fit onto something,
-        # set self as target fit
-        if targetFit is None:
-            targetFit = self
-            projected = False
-        else:
-            projected = not withBoosters
-
-        # If fit is calculated and we have nothing to do here, get out
-
-        # A note on why projected fits don't get to return here. If we return
-        # here, the projection afflictions will not be run as they are
-        # intertwined into the regular fit calculations. So, even if the fit has
-        # been calculated, we need to recalculate it again just to apply the
-        # projections. This is in contract to gang boosts, which are only
-        # calculated once, and their items are then looped and accessed with
-        #     self.gangBoosts.iteritems()
-        # We might be able to exit early in the fit calculations if we separate
-        # projections from the normal fit calculations. But we must ensure that
-        # projection have modifying stuff applied, such as gang boosts and other
-        # local modules that may help
-        if self.__calculated and not projected and not withBoosters:
-            pyfalog.debug("Fit has already been calculated and is not projected, returning: {0}", self)
+    def calculateLocal(self):
+        """
+        Calculate the fit by itself, including the command bonuses collected
+        into it, but nothing projected onto it. Done once until the fit is
+        cleared, see eos.fleetCalculation for the fits around it.
+        """
+        if self.__calculated:
+            pyfalog.debug("Fit has already been calculated, returning: {0}", self)
             return
 
-        for runTime in ("early", "normal", "late"):
-            # Items that are unrestricted. These items are run on the local fit
-            # first and then projected onto the target fit it one is designated
-            u = [
-                (self.character, self.ship),
-                self.drones,
-                self.fighters,
-                self.boosters,
-                self.appliedImplants,
-                self.modules
-            ] if not self.isStructure else [
-                # Ensure a restricted set for citadels
-                (self.character, self.ship),
-                self.fighters,
-                self.modules
-            ]
-
-            # Items that are restricted. These items are only run on the local
-            # fit. They are NOT projected onto the target fit. # See issue 354
-            r = [(self.mode,), self.projectedDrones, self.projectedFighters, self.projectedModules]
-
-            # chain unrestricted and restricted into one iterable
-            c = chain.from_iterable(u + r)
+        timer = Timer(u'Fit: {}, {}'.format(self.ID, self.name), pyfalog)
+        pyfalog.debug("Starting fit calculation on: {0}", self)
 
-            # We calculate gang bonuses first so that projected fits get them
-            # if self.gangBoosts is not None:
-            #     self.__calculateGangBoosts(runTime)
+        journal = self.calcJournal
+        if journal is not None:
+            journal.begin(self)
 
-            for item in c:
+        for runTime in RUNTIMES:
+            u, r = self.__items()
+            for item in chain.from_iterable(u + r):
                 # Registering the item about to affect the fit allows us to
                 # track "Affected By" relations correctly
                 if item is not None:
-                    if not self.__calculated:
-                        # apply effects locally if this is first time running them on fit
-                        self.register(item)
-                        item.calculateModifiedAttributes(self, runTime, False)
-
-                    if projected is True and projectionInfo and item not in chain.from_iterable(r):
-                        # apply effects onto target fit
-                        for _ in xrange(projectionInfo.amount):
-                            targetFit.register(item, origin=self)
-                            item.calculateModifiedAttributes(targetFit, runTime, True)
-
-                    if targetFit and withBoosters and item in self.modules:
-                        # Apply the gang boosts to target fit
-                        # targetFit.register(item, origin=self)
-                        item.calculateModifiedAttributes(targetFit, runTime, False, True)
-
-            if len(self.commandBonuses) > 0:
-                pyfalog.info("Command bonuses applied.")
-                pyfalog.debug(self.commandBonuses)
-
-            if not withBoosters and self.commandBonuses:
+                    self.__calculateItem(item, runTime, journal)
+
+            if self.commandBonuses:
+                pyfalog.debug("Applying command bonuses: {0}", self.commandBonuses)
                 self.__runCommandBoosts(runTime)
 
             timer.checkpoint('Done with runtime: %s' % runTime)
 
+        if journal is not None:
+            journal.end()
+
         # Mark fit as calculated
         self.__calculated = True
 
-        # Only apply projected fits if fit it not projected itself.
-        if not projected and not withBoosters:
-            for fit in self.projectedFits:
-                if fit.getProjectionInfo(self.ID).active:
-                    fit.calculateModifiedAttributes(self, withBoosters=withBoosters, dirtyStorage=dirtyStorage)
+    def collectCommandBonuses(self, targetFit):
+        """Add the command bursts of this calculated fit to targetFit, a fit or a warfareBuffs.BuffResolution"""
+        for runTime in RUNTIMES:
+            for module in self.modules:
+                module.calculateModifiedAttributes(targetFit, runTime, False, True)
 
-        timer.checkpoint('Done with fit calculation')
-
-        if shadow:
-            pyfalog.debug("Delete shadow fit object")
-            del self
+    def projectOnto(self, targetFit, amount):
+        """
+        Apply the projected effects of this calculated fit to targetFit, amount
+        times over, in a single pass over the items which project.
+        """
+        pyfalog.debug("Projecting {0} onto {1} {2} times", self, targetFit, amount)
+        overlays = self.__overlays
+        for runTime in RUNTIMES:
+            u, _ = self.__items()
+            for item in chain.from_iterable(u):
+                if item is None:
+                    continue
+                if overlays is not None:
+                    # Read from the shadow's values of the item, but modify the real target items
+                    overlays.applyOnly(item)
+                for _ in xrange(amount):
+                    targetFit.register(item, origin=self)
+                    item.calculateModifiedAttributes(targetFit, runTime, True)
+
+    def projectShadowOnto(self, targetFit, amount):
+        """
+        Like projectOnto, but from the fit as it is without anything projected
+        onto it, for when it projects onto itself or already had projections
+        applied. The fit is calculated again into a shadow for that.
+        """
+        shadow = self.buildShadow()
+        pyfalog.debug("Calculating shadow of fit for projection. {0} => {1}", self, shadow)
+        overlays = shadow.__overlays
+        try:
+            overlays.applyAll()
+            for fit in self.commandFits:
+                if fit is not self:
+                    fit.collectCommandBonuses(shadow)
+            shadow.calculateLocal()
+            shadow.projectOnto(targetFit, amount)
+        finally:
+            overlays.restoreAll()
+
+    def buildShadow(self):
+        """
+        Stand-in for this fit as a projection source, calculated apart from the
+        fit itself. The shadow has the same items, but is not known to the
+        database and doesn't adopt them: they are calculated into attribute
+        overlays while the shadow is in use.
+        """
+        shadow = manager_of_class(Fit).new_instance()
+        shadow.build()
+        shadow.calcJournal = None
+        # Mapped attributes are set on the instance directly, assigning them
+        # would add the items to the shadow's relations and the shadow to the session
+        vars(shadow).update({
+            "ID"                     : None,
+            "name"                   : u"%s copy" % self.name,
+            "implantLocation"        : self.implantLocation,
+            "projectedOnto"          : self.projectedOnto,
+            "boostedOf"              : {},
+            "shadowOf"               : self,
+            "_Fit__character"        : self.__character,
+            "_Fit__modules"          : self.__modules,
+            "_Fit__drones"           : self.__drones,
+            "_Fit__fighters"         : self.__fighters,
+            "_Fit__cargo"            : self.__cargo,
+            "_Fit__implants"         : self.__implants,
+            "_Fit__boosters"         : self.__boosters,
+            "_Fit__projectedModules" : self.__projectedModules,
+            "_Fit__projectedDrones"  : self.__projectedDrones,
+            "_Fit__projectedFighters": self.__projectedFighters,
+        })
+        shadow.__ship = self.__ship
+        shadow.__mode = self.__mode
+        shadow.__overlays = AttributeOverlays(chain(
+            (self.ship, self.mode),
+            self.drones,
+            self.fighters,
+            self.boosters,
+            self.appliedImplants,
+            self.modules,
+            self.projectedDrones,
+            self.projectedFighters,
+            self.projectedModules,
+        ))
+        shadow.__overlays.applyAll()
+        shadow.extraAttributes = self.ship.itemModifiedAttributes
+        shadow.__overlays.restoreAll()
+        return shadow
+
+    def __calculateItem(self, item, runTime, journal):
+        if journal is None:
+            self.register(item)
+            item.calculateModifiedAttributes(self, runTime, False)
+        elif isinstance(item, Character):
+            # Journal skills one by one, a change to a module should only rerun
+            # skills which actually affect it
+            for step in item.getSkillSteps(runTime, self.isStructure):
+                journal.run(self, step.skill, runTime, step.run, self, runTime)
+        else:
+            journal.run(self, item, runTime, item.calculateModifiedAttributes, self, runTime, False)
 
     def fill(self):
         """
@@ -1098,6 +1060,7 @@ class Fit(object):
         rechargeRate = self.ship.getModifiedItemAttr("shieldRechargeRate") / 1000.0
         return 10 / rechargeRate * sqrt(percent) * (1 - sqrt(percent)) * capacity
 
+    @recorded
     def addDrain(self, src, cycleTime, capNeed, clipSize=0):
         """ Used for both cap drains and cap fills (fills have negative capNeed) """
 
@@ -1162,6 +1125,7 @@ class Fit(object):
             sim.scale = False
             sim.t_max = 6 * 60 * 60 * 1000
             sim.reload = self.factorReload
+            sim.time_budget = config.capSimTimeBudget
             sim.run()
 
             capState = (sim.cap_stable_low + sim.cap_stable_high) / (2 * sim.capacitorCapacity)
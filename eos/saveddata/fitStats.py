@@ -0,0 +1,149 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+import time
+
+import eos.config
+import eos.db
+from eos.db.cache import QueryCache, caches
+from eos.fitHash import calculationHash, characterHash, fitHash
+
+# The calculated stats, the rest only describes what they hold for
+CALCULATED = ("dps", "volley", "ehp", "maxSpeed", "alignTime")
+
+# calculationHash => calculated stats, shared by all fits calculating the same in this process
+memo = caches["fitStatsMemo"] = QueryCache("fitStatsMemo", eos.config.saveddataCacheSize)
+
+
+class FitStats(object):
+    """
+    Headline stats of a calculated fit, kept so fits can be listed with them
+    without calculating them again. They hold for the fit contents, character
+    and gamedata they were taken with, see isValid.
+    """
+
+    def __init__(self):
+        self.contentHash = None
+        self.characterHash = None
+        self.gamedataVersion = None
+        self.timestamp = 0
+        self.dps = None
+        self.volley = None
+        self.ehp = None
+        self.maxSpeed = None
+        self.alignTime = None
+        self.price = None
+
+    @staticmethod
+    def priceTypeIDs(fit):
+        """Type IDs making up the price of fit, the ship first"""
+        typeIDs = [fit.ship.item.ID]
+
+        for mod in fit.modules:
+            if not mod.isEmpty:
+                typeIDs.append(mod.itemID)
+
+        for drone in fit.drones:
+            typeIDs.append(drone.itemID)
+
+        for fighter in fit.fighters:
+            typeIDs.append(fighter.itemID)
+
+        for cargo in fit.cargo:
+            typeIDs.append(cargo.itemID)
+
+        return typeIDs
+
+    @staticmethod
+    def priceAmounts(fit):
+        """typeID => how many of it make up the price of fit"""
+        amounts = {fit.ship.item.ID: 1}
+
+        for mod in fit.modules:
+            if not mod.isEmpty:
+                amounts[mod.itemID] = amounts.get(mod.itemID, 0) + 1
+
+        for fighter in fit.fighters:
+            amounts[fighter.itemID] = amounts.get(fighter.itemID, 0) + fighter.amountActive
+
+        for drone in fit.drones:
+            amounts[drone.itemID] = amounts.get(drone.itemID, 0) + drone.amount
+
+        for cargo in fit.cargo:
+            amounts[cargo.itemID] = amounts.get(cargo.itemID, 0) + cargo.amount
+
+        return amounts
+
+    @classmethod
+    def knownPrice(cls, fit, getPrice=None):
+        """
+        Price of fit from the prices fetched so far, None when any is missing.
+        Prices are looked up with getPrice(typeID), eos.db.getPrice by default.
+        """
+        getPrice = getPrice or eos.db.getPrice
+        total = 0
+        for typeID, amount in cls.priceAmounts(fit).iteritems():
+            price = getPrice(typeID)
+            if price is None or price.price is None:
+                return None
+            total += price.price * amount
+
+        return total
+
+    def update(self, fit, gamedataVersion, getPrice=None):
+        """Take the stats of calculated fit, getPrice is passed on to knownPrice"""
+        self.dps = fit.totalDPS
+        self.volley = fit.totalVolley
+        self.ehp = sum(value for value in fit.ehp.itervalues() if value is not None)
+        self.maxSpeed = fit.maxSpeed
+        self.alignTime = fit.alignTime
+        self.__describe(fit, gamedataVersion, getPrice)
+        memo.set(calculationHash(fit), tuple(getattr(self, name) for name in CALCULATED))
+
+    def reuse(self, fit, gamedataVersion, getPrice=None):
+        """
+        Take the stats of a fit calculating the same as fit, calculated before
+        in this process. Returns False when there are none, fit has to be
+        calculated then.
+        """
+        found, values = memo.get(calculationHash(fit))
+        if not found:
+            return False
+
+        for name, value in zip(CALCULATED, values):
+            setattr(self, name, value)
+        self.__describe(fit, gamedataVersion, getPrice)
+        return True
+
+    def __describe(self, fit, gamedataVersion, getPrice):
+        self.contentHash = fitHash(fit)
+        self.characterHash = characterHash(fit.character)
+        self.gamedataVersion = gamedataVersion
+        self.timestamp = time.time()
+        self.price = self.knownPrice(fit, getPrice)
+
+    def isValid(self, gamedataVersion, characterHash, contentHash=None):
+        """Whether the stats still hold, contentHash can only be checked with the fit at hand"""
+        return self.gamedataVersion == gamedataVersion and self.characterHash == characterHash and \
+            (contentHash is None or self.contentHash == contentHash)
+
+    def __repr__(self):
+        return "FitStats(fitID={}, dps={}, ehp={}) at {}".format(
+            self.fitID, self.dps, self.ehp, hex(id(self))
+        )
@@ -18,7 +18,7 @@
 # ===============================================================================
 
 from eos.effectHandlerHelpers import HandledItem
-from eos.modifiedAttributeDict import ModifiedAttributeDict, ItemAttrShortcut
+from eos.modifiedAttributeDict import newAttributeDict, ItemAttrShortcut
 
 
 class Mode(ItemAttrShortcut, HandledItem):
@@ -29,7 +29,7 @@ class Mode(ItemAttrShortcut, HandledItem):
                 'Passed item "%s" (category: (%s)) is not a Ship Modifier' % (item.name, item.category.name))
 
         self.__item = item
-        self.__itemModifiedAttributes = ModifiedAttributeDict()
+        self.__itemModifiedAttributes = newAttributeDict()
         self.__itemModifiedAttributes.original = self.item.attributes
         self.__itemModifiedAttributes.overrides = self.item.overrides
 
@@ -22,14 +22,19 @@ from logbook import Logger
 from sqlalchemy.orm import validates, reconstructor
 from math import floor
 
+import eos.config
 import eos.db
+from eos.calcJournal import recorded
 from eos.effectHandlerHelpers import HandledItem, HandledCharge
 from eos.enum import Enum
-from eos.modifiedAttributeDict import ModifiedAttributeDict, ItemAttrShortcut, ChargeAttrShortcut
+from eos.modifiedAttributeDict import newAttributeDict, ItemAttrShortcut, ChargeAttrShortcut
 from eos.saveddata.citadel import Citadel
 
 pyfalog = Logger(__name__)
 
+# Attributes deciding which charges fit a module
+CHARGE_ATTRIBUTES = tuple("chargeGroup%d" % i for i in range(5)) + ("chargeSize",)
+
 
 class State(Enum):
     OFFLINE = -1
@@ -119,8 +124,8 @@ class Module(HandledItem, HandledCharge, ItemAttrShortcut, ChargeAttrShortcut):
         self.__reloadForce = None
         self.__chargeCycles = None
         self.__hardpoint = Hardpoint.NONE
-        self.__itemModifiedAttributes = ModifiedAttributeDict(parent=self)
-        self.__chargeModifiedAttributes = ModifiedAttributeDict(parent=self)
+        self.__itemModifiedAttributes = newAttributeDict(parent=self)
+        self.__chargeModifiedAttributes = newAttributeDict(parent=self)
         self.__slot = self.dummySlot  # defaults to None
 
         if self.__item:
@@ -373,6 +378,7 @@ class Module(HandledItem, HandledCharge, ItemAttrShortcut, ChargeAttrShortcut):
         return moduleReloadTime
 
     @reloadTime.setter
+    @recorded
     def reloadTime(self, milliseconds):
         self.__reloadTime = milliseconds
 
@@ -381,6 +387,7 @@ class Module(HandledItem, HandledCharge, ItemAttrShortcut, ChargeAttrShortcut):
         return self.__reloadForce
 
     @forceReload.setter
+    @recorded
     def forceReload(self, type):
         self.__reloadForce = type
 
@@ -509,10 +516,27 @@ class Module(HandledItem, HandledCharge, ItemAttrShortcut, ChargeAttrShortcut):
                 return False
             return True
 
+    def __getIndexedCharges(self, published=False):
+        """IDs of the valid charges from the gamedata indexes, None when they don't apply"""
+        if not eos.config.gamedataIndexes or self.item is None:
+            return None
+
+        # The indexes only know the charges of the unmodified item
+        for attr in CHARGE_ATTRIBUTES:
+            if self.getModifiedItemAttr(attr) != self.item.getAttribute(attr):
+                return None
+
+        return eos.db.getGamedataIndexes().getValidCharges(self.item.ID, published)
+
     def isValidCharge(self, charge):
         # Check sizes, if 'charge size > module volume' it won't fit
         if charge is None:
             return True
+
+        validCharges = self.__getIndexedCharges()
+        if validCharges is not None:
+            return charge.ID in validCharges
+
         chargeVolume = charge.volume
         moduleCapacity = self.item.capacity
         if chargeVolume is not None and moduleCapacity is not None and chargeVolume > moduleCapacity:
@@ -535,6 +559,10 @@ class Module(HandledItem, HandledCharge, ItemAttrShortcut, ChargeAttrShortcut):
         return False
 
     def getValidCharges(self):
+        indexedCharges = self.__getIndexedCharges(published=True)
+        if indexedCharges is not None:
+            return set(eos.db.getItemsByID(indexedCharges, eager=("icon", "attributes")).itervalues())
+
         validCharges = set()
         for i in range(5):
             itemChargeGroup = self.getModifiedItemAttr('chargeGroup' + str(i))
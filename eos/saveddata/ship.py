@@ -21,7 +21,7 @@ from logbook import Logger
 
 import eos.db
 from eos.effectHandlerHelpers import HandledItem
-from eos.modifiedAttributeDict import ModifiedAttributeDict, ItemAttrShortcut, cappingAttrKeyCache
+from eos.modifiedAttributeDict import newAttributeDict, ItemAttrShortcut, cappingAttrKeyCache
 from eos.saveddata.mode import Mode
 
 pyfalog = Logger(__name__)
@@ -48,7 +48,7 @@ class Ship(ItemAttrShortcut, HandledItem):
 
         self.__item = item
         self.__modeItems = self.__getModeItems()
-        self.__itemModifiedAttributes = ModifiedAttributeDict(parent=self)
+        self.__itemModifiedAttributes = newAttributeDict(parent=self)
         self.__itemModifiedAttributes.original = dict(self.item.attributes)
         self.__itemModifiedAttributes.original.update(self.EXTRA_ATTRIBUTES)
         self.__itemModifiedAttributes.overrides = self.item.overrides
@@ -0,0 +1,286 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+In memory full text search over short texts, like item and fit names.
+
+Texts are split into lower case words, kept in an inverted index. A document
+matches a query when every word of the query matches a word of the document,
+either exactly, as its prefix, or as a prefix with a few typos: one for words
+of 4 to 7 characters, two for longer ones. When nothing matches that way,
+query words match anywhere inside the words of documents, as a LIKE search
+does, so "burner" still finds Afterburner. Matches are ranked by how well the
+words matched, whether they matched the name or the extra text of the
+document, and the length of the name.
+
+Search results are the matches of all documents, so when the next query
+only extends the last one, as it does while typing, it is answered by
+narrowing the last results down instead of going through the index again.
+"""
+
+import bisect
+import re
+import threading
+
+TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Score of a query word matching a word of a document exactly, as its prefix, and with typos, less per typo
+EXACT = 4.0
+PREFIX = 3.0
+FUZZY = 2.0
+TYPO = 0.5
+# Score of a query word found inside a word of a document, only looked for when nothing matched otherwise
+INFIX = 1.0
+# Weight of matches in the extra text, against those in the name
+EXTRA_WEIGHT = 0.5
+# Added when the name starts with the first word of the query
+LEADING = 1.0
+
+
+def tokenize(text):
+    """Lower case words of text, in order"""
+    if isinstance(text, str):
+        text = text.decode("utf-8", "replace")
+    return TOKEN.findall(text.lower())
+
+
+def unique(tokens):
+    seen = set()
+    return tuple(token for token in tokens if not (token in seen or seen.add(token)))
+
+
+def tolerance(term):
+    """Typos allowed for a query word"""
+    if len(term) < 4:
+        return 0
+    if len(term) < 8:
+        return 1
+    return 2
+
+
+def prefixDistance(term, token, limit):
+    """
+    Fewest insertions, deletions, substitutions and swaps of neighbouring
+    characters turning term into a prefix of token. Anything over limit is
+    returned as limit + 1.
+    """
+    length = len(term)
+    before = None
+    previous = range(length + 1)
+    best = length
+    for j in xrange(1, min(len(token), length + limit) + 1):
+        char = token[j - 1]
+        current = [j] + [0] * length
+        for i in xrange(1, length + 1):
+            value = min(previous[i] + 1, current[i - 1] + 1, previous[i - 1] + (term[i - 1] != char))
+            if i > 1 and before is not None and term[i - 1] == token[j - 2] and term[i - 2] == char:
+                value = min(value, before[i - 2] + 1)
+            current[i] = value
+        best = min(best, current[length])
+        if min(current) > limit:
+            break
+        before, previous = previous, current
+
+    return min(best, limit + 1)
+
+
+def quality(term, token, infix=False):
+    """Score of term matching token, 0 when it doesn't. With infix, term may be anywhere in token."""
+    if token == term:
+        return EXACT
+    if token.startswith(term):
+        return PREFIX
+    limit = tolerance(term)
+    # Typos in the first character are rare, leaving them out keeps the words to check few
+    if limit and token[0] == term[0] and len(token) >= len(term) - limit:
+        distance = prefixDistance(term, token, limit)
+        if distance <= limit:
+            return FUZZY - TYPO * distance
+    if infix and term in token:
+        return INFIX
+    return 0
+
+
+class SearchIndex(object):
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        # ID => (name, words of the name, words only in the extra text)
+        self.__docs = {}
+        # word => IDs of the documents having it
+        self.__postings = {}
+        # All words sorted, and by their first character, built again on the next search once words come or go
+        self.__tokens = None
+        self.__initials = None
+        # Words of the last query, ID => score of everything it matched and whether it looked inside words
+        self.__previous = None
+
+    def __len__(self):
+        return len(self.__docs)
+
+    def __contains__(self, docID):
+        return docID in self.__docs
+
+    def add(self, docID, name, extra=u""):
+        """Index name and extra text under docID, replacing what it had before"""
+        nameTokens = unique(tokenize(name or u""))
+        extraTokens = tuple(token for token in unique(tokenize(extra or u"")) if token not in nameTokens)
+        with self.__lock:
+            self.__remove(docID)
+            self.__docs[docID] = (name, nameTokens, extraTokens)
+            for token in nameTokens + extraTokens:
+                postings = self.__postings.get(token)
+                if postings is None:
+                    postings = self.__postings[token] = set()
+                    self.__tokens = self.__initials = None
+                postings.add(docID)
+            self.__previous = None
+
+    def remove(self, docID):
+        with self.__lock:
+            self.__remove(docID)
+
+    def __remove(self, docID):
+        doc = self.__docs.pop(docID, None)
+        if doc is None:
+            return
+        for token in doc[1] + doc[2]:
+            postings = self.__postings[token]
+            postings.discard(docID)
+            if not postings:
+                del self.__postings[token]
+                self.__tokens = self.__initials = None
+        self.__previous = None
+
+    def search(self, query, accept=None, limit=None):
+        """
+        IDs of the documents matching query, best first. Only those accept
+        returns True for are returned, when it's given, and no more than limit.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self.__lock:
+            narrowed = self.__narrow(terms)
+            if narrowed is None:
+                scores, infix = self.__match(terms), False
+            else:
+                scores, infix = narrowed
+            if not scores and not infix:
+                scores, infix = self.__match(terms, True), True
+            self.__previous = terms, scores, infix
+            ranked = sorted(scores, key=lambda docID: (-scores[docID], len(self.__docs[docID][0]),
+                                                       self.__docs[docID][0]))
+
+        if accept is not None:
+            ranked = (docID for docID in ranked if accept(docID))
+        results = []
+        for docID in ranked:
+            if limit is not None and len(results) >= limit:
+                break
+            results.append(docID)
+        return results
+
+    def __narrow(self, terms):
+        """
+        Scores of the matches narrowed down from the last search and whether
+        they are inside words, None when terms don't extend it
+        """
+        if self.__previous is None:
+            return None
+        previousTerms, previousScores, infix = self.__previous
+        if len(terms) < len(previousTerms):
+            return None
+        last = len(previousTerms) - 1
+        for i, previous in enumerate(previousTerms):
+            term = terms[i]
+            if term != previous and (i != last or not term.startswith(previous) or
+                                     tolerance(term) != tolerance(previous)):
+                return None
+
+        return self.__score(terms, previousScores, infix), infix
+
+    def __match(self, terms, infix=False):
+        if self.__tokens is None:
+            self.__tokens = sorted(self.__postings)
+            self.__initials = {}
+            for token in self.__tokens:
+                self.__initials.setdefault(token[0], []).append(token)
+
+        candidates = None
+        for term in terms:
+            if infix:
+                tokens = self.__tokens
+            elif tolerance(term):
+                tokens = self.__initials.get(term[0], ())
+            else:
+                # Words the term is a prefix of are next to each other in the sorted words
+                start = bisect.bisect_left(self.__tokens, term)
+                tokens = self.__tokens[start:bisect.bisect_left(self.__tokens, term + u"\uffff", start)]
+
+            docIDs = set()
+            for token in tokens:
+                if quality(term, token, infix):
+                    docIDs.update(self.__postings[token])
+            candidates = docIDs if candidates is None else candidates & docIDs
+            if not candidates:
+                return {}
+
+        return self.__score(terms, candidates, infix)
+
+    def __score(self, terms, docIDs, infix=False):
+        """Scores of the documents in docIDs matching all terms"""
+        qualities = [{} for _ in terms]
+        scores = {}
+        for docID in docIDs:
+            name, nameTokens, extraTokens = self.__docs[docID]
+            score = 0
+            for term, known in zip(terms, qualities):
+                best = 0
+                for weight, docTokens in ((1, nameTokens), (EXTRA_WEIGHT, extraTokens)):
+                    for token in docTokens:
+                        value = known.get(token)
+                        if value is None:
+                            value = known[token] = quality(term, token, infix)
+                        best = max(best, value * weight)
+                if not best:
+                    break
+                score += best
+            else:
+                if nameTokens and nameTokens[0].startswith(terms[0]):
+                    score += LEADING
+                scores[docID] = score
+        return scores
+
+    def dump(self):
+        """The index as plain data for marshal"""
+        with self.__lock:
+            return {
+                "docs"    : self.__docs.copy(),
+                "postings": dict((token, tuple(docIDs)) for token, docIDs in self.__postings.iteritems()),
+            }
+
+    @classmethod
+    def restore(cls, data):
+        """An index from what dump returned"""
+        index = cls()
+        index.__docs = dict(data["docs"])
+        index.__postings = dict((token, set(docIDs)) for token, docIDs in data["postings"].iteritems())
+        return index
@@ -0,0 +1,188 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Precompiled skill bonuses of a character.
+
+Almost every skill effect only computes a bonus from the skill's attributes and
+level, then hands it to a filtered modification of the fit, like
+fit.modules.filteredItemBoost(filter, attribute, bonus). The bonuses are the
+same for every fit the character is used with, until a skill level changes.
+
+A SkillProfile runs every skill effect once against a recording stand-in for
+the fit, keeping the modifications issued as (target, method, arguments). A fit
+calculation then replays those modifications for every skill, in the original
+order and with the skill registered as the modifier, so "Affected By" and the
+result are the same as running the effects. Skills without any effect for a
+runTime are skipped altogether.
+
+Effects which look at the fit instead of only modifying it (fit.ship.item,
+fit.ship.getModifiedItemAttr(...), ...) can't be recorded, their skill is
+run normally on every calculation.
+"""
+
+from logbook import Logger
+
+from eos import calcJournal
+
+pyfalog = Logger(__name__)
+
+OPERATIONS = ("PreAssign", "Increase", "Multiply", "Boost", "Force")
+
+LIST_METHODS = frozenset("filtered{0}{1}".format(kind, operation)
+                         for kind in ("Item", "Charge") for operation in OPERATIONS)
+ITEM_METHODS = frozenset("{0}{1}{2}Attr".format(operation[0].lower(), operation[1:], kind)
+                         for kind in ("Item", "Charge") for operation in OPERATIONS)
+ATTRIBUTE_METHODS = frozenset(operation[0].lower() + operation[1:] for operation in OPERATIONS)
+SKILL_METHODS = frozenset(("filteredSkillIncrease", "filteredSkillMultiply", "filteredSkillBoost"))
+
+# Parts of the fit skill effects can modify without looking at them
+TARGETS = {
+    "modules": LIST_METHODS,
+    "drones": LIST_METHODS,
+    "fighters": LIST_METHODS,
+    "boosters": LIST_METHODS,
+    "implants": LIST_METHODS,
+    "appliedImplants": LIST_METHODS,
+    "ship": ITEM_METHODS,
+    "extraAttributes": ATTRIBUTE_METHODS,
+    "character": SKILL_METHODS,
+}
+
+
+class DynamicEffect(Exception):
+    """Raised when an effect uses more of the fit than the modifications a profile can record"""
+
+
+class RecordingTarget(object):
+    """Stand-in for a part of the fit, recording the modifications made to it"""
+
+    def __init__(self, ops, name, methods):
+        self.ops = ops
+        self.name = name
+        self.methods = methods
+
+    def __getattr__(self, method):
+        if method not in self.methods:
+            raise DynamicEffect("{0}.{1}".format(self.name, method))
+
+        def record(*args, **kwargs):
+            self.ops.append((self.name, method, args, kwargs))
+
+        return record
+
+
+class RecordingFit(object):
+    """Stand-in for the fit effects are run against while compiling a profile"""
+
+    def __init__(self, ops):
+        for name, methods in TARGETS.iteritems():
+            setattr(self, name, RecordingTarget(ops, name, methods))
+
+    def __getattr__(self, name):
+        raise DynamicEffect("fit.{0}".format(name))
+
+
+class SkillStep(object):
+    """
+    Calculation of a single skill at one runTime. effects holds the recorded
+    modifications of each of its effects, None means running the skill itself.
+    """
+    __slots__ = ("skill", "effects")
+
+    def __init__(self, skill, effects=None):
+        self.skill = skill
+        self.effects = effects
+
+    def run(self, fit, runTime):
+        if self.effects is None:
+            self.skill.calculateModifiedAttributes(fit, runTime)
+            return
+
+        if self.skill.isSuppressed():
+            return
+
+        for ops in self.effects:
+            try:
+                for target, method, args, kwargs in ops:
+                    getattr(getattr(fit, target), method)(*args, **kwargs)
+            except AttributeError:
+                # Same as the effect raising it, the rest of it is skipped
+                continue
+
+
+class SkillProfile(object):
+    """Skill steps of a character, compiled per runTime and kind of fit on first use"""
+
+    def __init__(self, character):
+        self.character = character
+        self.__steps = {}
+
+    def getSteps(self, runTime, structure):
+        key = (runTime, structure)
+        steps = self.__steps.get(key)
+        if steps is None:
+            steps = self.__steps[key] = self.__compile(runTime, structure)
+        return steps
+
+    def __compile(self, runTime, structure):
+        # Compiling reads skill levels, which must not end up in the journal of whichever step is running
+        previous = calcJournal.state.recorder
+        calcJournal.state.recorder = None
+        try:
+            steps = []
+            dynamic = 0
+            for skill in self.character.skills:
+                step = self.__compileSkill(skill, runTime, structure)
+                if step is not None:
+                    steps.append(step)
+                    if step.effects is None:
+                        dynamic += 1
+        finally:
+            calcJournal.state.recorder = previous
+
+        pyfalog.debug("Compiled skill profile of {0} at runTime {1}: {2} of {3} skills, {4} run directly",
+                      self.character, runTime, len(steps), len(self.character.skills), dynamic)
+        return steps
+
+    @staticmethod
+    def __compileSkill(skill, runTime, structure):
+        item = skill.item
+        if item is None:
+            return None
+
+        effects = []
+        for effect in item.effects.itervalues():
+            if effect.runTime == runTime and \
+                    effect.isType("passive") and \
+                    (not structure or effect.isType("structure")) and \
+                    effect.activeByDefault:
+                ops = []
+                try:
+                    effect.handler(RecordingFit(ops), skill, ("skill",))
+                except AttributeError:
+                    # The effect stops at the same point whenever it runs, keep what it did until then
+                    pass
+                except DynamicEffect as e:
+                    pyfalog.debug("Skill {0} uses {1}, running it on every calculation", item.name, e)
+                    return SkillStep(skill)
+                if ops:
+                    effects.append(ops)
+
+        return SkillStep(skill, effects) if effects else None
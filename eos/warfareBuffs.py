@@ -0,0 +1,217 @@
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Warfare buffs of command bursts and titan effect generators.
+
+Burst effects don't modify anything themselves, they hand the fit a warfare
+buff ID and a value. Of every buff ID only the strongest value is applied,
+see addBonus. WARFARE_BUFFS describes what each buff does to the fit, as
+operations boosting attributes of the ship or of the modules matching a
+filter by the buff's value, and applyBuff carries them out.
+
+The buff definitions aren't part of the gamedata database, they are kept here.
+"""
+
+from collections import namedtuple
+
+from logbook import Logger
+
+from eos.effectHandlerHelpers import inGroup, requiresSkill
+
+pyfalog = Logger(__name__)
+
+WarfareBuff = namedtuple("WarfareBuff", ("name", "operations"))
+# Attributes boosted by the buff value, of the ship when filter is None, else of the modules matching it
+BuffOperation = namedtuple("BuffOperation", ("filter", "attributes", "stackingPenalties"))
+
+SHIP = None
+
+DAMAGE_TYPES = ("Em", "Thermal", "Kinetic", "Explosive")
+SCAN_TYPES = ("Gravimetric", "Radar", "Ladar", "Magnetometric")
+
+
+def resonances(damageType):
+    """Armor, shield and hull resonances of a damage type"""
+    return ("armor%sDamageResonance" % damageType, "shield%sDamageResonance" % damageType,
+            "%sDamageResonance" % (damageType[0].lower() + damageType[1:]))
+
+
+SHIELD_REPAIRERS = requiresSkill("Shield Operation", "Shield Emission Systems")
+ARMOR_REPAIRERS = requiresSkill("Remote Armor Repair Systems", "Repair Systems")
+EWAR = inGroup("ECM", "Sensor Dampener", "Weapon Disruptor", "Target Painter")
+MINING = requiresSkill("Mining", "Ice Harvesting", "Gas Cloud Harvesting")
+
+WARFARE_BUFFS = {
+    10: WarfareBuff("Shield Burst: Shield Harmonizing: Shield Resistance", (
+        BuffOperation(SHIP, tuple("shield%sDamageResonance" % damageType for damageType in DAMAGE_TYPES), False),
+    )),
+    11: WarfareBuff("Shield Burst: Active Shielding: Repair Duration/Capacitor", (
+        BuffOperation(SHIELD_REPAIRERS, ("capacitorNeed", "duration"), False),
+    )),
+    12: WarfareBuff("Shield Burst: Shield Extension: Shield HP", (
+        BuffOperation(SHIP, ("shieldCapacity",), True),
+    )),
+    13: WarfareBuff("Armor Burst: Armor Energizing: Armor Resistance", (
+        BuffOperation(SHIP, tuple("armor%sDamageResonance" % damageType for damageType in DAMAGE_TYPES), False),
+    )),
+    14: WarfareBuff("Armor Burst: Rapid Repair: Repair Duration/Capacitor", (
+        BuffOperation(ARMOR_REPAIRERS, ("capacitorNeed", "duration"), False),
+    )),
+    15: WarfareBuff("Armor Burst: Armor Reinforcement: Armor HP", (
+        BuffOperation(SHIP, ("armorHP",), True),
+    )),
+    16: WarfareBuff("Information Burst: Sensor Optimization: Scan Resolution", (
+        BuffOperation(SHIP, ("scanResolution",), True),
+    )),
+    17: WarfareBuff("Information Burst: Electronic Superiority: EWAR Range and Strength", (
+        BuffOperation(EWAR, ("maxRange", "falloffEffectiveness"), True),
+        BuffOperation(inGroup("ECM"), tuple("scan%sStrengthBonus" % scanType for scanType in SCAN_TYPES), True),
+        BuffOperation(inGroup("Weapon Disruptor"), (
+            "missileVelocityBonus", "explosionDelayBonus", "aoeVelocityBonus", "falloffBonus",
+            "maxRangeBonus", "aoeCloudSizeBonus", "trackingSpeedBonus"), False),
+        BuffOperation(inGroup("Sensor Dampener"), ("maxTargetRangeBonus", "scanResolutionBonus"), False),
+        BuffOperation(inGroup("Target Painter"), ("signatureRadiusBonus",), True),
+    )),
+    18: WarfareBuff("Information Burst: Electronic Hardening: Scan Strength", (
+        BuffOperation(SHIP, tuple("scan%sStrength" % scanType for scanType in SCAN_TYPES), True),
+    )),
+    19: WarfareBuff("Information Burst: Electronic Hardening: RSD/RWD Resistance", (
+        BuffOperation(SHIP, ("sensorDampenerResistance", "weaponDisruptionResistance"), False),
+    )),
+    20: WarfareBuff("Skirmish Burst: Evasive Maneuvers: Signature Radius", (
+        BuffOperation(SHIP, ("signatureRadius",), True),
+    )),
+    21: WarfareBuff("Skirmish Burst: Interdiction Maneuvers: Tackle Range", (
+        BuffOperation(inGroup("Stasis Web", "Warp Scrambler"), ("maxRange",), True),
+    )),
+    22: WarfareBuff("Skirmish Burst: Rapid Deployment: AB/MWD Speed Increase", (
+        BuffOperation(requiresSkill("Afterburner", "High Speed Maneuvering"), ("speedFactor",), True),
+    )),
+    23: WarfareBuff("Mining Burst: Mining Laser Field Enhancement: Mining/Survey Range", (
+        BuffOperation(MINING, ("maxRange",), True),
+        BuffOperation(requiresSkill("CPU Management"), ("surveyScanRange",), True),
+    )),
+    24: WarfareBuff("Mining Burst: Mining Laser Optimization: Mining Capacitor/Duration", (
+        BuffOperation(MINING, ("capacitorNeed", "duration"), True),
+    )),
+    25: WarfareBuff("Mining Burst: Mining Equipment Preservation: Crystal Volatility", (
+        BuffOperation(requiresSkill("Mining"), ("crystalVolatilityChance",), True),
+    )),
+    26: WarfareBuff("Information Burst: Sensor Optimization: Targeting Range", (
+        BuffOperation(SHIP, ("maxTargetRange",), False),
+    )),
+    60: WarfareBuff("Skirmish Burst: Evasive Maneuvers: Agility", (
+        BuffOperation(SHIP, ("agility",), True),
+    )),
+
+    # Titan effect generators
+    39: WarfareBuff("Avatar Effect Generator: Capacitor Recharge bonus", (
+        BuffOperation(SHIP, ("rechargeRate",), True),
+    )),
+    40: WarfareBuff("Avatar Effect Generator: Kinetic resistance bonus", (
+        BuffOperation(SHIP, resonances("Kinetic"), True),
+    )),
+    41: WarfareBuff("Avatar Effect Generator: EM resistance penalty", (
+        BuffOperation(SHIP, resonances("Em"), True),
+    )),
+    42: WarfareBuff("Erebus Effect Generator: Armor HP bonus", (
+        BuffOperation(SHIP, ("armorHP",), True),
+    )),
+    43: WarfareBuff("Erebus Effect Generator: Explosive resistance bonus", (
+        BuffOperation(SHIP, resonances("Explosive"), True),
+    )),
+    44: WarfareBuff("Erebus Effect Generator: Thermal resistance penalty", (
+        BuffOperation(SHIP, resonances("Thermal"), True),
+    )),
+    45: WarfareBuff("Ragnarok Effect Generator: Signature Radius bonus", (
+        BuffOperation(SHIP, ("signatureRadius",), True),
+    )),
+    46: WarfareBuff("Ragnarok Effect Generator: Thermal resistance bonus", (
+        BuffOperation(SHIP, resonances("Thermal"), True),
+    )),
+    47: WarfareBuff("Ragnarok Effect Generator: Explosive resistance penalty", (
+        BuffOperation(SHIP, resonances("Explosive"), True),
+    )),
+    48: WarfareBuff("Leviathan Effect Generator: Shield HP bonus", (
+        BuffOperation(SHIP, ("shieldCapacity",), True),
+    )),
+    49: WarfareBuff("Leviathan Effect Generator: EM resistance bonus", (
+        BuffOperation(SHIP, resonances("Em"), True),
+    )),
+    50: WarfareBuff("Leviathan Effect Generator: Kinetic resistance penalty", (
+        BuffOperation(SHIP, resonances("Kinetic"), True),
+    )),
+    51: WarfareBuff("Avatar Effect Generator: Velocity penalty", (
+        BuffOperation(SHIP, ("maxVelocity",), True),
+    )),
+    52: WarfareBuff("Erebus Effect Generator: Shield RR penalty", (
+        BuffOperation(requiresSkill("Shield Emission Systems"), ("shieldBonus",), True),
+    )),
+    53: WarfareBuff("Leviathan Effect Generator: Armor RR penalty", (
+        BuffOperation(requiresSkill("Remote Armor Repair Systems"), ("armorDamageAmount",), True),
+    )),
+    54: WarfareBuff("Ragnarok Effect Generator: Laser and Hybrid Optimal penalty", (
+        BuffOperation(inGroup("Energy Weapon", "Hybrid Weapon"), ("maxRange",), True),
+    )),
+}
+
+
+def addBonus(bonuses, warfareBuffID, value, module, effect, runTime="normal"):
+    """Keep value in bonuses if it's the strongest for warfareBuffID so far"""
+    # @todo should we pass in min/max to this function, or is abs okay?
+    # (abs is old method, ccp now provides the aggregate function in their data)
+    if warfareBuffID not in bonuses or abs(bonuses[warfareBuffID][1]) < abs(value):
+        bonuses[warfareBuffID] = (runTime, value, module, effect)
+
+
+def applyBuff(fit, warfareBuffID, value):
+    """Apply warfare buff warfareBuffID of value to fit, with the module it's from registered"""
+    buff = WARFARE_BUFFS.get(warfareBuffID)
+    if buff is None:
+        pyfalog.debug("Unknown warfare buff {0}, skipping it", warfareBuffID)
+        return
+
+    for operation in buff.operations:
+        if operation.filter is SHIP:
+            for attribute in operation.attributes:
+                fit.ship.boostItemAttr(attribute, value, stackingPenalties=operation.stackingPenalties)
+            continue
+
+        # One lookup for all attributes of the operation
+        for module in fit.modules.matching(operation.filter):
+            for attribute in operation.attributes:
+                try:
+                    module.boostItemAttr(attribute, value, stackingPenalties=operation.stackingPenalties)
+                except AttributeError:
+                    pass
+
+
+class BuffResolution(object):
+    """
+    Strongest bonus per warfare buff ID of a number of boosting fits. Stands
+    in for the boosted fit while the boosters' bursts are collected, so the
+    result can be handed to every fit boosted by the same fits.
+    """
+
+    def __init__(self):
+        self.bonuses = {}
+
+    def addCommandBonus(self, warfareBuffID, value, module, effect, runTime="normal"):
+        addBonus(self.bonuses, warfareBuffID, value, module, effect, runTime)
@@ -36,6 +36,14 @@ class PFFittingEnginePref(PreferenceView):
                                                wx.DefaultPosition, wx.DefaultSize, 0)
         mainSizer.Add(self.cbGlobalForceReload, 0, wx.ALL | wx.EXPAND, 5)
 
+        self.cbIncrementalCalculation = wx.CheckBox(panel, wx.ID_ANY, u"Only recalculate the parts of a fit affected by a change (incremental calculation).",
+                                                    wx.DefaultPosition, wx.DefaultSize, 0)
+        mainSizer.Add(self.cbIncrementalCalculation, 0, wx.ALL | wx.EXPAND, 5)
+
+        self.cbBackgroundRecalc = wx.CheckBox(panel, wx.ID_ANY, u"Recalculate fits in the background while changing them.",
+                                              wx.DefaultPosition, wx.DefaultSize, 0)
+        mainSizer.Add(self.cbBackgroundRecalc, 0, wx.ALL | wx.EXPAND, 5)
+
         # Future code once new cap sim is implemented
         '''
         self.cbGlobalForceReactivationTimer = wx.CheckBox( panel, wx.ID_ANY, u"Factor in reactivation timer", wx.DefaultPosition, wx.DefaultSize, 0 )
@@ -64,7 +72,13 @@ class PFFittingEnginePref(PreferenceView):
 
         self.cbGlobalForceReload.SetValue(self.sFit.serviceFittingOptions["useGlobalForceReload"])
 
+        self.cbIncrementalCalculation.SetValue(self.sFit.serviceFittingOptions["incrementalCalculation"])
+
+        self.cbBackgroundRecalc.SetValue(self.sFit.serviceFittingOptions["backgroundRecalc"])
+
         self.cbGlobalForceReload.Bind(wx.EVT_CHECKBOX, self.OnCBGlobalForceReloadStateChange)
+        self.cbIncrementalCalculation.Bind(wx.EVT_CHECKBOX, self.OnCBIncrementalCalculationStateChange)
+        self.cbBackgroundRecalc.Bind(wx.EVT_CHECKBOX, self.OnCBBackgroundRecalcStateChange)
 
         panel.SetSizer(mainSizer)
         panel.Layout()
@@ -72,6 +86,12 @@ class PFFittingEnginePref(PreferenceView):
     def OnCBGlobalForceReloadStateChange(self, event):
         self.sFit.serviceFittingOptions["useGlobalForceReload"] = self.cbGlobalForceReload.GetValue()
 
+    def OnCBIncrementalCalculationStateChange(self, event):
+        self.sFit.serviceFittingOptions["incrementalCalculation"] = self.cbIncrementalCalculation.GetValue()
+
+    def OnCBBackgroundRecalcStateChange(self, event):
+        self.sFit.serviceFittingOptions["backgroundRecalc"] = self.cbBackgroundRecalc.GetValue()
+
     def getImage(self):
         return BitmapLoader.getBitmap("settings_fitting", "gui")
 
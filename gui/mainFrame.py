@@ -71,7 +71,7 @@ from service.update import Update
 # import this to access override setting
 from eos.modifiedAttributeDict import ModifiedAttributeDict
 from eos.db.saveddata.loadDefaultDatabaseValues import DefaultDatabaseValues
-from eos.db.saveddata.queries import getFit as db_getFit
+from eos.db.saveddata.queries import getFit as db_getFit, sync as db_sync, writeBehind as db_writeBehind
 from service.port import Port
 from service.settings import HTMLExportSettings
 
@@ -151,6 +151,9 @@ class MainFrame(wx.Frame):
 
         MainFrame.__instance = self
 
+        # Commits of saved data put off by write-behind are made on this thread, between the changes it makes
+        db_writeBehind.schedule = lambda delay, function: wx.CallAfter(wx.CallLater, int(delay * 1000), function)
+
         # Load stored settings (width/height/maximized..)
         self.LoadMainFrameAttribs()
 
@@ -228,6 +231,9 @@ class MainFrame(wx.Frame):
         # Show ourselves
         self.Show()
 
+        # Fits recalculated in the background are shown again once they're done
+        Fit.getInstance().recalcCallback = lambda fitID: wx.PostEvent(self, GE.FitChanged(fitID=fitID))
+
         self.LoadPreviousOpenFits()
 
         # Check for updates
@@ -346,6 +352,8 @@ class MainFrame(wx.Frame):
 
         # save all teh settingz
         SettingsProvider.getInstance().saveAll()
+        # commit changes still waiting to be written
+        db_sync()
         event.Skip()
 
     def ExitApp(self, event):
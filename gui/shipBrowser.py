@@ -18,6 +18,7 @@ import gui.utils.colorUtils as colorUtils
 import gui.utils.drawUtils as drawUtils
 import gui.utils.animUtils as animUtils
 import gui.utils.animEffects as animEffects
+from gui.utils.numberFormatter import formatAmount
 from gui.PFListPane import PFListPane
 from gui.contextMenu import ContextMenu
 from gui.bitmapLoader import BitmapLoader
@@ -861,13 +862,16 @@ class ShipBrowser(wx.Panel):
         self._stage3Data = shipID
 
         shipTrait = ship.traits.traitText if (ship.traits is not None) else ""  # empty string if no traits
+        fitStats = sFit.getFitStats(shipID)
 
         for ID, name, booster, timestamp in fitList:
-            self.lpane.AddWidget(FitItem(self.lpane, ID, (shipName, shipTrait, name, booster, timestamp), shipID))
+            self.lpane.AddWidget(FitItem(self.lpane, ID, (shipName, shipTrait, name, booster, timestamp), shipID,
+                                         fitStats=fitStats.get(ID)))
 
         self.lpane.RefreshList()
         self.lpane.Thaw()
         self.raceselect.RebuildRaces(self.RACE_ORDER)
+        sFit.fillFitStats([ID for ID, _, _, _ in fitList if ID not in fitStats], self.fitStatsFilled)
 
     def searchStage(self, event):
 
@@ -903,14 +907,17 @@ class ShipBrowser(wx.Panel):
                     ShipItem(self.lpane, ship.ID, (ship.name, shipTrait, len(sFit.getFitsWithShip(ship.ID))),
                              ship.race))
 
+            fitStats = sFit.getFitStats() if fitList else {}
             for ID, name, shipID, shipName, booster, timestamp in fitList:
                 ship = sMkt.getItem(shipID)
                 shipTrait = ship.traits.traitText if (ship.traits is not None) else ""  # empty string if no traits
 
-                self.lpane.AddWidget(FitItem(self.lpane, ID, (shipName, shipTrait, name, booster, timestamp), shipID))
+                self.lpane.AddWidget(FitItem(self.lpane, ID, (shipName, shipTrait, name, booster, timestamp), shipID,
+                                             fitStats=fitStats.get(ID)))
             if len(ships) == 0 and len(fitList) == 0:
                 self.lpane.AddWidget(PFStaticText(self.lpane, label=u"No matching results."))
             self.lpane.RefreshList(doFocus=False)
+            sFit.fillFitStats([fit[0] for fit in fitList if fit[0] not in fitStats], self.fitStatsFilled)
         self.lpane.Thaw()
 
         self.raceselect.RebuildRaces(self.RACE_ORDER)
@@ -919,6 +926,12 @@ class ShipBrowser(wx.Panel):
             self.raceselect.Show(False)
             self.Layout()
 
+    def fitStatsFilled(self, fitStats):
+        """Show the stats calculated in the background on the fits still listed"""
+        for widget in self.lpane.GetWidgetList():
+            if widget.GetType() == 3 and widget.fitID in fitStats:
+                widget.SetFitStats(fitStats[widget.fitID])
+
     def importStage(self, event):
         self.lpane.ShowLoading(False)
 
@@ -1438,7 +1451,7 @@ class FitItem(SFItem.SFBrowserItem):
     def __init__(self, parent, fitID=None, shipFittingInfo=("Test", "TestTrait", "cnc's avatar", 0, 0), shipID=None,
                  itemData=None,
                  id=wx.ID_ANY, pos=wx.DefaultPosition,
-                 size=(0, 40), style=0):
+                 size=(0, 40), style=0, fitStats=None):
 
         # =====================================================================
         # animCount should be 10 if we enable animation in Preferences
@@ -1492,8 +1505,8 @@ class FitItem(SFItem.SFBrowserItem):
         self.dragTLFBmp = None
 
         self.bkBitmap = None
-        if self.shipTrait != "":  # show no tooltip if no trait available
-            self.SetToolTip(wx.ToolTip(u'{}\n{}\n{}'.format(self.shipName, u'─' * 20, self.shipTrait)))
+        self.fitStats = fitStats
+        self.UpdateToolTip()
         self.padding = 4
         self.editWidth = 150
 
@@ -1639,6 +1652,29 @@ class FitItem(SFItem.SFBrowserItem):
     def GetType(self):
         return 3
 
+    def SetFitStats(self, fitStats):
+        self.fitStats = fitStats
+        self.UpdateToolTip()
+
+    def UpdateToolTip(self):
+        lines = []
+        if self.fitStats is not None:
+            stats = self.fitStats
+            lines.append(u"DPS: {}  Volley: {}".format(formatAmount(stats.dps, 3, 0, 9),
+                                                        formatAmount(stats.volley, 3, 0, 9)))
+            lines.append(u"EHP: {}  Speed: {} m/s  Align: {}s".format(
+                formatAmount(stats.ehp, 3, 0, 9), formatAmount(stats.maxSpeed, 3, 0, 9),
+                formatAmount(stats.alignTime, 3, 0, 3)))
+            if stats.price is not None:
+                lines.append(u"Price: {} ISK".format(formatAmount(stats.price, 3, 3, 9)))
+
+        if self.shipTrait != "":
+            lines.extend((u'─' * 20, self.shipTrait))
+
+        # show no tooltip if there is nothing to show
+        if lines:
+            self.SetToolTip(wx.ToolTip(u'\n'.join([self.shipName] + lines)))
+
     def OnTimer(self, event):
 
         if self.selTimerID == event.GetId():
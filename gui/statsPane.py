@@ -70,9 +70,13 @@ class StatsPane(wx.Panel):
 
     def fitChanged(self, event):
         sFit = Fit.getInstance()
-        fit = sFit.getFit(event.fitID)
+        # A background recalculation is still running, it sends another FitChanged when done
+        stale = sFit.isRecalcPending(event.fitID)
+        fit = None if stale else sFit.getFit(event.fitID)
         for view in self.views:
-            view.refreshPanel(fit)
+            view.setStale(stale)
+            if not stale:
+                view.refreshPanel(fit)
         event.Skip()
 
     def __init__(self, parent):
@@ -41,6 +41,10 @@ class StatsView(object):
     def refreshPanel(self, fit):
         raise NotImplementedError()
 
+    def setStale(self, stale):
+        """Grey out the shown numbers while the fit is being recalculated"""
+        self.panel.Enable(not stale)
+
 
 # noinspection PyUnresolvedReferences
 from gui.builtinStatsViews import (  # noqa: E402, F401
@@ -7,7 +7,7 @@ from service.fit import Fit
 from service.port import Port
 from service.market import Market
 from logbook import Logger
-from eos.db import getFit
+import eos.db
 
 pyfalog = Logger(__name__)
 
@@ -57,10 +57,20 @@ class exportHtmlThread(threading.Thread):
         minimal = settings.getMinimalEnabled()
         dnaUrl = "https://o.smium.org/loadout/dna/"
 
-        if minimal:
-            HTML = self.generateMinimalHTML(sMkt, sFit, dnaUrl)
-        else:
-            HTML = self.generateFullHTML(sMkt, sFit, dnaUrl)
+        # Fits are read through a session of this thread, leaving those of the GUI alone
+        session = eos.db.newSaveddataSession()
+        try:
+            fitsByShip = {}
+            for fit in sFit.iterAllFits(session=session):
+                fitsByShip.setdefault(fit.shipID, []).append(fit)
+
+            if minimal:
+                HTML = self.generateMinimalHTML(sMkt, fitsByShip, dnaUrl)
+            else:
+                HTML = self.generateFullHTML(sMkt, fitsByShip, dnaUrl)
+        finally:
+            session.close()
+            eos.db.removeGamedataSession()
 
         try:
             FILE = open(settings.getPath(), "w")
@@ -73,7 +83,7 @@ class exportHtmlThread(threading.Thread):
         if self.callback:
             wx.CallAfter(self.callback, -1)
 
-    def generateFullHTML(self, sMkt, sFit, dnaUrl):
+    def generateFullHTML(self, sMkt, fitsByShip, dnaUrl):
         """ Generate the complete HTML with styling and javascript """
         timestamp = time.localtime(time.time())
         localDate = "%d/%02d/%02d %02d:%02d" % (timestamp[0], timestamp[1], timestamp[2], timestamp[3], timestamp[4])
@@ -188,7 +198,7 @@ class exportHtmlThread(threading.Thread):
             # Keep track of how many ships per group
             groupFits = 0
             for ship in ships:
-                fits = sFit.getFitsWithShip(ship.ID)
+                fits = fitsByShip.get(ship.ID, [])
 
                 if len(fits) > 0:
                     groupFits += len(fits)
@@ -198,9 +208,9 @@ class exportHtmlThread(threading.Thread):
                             return
                         fit = fits[0]
                         try:
-                            dnaFit = Port.exportDna(getFit(fit[0]))
+                            dnaFit = Port.exportDna(fit)
                             HTMLgroup += '        <li><a data-dna="' + dnaFit + '" target="_blank">' + ship.name + ": " + \
-                                         fit[1] + '</a></li>\n'
+                                         fit.name + '</a></li>\n'
                         except:
                             pyfalog.warning("Failed to export line")
                             pass
@@ -221,10 +231,9 @@ class exportHtmlThread(threading.Thread):
                             if self.stopRunning:
                                 return
                             try:
-                                dnaFit = Port.exportDna(getFit(fit[0]))
+                                dnaFit = Port.exportDna(fit)
                                 print dnaFit
-                                HTMLship += '          <li><a data-dna="' + dnaFit + '" target="_blank">' + fit[
-                                    1] + '</a></li>\n'
+                                HTMLship += '          <li><a data-dna="' + dnaFit + '" target="_blank">' + fit.name + '</a></li>\n'
                             except:
                                 pyfalog.warning("Failed to export line")
                                 continue
@@ -254,7 +263,7 @@ class exportHtmlThread(threading.Thread):
 
         return HTML
 
-    def generateMinimalHTML(self, sMkt, sFit, dnaUrl):
+    def generateMinimalHTML(self, sMkt, fitsByShip, dnaUrl):
         """ Generate a minimal HTML version of the fittings, without any javascript or styling"""
         categoryList = list(sMkt.getShipRoot())
         categoryList.sort(key=lambda _ship: _ship.name)
@@ -270,14 +279,14 @@ class exportHtmlThread(threading.Thread):
             ships.sort(key=lambda _ship: _ship.name)
 
             for ship in ships:
-                fits = sFit.getFitsWithShip(ship.ID)
+                fits = fitsByShip.get(ship.ID, [])
                 for fit in fits:
                     if self.stopRunning:
                         return
                     try:
-                        dnaFit = Port.exportDna(getFit(fit[0]))
+                        dnaFit = Port.exportDna(fit)
                         HTML += '<a class="outOfGameBrowserLink" target="_blank" href="' + dnaUrl + dnaFit + '">' + ship.name + ': ' + \
-                                fit[1] + '</a><br> \n'
+                                fit.name + '</a><br> \n'
                     except:
                         pyfalog.error("Failed to export line")
                         continue
@@ -22,6 +22,7 @@ import sys
 import os
 import os.path
 import re
+import time
 import config
 
 from optparse import OptionParser, BadOptionError, AmbiguousOptionError
@@ -287,8 +288,12 @@ if __name__ == "__main__":
         if hasattr(sys, 'frozen') and options.debug:
             pyfalog.critical("Running in frozen mode with debug turned on. Forcing all output to be written to log.")
 
+        startTime = time.time()
         from gui.mainFrame import MainFrame
 
         pyfa = wx.App(False)
         MainFrame(options.title)
+        pyfalog.info("Main window ready in {0:.2f}s", time.time() - startTime)
+        from eos import effectRegistry
+        effectRegistry.logStats()
         pyfa.MainLoop()
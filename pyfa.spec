@@ -26,6 +26,10 @@ added_files = [
              ( 'LICENSE', '.' ),
              ]
 
+# Effects compiled by scripts/buildEffectBundle.py, imported one by one without it
+if os.path.isfile('eos/effects.bundle'):
+    added_files.append(('eos/effects.bundle', 'eos'))
+
 import_these = []
 
 # Walk eos.effects and add all effects so we can import them properly
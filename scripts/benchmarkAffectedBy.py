@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Time and memory "Affected By" recording costs per fit calculation.
+
+Every fit is calculated with recordAffectedBy on and off. Shown are the best
+calculation time, the memory taken by the recorded afflictions (or the names
+of attributes left out, when off) and the time it takes to trace a single
+module on demand afterwards.
+"""
+
+import argparse
+import os.path
+import sys
+import timeit
+from itertools import chain
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import eos.config
+
+eos.config.saveddata_connectionstring = "sqlite:///:memory:"
+
+import eos.db  # noqa: E402
+from eos.saveddata.character import Character  # noqa: E402
+from eos.saveddata.fit import Fit  # noqa: E402
+from eos.saveddata.module import Module, State  # noqa: E402
+from eos.saveddata.ship import Ship  # noqa: E402
+
+FITS = (
+    ("Rifter", ("200mm AutoCannon II", "200mm AutoCannon II", "200mm AutoCannon II", "1MN Afterburner II",
+                "Stasis Webifier II", "Small Armor Repairer II", "Gyrostabilizer II", "Damage Control II")),
+    ("Drake", ("Heavy Missile Launcher II",) * 6 + ("Large Shield Extender II", "Large Shield Extender II",
+                                                     "Adaptive Invulnerability Field II", "10MN Afterburner II",
+                                                     "Ballistic Control System II", "Ballistic Control System II",
+                                                     "Damage Control II")),
+    ("Megathron", ("Neutron Blaster Cannon II",) * 7 + ("Magnetic Field Stabilizer II",
+                                                         "Magnetic Field Stabilizer II",
+                                                         "Energized Adaptive Nano Membrane II",
+                                                         "Damage Control II", "Large Armor Repairer II",
+                                                         "Stasis Webifier II", "Warp Scrambler II")),
+)
+
+
+def buildFit(shipName, moduleNames):
+    fit = Fit(Ship(eos.db.getItem(shipName)))
+    fit.character = Character.getAll5()
+    for name in moduleNames:
+        mod = Module(eos.db.getItem(name))
+        if mod.fits(fit):
+            fit.modules.append(mod)
+            if mod.isValidState(State.ACTIVE):
+                mod.state = State.ACTIVE
+    return fit
+
+
+def calculate(fit):
+    fit.clear()
+    fit.calculateModifiedAttributes()
+
+
+def attributeDicts(fit):
+    for holder in chain((fit.ship,), fit.modules, fit.drones, fit.implants, fit.boosters):
+        yield holder.itemModifiedAttributes
+        if getattr(holder, "charge", None) is not None:
+            yield holder.chargeModifiedAttributes
+
+
+def sizeOf(obj):
+    """Size of containers and their tuples, not counting the modifiers and fits referred to"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeOf(value) for value in obj.itervalues())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(sizeOf(value) for value in obj if isinstance(value, (list, tuple, dict)))
+    return size
+
+
+def provenanceSize(fit):
+    size = 0
+    for attrs in attributeDicts(fit):
+        for name in ("_ModifiedAttributeDict__affectedBy", "_ModifiedAttributeDict__untraced"):
+            value = getattr(attrs, name, None)
+            if value is not None:
+                size += sizeOf(value)
+    return size
+
+
+def main(runs):
+    print "{0:<12} {1:>14} {2:>14} {3:>12} {4:>12} {5:>12}".format(
+        "Fit", "recorded (ms)", "lazy (ms)", "recorded KiB", "lazy KiB", "trace (ms)")
+    for shipName, moduleNames in FITS:
+        fit = buildFit(shipName, moduleNames)
+        results = {}
+        for record in (True, False):
+            fit.recordAffectedBy = record
+            calculate(fit)
+            results[record] = (min(timeit.repeat(lambda: calculate(fit), repeat=runs, number=1)),
+                               provenanceSize(fit))
+
+        mod = next(mod for mod in fit.modules if not mod.isEmpty)
+
+        def trace():
+            calculate(fit)
+            list(mod.itemModifiedAttributes.iterAfflictions())
+
+        traceTime = min(timeit.repeat(trace, repeat=runs, number=1)) - results[False][0]
+
+        print "{0:<12} {1:>14.2f} {2:>14.2f} {3:>12.1f} {4:>12.1f} {5:>12.2f}".format(
+            shipName, results[True][0] * 1000, results[False][0] * 1000, results[True][1] / 1024.0,
+            results[False][1] / 1024.0, traceTime * 1000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-r", "--runs", type=int, default=10, help="number of timed runs, the best one is shown")
+    args = parser.parse_args()
+    main(args.runs)
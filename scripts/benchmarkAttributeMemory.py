@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Memory used by calculated fits with each modified attribute store.
+
+Builds and calculates the given number of fits, cycling through a few fit
+templates, and keeps all of them in memory. Each store is measured in a fresh
+process, as the growth of its peak resident memory.
+"""
+
+import argparse
+import os.path
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+FITS = (
+    ("Rifter", ("200mm AutoCannon II", "200mm AutoCannon II", "200mm AutoCannon II", "1MN Afterburner II",
+                "Stasis Webifier II", "Small Armor Repairer II", "Gyrostabilizer II", "Damage Control II")),
+    ("Abaddon", ("Mega Pulse Laser II",) * 8 + ("Large Armor Repairer II", "Energized Adaptive Nano Membrane II",
+                                                 "Energized Adaptive Nano Membrane II", "Damage Control II",
+                                                 "Heat Sink II", "Heat Sink II", "Heat Sink II",
+                                                 "100MN Afterburner II", "Tracking Computer II",
+                                                 "Tracking Computer II", "Cap Recharger II")),
+    ("Raven", ("Cruise Missile Launcher II",) * 6 + ("Adaptive Invulnerability Field II",
+                                                      "Adaptive Invulnerability Field II",
+                                                      "Large Shield Extender II", "Large Shield Extender II",
+                                                      "Ballistic Control System II", "Ballistic Control System II",
+                                                      "Damage Control II")),
+    ("Vexor", ("Drone Link Augmentor II", "Drone Link Augmentor II", "10MN Afterburner II", "Medium Shield Extender II",
+               "Drone Damage Amplifier II", "Drone Damage Amplifier II", "Damage Control II")),
+)
+
+
+def maxRss():
+    # Kilobytes on linux, bytes on OS X
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def measure(count, compact):
+    import eos.config
+    eos.config.saveddata_connectionstring = "sqlite:///:memory:"
+    eos.config.compactAttributes = compact
+    eos.config.debug = False
+
+    import eos.db
+    from eos.saveddata.character import Character
+    from eos.saveddata.fit import Fit
+    from eos.saveddata.module import Module, State
+    from eos.saveddata.ship import Ship
+
+    character = Character.getAll5()
+    templates = [(eos.db.getItem(shipName), [eos.db.getItem(name) for name in moduleNames])
+                 for shipName, moduleNames in FITS]
+
+    def buildFit(ship, modules):
+        fit = Fit(Ship(ship))
+        fit.character = character
+        for item in modules:
+            mod = Module(item)
+            if mod.fits(fit):
+                fit.modules.append(mod)
+                if mod.isValidState(State.ACTIVE):
+                    mod.state = State.ACTIVE
+        fit.calculateModifiedAttributes()
+        return fit
+
+    # Warm up caches, so they don't count towards the fits
+    for ship, modules in templates:
+        buildFit(ship, modules)
+
+    before = maxRss()
+    start = time.time()
+    fits = [buildFit(*templates[i % len(templates)]) for i in xrange(count)]
+    elapsed = time.time() - start
+    grown = maxRss() - before
+
+    print "{0} {1} {2}".format(len(fits), grown, elapsed)
+
+
+def main(count):
+    results = {}
+    for label in ("dict", "compact"):
+        output = subprocess.check_output([sys.executable, __file__, "-n", str(count), "--measure", label])
+        fits, grown, elapsed = output.strip().splitlines()[-1].split()
+        results[label] = int(grown)
+        print "{0:<8} {1} fits: {2:.1f} MiB, {3:.1f} KiB per fit, calculated in {4:.2f}s".format(
+            label, fits, int(grown) / 1024.0 / 1024, int(grown) / 1024.0 / int(fits), float(elapsed))
+
+    if results["compact"]:
+        print "Compact store uses {0:.2f}x less memory".format(float(results["dict"]) / results["compact"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--fits", type=int, default=1000, help="number of fits to keep in memory")
+    parser.add_argument("--measure", choices=("dict", "compact"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.fits, args.measure == "compact")
+    else:
+        main(args.fits)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Compare capacitor simulation with and without reload period detection.
+
+Runs a catalogue of cap heavy setups (neutralizers, cap boosters, ancillary
+repairers, incoming neuts) through CapSimulator the way Fit.simulateCap does,
+once the old way (no steady state detection when reloads are involved) and
+once the new way, and checks that the reported capacitor state agrees within
+the simulator's stability_precision.
+"""
+
+import argparse
+import os.path
+import sys
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from eos.capSim import CapSimulator  # noqa: E402
+
+# name, capacitor capacity, recharge rate, [(duration, capNeed, clipSize, disableStagger)]
+CATALOGUE = (
+    ("Heavy neuts and cap boosters", 6250, 1012500, [
+        (12000, 300, 0, False)] * 2 + [(12000, -800, 8, False)] * 2),
+    ("Heavy neuts, single cap booster", 6250, 1012500, [
+        (12000, 300, 0, False)] * 3 + [(12000, -800, 8, False)]),
+    ("Ancillary armor repairer", 1875, 393750, [
+        (6000, 40, 8, False), (10000, 45, 0, False), (5000, 5, 0, False)]),
+    ("Dual ancillary shield boosters", 2340, 374400, [
+        (3000, 28, 9, False), (3000, 28, 9, False), (10000, 45, 0, False)]),
+    ("Blaster battleship with cap booster", 5500, 1006000, [
+        (3750, 4.6, 40, True)] * 8 + [(10000, 165, 0, False), (12000, -400, 8, False)]),
+    ("Medium neuts and cap booster", 1350, 287500, [
+        (12000, 45, 0, False)] * 3 + [(10000, 45, 0, False), (12000, -150, 12, False)]),
+    ("Incoming heavy neut pressure", 5500, 1006000, [
+        (10000, 165, 0, False), (12000, -400, 8, False), (24000, 300, 0, False)]),
+    ("Ancillary repairer, no boosters", 900, 187500, [
+        (4500, 24, 8, False), (5000, 2, 0, False), (4000, 2.4, 0, False)]),
+)
+
+
+def simulate(capacity, recharge, drains, reloadPeriods, timeBudget=None):
+    sim = CapSimulator()
+    sim.init(drains)
+    sim.capacitorCapacity = capacity
+    sim.capacitorRecharge = recharge
+    sim.stagger = True
+    sim.scale = False
+    sim.t_max = 6 * 60 * 60 * 1000
+    sim.reload = True
+    sim.reload_periods = reloadPeriods
+    sim.time_budget = timeBudget
+    sim.run()
+    return sim
+
+
+def capState(sim):
+    """What Fit.simulateCap reports: stable percentage, or seconds until the capacitor runs out"""
+    state = (sim.cap_stable_low + sim.cap_stable_high) / (2 * sim.capacitorCapacity)
+    if state > 0:
+        return True, min(100, state * 100)
+    return False, sim.t / 1000.0
+
+
+def agrees(old, new):
+    oldStable, oldState = capState(old)
+    newStable, newState = capState(new)
+    return oldStable == newStable and abs(oldState - newState) <= 10 ** -old.stability_precision
+
+
+def main(timeBudget):
+    failures = 0
+    print "{0:<38} {1:>10} {2:>10} {3:>10} {4:>10}  {5}".format(
+        "Setup", "old (s)", "new (s)", "old iter", "new iter", "result")
+    for name, capacity, recharge, drains in CATALOGUE:
+        old = simulate(capacity, recharge, drains, False)
+        new = simulate(capacity, recharge, drains, True, timeBudget)
+        ok = agrees(old, new)
+        if not new.approximate:
+            # Running out of time budget is allowed to change the answer
+            failures += not ok
+        stable, state = capState(new)
+        if stable:
+            result = "stable at {0:.1f}%".format(state)
+        else:
+            result = "runs out at {0:.1f}s".format(state)
+        if new.approximate:
+            result += " (approximate)"
+        print "{0:<38} {1:>10.4f} {2:>10.4f} {3:>10} {4:>10}  {5}{6}".format(
+            name, old.runtime, new.runtime, old.iterations, new.iterations, result, "" if ok else "  DIFFERS")
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-b", "--budget", type=float, default=None, help="time budget of the new simulation, seconds")
+    args = parser.parse_args()
+    sys.exit(1 if main(args.budget) else 0)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Compare full fit calculation time with and without HandledList filter indexes.
+
+A capital ship fit with an all level V character is used, so every one of the
+character's skills runs its effects against the fit's modules, drones and
+fighters.
+"""
+
+import argparse
+import os.path
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import eos.config
+
+eos.config.saveddata_connectionstring = "sqlite:///:memory:"
+
+import eos.db  # noqa: E402
+from eos.effectHandlerHelpers import HandledList  # noqa: E402
+from eos.saveddata.character import Character  # noqa: E402
+from eos.saveddata.fit import Fit  # noqa: E402
+from eos.saveddata.module import Module, State  # noqa: E402
+from eos.saveddata.ship import Ship  # noqa: E402
+
+MODULES = (
+    "Siege Module II",
+    "Hexa 2500mm Repeating Cannon II",
+    "Hexa 2500mm Repeating Cannon II",
+    "Hexa 2500mm Repeating Cannon II",
+    "Capital Armor Repairer I",
+    "Capital Armor Repairer I",
+    "Damage Control II",
+    "Gyrostabilizer II",
+    "Gyrostabilizer II",
+    "Gyrostabilizer II",
+    "Tracking Enhancer II",
+    "Capital Cap Battery II",
+)
+
+
+def buildFit(shipName):
+    fit = Fit(Ship(eos.db.getItem(shipName)))
+    fit.character = Character.getAll5()
+    for name in MODULES:
+        mod = Module(eos.db.getItem(name))
+        if not mod.fits(fit):
+            print "Skipping {0}, does not fit".format(name)
+            continue
+        fit.modules.append(mod)
+        if mod.isValidState(State.ACTIVE):
+            mod.state = State.ACTIVE
+    return fit
+
+
+def calculate(fit):
+    fit.clear()
+    fit.calculateModifiedAttributes()
+
+
+def main(shipName, runs):
+    fit = buildFit(shipName)
+    print "{0} with {1} modules, {2} skills".format(shipName, len(fit.modules), len(fit.character.skills))
+
+    results = {}
+    for indexed in (False, True):
+        HandledList.INDEXED = indexed
+        calculate(fit)
+        times = timeit.repeat(lambda: calculate(fit), repeat=runs, number=1)
+        results[indexed] = min(times)
+        print "{0:<10} best {1:.4f}s, mean {2:.4f}s".format(
+            "indexed" if indexed else "scan", min(times), sum(times) / len(times))
+
+    print "Speedup: {0:.2f}x".format(results[False] / results[True])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-s", "--ship", default="Naglfar", help="name of the ship to fit")
+    parser.add_argument("-r", "--runs", type=int, default=20, help="number of calculations per mode")
+    args = parser.parse_args()
+    main(args.ship, args.runs)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Micro-benchmarks of stacking penalized attribute calculation.
+
+Uses resist and damage modifier heavy fits with an all level V character and
+times, per fit, a full calculation, reading every modified attribute of the
+ship and modules for the first time (calculating them) and reading them again
+(memoized). The stacking penalized multipliers of the fits are also run
+through the previous filter and sort implementation, to check the results
+are the same and compare speed.
+"""
+
+import argparse
+import os.path
+import sys
+import timeit
+from math import exp
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import eos.config
+
+eos.config.saveddata_connectionstring = "sqlite:///:memory:"
+
+import eos.db  # noqa: E402
+from eos.saveddata.character import Character  # noqa: E402
+from eos.saveddata.fit import Fit  # noqa: E402
+from eos.saveddata.module import Module, State  # noqa: E402
+from eos.saveddata.ship import Ship  # noqa: E402
+
+FITS = (
+    ("Abaddon", ("Mega Pulse Laser II",) * 8 + ("Large Armor Repairer II", "Energized Adaptive Nano Membrane II",
+                                                 "Energized Adaptive Nano Membrane II", "Damage Control II",
+                                                 "Heat Sink II", "Heat Sink II", "Heat Sink II",
+                                                 "100MN Afterburner II", "Tracking Computer II",
+                                                 "Tracking Computer II", "Cap Recharger II")),
+    ("Raven", ("Cruise Missile Launcher II",) * 6 + ("Adaptive Invulnerability Field II",
+                                                      "Adaptive Invulnerability Field II",
+                                                      "Adaptive Invulnerability Field II",
+                                                      "Large Shield Extender II", "Large Shield Extender II",
+                                                      "Ballistic Control System II", "Ballistic Control System II",
+                                                      "Ballistic Control System II", "Ballistic Control System II",
+                                                      "Damage Control II")),
+    ("Megathron", ("Neutron Blaster Cannon II",) * 7 + ("Magnetic Field Stabilizer II",
+                                                         "Magnetic Field Stabilizer II",
+                                                         "Magnetic Field Stabilizer II",
+                                                         "Energized Adaptive Nano Membrane II",
+                                                         "Energized Adaptive Nano Membrane II",
+                                                         "Damage Control II", "Large Armor Repairer II",
+                                                         "Stasis Webifier II", "Warp Scrambler II",
+                                                         "Tracking Computer II")),
+)
+
+
+def buildFit(shipName, moduleNames):
+    fit = Fit(Ship(eos.db.getItem(shipName)))
+    fit.character = Character.getAll5()
+    for name in moduleNames:
+        mod = Module(eos.db.getItem(name))
+        if not mod.fits(fit):
+            print "Skipping {0}, does not fit {1}".format(name, shipName)
+            continue
+        fit.modules.append(mod)
+        if mod.isValidState(State.ACTIVE):
+            mod.state = State.ACTIVE
+    fit.calculateModifiedAttributes()
+    return fit
+
+
+def attributeDicts(fit):
+    yield fit.ship.itemModifiedAttributes
+    for mod in fit.modules:
+        yield mod.itemModifiedAttributes
+        if mod.charge is not None:
+            yield mod.chargeModifiedAttributes
+
+
+def calculate(fit):
+    fit.clear()
+    fit.calculateModifiedAttributes()
+
+
+def readAll(fit):
+    for attrs in attributeDicts(fit):
+        for key in attrs:
+            attrs[key]
+
+
+def oldPenalized(val, penalizedMultipliers):
+    """The filter and sort implementation stacking penalties used to have"""
+    l1 = filter(lambda _val: _val > 1, penalizedMultipliers)
+    l2 = filter(lambda _val: _val < 1, penalizedMultipliers)
+    abssort = lambda _val: -abs(_val - 1)
+    l1.sort(key=abssort)
+    l2.sort(key=abssort)
+    for l in (l1, l2):
+        for i in xrange(len(l)):
+            val *= 1 + (l[i] - 1) * exp(- i ** 2 / 7.1289)
+    return val
+
+
+def penaltyGroups(fit):
+    for attrs in attributeDicts(fit):
+        for groups in attrs._ModifiedAttributeDict__penalizedMultipliers.itervalues():
+            for group in groups.itervalues():
+                yield group
+
+
+def main(runs):
+    failures = 0
+    print "{0:<12} {1:>10} {2:>12} {3:>12} {4:>8} {5:>12} {6:>12}".format(
+        "Fit", "calc (ms)", "1st read(ms)", "reread (ms)", "groups", "old (us)", "new (us)")
+    for shipName, moduleNames in FITS:
+        fit = buildFit(shipName, moduleNames)
+
+        calcTime = min(timeit.repeat(lambda: calculate(fit), repeat=runs, number=1))
+
+        def firstRead():
+            calculate(fit)
+            readAll(fit)
+
+        firstReadTime = min(timeit.repeat(firstRead, repeat=runs, number=1)) - calcTime
+        rereadTime = min(timeit.repeat(lambda: readAll(fit), repeat=runs, number=1))
+
+        groups = [(group, group.bonuses + group.maluses) for group in penaltyGroups(fit)]
+        for group, values in groups:
+            old, new = oldPenalized(1.0, values), group.apply(1.0)
+            if abs(old - new) > 1e-12 * abs(old):
+                print "  Stacking result differs: {0} vs {1} for {2}".format(old, new, values)
+                failures += 1
+
+        number = 100
+        oldTime = min(timeit.repeat(lambda: [oldPenalized(1.0, values) for _, values in groups],
+                                    repeat=runs, number=number)) / number
+        newTime = min(timeit.repeat(lambda: [group.apply(1.0) for group, _ in groups],
+                                    repeat=runs, number=number)) / number
+
+        print "{0:<12} {1:>10.2f} {2:>12.2f} {3:>12.2f} {4:>8} {5:>12.1f} {6:>12.1f}".format(
+            shipName, calcTime * 1000, firstReadTime * 1000, rereadTime * 1000, len(groups), oldTime * 1e6,
+            newTime * 1e6)
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-r", "--runs", type=int, default=10, help="number of timed runs, the best one is shown")
+    args = parser.parse_args()
+    sys.exit(1 if main(args.runs) else 0)
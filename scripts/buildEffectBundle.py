@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Compile all effect modules into eos/effects.bundle.
+
+With --time, loading every effect is timed from the bundle and by importing
+the modules one by one, each in a fresh process so nothing is cached.
+"""
+
+import argparse
+import os.path
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def main(path=None):
+    import eos.config
+    from eos import effectRegistry
+    count = effectRegistry.build(path)
+    print "Compiled {0} effects into {1}".format(count, path or eos.config.effectBundle)
+
+
+def loadAll(path):
+    """Load every effect, report the seconds it took"""
+    import eos.config
+    eos.config.effectBundle = path
+    from eos import effectRegistry
+
+    start = time.time()
+    for fileName in os.listdir(effectRegistry.effectsPath()):
+        name, ext = os.path.splitext(fileName)
+        if ext == ".py" and not name.startswith("_"):
+            effectRegistry.getHandler(name)
+    print time.time() - start
+
+
+def timeLoading(path, runs):
+    import eos.config
+    path = path or eos.config.effectBundle
+    for label, bundle in (("files", ""), ("bundle", path)):
+        results = []
+        for _ in xrange(runs):
+            output = subprocess.check_output([sys.executable, __file__, "--load-all", bundle])
+            results.append(float(output.strip().splitlines()[-1]))
+        print "Loading all effects from {0}: {1:.3f}s".format(label, min(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="path of the bundle, eos/effects.bundle by default")
+    parser.add_argument("-t", "--time", action="store_true", help="time loading all effects with and without bundle")
+    parser.add_argument("-r", "--runs", type=int, default=3, help="fresh processes timed for --time")
+    parser.add_argument("--load-all", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load_all is not None:
+        loadAll(args.load_all or None)
+    else:
+        main(args.output)
+        if args.time:
+            timeLoading(args.output, args.runs)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Build the gamedata snapshot for an eve.db.
+
+The snapshot is written next to the database as eve.snapshot unless another
+path is given. With --time, the time from a cold start to the first calculated
+fit is measured with and without the snapshot, each in a fresh process.
+"""
+
+import time
+
+START = time.time()
+
+import argparse  # noqa: E402
+import os.path  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+SHIP = "Rifter"
+MODULES = ("200mm AutoCannon II", "200mm AutoCannon II", "200mm AutoCannon II", "1MN Afterburner II",
+           "Stasis Webifier II", "Small Armor Repairer II", "Gyrostabilizer II", "Damage Control II")
+
+
+def main(db, snapshot=None):
+    import eos.config
+    eos.config.gamedata_connectionstring = "sqlite:///" + db
+    eos.config.saveddata_connectionstring = "sqlite:///:memory:"
+    eos.config.debug = False
+
+    import eos.db.gamedata.snapshot
+
+    if snapshot is None:
+        snapshot = os.path.join(os.path.dirname(db), "eve.snapshot")
+
+    start = time.time()
+    clientBuild = eos.db.gamedata.snapshot.build(snapshot)
+    print "Built snapshot of build {0} at {1}: {2:.1f} MiB in {3:.2f}s".format(
+        clientBuild, snapshot, os.path.getsize(snapshot) / 1024.0 / 1024, time.time() - start)
+    return snapshot
+
+
+def coldStart(db, snapshot):
+    """Calculate a fit right after startup, report the seconds since the process started"""
+    import eos.config
+    eos.config.gamedata_connectionstring = "sqlite:///" + db
+    eos.config.saveddata_connectionstring = "sqlite:///:memory:"
+    eos.config.gamedataSnapshot = snapshot
+    eos.config.debug = False
+
+    import eos.db
+    from eos.saveddata.character import Character
+    from eos.saveddata.fit import Fit
+    from eos.saveddata.module import Module, State
+    from eos.saveddata.ship import Ship
+
+    fit = Fit(Ship(eos.db.getItem(SHIP)))
+    fit.character = Character.getAll5()
+    for name in MODULES:
+        module = Module(eos.db.getItem(name))
+        fit.modules.append(module)
+        if module.isValidState(State.ACTIVE):
+            module.state = State.ACTIVE
+    fit.calculateModifiedAttributes()
+    fit.totalDps
+
+    print time.time() - START
+
+
+def timeColdStart(db, snapshot, runs):
+    times = {}
+    for label, path in (("database", ""), ("snapshot", snapshot)):
+        results = []
+        for _ in xrange(runs):
+            output = subprocess.check_output([sys.executable, __file__, db, "--cold-start", path])
+            results.append(float(output.strip().splitlines()[-1]))
+        times[label] = min(results)
+        print "Cold start to first calculated fit, {0}: {1:.3f}s".format(label, times[label])
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("db", help="path to eve.db")
+    parser.add_argument("-s", "--snapshot", help="path of the snapshot, next to the database by default")
+    parser.add_argument("-t", "--time", action="store_true", help="measure cold start with and without snapshot")
+    parser.add_argument("-r", "--runs", type=int, default=3, help="cold starts measured for --time")
+    parser.add_argument("--cold-start", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    db = os.path.realpath(os.path.expanduser(args.db))
+    if args.cold_start is not None:
+        coldStart(db, args.cold_start or None)
+    else:
+        snapshot = main(db, args.snapshot)
+        if args.time:
+            timeColdStart(db, snapshot, args.runs)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# ===============================================================================
+# Copyright (C) 2010 Diego Duclos
+#
+# This file is part of eos.
+#
+# eos is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# eos is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with eos.  If not, see <http://www.gnu.org/licenses/>.
+# ===============================================================================
+
+"""
+Build the item search index for an eve.db.
+
+The index is written next to the database as eve.searchindex unless another
+path is given. With --time, searches typed one character at a time are timed
+through the index and through LIKE queries.
+"""
+
+import argparse
+import os.path
+import sys
+import time
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+QUERIES = ("stasis webifier", "200mm autocannon", "heavy assault missile launcher", "damage control",
+           "rifter", "medium armor repairer", "republic fleet", "gyrostabilizer")
+
+
+def main(db, index=None):
+    import eos.config
+    eos.config.gamedata_connectionstring = "sqlite:///" + db
+    eos.config.saveddata_connectionstring = "sqlite:///:memory:"
+    eos.config.debug = False
+
+    import eos.db.gamedata.search
+
+    if index is None:
+        index = os.path.join(os.path.dirname(db), "eve.searchindex")
+
+    start = time.time()
+    clientBuild = eos.db.gamedata.search.build(index)
+    print "Built item search index of build {0} at {1}: {2:.1f} MiB in {3:.2f}s".format(
+        clientBuild, index, os.path.getsize(index) / 1024.0 / 1024, time.time() - start)
+    return index
+
+
+def timeSearches(index):
+    import eos.config
+    eos.config.gamedataSearchIndex = index
+    eos.config.gamedataCache = False
+
+    import eos.db
+    from eos.db.gamedata.search import getItemSearch
+
+    start = time.time()
+    getItemSearch()
+    print "Read item search index in {0:.1f}ms".format((time.time() - start) * 1000)
+
+    for label, search in (("LIKE", lambda text: eos.db.searchItems(text)),
+                          ("index", lambda text: getItemSearch().search(text))):
+        start = time.time()
+        searches = 0
+        for query in QUERIES:
+            for end in xrange(1, len(query) + 1):
+                search(query[:end])
+                searches += 1
+        print "{0} searches typed through {1}: {2:.2f}ms each".format(
+            searches, label, (time.time() - start) * 1000 / searches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("db", help="path to eve.db")
+    parser.add_argument("-i", "--index", help="path of the index, next to the database by default")
+    parser.add_argument("-t", "--time", action="store_true", help="time searches with and without the index")
+    args = parser.parse_args()
+
+    index = main(os.path.realpath(os.path.expanduser(args.db)), args.index)
+    if args.time:
+        timeSearches(index)
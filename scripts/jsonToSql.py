@@ -36,6 +36,7 @@ def main(db, json_path):
     # Import eos.config first and change it
     import eos.config
     eos.config.gamedata_connectionstring = db
+    eos.config.gamedataReadOnly = False
     eos.config.debug = False
 
     # Now thats done, we can import the eos modules using the config
@@ -242,7 +243,8 @@ def main(db, json_path):
 
                 eos.db.gamedata_session.add(instance)
 
-    eos.db.gamedata_session.commit()
+    # Gamedata sessions autocommit, the flush is committed on its own
+    eos.db.gamedata_session.flush()
 
     print("done")
 
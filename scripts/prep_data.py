@@ -95,6 +95,20 @@ if os.path.isfile(db_file):
 
 jsonToSql.main("sqlite:///"+db_file, dump_path)
 
+### Snapshot
+import buildGamedataSnapshot
+
+snapshot_file = os.path.join(dump_path, "eve.snapshot")
+header("Building gamedata snapshot", snapshot_file)
+buildGamedataSnapshot.main(db_file, snapshot_file)
+
+### Search index
+import buildSearchIndex
+
+search_index_file = os.path.join(dump_path, "eve.searchindex")
+header("Building item search index", search_index_file)
+buildSearchIndex.main(db_file, search_index_file)
+
 ### Diff generation
 import itemDiff
 diff_file = os.path.join(dump_path, "diff.txt")
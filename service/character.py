@@ -50,13 +50,19 @@ class CharacterImportThread(threading.Thread):
         self.callback = callback
 
     def run(self):
+        try:
+            # The characters hold gamedata of this thread, the GUI loads them again
+            eos.db.release(self.importCharacters())
+        finally:
+            eos.db.removeGamedataSession()
+        wx.CallAfter(self.callback)
+
+    def importCharacters(self):
+        """Import the characters of paths, returns those imported"""
+        characters = []
         paths = self.paths
         sCharacter = Character.getInstance()
-        all5_character = es_Character("All 5", 5)
-        all_skill_ids = []
-        for skill in all5_character.skills:
-            # Parse out the skill item IDs to make searching it easier later on
-            all_skill_ids.append(skill.itemID)
+        all_skill_ids = es_Character.getSkillIDMap()
 
         for path in paths:
             try:
@@ -64,6 +70,7 @@ class CharacterImportThread(threading.Thread):
                 with open(path, mode='r') as charFile:
                     sheet = ParseXML(charFile)
                     char = sCharacter.new(sheet.name + " (imported)")
+                    characters.append(char)
                     sCharacter.apiUpdateCharSheet(char.ID, sheet.skills)
             except:
                 # if it's not api XML data, try this
@@ -91,13 +98,14 @@ class CharacterImportThread(threading.Thread):
                                     skill.getAttribute("level"),
                             )
                     char = sCharacter.new(name + " (EVEMon)")
+                    characters.append(char)
                     sCharacter.apiUpdateCharSheet(char.ID, skills)
                 except Exception, e:
                     pyfalog.error("Exception on character import:")
                     pyfalog.error(e)
                     continue
 
-        wx.CallAfter(self.callback)
+        return characters
 
 
 class SkillBackupThread(threading.Thread):
@@ -236,6 +244,7 @@ class Character(object):
             return
         char = eos.db.getCharacter(charID)
         char.saveLevels()
+        eos.db.sync()
 
     @staticmethod
     def saveCharacterAs(charID, newName):
@@ -18,9 +18,16 @@
 # ===============================================================================
 
 import copy
+import threading
 from logbook import Logger
 
+# noinspection PyPackageRequirements
+import wx
+
+import eos.config
 import eos.db
+from eos.calcTransfer import TransferError, takeCalculations
+from eos.fitHash import characterHash, fitHash
 from eos.saveddata.booster import Booster as es_Booster
 from eos.saveddata.cargo import Cargo as es_Cargo
 from eos.saveddata.character import Character as saveddata_Character
@@ -28,16 +35,97 @@ from eos.saveddata.citadel import Citadel as es_Citadel
 from eos.saveddata.damagePattern import DamagePattern as es_DamagePattern
 from eos.saveddata.drone import Drone as es_Drone
 from eos.saveddata.fighter import Fighter as es_Fighter
+from eos.saveddata.fitStats import FitStats as es_FitStats
+from eos.saveddata.price import Price as es_Price
 from eos.saveddata.implant import Implant as es_Implant
 from eos.saveddata.ship import Ship as es_Ship
 from eos.saveddata.module import Module as es_Module, State, Slot
-from eos.saveddata.fit import Fit as FitType
+from eos.saveddata.fit import Fit as FitType, calculationLock
 from service.character import Character
 from service.damagePattern import DamagePattern
 from service.settings import SettingsProvider
 
 pyfalog = Logger(__name__)
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    from utils.compat import OrderedDict
+
+
+class RecalcWorkerThread(threading.Thread):
+    """
+    Recalculates fits off the main thread, see Fit.requestRecalc. Fits are
+    loaded into a session of the worker's own and calculated there, the fits
+    the GUI holds are only changed on the main thread, taking over the results.
+    Pending requests are kept per fit, so a fit which changes again before the
+    worker gets to it is only calculated once, in its latest state.
+    """
+
+    def __init__(self, sFit):
+        threading.Thread.__init__(self)
+        self.name = "RecalcWorker"
+        self.daemon = True
+        pyfalog.debug("Initialize RecalcWorkerThread.")
+        self.sFit = sFit
+        # fitID -> (generation, checkStates, baseIndex, skillLevels)
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+
+    def request(self, fitID, generation, checkStates, baseIndex, skillLevels):
+        with self.condition:
+            self.pending.pop(fitID, None)
+            self.pending[fitID] = (generation, checkStates, baseIndex, skillLevels)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                fitID, (generation, checkStates, baseIndex, skillLevels) = self.pending.popitem(last=False)
+
+            calculated = self.sFit.calculateApart(fitID, generation, checkStates, baseIndex, skillLevels)
+            wx.CallAfter(self.sFit.recalcDone, fitID, generation, calculated)
+
+
+class FitStatsThread(threading.Thread):
+    """
+    Calculates fits for their headline stats, see Fit.fillFitStats. Fits are
+    loaded into a session of the worker's own, so the fits the GUI holds are
+    never touched. A new request replaces the one waiting and cuts the running
+    one short, only the fits listed last matter.
+    """
+
+    def __init__(self, sFit):
+        threading.Thread.__init__(self)
+        self.name = "FitStats"
+        self.daemon = True
+        self.sFit = sFit
+        # (fitIDs, changes, callback) of the latest request
+        self.request = None
+        self.condition = threading.Condition()
+
+    def fill(self, fitIDs, changes, callback):
+        with self.condition:
+            self.request = (fitIDs, changes, callback)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.request is None:
+                    self.condition.wait()
+                fitIDs, changes, callback = self.request
+                self.request = None
+
+            session = eos.db.newSaveddataSession()
+            try:
+                stats = self.sFit.calculateFitStats(fitIDs, session, lambda: self.request is not None)
+            finally:
+                session.close()
+            wx.CallAfter(self.sFit.fitStatsDone, stats, changes, callback)
+
 
 class Fit(object):
     instance = None
@@ -56,6 +144,15 @@ class Fit(object):
         self.character = saveddata_Character.getAll5()
         self.booster = False
         self.dirtyFitIDs = set()
+        # Calculations and background recalculation bookkeeping, the lock is shared with eos
+        # which calculates fits again for Affected By
+        self.recalcLock = calculationLock
+        # fitID => (generation, checkStates, base, fill) of the latest background recalculation requested
+        self.recalcRequests = {}
+        self.recalcWorker = None
+        # Called on the main thread with the fitID whenever a background recalculation is done
+        self.recalcCallback = None
+        self.fitStatsWorker = None
 
         serviceFittingDefaultOptions = {
             "useGlobalCharacter": False,
@@ -72,6 +169,8 @@ class Fit(object):
             "exportCharges": True,
             "openFitInNew": False,
             "priceSystem": "Jita",
+            "incrementalCalculation": False,
+            "backgroundRecalc": True,
         }
 
         self.serviceFittingOptions = SettingsProvider.getInstance().getSettings(
@@ -79,8 +178,20 @@ class Fit(object):
 
     @staticmethod
     def getAllFits():
-        fits = eos.db.getFitList()
-        return fits
+        """All fits with everything they hold, loaded together"""
+        return [fit for fit in eos.db.loadFits(eos.db.getFitIDs()) if not fit.isInvalid]
+
+    @staticmethod
+    def iterAllFits(chunkSize=eos.db.LOAD_CHUNK, session=None):
+        """
+        All fits with everything they hold, loaded chunkSize at a time, so no
+        more are held at once. Fits are loaded into session, see loadFits.
+        """
+        fitIDs = eos.db.getFitIDs()
+        for start in xrange(0, len(fitIDs), chunkSize):
+            for fit in eos.db.loadFits(fitIDs[start:start + chunkSize], session):
+                if not fit.isInvalid:
+                    yield fit
 
     @staticmethod
     def getFitsWithShip(shipID):
@@ -92,6 +203,117 @@ class Fit(object):
 
         return names
 
+    @staticmethod
+    def getFitStats(shipID=None):
+        """
+        fitID => FitStats of the fits of shipID, or of all fits, whose stats still
+        hold for their character and the gamedata. Fits are not loaded, fits
+        missing from the result can be calculated with fillFitStats.
+        """
+        gamedataVersion = eos.config.gamedata_version
+        characterHashes = {}
+        valid = {}
+        for stats, characterID in eos.db.getFitStatsList(gamedataVersion, shipID):
+            if characterID not in characterHashes:
+                character = eos.db.getCharacter(characterID) if characterID is not None else None
+                characterHashes[characterID] = characterHash(character)
+            if stats.isValid(gamedataVersion, characterHashes[characterID]):
+                valid[stats.fitID] = stats
+
+        return valid
+
+    @staticmethod
+    def getContentHashes(shipIDs):
+        """
+        contentHash => fitID of the saved fits of shipIDs. The hashes kept with
+        the stats are used, fits without stats are loaded to hash them.
+        """
+        hashes = {}
+        for fitID, contentHash in eos.db.getFitContentHashes(shipIDs):
+            if contentHash is None:
+                fit = eos.db.getFit(fitID)
+                if fit is None or fit.isInvalid:
+                    continue
+                contentHash = fitHash(fit)
+            hashes.setdefault(contentHash, fitID)
+
+        return hashes
+
+    def fillFitStats(self, fitIDs, callback):
+        """
+        Calculate fitIDs in the background to store their stats, callback is
+        called on the main thread with fitID => FitStats of those calculated.
+        With an in memory database, which the worker can't read, they are
+        calculated right away.
+        """
+        if not fitIDs:
+            return
+        fitIDs = list(fitIDs)
+        changes = eos.db.getFitStatsChanges(fitIDs)
+        # Stats are calculated on fits read in a session of their own, which sees what's committed
+        eos.db.sync()
+
+        if eos.db.saveddataInMemory:
+            session = eos.db.newSaveddataSession()
+            try:
+                stats = self.calculateFitStats(fitIDs, session)
+            finally:
+                session.close()
+            self.fitStatsDone(stats, changes, callback)
+            return
+
+        if self.fitStatsWorker is None:
+            self.fitStatsWorker = FitStatsThread(self)
+            self.fitStatsWorker.start()
+        self.fitStatsWorker.fill(fitIDs, changes, callback)
+
+    def calculateFitStats(self, fitIDs, session, stop=None):
+        """
+        fitID => FitStats of fitIDs, loaded into session, one of
+        eos.db.newSaveddataSession, and calculated. The stats aren't saved.
+        Stops early once stop() is true.
+        """
+        gamedataVersion = eos.config.gamedata_version
+
+        def getPrice(typeID):
+            return session.query(es_Price).get(typeID)
+
+        stats = {}
+        fits = dict((fit.ID, fit) for fit in eos.db.loadFits(fitIDs, session))
+        for fitID in fitIDs:
+            if stop is not None and stop():
+                break
+            fit = fits.get(fitID)
+            if fit is None or fit.isInvalid:
+                continue
+            try:
+                fitStats = es_FitStats()
+                fitStats.fitID = fitID
+                # Copies of a fit calculated before don't need calculating again
+                if not fitStats.reuse(fit, gamedataVersion, getPrice):
+                    fit.factorReload = self.serviceFittingOptions["useGlobalForceReload"]
+                    # Nobody asks these fits what affects what
+                    fit.recordAffectedBy = False
+                    fit.clear()
+                    fit.calculateModifiedAttributes()
+                    fitStats.update(fit, gamedataVersion, getPrice)
+                stats[fitID] = fitStats
+            except Exception as e:
+                pyfalog.error("Failed to calculate stats of fit {0}.", fitID)
+                pyfalog.error(e)
+
+        return stats
+
+    @staticmethod
+    def fitStatsDone(stats, changes, callback):
+        """Save stats, leaving out those of fits changed since they were asked for"""
+        now = eos.db.getFitStatsChanges(stats.keys())
+        current = [fitStats for fitID, fitStats in stats.iteritems() if now[fitID] == changes.get(fitID, 0)]
+        saved = dict((fitStats.fitID, fitStats) for fitStats in eos.db.mergeFitStats(current))
+        eos.db.commit()
+        if callback is not None:
+            callback(saved)
+
     @staticmethod
     def getBoosterFits():
         """ Lists fits flagged as booster """
@@ -128,7 +350,7 @@ class Fit(object):
         fit.character = self.character
         fit.booster = self.booster
         eos.db.save(fit)
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return fit.ID
 
     @staticmethod
@@ -178,7 +400,7 @@ class Fit(object):
         fit = eos.db.getFit(fitID)
         fit.factorReload = not fit.factorReload
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def switchFit(self, fitID):
         if fitID is None:
@@ -195,7 +417,7 @@ class Fit(object):
                 fit.damagePattern = self.pattern
 
         eos.db.commit()
-        self.recalc(fit, withBoosters=True)
+        self.requestRecalc(fit)
 
     def getFit(self, fitID, projected=False, basic=False):
         """
@@ -229,7 +451,10 @@ class Fit(object):
 
     @staticmethod
     def searchFits(name):
-        results = eos.db.searchFits(name)
+        if eos.config.searchIndex:
+            results = eos.db.findFits(name)
+        else:
+            results = eos.db.searchFits(name)
         fits = []
         for fit in results:
             fits.append((
@@ -251,7 +476,7 @@ class Fit(object):
 
         fit.implants.append(implant)
         if recalc:
-            self.recalc(fit)
+            self.requestRecalc(fit)
         return True
 
     def removeImplant(self, fitID, position):
@@ -261,7 +486,7 @@ class Fit(object):
         fit = eos.db.getFit(fitID)
         implant = fit.implants[position]
         fit.implants.remove(implant)
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def addBooster(self, fitID, itemID):
@@ -277,7 +502,7 @@ class Fit(object):
             return False
 
         fit.boosters.append(booster)
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def removeBooster(self, fitID, position):
@@ -287,7 +512,7 @@ class Fit(object):
         fit = eos.db.getFit(fitID)
         booster = fit.boosters[position]
         fit.boosters.remove(booster)
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def project(self, fitID, thing):
@@ -336,7 +561,7 @@ class Fit(object):
             fit.projectedModules.append(module)
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def addCommandFit(self, fitID, thing):
@@ -355,7 +580,7 @@ class Fit(object):
         eos.db.saveddata_session.refresh(thing)
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def toggleProjected(self, fitID, thing, click):
@@ -377,7 +602,7 @@ class Fit(object):
                 projectionInfo.active = not projectionInfo.active
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def toggleCommandFit(self, fitID, thing):
         fit = eos.db.getFit(fitID)
@@ -386,7 +611,7 @@ class Fit(object):
             commandInfo.active = not commandInfo.active
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def changeAmount(self, fitID, projected_fit, amount):
         """Change amount of projected fits"""
@@ -397,14 +622,14 @@ class Fit(object):
             projectionInfo.amount = amount
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def changeActiveFighters(self, fitID, fighter, amount):
         fit = eos.db.getFit(fitID)
         fighter.amountActive = amount
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def removeProjected(self, fitID, thing):
         fit = eos.db.getFit(fitID)
@@ -419,14 +644,14 @@ class Fit(object):
             # fit.projectedFits.remove(thing)
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def removeCommand(self, fitID, thing):
         fit = eos.db.getFit(fitID)
         del fit.__commandFits[thing.ID]
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def appendModule(self, fitID, itemID):
         fit = eos.db.getFit(fitID)
@@ -447,13 +672,10 @@ class Fit(object):
             if m.isValidState(State.ACTIVE):
                 m.state = State.ACTIVE
 
-            # As some items may affect state-limiting attributes of the ship, calculate new attributes first
-            self.recalc(fit)
-            # Then, check states of all modules and change where needed. This will recalc if needed
-            self.checkStates(fit, m)
-
-            fit.fill()
             eos.db.commit()
+            # As some items may affect state-limiting attributes of the ship, calculate new attributes first,
+            # then check states of all modules and change where needed, and fill the slots
+            self.requestRecalc(fit, checkStates=True, base=m, fill=True)
 
             return numSlots != len(fit.modules)
         else:
@@ -466,10 +688,8 @@ class Fit(object):
 
         numSlots = len(fit.modules)
         fit.modules.toDummy(position)
-        self.recalc(fit)
-        self.checkStates(fit, None)
-        fit.fill()
         eos.db.commit()
+        self.requestRecalc(fit, checkStates=True, fill=True)
         return numSlots != len(fit.modules)
 
     def changeModule(self, fitID, position, newItemID):
@@ -491,13 +711,10 @@ class Fit(object):
             if m.isValidState(State.ACTIVE):
                 m.state = State.ACTIVE
 
-            # As some items may affect state-limiting attributes of the ship, calculate new attributes first
-            self.recalc(fit)
-            # Then, check states of all modules and change where needed. This will recalc if needed
-            self.checkStates(fit, m)
-
-            fit.fill()
             eos.db.commit()
+            # As some items may affect state-limiting attributes of the ship, calculate new attributes first,
+            # then check states of all modules and change where needed, and fill the slots
+            self.requestRecalc(fit, checkStates=True, base=m, fill=True)
 
             return True
         else:
@@ -554,7 +771,7 @@ class Fit(object):
                 fit.cargo.insert(cargoIdx, moduleP)
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     @staticmethod
     def swapModules(fitID, src, dst):
@@ -590,7 +807,7 @@ class Fit(object):
             fit.modules.insert(dst, new)
 
             eos.db.commit()
-            self.recalc(fit)
+            self.requestRecalc(fit)
 
     def addCargo(self, fitID, itemID, amount=1, replace=False):
         """
@@ -623,7 +840,7 @@ class Fit(object):
         else:
             cargo.amount += amount
 
-        self.recalc(fit)
+        self.requestRecalc(fit)
         eos.db.commit()
 
         return True
@@ -635,7 +852,7 @@ class Fit(object):
         fit = eos.db.getFit(fitID)
         charge = fit.cargo[position]
         fit.cargo.remove(charge)
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def addFighter(self, fitID, itemID):
@@ -679,7 +896,7 @@ class Fit(object):
                     return False
 
             eos.db.commit()
-            self.recalc(fit)
+            self.requestRecalc(fit)
             return True
         else:
             return False
@@ -690,7 +907,7 @@ class Fit(object):
         fit.fighters.remove(f)
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def addDrone(self, fitID, itemID, numDronesToAdd=1):
@@ -714,7 +931,7 @@ class Fit(object):
                     return False
             drone.amount += numDronesToAdd
             eos.db.commit()
-            self.recalc(fit)
+            self.requestRecalc(fit)
             return True
         else:
             return False
@@ -741,7 +958,7 @@ class Fit(object):
             d2.amountActive = d2.amount
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     @staticmethod
@@ -782,7 +999,7 @@ class Fit(object):
             del fit.drones[i]
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def toggleDrone(self, fitID, i):
@@ -794,7 +1011,7 @@ class Fit(object):
             d.amountActive = d.amount
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def toggleFighter(self, fitID, i):
@@ -803,7 +1020,7 @@ class Fit(object):
         f.active = not f.active
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def toggleImplant(self, fitID, i):
@@ -812,7 +1029,7 @@ class Fit(object):
         implant.active = not implant.active
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def toggleImplantSource(self, fitID, source):
@@ -820,7 +1037,7 @@ class Fit(object):
         fit.implantSource = source
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def toggleBooster(self, fitID, i):
@@ -829,14 +1046,14 @@ class Fit(object):
         booster.active = not booster.active
 
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
         return True
 
     def toggleFighterAbility(self, fitID, ability):
         fit = eos.db.getFit(fitID)
         ability.active = not ability.active
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def changeChar(self, fitID, charID):
         if fitID is None or charID is None:
@@ -847,7 +1064,7 @@ class Fit(object):
 
         fit = eos.db.getFit(fitID)
         fit.character = self.character = eos.db.getCharacter(charID)
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     @staticmethod
     def isAmmo(itemID):
@@ -864,7 +1081,7 @@ class Fit(object):
             if mod.isValidCharge(ammo):
                 mod.charge = ammo
 
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     @staticmethod
     def getTargetResists(fitID):
@@ -882,7 +1099,7 @@ class Fit(object):
         fit.targetResists = pattern
         eos.db.commit()
 
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     @staticmethod
     def getDamagePattern(fitID):
@@ -900,7 +1117,7 @@ class Fit(object):
         fit.damagePattern = self.pattern = pattern
         eos.db.commit()
 
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def setMode(self, fitID, mode):
         if fitID is None:
@@ -910,7 +1127,7 @@ class Fit(object):
         fit.mode = mode
         eos.db.commit()
 
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def setAsPattern(self, fitID, ammo):
         if fitID is None:
@@ -927,9 +1144,16 @@ class Fit(object):
             setattr(dp, "%sAmount" % attr, ammo.getAttribute("%sDamage" % attr) or 0)
 
         fit.damagePattern = dp
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def checkStates(self, fit, base):
+        # If any state was changed, recalculate attributes again
+        if self.correctStates(fit, base):
+            self.recalc(fit)
+
+    @staticmethod
+    def correctStates(fit, base):
+        """Put the modules and projected drones of fit, other than base, in states they can be in"""
         changed = False
         for mod in fit.modules:
             if mod != base:
@@ -949,9 +1173,24 @@ class Fit(object):
                 drone.amountActive = 0
                 changed = True
 
-        # If any state was changed, recalculate attributes again
-        if changed:
-            self.recalc(fit)
+        return changed
+
+    @staticmethod
+    def takeStates(fit, calculated):
+        """Take over the states correctStates changed on calculated, the copy of fit calculated apart"""
+        changes = []
+        for name, attr in (("modules", "state"), ("projectedModules", "state"), ("projectedDrones", "amountActive")):
+            sources, targets = getattr(calculated, name), getattr(fit, name)
+            if len(sources) != len(targets):
+                raise TransferError("The {0} of fit {1} changed".format(name, fit.ID))
+            for source, target in zip(sources, targets):
+                if getattr(source.item, "ID", None) != getattr(target.item, "ID", None):
+                    raise TransferError("The {0} of fit {1} changed".format(name, fit.ID))
+                if getattr(source, attr) != getattr(target, attr):
+                    changes.append((target, attr, getattr(source, attr)))
+
+        for target, attr, value in changes:
+            setattr(target, attr, value)
 
     def toggleModulesState(self, fitID, base, modules, click):
         changed = False
@@ -971,10 +1210,9 @@ class Fit(object):
             eos.db.commit()
             fit = eos.db.getFit(fitID)
 
-            # As some items may affect state-limiting attributes of the ship, calculate new attributes first
-            self.recalc(fit)
-            # Then, check states of all modules and change where needed. This will recalc if needed
-            self.checkStates(fit, base)
+            # As some items may affect state-limiting attributes of the ship, calculate new attributes first,
+            # then check states of all modules and change where needed
+            self.requestRecalc(fit, checkStates=True, base=base)
 
     # Old state : New State
     localMap = {
@@ -1025,12 +1263,144 @@ class Fit(object):
 
         fit = eos.db.getFit(fitID)
         eos.db.commit()
-        self.recalc(fit)
+        self.requestRecalc(fit)
 
     def recalc(self, fit, withBoosters=True):
         pyfalog.info("=" * 10 + "recalc" + "=" * 10)
+        # Waits for other threads calculating the same fits, like one tracing Affected By
+        with self.recalcLock:
+            self.__calculate(fit, self.serviceFittingOptions["incrementalCalculation"])
+
+    def __calculate(self, fit, incremental):
         if fit.factorReload is not self.serviceFittingOptions["useGlobalForceReload"]:
             fit.factorReload = self.serviceFittingOptions["useGlobalForceReload"]
+        fit.incrementalCalculation = incremental
         fit.clear()
 
-        fit.calculateModifiedAttributes(withBoosters=False)
+        fit.calculateModifiedAttributes()
+
+    def requestRecalc(self, fit, checkStates=False, base=None, fill=False):
+        """
+        Recalculate fit on the recalc worker thread, followed by
+        checkStates(fit, base) and filling its slots when asked for. The worker
+        calculates a copy of the fit loaded from the database, fit takes over
+        the results on the main thread and recalcCallback is called. Only the
+        latest request for a fit is taken over, the follow-ups of the requests
+        before it are added to it. Without background recalculation, with an
+        in memory database the worker can't read, or without a main loop to
+        take the results over, this is done right away.
+        """
+        if (not self.serviceFittingOptions["backgroundRecalc"] or fit.ID is None or eos.db.saveddataInMemory or
+                wx.GetApp() is None):
+            self.recalc(fit)
+            if checkStates:
+                self.checkStates(fit, base)
+            if fill:
+                fit.fill()
+                eos.db.commit()
+            return
+
+        generation = 1
+        pending = self.recalcRequests.get(fit.ID)
+        if pending is not None:
+            generation = pending[0] + 1
+            if not checkStates:
+                checkStates, base = pending[1:3]
+            fill = fill or pending[3]
+        self.recalcRequests[fit.ID] = (generation, checkStates, base, fill)
+
+        # The worker reads what's committed
+        eos.db.sync()
+        baseIndex = next((i for i, mod in enumerate(fit.modules) if mod is base), None)
+
+        if self.recalcWorker is None:
+            self.recalcWorker = RecalcWorkerThread(self)
+            self.recalcWorker.start()
+        self.recalcWorker.request(fit.ID, generation, checkStates, baseIndex, self.unsavedSkillLevels(fit))
+
+    def isRecalcPending(self, fitID):
+        """Whether fit has a background recalculation which isn't done yet"""
+        return fitID in self.recalcRequests
+
+    @staticmethod
+    def unsavedSkillLevels(fit):
+        """characterID => {skillID: level} of the skill levels changed but not saved, of fit and the fits around it"""
+        levels = {}
+        seen = set()
+        fits = [fit]
+        while fits:
+            current = fits.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            character = current.character
+            if character is not None and character.dirtySkills:
+                levels[character.ID] = dict((skill.itemID, skill.activeLevel) for skill in character.dirtySkills)
+            fits.extend(current.projectedFits)
+            fits.extend(current.commandFits)
+        return levels
+
+    def calculateApart(self, fitID, generation, checkStates, baseIndex, skillLevels):
+        """
+        Runs on the recalc worker thread. Calculates fitID as loaded into a
+        session of its own, with the skill levels of unsavedSkillLevels.
+        Returns the fits calculated, fitID first, None if that failed.
+        """
+        session = eos.db.newSaveddataSession()
+        try:
+            fit = next(iter(eos.db.loadFits([fitID], session)), None)
+            if fit is None or fit.isInvalid:
+                return None
+
+            fits = [loaded for loaded in session.identity_map.values() if isinstance(loaded, FitType)]
+            for character in set(loaded.character for loaded in fits if loaded.character is not None):
+                for skillID, level in skillLevels.get(character.ID, {}).iteritems():
+                    character.getSkill(skillID).level = level
+
+            # Copies are calculated once, keeping a journal for them is no use
+            self.__calculate(fit, False)
+            if checkStates and self.correctStates(fit, fit.modules[baseIndex] if baseIndex is not None else None):
+                self.__calculate(fit, False)
+
+            return [fit] + [loaded for loaded in fits if loaded is not fit and loaded.isCalculated]
+        except Exception as e:
+            # The fit may have been changed under our feet, that is fine as long as a newer request is coming
+            if self.recalcRequests.get(fitID, (None,))[0] == generation:
+                pyfalog.critical("Background recalculation of fit {0} failed.", fitID)
+                pyfalog.critical(e)
+            return None
+        finally:
+            session.close()
+
+    def recalcDone(self, fitID, generation, calculated):
+        """Runs on the main thread, fitID takes over the results of its latest background recalculation"""
+        pending = self.recalcRequests.get(fitID)
+        if pending is None or pending[0] != generation:
+            pyfalog.debug("Dropping stale recalculation {0} of fit {1}", generation, fitID)
+            return
+
+        _, checkStates, base, fill = self.recalcRequests.pop(fitID)
+        fit = eos.db.getFit(fitID)
+        if fit is None:
+            return
+
+        if calculated is not None:
+            try:
+                self.takeStates(fit, calculated[0])
+                takeCalculations(calculated, [eos.db.getFit(source.ID) for source in calculated])
+            except Exception as e:
+                pyfalog.warning("Unable to take over the background recalculation of fit {0}.", fitID)
+                pyfalog.warning(e)
+                calculated = None
+        if calculated is None:
+            # Calculated here instead, as without background recalculation
+            self.recalc(fit)
+            if checkStates:
+                self.checkStates(fit, base)
+        if fill:
+            fit.fill()
+
+        # States may have been corrected along with the calculation
+        eos.db.commit()
+        if self.recalcCallback is not None:
+            self.recalcCallback(fitID)
@@ -27,6 +27,7 @@ import wx
 from sqlalchemy.sql import or_
 
 import config
+import eos.config
 import eos.db
 from service import conversions
 from service.settings import SettingsProvider
@@ -46,6 +47,9 @@ pyfalog = Logger(__name__)
 # Event which tells threads dependent on Market that it's initialized
 mktRdy = threading.Event()
 
+# Relations of the items found by searches loaded along with them
+SEARCH_EAGER = ("icon", "group.category", "metaGroup", "metaGroup.parent")
+
 
 class ShipBrowserWorkerThread(threading.Thread):
     def __init__(self):
@@ -68,12 +72,12 @@ class ShipBrowserWorkerThread(threading.Thread):
         while True:
             try:
                 id_, callback = queue.get()
-                set_ = cache.get(id_)
-                if set_ is None:
-                    set_ = sMkt.getShipList(id_)
-                    cache[id_] = set_
+                shipIDs = cache.get(id_)
+                if shipIDs is None:
+                    shipIDs = [ship.ID for ship in sMkt.getShipList(id_)]
+                    cache[id_] = shipIDs
 
-                wx.CallAfter(callback, (id_, set_))
+                wx.CallAfter(self.handOver, callback, id_, shipIDs)
             except Exception as e:
                 pyfalog.critical("Callback failed.")
                 pyfalog.critical(e)
@@ -84,6 +88,11 @@ class ShipBrowserWorkerThread(threading.Thread):
                     pyfalog.critical("Queue task done failed.")
                     pyfalog.critical(e)
 
+    @staticmethod
+    def handOver(callback, id_, shipIDs):
+        # Gamedata is handed over by ID, the main thread looks the ships up in its own gamedata session
+        callback((id_, set(eos.db.getItemsByID(shipIDs, eager=("group", "marketGroup")).itervalues())))
+
 
 class PriceWorkerThread(threading.Thread):
     def __init__(self):
@@ -150,24 +159,39 @@ class SearchWorkerThread(threading.Thread):
             self.searchRequest = None
             cv.release()
             sMkt = Market.getInstance()
-            if filterOn is True:
-                # Rely on category data provided by eos as we don't hardcode them much in service
-                filter_ = or_(types_Category.name.in_(sMkt.SEARCH_CATEGORIES), types_Group.name.in_(sMkt.SEARCH_GROUPS))
-            elif filterOn:  # filter by selected categories
-                filter_ = types_Category.name.in_(filterOn)
+            if eos.config.searchIndex:
+                if filterOn is True:
+                    categories, groups = sMkt.SEARCH_CATEGORIES, sMkt.SEARCH_GROUPS
+                elif filterOn:  # filter by selected categories
+                    categories, groups = filterOn, ()
+                else:
+                    categories, groups = None, None
+
+                results = eos.db.findItems(request, categories, groups, eager=SEARCH_EAGER)
             else:
-                filter_ = None
-
-            results = eos.db.searchItems(request, where=filter_,
-                                         join=(types_Item.group, types_Group.category),
-                                         eager=("icon", "group.category", "metaGroup", "metaGroup.parent"))
-
-            items = set()
+                if filterOn is True:
+                    # Rely on category data provided by eos as we don't hardcode them much in service
+                    filter_ = or_(types_Category.name.in_(sMkt.SEARCH_CATEGORIES),
+                                  types_Group.name.in_(sMkt.SEARCH_GROUPS))
+                elif filterOn:  # filter by selected categories
+                    filter_ = types_Category.name.in_(filterOn)
+                else:
+                    filter_ = None
+
+                results = eos.db.searchItems(request, where=filter_,
+                                             join=(types_Item.group, types_Group.category), eager=SEARCH_EAGER)
+
+            itemIDs = set()
             # Return only published items, consult with Market service this time
             for item in results:
                 if sMkt.getPublicityByItem(item):
-                    items.add(item)
-            wx.CallAfter(callback, items)
+                    itemIDs.add(item.ID)
+            wx.CallAfter(self.handOver, callback, itemIDs)
+
+    @staticmethod
+    def handOver(callback, itemIDs):
+        # Gamedata is handed over by ID, the main thread looks the items up in its own gamedata session
+        callback(set(eos.db.getItemsByID(itemIDs, eager=SEARCH_EAGER).itervalues()))
 
     def scheduleSearch(self, text, callback, filterOn=True):
         self.cv.acquire()
@@ -452,6 +476,14 @@ class Market(object):
 
         return item
 
+    @staticmethod
+    def getItemsByName(names, *args, **kwargs):
+        """name => item of the names there are items for, looked up together"""
+        names = set(names)
+        converted = dict((name, conversions.all.get(name, name)) for name in names)
+        items = eos.db.getItemsByName(converted.itervalues(), *args, **kwargs)
+        return dict((name, items[converted[name]]) for name in names if converted[name] in items)
+
     def getGroup(self, identity, *args, **kwargs):
         """Get group by its ID or name"""
         if isinstance(identity, types_Group):
@@ -803,10 +835,13 @@ class Market(object):
 
     def searchShips(self, name):
         """Find ships according to given text pattern"""
-        filter_ = types_Category.name.in_(["Ship", "Structure"])
-        results = eos.db.searchItems(name, where=filter_,
-                                     join=(types_Item.group, types_Group.category),
-                                     eager=("icon", "group.category", "metaGroup", "metaGroup.parent"))
+        eager = SEARCH_EAGER
+        if eos.config.searchIndex:
+            results = eos.db.findItems(name, categories=("Ship", "Structure"), eager=eager)
+        else:
+            filter_ = types_Category.name.in_(["Ship", "Structure"])
+            results = eos.db.searchItems(name, where=filter_, join=(types_Item.group, types_Group.category),
+                                         eager=eager)
         ships = set()
         for item in results:
             if self.getPublicityByItem(item):
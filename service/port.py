@@ -19,7 +19,6 @@
 
 import re
 import os
-import xml.dom
 from logbook import Logger
 import collections
 import json
@@ -29,8 +28,12 @@ import locale
 from codecs import open
 
 import xml.parsers.expat
+from cStringIO import StringIO
+from xml.etree import cElementTree as ElementTree
+from xml.sax.saxutils import XMLGenerator
 
 from eos import db
+from eos.fitHash import fitHash
 from service.fit import Fit as svcFit
 
 # noinspection PyPackageRequirements
@@ -70,6 +73,41 @@ INV_FLAG_CARGOBAY = 5
 INV_FLAG_DRONEBAY = 87
 INV_FLAG_FIGHTER = 158
 
+# Fits of an EVE XML file parsed, looked up and saved together
+XML_CHUNK = 100
+
+
+class DuplicateFilter(object):
+    """
+    Leaves out imported fits whose contents are those of a saved fit, or of a
+    fit it let through before
+    """
+
+    def __init__(self):
+        # Content hash => fit ID or name
+        self.known = {}
+        # Ships whose saved fits are in known
+        self.shipIDs = set()
+
+    def __call__(self, fits):
+        shipIDs = set(fit.shipID for fit in fits) - self.shipIDs
+        if shipIDs:
+            for contentHash, fitID in svcFit.getInstance().getContentHashes(shipIDs).iteritems():
+                self.known.setdefault(contentHash, fitID)
+            self.shipIDs |= shipIDs
+
+        unique = []
+        for fit in fits:
+            contentHash = fitHash(fit)
+            if contentHash in self.known:
+                pyfalog.info("Skipping fit {0}, its contents are the same as those of fit {1}",
+                             fit.name, self.known[contentHash])
+                continue
+            self.known[contentHash] = fit.name
+            unique.append(fit)
+
+        return unique
+
 
 class Port(object):
     instance = None
@@ -84,6 +122,8 @@ class Port(object):
     @staticmethod
     def backupFits(path, callback):
         pyfalog.debug("Starting backup fits thread.")
+        # What's backed up is on disk as well
+        db.sync()
         thread = FitBackupThread(path, callback)
         thread.start()
 
@@ -94,22 +134,84 @@ class Port(object):
         thread.start()
 
     @staticmethod
-    def importFitFromFiles(paths, callback=None):
+    def skipDuplicates(fits):
+        """The fits whose contents are not those of a saved fit, or of a fit earlier in fits"""
+        return DuplicateFilter()(fits)
+
+    @staticmethod
+    def saveImported(fits, duplicates=None, callback=None, saved=0):
+        """
+        Save imported fits, leaving out those duplicates, a DuplicateFilter,
+        filters out when it's given. saved is the number of fits of the same
+        import saved before, for the progress shown. Returns the IDs saved.
+        """
+        sFit = svcFit.getInstance()
+        for fit in fits:
+            # Set some more fit attributes, these two are part of what makes fits the same. The character
+            # isn't, and setting it adds the fit to the session, so that is left for the fits saved
+            fit.damagePattern = sFit.pattern
+            fit.targetResists = sFit.targetResists
+
+        if duplicates is not None:
+            numFits = len(fits)
+            fits = duplicates(fits)
+            if callback and len(fits) < numFits:  # Pulse
+                wx.CallAfter(callback, 1, "Skipping %d fits already there" % (numFits - len(fits)))
+
+        IDs = []
+        for fit in fits:
+            fit.character = sFit.character
+            db.save(fit)
+            IDs.append(fit.ID)
+            if callback:  # Pulse
+                pyfalog.debug("Processing complete, saving fits to database: {0}", saved + len(IDs))
+                wx.CallAfter(callback, 1, "Processing complete, saving fits to database\n(%d)" % (saved + len(IDs)))
+
+        return IDs
+
+    @staticmethod
+    def isXmlFile(path):
+        """Whether the file at path starts like an UTF-8 XML document"""
+        with open(path, "rb") as file_:
+            start = file_.read(256)
+        if start.startswith('\xef\xbb\xbf'):
+            start = start[3:]
+        return start.lstrip().startswith("<")
+
+    @staticmethod
+    def importFitFromFiles(paths, callback=None, skipDuplicates=True):
         """
-        Imports fits from file(s). First processes all provided paths and stores
-        assembled fits into a list. This allows us to call back to the GUI as
-        fits are processed as well as when fits are being saved.
+        Imports fits from file(s). EVE XML files are parsed as they are read,
+        and their fits saved in chunks, other files are read whole and their
+        fits saved at the end. Callbacks to the GUI are made as fits are
+        processed and saved. Fits with the same contents as a saved fit, or as
+        a fit imported along, are not saved again unless skipDuplicates is False.
         returns
         """
         defcodepage = locale.getpreferredencoding()
-        sFit = svcFit.getInstance()
+        duplicates = DuplicateFilter() if skipDuplicates else None
 
         fits = []
+        IDs = []
         for path in paths:
             if callback:  # Pulse
                 pyfalog.debug("Processing file:\n{0}", path)
                 wx.CallAfter(callback, 1, "Processing file:\n%s" % path)
 
+            if Port.isXmlFile(path):
+                parsed = 0
+                try:
+                    for chunk in Port.iterXmlFits(path, callback):
+                        parsed += len(chunk)
+                        IDs += Port.saveImported(chunk, duplicates, callback, len(IDs))
+                    continue
+                except (ElementTree.ParseError, xml.parsers.expat.ExpatError):
+                    if parsed:
+                        pyfalog.warning("Malformed XML in:\n{0}", path)
+                        return False, "Malformed XML in %s" % path
+                    # Not UTF-8 maybe, read it whole and decode it below
+                    pyfalog.info("Unable to parse {0} as it's read, reading it whole", path)
+
             file_ = open(path, "r")
             srcString = file_.read()
 
@@ -168,7 +270,7 @@ class Port(object):
             try:
                 _, fitsImport = Port.importAuto(srcString, path, callback=callback, encoding=codec_found)
                 fits += fitsImport
-            except xml.parsers.expat.ExpatError:
+            except (ElementTree.ParseError, xml.parsers.expat.ExpatError):
                 pyfalog.warning("Malformed XML in:\n{0}", path)
                 return False, "Malformed XML in %s" % path
             except Exception as e:
@@ -176,24 +278,12 @@ class Port(object):
                 pyfalog.critical(e)
                 return False, "Unknown Error while processing {0}" % path
 
-        IDs = []
-        numFits = len(fits)
-        for i, fit in enumerate(fits):
-            # Set some more fit attributes and save
-            fit.character = sFit.character
-            fit.damagePattern = sFit.pattern
-            fit.targetResists = sFit.targetResists
-            db.save(fit)
-            IDs.append(fit.ID)
-            if callback:  # Pulse
-                pyfalog.debug("Processing complete, saving fits to database: {0}/{1}", i + 1, numFits)
-                wx.CallAfter(
-                    callback, 1,
-                    "Processing complete, saving fits to database\n(%d/%d)" %
-                    (i + 1, numFits)
-                )
+        IDs += Port.saveImported(fits, duplicates, callback, len(IDs))
+        # Saves above are written in one go
+        db.sync()
 
-        return True, fits
+        # Fits saved from chunks are let go of along the way, these are loaded without what they hold
+        return True, db.getFits(IDs)
 
     @staticmethod
     def importFitFromBuffer(bufferStr, activeFit=None):
@@ -825,89 +915,141 @@ class Port(object):
 
     @staticmethod
     def importXml(text, callback=None, encoding="utf-8"):
-        sMkt = Market.getInstance()
-
-        doc = xml.dom.minidom.parseString(text.encode(encoding))
-        fittings = doc.getElementsByTagName("fittings").item(0)
-        fittings = fittings.getElementsByTagName("fitting")
         fits = []
+        for chunk in Port.iterXmlFits(StringIO(text.encode(encoding)), callback):
+            fits += chunk
+        return fits
+
+    @classmethod
+    def iterXmlFits(cls, source, callback=None, chunkSize=XML_CHUNK):
+        """
+        Fits of EVE XML source, a file name or file, in lists of up to
+        chunkSize, parsed as the source is read. The items of a list are
+        looked up together.
+        """
+        records = []
+        for record in cls.iterXml(source):
+            records.append(record)
+            if len(records) >= chunkSize:
+                yield cls._xmlFits(records, callback)
+                records = []
+        if records:
+            yield cls._xmlFits(records, callback)
+
+    @staticmethod
+    def iterXml(source):
+        """
+        (name, ship type, attributes of each hardware) of the fittings in EVE
+        XML source, as they are parsed. A fitting is dropped once it's read,
+        the whole document is never held.
+        """
+        parents = []
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                continue
+
+            parents.pop()
+            if element.tag != "fitting":
+                continue
 
-        for i, fitting in enumerate(fittings):
-            f = Fit()
-            f.name = fitting.getAttribute("name")
             # <localized hint="Maelstrom">Maelstrom</localized>
-            shipType = fitting.getElementsByTagName("shipType").item(0).getAttribute("value")
+            shipType = element.find(".//shipType")
+            yield (element.get("name", ""), shipType.get("value", "") if shipType is not None else "",
+                   [dict(hardware.attrib) for hardware in element.iter("hardware")])
+
+            if parents:
+                parents[-1].remove(element)
+            element.clear()
+
+    @staticmethod
+    def _xmlFits(records, callback=None):
+        """Fits of records from iterXml, with their items looked up together"""
+        names = set()
+        for _, shipType, hardwares in records:
+            names.add(shipType)
+            names.update(hardware.get("type", "") for hardware in hardwares)
+        items = Market.getInstance().getItemsByName(names, eager="group.category")
+
+        fits = []
+        for name, shipType, hardwares in records:
+            fit = Port._xmlFit(name, items.get(shipType), hardwares, items)
+            if fit is not None:
+                fits.append(fit)
+                if callback:
+                    wx.CallAfter(callback, None)
+
+        return fits
+
+    @staticmethod
+    def _xmlFit(name, ship, hardwares, items):
+        f = Fit()
+        f.name = name
+        try:
             try:
-                try:
-                    f.ship = Ship(sMkt.getItem(shipType))
-                except ValueError:
-                    f.ship = Citadel(sMkt.getItem(shipType))
-            except Exception as e:
-                pyfalog.warning("Caught exception on importXml")
-                pyfalog.error(e)
-                continue
-            hardwares = fitting.getElementsByTagName("hardware")
-            moduleList = []
-            for hardware in hardwares:
-                try:
-                    moduleName = hardware.getAttribute("type")
+                f.ship = Ship(ship)
+            except ValueError:
+                f.ship = Citadel(ship)
+        except Exception as e:
+            pyfalog.warning("Caught exception on importXml")
+            pyfalog.error(e)
+            return None
+
+        moduleList = []
+        for hardware in hardwares:
+            try:
+                moduleName = hardware.get("type", "")
+                item = items.get(moduleName)
+                if item is None:
+                    pyfalog.warning("Could not get item: {0}", moduleName)
+                    continue
+
+                if item.category.name == "Drone":
+                    d = Drone(item)
+                    d.amount = int(hardware.get("qty", ""))
+                    f.drones.append(d)
+                elif item.category.name == "Fighter":
+                    ft = Fighter(item)
+                    ft.amount = int(hardware.get("qty", "")) if ft.amount <= ft.fighterSquadronMaxSize else ft.fighterSquadronMaxSize
+                    f.fighters.append(ft)
+                elif hardware.get("slot", "").lower() == "cargo":
+                    # although the eve client only support charges in cargo, third-party programs
+                    # may support items or "refits" in cargo. Support these by blindly adding all
+                    # cargo, not just charges
+                    c = Cargo(item)
+                    c.amount = int(hardware.get("qty", ""))
+                    f.cargo.append(c)
+                else:
                     try:
-                        item = sMkt.getItem(moduleName, eager="group.category")
-                    except Exception as e:
-                        pyfalog.warning("Caught exception on importXml")
-                        pyfalog.error(e)
+                        m = Module(item)
+                    # When item can't be added to any slot (unknown item or just charge), ignore it
+                    except ValueError:
+                        pyfalog.warning("item can't be added to any slot (unknown item or just charge), ignore it")
                         continue
-                    if item:
-                        if item.category.name == "Drone":
-                            d = Drone(item)
-                            d.amount = int(hardware.getAttribute("qty"))
-                            f.drones.append(d)
-                        elif item.category.name == "Fighter":
-                            ft = Fighter(item)
-                            ft.amount = int(hardware.getAttribute("qty")) if ft.amount <= ft.fighterSquadronMaxSize else ft.fighterSquadronMaxSize
-                            f.fighters.append(ft)
-                        elif hardware.getAttribute("slot").lower() == "cargo":
-                            # although the eve client only support charges in cargo, third-party programs
-                            # may support items or "refits" in cargo. Support these by blindly adding all
-                            # cargo, not just charges
-                            c = Cargo(item)
-                            c.amount = int(hardware.getAttribute("qty"))
-                            f.cargo.append(c)
-                        else:
-                            try:
-                                m = Module(item)
-                            # When item can't be added to any slot (unknown item or just charge), ignore it
-                            except ValueError:
-                                pyfalog.warning("item can't be added to any slot (unknown item or just charge), ignore it")
-                                continue
-                            # Add subsystems before modules to make sure T3 cruisers have subsystems installed
-                            if item.category.name == "Subsystem":
-                                if m.fits(f):
-                                    m.owner = f
-                                    f.modules.append(m)
-                            else:
-                                if m.isValidState(State.ACTIVE):
-                                    m.state = State.ACTIVE
-
-                                moduleList.append(m)
+                    # Add subsystems before modules to make sure T3 cruisers have subsystems installed
+                    if item.category.name == "Subsystem":
+                        if m.fits(f):
+                            m.owner = f
+                            f.modules.append(m)
+                    else:
+                        if m.isValidState(State.ACTIVE):
+                            m.state = State.ACTIVE
 
-                except KeyboardInterrupt:
-                    pyfalog.warning("Keyboard Interrupt")
-                    continue
+                        moduleList.append(m)
 
-            # Recalc to get slot numbers correct for T3 cruisers
-            svcFit.getInstance().recalc(f)
+            except KeyboardInterrupt:
+                pyfalog.warning("Keyboard Interrupt")
+                continue
 
-            for module in moduleList:
-                if module.fits(f):
-                    module.owner = f
-                    f.modules.append(module)
+        # Recalc to get slot numbers correct for T3 cruisers
+        svcFit.getInstance().recalc(f)
 
-            fits.append(f)
-            if callback:
-                wx.CallAfter(callback, None)
+        for module in moduleList:
+            if module.fits(f):
+                module.owner = f
+                f.modules.append(module)
 
-        return fits
+        return f
 
     @staticmethod
     def _exportEftBase(fit):
@@ -1040,87 +1182,98 @@ class Port(object):
 
     @classmethod
     def exportXml(cls, callback=None, *fits):
-        doc = xml.dom.minidom.Document()
-        fittings = doc.createElement("fittings")
-        doc.appendChild(fittings)
+        out = StringIO()
+        cls.writeXml(out, fits, callback)
+        return out.getvalue().decode("utf-8")
+
+    @classmethod
+    def writeXml(cls, out, fits, callback=None):
+        """
+        Write fits, any iterable of them, to the file out as UTF-8 EVE XML. A
+        fit is written as soon as it comes, the whole document is never held.
+        """
         sFit = svcFit.getInstance()
+        exportCharges = sFit.serviceFittingOptions["exportCharges"]
+
+        writer = XMLGenerator(out, "utf-8")
+        writer.startDocument()
+        writer.startElement("fittings", {})
 
         for i, fit in enumerate(fits):
             try:
-                fitting = doc.createElement("fitting")
-                fitting.setAttribute("name", fit.name)
-                fittings.appendChild(fitting)
-                description = doc.createElement("description")
-                description.setAttribute("value", "")
-                fitting.appendChild(description)
-                shipType = doc.createElement("shipType")
-                shipType.setAttribute("value", fit.ship.item.name)
-                fitting.appendChild(shipType)
-
-                charges = {}
-                slotNum = {}
-                for module in fit.modules:
-                    if module.isEmpty:
-                        continue
-
-                    slot = module.slot
-
-                    if slot == Slot.SUBSYSTEM:
-                        # Order of subsystem matters based on this attr. See GH issue #130
-                        slotId = module.getModifiedItemAttr("subSystemSlot") - 125
-                    else:
-                        if slot not in slotNum:
-                            slotNum[slot] = 0
-
-                        slotId = slotNum[slot]
-                        slotNum[slot] += 1
-
-                    hardware = doc.createElement("hardware")
-                    hardware.setAttribute("type", module.item.name)
-                    slotName = Slot.getName(slot).lower()
-                    slotName = slotName if slotName != "high" else "hi"
-                    hardware.setAttribute("slot", "%s slot %d" % (slotName, slotId))
-                    fitting.appendChild(hardware)
-
-                    if module.charge and sFit.serviceFittingOptions["exportCharges"]:
-                        if module.charge.name not in charges:
-                            charges[module.charge.name] = 0
-                        # `or 1` because some charges (ie scripts) are without qty
-                        charges[module.charge.name] += module.numCharges or 1
-
-                for drone in fit.drones:
-                    hardware = doc.createElement("hardware")
-                    hardware.setAttribute("qty", "%d" % drone.amount)
-                    hardware.setAttribute("slot", "drone bay")
-                    hardware.setAttribute("type", drone.item.name)
-                    fitting.appendChild(hardware)
-
-                for fighter in fit.fighters:
-                    hardware = doc.createElement("hardware")
-                    hardware.setAttribute("qty", "%d" % fighter.amountActive)
-                    hardware.setAttribute("slot", "fighter bay")
-                    hardware.setAttribute("type", fighter.item.name)
-                    fitting.appendChild(hardware)
-
-                for cargo in fit.cargo:
-                    if cargo.item.name not in charges:
-                        charges[cargo.item.name] = 0
-                    charges[cargo.item.name] += cargo.amount
-
-                for name, qty in charges.items():
-                    hardware = doc.createElement("hardware")
-                    hardware.setAttribute("qty", "%d" % qty)
-                    hardware.setAttribute("slot", "cargo")
-                    hardware.setAttribute("type", name)
-                    fitting.appendChild(hardware)
+                elements = [
+                    ("description", {"value": ""}),
+                    ("shipType", {"value": fit.ship.item.name}),
+                ]
+                elements += [("hardware", hardware) for hardware in cls._xmlHardware(fit, exportCharges)]
             except:
-                print("Failed on fitID: %d" % fit.ID)
+                pyfalog.error("Failed on fitID: {0}", fit.ID)
                 continue
             finally:
                 if callback:
                     wx.CallAfter(callback, i)
 
-        return doc.toprettyxml()
+            writer.ignorableWhitespace("\n\t")
+            writer.startElement("fitting", {"name": fit.name})
+            for name, attributes in elements:
+                writer.ignorableWhitespace("\n\t\t")
+                writer.startElement(name, OrderedDict(sorted(attributes.iteritems())))
+                writer.endElement(name)
+            writer.ignorableWhitespace("\n\t")
+            writer.endElement("fitting")
+
+        writer.ignorableWhitespace("\n")
+        writer.endElement("fittings")
+        writer.ignorableWhitespace("\n")
+        writer.endDocument()
+
+    @staticmethod
+    def _xmlHardware(fit, exportCharges):
+        """Attributes of the hardware elements of fit"""
+        hardwares = []
+        charges = {}
+        slotNum = {}
+        for module in fit.modules:
+            if module.isEmpty:
+                continue
+
+            slot = module.slot
+
+            if slot == Slot.SUBSYSTEM:
+                # Order of subsystem matters based on this attr. See GH issue #130
+                slotId = module.getModifiedItemAttr("subSystemSlot") - 125
+            else:
+                if slot not in slotNum:
+                    slotNum[slot] = 0
+
+                slotId = slotNum[slot]
+                slotNum[slot] += 1
+
+            slotName = Slot.getName(slot).lower()
+            slotName = slotName if slotName != "high" else "hi"
+            hardwares.append({"type": module.item.name, "slot": "%s slot %d" % (slotName, slotId)})
+
+            if module.charge and exportCharges:
+                if module.charge.name not in charges:
+                    charges[module.charge.name] = 0
+                # `or 1` because some charges (ie scripts) are without qty
+                charges[module.charge.name] += module.numCharges or 1
+
+        for drone in fit.drones:
+            hardwares.append({"qty": "%d" % drone.amount, "slot": "drone bay", "type": drone.item.name})
+
+        for fighter in fit.fighters:
+            hardwares.append({"qty": "%d" % fighter.amountActive, "slot": "fighter bay", "type": fighter.item.name})
+
+        for cargo in fit.cargo:
+            if cargo.item.name not in charges:
+                charges[cargo.item.name] = 0
+            charges[cargo.item.name] += cargo.amount
+
+        for name, qty in charges.items():
+            hardwares.append({"qty": "%d" % qty, "slot": "cargo", "type": name})
+
+        return hardwares
 
     @staticmethod
     def exportMultiBuy(fit):
@@ -1176,13 +1329,16 @@ class FitBackupThread(threading.Thread):
         self.callback = callback
 
     def run(self):
-        path = self.path
         sFit = svcFit.getInstance()
-        sPort = Port.getInstance()
-        backedUpFits = sPort.exportXml(self.callback, *sFit.getAllFits())
-        backupFile = open(path, "w", encoding="utf-8")
-        backupFile.write(backedUpFits)
-        backupFile.close()
+        # Fits are read in a session of their own, the GUI's fits never hold gamedata of this thread
+        session = db.newSaveddataSession()
+        try:
+            # Fits are loaded a chunk at a time and written as they come
+            with open(self.path, "wb") as backupFile:
+                Port.writeXml(backupFile, sFit.iterAllFits(session=session), self.callback)
+        finally:
+            session.close()
+            db.removeGamedataSession()
 
         # Send done signal to GUI
         wx.CallAfter(self.callback, -1)
@@ -1196,10 +1352,20 @@ class FitImportThread(threading.Thread):
 
     def run(self):
         sPort = Port.getInstance()
-        success, result = sPort.importFitFromFiles(self.paths, self.callback)
+        try:
+            success, result = sPort.importFitFromFiles(self.paths, self.callback)
+            if success:
+                # The fits hold gamedata of this thread, the GUI loads them again by ID
+                db.release(result)
+                result = [fit.ID for fit in result]
+        finally:
+            db.removeGamedataSession()
 
         if not success:  # there was an error during processing
             pyfalog.error("Error while processing file import: {0}", result)
             wx.CallAfter(self.callback, -2, result)
         else:  # Send done signal to GUI
-            wx.CallAfter(self.callback, -1, result)
+            wx.CallAfter(self.imported, result)
+
+    def imported(self, fitIDs):
+        self.callback(-1, db.getFits(fitIDs))
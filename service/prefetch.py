@@ -42,6 +42,8 @@ if config.saveDB and os.path.isfile(config.saveDB):
     # Import values that must exist otherwise Pyfa breaks
     pyfalog.debug("Import Required Database Values.")
     DefaultDatabaseValues.importRequiredDefaults()
+    # The checks below run on connections of their own, they need to see the defaults committed
+    db.sync()
 
     # Finds and fixes database corruption issues.
     pyfalog.debug("Starting database validation.")
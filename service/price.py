@@ -22,6 +22,7 @@ import time
 from xml.dom import minidom
 
 from eos import db
+from eos.saveddata.fitStats import FitStats as es_FitStats
 from service.network import Network, TimeoutError
 from service.fit import Fit
 from logbook import Logger
@@ -139,19 +140,4 @@ class Price(object):
     @classmethod
     def fitItemsList(cls, fit):
         # Compose a list of all the data we need & request it
-        typeIDs = [fit.ship.item.ID]
-
-        for mod in fit.modules:
-            if not mod.isEmpty:
-                typeIDs.append(mod.itemID)
-
-        for drone in fit.drones:
-            typeIDs.append(drone.itemID)
-
-        for fighter in fit.fighters:
-            typeIDs.append(fighter.itemID)
-
-        for cargo in fit.cargo:
-            typeIDs.append(cargo.itemID)
-
-        return typeIDs
+        return es_FitStats.priceTypeIDs(fit)
@@ -0,0 +1,31 @@
+"""Shared test setup.
+
+Tests that create fits go through the services, which commit them. Point saveddata at a temporary database,
+before anything imports eos.db, so they never write to the user's saveddata.db.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Add root to python paths, this allows us to import submodules
+sys.path.append(os.path.realpath(os.path.join(script_dir, '..')))
+
+# noinspection PyPep8
+import eos.config
+
+saveddata_dir = tempfile.mkdtemp(prefix="pyfa-tests-")
+eos.config.saveddata_connectionstring = "sqlite:///" + os.path.join(saveddata_dir, "saveddata.db")
+
+# noinspection PyPep8
+import eos.db
+
+eos.db.saveddata_meta.create_all()
+
+
+def pytest_unconfigure(config):
+    eos.db.saveddata_session.close()
+    eos.db.saveddata_engine.dispose()
+    shutil.rmtree(saveddata_dir, ignore_errors=True)
@@ -0,0 +1,62 @@
+from eos.modifiedAttributeDict import CompactModifiedAttributeDict, ModifiedAttributeDict, cappingAttrKeyCache, \
+    defaultValuesCache
+
+
+class Attribute(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class Fit(object):
+    """Calculates a single attribute dict, tracing like eos.saveddata.fit.Fit"""
+    recordAffectedBy = False
+
+    def __init__(self, attrs):
+        self.attrs = attrs
+        self.traced = set()
+        self.calculations = 0
+        attrs.original = {"hp": Attribute(100.0)}
+        attrs.fit = self
+
+    def getOrigin(self):
+        return None
+
+    def getModifier(self):
+        return "Damage Control"
+
+    def tracesAfflictions(self, attributes, attributeName):
+        return id(attributes) in self.traced
+
+    def traceAfflictions(self, attributes):
+        self.traced.add(id(attributes))
+        try:
+            self.calculate()
+        finally:
+            self.traced.discard(id(attributes))
+
+    def calculate(self):
+        self.calculations += 1
+        self.attrs.clear()
+        self.attrs.boost("hp", 25)
+        self.attrs.increase("hp", 10)
+
+
+def test_tracedOnDemand():
+    defaultValuesCache["hp"] = 0.0
+    cappingAttrKeyCache["hp"] = None
+    for cls in (ModifiedAttributeDict, CompactModifiedAttributeDict):
+        fit = Fit(cls())
+        fit.calculate()
+        assert fit.attrs["hp"] == 137.5
+
+        assert list(fit.attrs.iterAfflictions()) == ["hp"]
+        assert fit.calculations == 2
+        assert fit.attrs.getAfflictions("hp") == {fit: [("Damage Control", "*", 1.25, True),
+                                                        ("Damage Control", "+", 10, True)]}
+        assert fit.attrs["hp"] == 137.5
+        # Recorded now, until the next calculation
+        assert fit.calculations == 2
+
+        fit.calculate()
+        assert fit.attrs.getAfflictions("hp")
+        assert fit.calculations == 4
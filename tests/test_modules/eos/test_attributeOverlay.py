@@ -0,0 +1,56 @@
+from eos.modifiedAttributeDict import AttributeOverlays, CompactModifiedAttributeDict, ModifiedAttributeDict, \
+    cappingAttrKeyCache, defaultValuesCache
+
+
+class Attribute(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class Fit(object):
+    recordAffectedBy = True
+
+    def getOrigin(self):
+        return None
+
+    def getModifier(self):
+        return "Stasis Webifier II"
+
+
+class Holder(object):
+    def __init__(self, cls, velocity):
+        self.itemModifiedAttributes = cls(Fit(), self)
+        self.itemModifiedAttributes.original = {"maxVelocity": Attribute(velocity)}
+
+
+def test_overlays():
+    defaultValuesCache["maxVelocity"] = 0.0
+    cappingAttrKeyCache["maxVelocity"] = None
+    for cls in (ModifiedAttributeDict, CompactModifiedAttributeDict):
+        ship, drone = Holder(cls, 300.0), Holder(cls, 1000.0)
+        ship.itemModifiedAttributes.boost("maxVelocity", 25)
+        realShip, realDrone = ship.itemModifiedAttributes, drone.itemModifiedAttributes
+        overlays = AttributeOverlays((ship, None, drone))
+
+        overlays.applyAll()
+        assert ship.itemModifiedAttributes is not realShip
+        assert isinstance(ship.itemModifiedAttributes, cls)
+        assert ship.itemModifiedAttributes["maxVelocity"] == 300.0
+        ship.itemModifiedAttributes.fit = Fit()
+        ship.itemModifiedAttributes.boost("maxVelocity", -50)
+        assert ship.itemModifiedAttributes["maxVelocity"] == 150.0
+
+        overlays.applyOnly(drone)
+        assert ship.itemModifiedAttributes is realShip
+        assert drone.itemModifiedAttributes is not realDrone
+
+        overlays.restoreAll()
+        assert ship.itemModifiedAttributes is realShip
+        assert drone.itemModifiedAttributes is realDrone
+        assert realShip["maxVelocity"] == 375.0
+        assert list(realShip.getAfflictions("maxVelocity").values()) == [[("Stasis Webifier II", "*", 1.25, True)]]
+
+        # Overlays are kept until the overlays themselves are dropped
+        overlays.applyAll()
+        assert ship.itemModifiedAttributes["maxVelocity"] == 150.0
+        overlays.restoreAll()
@@ -0,0 +1,23 @@
+import eos.db
+from eos.batch import evaluateFits
+from service.fit import Fit
+
+
+def test_evaluateFitsInProcess():
+    sFit = Fit.getInstance()
+    fitID = sFit.newFit(eos.db.getItem("Rifter").ID, "Batch test")
+    for moduleName in ("200mm AutoCannon II", "200mm AutoCannon II", "Damage Control II", "Gyrostabilizer II"):
+        sFit.appendModule(fitID, eos.db.getItem(moduleName).ID)
+
+    results = list(evaluateFits([fitID, -1], processes=0))
+    assert [result.fitID for result in results] == [fitID, -1]
+
+    result, missing = results
+    fit = eos.db.getFit(fitID)
+    assert result.error is None
+    assert result.shipName == "Rifter"
+    assert result.dps == fit.totalDPS > 0
+    assert result.ehp == sum(fit.ehp.itervalues())
+    assert result.maxSpeed == fit.maxSpeed
+    assert result.alignTime == fit.alignTime
+    assert missing.error is not None
@@ -0,0 +1,108 @@
+"""
+Incremental fit calculation must give exactly the same results as a full one.
+
+Every fit of the corpus is calculated once with a journal, changed in a few ways
+and calculated again incrementally. The resulting attributes and "Affected By"
+data are then compared against a full calculation of the same fit.
+"""
+
+from itertools import chain
+
+import eos.db
+from eos.calcJournal import CalculationJournal
+from eos.saveddata.module import State
+from service.fit import Fit
+
+# Fits built from scratch, in addition to whatever is stored in saveddata
+CORPUS = (
+    ("Rifter", ("200mm AutoCannon II", "200mm AutoCannon II", "1MN Afterburner II", "Warp Disruptor II",
+                "Damage Control II", "Gyrostabilizer II", "Small Armor Repairer II")),
+    ("Drake", ("Heavy Missile Launcher II", "Heavy Missile Launcher II", "Large Shield Extender II",
+               "Adaptive Invulnerability Field II", "Ballistic Control System II", "Ballistic Control System II")),
+    ("Proteus", ("Heavy Neutron Blaster II", "50MN Microwarpdrive II", "Warp Scrambler II",
+                 "Reactive Armor Hardener", "Magnetic Field Stabilizer II", "1600mm Steel Plates II")),
+)
+
+
+def buildCorpus():
+    sFit = Fit.getInstance()
+    fits = [fit for fit in eos.db.getFitList() if not fit.isInvalid]
+    for shipName, moduleNames in CORPUS:
+        fitID = sFit.newFit(eos.db.getItem(shipName).ID, "Calculation journal test")
+        for moduleName in moduleNames:
+            sFit.appendModule(fitID, eos.db.getItem(moduleName).ID)
+        fits.append(eos.db.getFit(fitID))
+    return fits
+
+
+def attributeSnapshot(fit):
+    """All modified attribute values and afflictions of everything on the fit"""
+    snapshot = {}
+    holders = chain((fit.ship,), fit.modules, fit.drones, fit.fighters, fit.implants, fit.boosters)
+    for holder in holders:
+        dicts = [holder.itemModifiedAttributes]
+        if getattr(holder, "chargeModifiedAttributes", None) is not None:
+            dicts.append(holder.chargeModifiedAttributes)
+        for i, attrs in enumerate(dicts):
+            for key in attrs:
+                afflictions = dict((source, list(affs)) for source, affs in attrs.getAfflictions(key).iteritems())
+                snapshot[(id(holder), i, key)] = (attrs[key], afflictions)
+    return snapshot
+
+
+def calculate(fit, journal):
+    fit.calcJournal = journal
+    fit.recordAffectedBy = True
+    fit.clear()
+    fit.calculateModifiedAttributes()
+    return attributeSnapshot(fit)
+
+
+def assertSameResults(fit, journal):
+    incremental = calculate(fit, journal)
+    full = calculate(fit, None)
+    assert incremental.keys() == full.keys()
+    for key, (value, afflictions) in full.iteritems():
+        incrementalValue, incrementalAfflictions = incremental[key]
+        assert type(incrementalValue) is type(value) and incrementalValue == value, key
+        assert incrementalAfflictions == afflictions, key
+
+
+def test_incrementalMatchesFull():
+    for fit in buildCorpus():
+        journal = CalculationJournal()
+        # Prime the journal
+        calculate(fit, journal)
+        assertSameResults(fit, journal)
+
+        for mod in fit.modules:
+            if mod.isEmpty:
+                continue
+            for state in (State.OFFLINE, State.ACTIVE, State.OVERHEATED, State.ONLINE):
+                if not mod.isValidState(state):
+                    continue
+                mod.state = state
+                assertSameResults(fit, journal)
+
+        for mod in fit.modules:
+            if mod.isEmpty or mod.charge is None:
+                continue
+            original = mod.charge
+            for charge in list(mod.getValidCharges())[:3]:
+                mod.charge = charge
+                assertSameResults(fit, journal)
+            mod.charge = original
+            assertSameResults(fit, journal)
+
+        removed = [mod for mod in fit.modules if not mod.isEmpty][:1]
+        for mod in removed:
+            fit.modules.toDummy(mod.modPosition)
+            assertSameResults(fit, journal)
+
+
+def test_journalReplaysUnchangedSteps():
+    fit = buildCorpus()[-1]
+    journal = CalculationJournal()
+    calculate(fit, journal)
+    calculate(fit, journal)
+    assert journal.replayed > 0
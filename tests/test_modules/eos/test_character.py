@@ -0,0 +1,36 @@
+import copy
+
+import eos.db
+from eos.saveddata.character import Character
+
+
+def test_sparseSkills():
+    char = Character("Sparse skills test", 5)
+    eos.db.save(char)
+    first, second = Character.getSkillList()[:2]
+
+    # Skills at the default level aren't stored
+    assert len(char.skills) == len(Character.getSkillList())
+    assert char.storedSkills == []
+    skill = char.getSkill(first.ID)
+    assert skill.level == 5 and skill is char.getSkill(first.name)
+
+    skill.level = 3
+    assert char.isDirty and char.storedSkills == []
+    char.saveLevels()
+    assert char.storedSkills == [skill]
+    assert char.getSkill(first.ID).level == 3
+
+    # Copies keep the stored and unsaved levels, everything else comes with the default level
+    char.getSkill(second.ID).level = 1
+    charCopy = copy.deepcopy(char)
+    eos.db.save(charCopy)
+    assert charCopy.defaultLevel == 5
+    assert sorted((skill.itemID, skill.level) for skill in charCopy.storedSkills) == \
+        sorted(((first.ID, 3), (second.ID, 1)))
+    assert all(skill.level == 5 for skill in charCopy.skills if skill.itemID not in (first.ID, second.ID))
+
+    char.revertLevels()
+    assert char.getSkill(second.ID).level == 5
+    eos.db.remove(charCopy)
+    eos.db.remove(char)
@@ -0,0 +1,71 @@
+import random
+
+from eos.modifiedAttributeDict import CompactModifiedAttributeDict, ModifiedAttributeDict, cappingAttrKeyCache, \
+    defaultValuesCache
+
+KEYS = ("hp", "speed", "range", "capped", "cap", "missing")
+
+
+class Attribute(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class Fit(object):
+    recordAffectedBy = True
+
+    def getOrigin(self):
+        return None
+
+    def getModifier(self):
+        return "modifier"
+
+
+def build(cls, fit):
+    attrs = cls(fit)
+    attrs.original = {"hp": Attribute(100.0), "speed": Attribute(250.0), "range": Attribute(5000.0),
+                      "capped": Attribute(8.0)}
+    return attrs
+
+
+def randomOperation(rng):
+    key = rng.choice(KEYS)
+    return rng.choice((
+        lambda attrs: attrs.increase(key, rng.uniform(-5, 5), position=rng.choice(("pre", "post"))),
+        lambda attrs: attrs.multiply(key, rng.uniform(0.5, 1.5), stackingPenalties=rng.random() < 0.5,
+                                     penaltyGroup=rng.choice(("default", "postMul"))),
+        lambda attrs: attrs.boost(key, rng.uniform(-30, 30)),
+        lambda attrs: attrs.preAssign(key, rng.uniform(0, 10)),
+        lambda attrs: attrs.force(key, rng.uniform(0, 10)) if rng.random() < 0.1 else None,
+        lambda attrs: attrs.__setitem__(key, rng.uniform(0, 10)),
+        lambda attrs: attrs.__delitem__(key),
+        lambda attrs: attrs[key],
+    ))
+
+
+def test_sameAsModifiedAttributeDict():
+    defaultValuesCache.update(dict((key, 1.0) for key in KEYS))
+    cappingAttrKeyCache.update(dict((key, None) for key in KEYS))
+    cappingAttrKeyCache["capped"] = "cap"
+
+    rng = random.Random(7)
+    fit = Fit()
+    for _ in xrange(200):
+        expected, compact = build(ModifiedAttributeDict, fit), build(CompactModifiedAttributeDict, fit)
+        for _ in xrange(rng.randint(0, 30)):
+            state = rng.getstate()
+            randomOperation(rng)(expected)
+            rng.setstate(state)
+            randomOperation(rng)(compact)
+
+        assert sorted(compact) == sorted(expected)
+        assert len(compact) == len(expected)
+        for key in KEYS:
+            assert (key in compact) == (key in expected)
+            assert compact[key] == expected[key]
+            assert compact.getAfflictions(key) == expected.getAfflictions(key)
+
+        expected.clear()
+        compact.clear()
+        assert compact.items() == [(key, expected[key]) for key in compact]
+        assert list(compact.iterAfflictions()) == []
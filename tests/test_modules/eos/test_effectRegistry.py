@@ -0,0 +1,65 @@
+import os
+
+import eos.config
+from eos import effectRegistry
+
+EFFECTS = ("adaptivearmorhardener", "agilitymultipliereffect", "loPower", "doesnotexist")
+
+
+def loadEffects(bundle):
+    eos.config.effectBundle = bundle
+    effectRegistry.reset()
+    handlers = {}
+    for name in EFFECTS:
+        try:
+            handlers[name] = effectRegistry.getHandler(name.lower())
+        except ImportError:
+            handlers[name] = None
+    return handlers
+
+
+def test_bundleMatchesModules(tmpdir):
+    path = str(tmpdir.join("effects.bundle"))
+    count = effectRegistry.build(path)
+    assert count == len([f for f in os.listdir(effectRegistry.effectsPath()) if f.endswith(".py")]) - 1
+
+    old = eos.config.effectBundle
+    try:
+        fromFiles = loadEffects(None)
+        assert effectRegistry.stats["source"] == "files"
+        fromBundle = loadEffects(path)
+        assert effectRegistry.stats["source"] == "bundle"
+    finally:
+        eos.config.effectBundle = old
+        effectRegistry.reset()
+
+    for name in EFFECTS:
+        files, bundle = fromFiles[name], fromBundle[name]
+        if files is None:
+            assert bundle is None
+            continue
+        assert bundle.module.__name__ == files.module.__name__
+        assert bundle.handler.func_code.co_code == files.handler.func_code.co_code
+        assert (bundle.runTime, bundle.activeByDefault, bundle.type) == \
+               (files.runTime, files.activeByDefault, files.type)
+
+
+def test_staleBundle(tmpdir):
+    path = str(tmpdir.join("effects.bundle"))
+    effectRegistry.build(path)
+    source = os.path.join(effectRegistry.effectsPath(), "adaptivearmorhardener.py")
+    info = os.stat(source)
+
+    old = eos.config.effectBundle
+    try:
+        loadEffects(path)
+        assert effectRegistry.stats["source"] == "bundle"
+
+        # An effect edited after the bundle was made
+        os.utime(source, (info.st_atime, info.st_mtime + 10))
+        loadEffects(path)
+        assert effectRegistry.stats["source"] == "files"
+    finally:
+        os.utime(source, (info.st_atime, info.st_mtime))
+        eos.config.effectBundle = old
+        effectRegistry.reset()
@@ -0,0 +1,48 @@
+import eos.db
+from eos.graph import Data
+from eos.graph.fitDps import FitDpsGraph
+from service.fit import Fit
+
+FITS = (
+    ("Rifter", ("200mm AutoCannon II", "200mm AutoCannon II", "Stasis Webifier II", "Gyrostabilizer II")),
+    ("Drake", ("Heavy Missile Launcher II", "Heavy Missile Launcher II", "Target Painter II",
+               "Ballistic Control System II")),
+)
+
+FIELDS = (
+    {"distance": "0-60", "velocity": "0-2000", "signatureRadius": "150", "angle": "90"},
+    {"distance": "10", "velocity": "500;1500", "signatureRadius": "20-500", "angle": "0-90"},
+    {"distance": "1-60", "velocity": "1000", "signatureRadius": None, "angle": "45"},
+)
+
+
+def points(graph, fields):
+    graph.clearData()
+    for name, value in fields.iteritems():
+        graph.setData(Data(name, value))
+    return list(graph.getIterator())
+
+
+def test_arrayEvaluationMatchesScalar():
+    sFit = Fit.getInstance()
+    for shipName, moduleNames in FITS:
+        fitID = sFit.newFit(eos.db.getItem(shipName).ID, "DPS graph test")
+        for moduleName in moduleNames:
+            sFit.appendModule(fitID, eos.db.getItem(moduleName).ID)
+        fit = sFit.getFit(fitID)
+
+        graph = FitDpsGraph(fit)
+        if graph.arrayFunction is None:
+            # numpy is not available
+            return
+
+        for fields in FIELDS:
+            arrayPoints = points(graph, fields)
+            arrayFunction, graph.arrayFunction = graph.arrayFunction, None
+            scalarPoints = points(graph, fields)
+            graph.arrayFunction = arrayFunction
+
+            assert len(arrayPoints) == len(scalarPoints)
+            for (arrayPoint, arrayValue), (scalarPoint, scalarValue) in zip(arrayPoints, scalarPoints):
+                assert arrayPoint.keys() == scalarPoint.keys()
+                assert abs(arrayValue - scalarValue) <= 1e-9 * max(1, abs(scalarValue))
@@ -0,0 +1,110 @@
+from collections import namedtuple
+
+from eos.fitHash import calculationHash, fitHash
+from eos.saveddata.fitStats import FitStats
+
+Module = namedtuple("Module", ("itemID", "chargeID", "state", "isEmpty"))
+Drone = namedtuple("Drone", ("itemID", "amount", "amountActive"))
+Implant = namedtuple("Implant", ("itemID", "active"))
+Projection = namedtuple("Projection", ("amount", "active"))
+Item = namedtuple("Item", ("ID",))
+Ship = namedtuple("Ship", ("item",))
+
+
+class Fit(object):
+    """The parts of eos.saveddata.fit.Fit fitHash and FitStats look at"""
+
+    def __init__(self, ID, name, modules=(), drones=()):
+        self.ID = ID
+        self.name = name
+        self.shipID = 587
+        self.ship = Ship(Item(587))
+        self.character = None
+        self.modeID = None
+        self.modules = list(modules)
+        self.drones = list(drones)
+        self.fighters = []
+        self.projectedModules = []
+        self.projectedDrones = []
+        self.projectedFighters = []
+        self.implants = [Implant(10228, True)]
+        self.boosters = []
+        self.cargo = []
+        self.implantLocation = 0
+        self.factorReload = False
+        self.damagePattern = None
+        self.targetResists = None
+        self.projectedFits = []
+        self.commandFits = []
+        # Calculated stats
+        self.totalDPS = len(self.modules) * 10.0
+        self.totalVolley = 20.0
+        self.ehp = {"shield": 500.0, "armor": 300.0, "hull": None}
+        self.maxSpeed = 350.0
+        self.alignTime = 4.2
+
+    def getProjectionInfo(self, fitID):
+        return Projection(1, True)
+
+    def getCommandInfo(self, fitID):
+        return Projection(None, True)
+
+
+def test_fitHash():
+    modules = [Module(3831, None, 1, False), Module(2961, 12625, 1, False), Module(None, None, 0, True)]
+    drones = [Drone(2488, 2, 2)]
+    fit = Fit(1, "Rifter", modules, drones)
+
+    # Names, IDs, empty slots and the order of items don't matter
+    same = Fit(2, "Rifter copy", reversed(modules[:2]), drones)
+    assert fitHash(fit) == fitHash(same)
+
+    # What the items are and their states do
+    assert fitHash(fit) != fitHash(Fit(3, "Rifter", modules, [Drone(2488, 2, 1)]))
+    assert fitHash(fit) != fitHash(Fit(4, "Rifter", [Module(2961, 12625, 2, False)] + modules[:1], drones))
+
+
+def test_fitStatsValid():
+    stats = FitStats()
+    stats.contentHash = "content"
+    stats.characterHash = "character"
+    stats.gamedataVersion = "1.0"
+
+    assert stats.isValid("1.0", "character")
+    assert stats.isValid("1.0", "character", "content")
+    assert not stats.isValid("1.0", "character", "changed")
+    assert not stats.isValid("1.0", "other character")
+    assert not stats.isValid("1.1", "character")
+
+
+def test_fitStatsReuse():
+    modules = [Module(3831, None, 1, False), Module(2961, 12625, 1, False)]
+    fit = Fit(5, "Rifter", modules)
+    FitStats().update(fit, "1.0")
+
+    # A copy calculates the same, its stats come from the memo
+    copy = Fit(6, "Rifter copy", reversed(modules))
+    copy.totalDPS = None
+    assert calculationHash(copy) == calculationHash(fit)
+    stats = FitStats()
+    assert stats.reuse(copy, "1.0")
+    assert (stats.dps, stats.ehp, stats.gamedataVersion) == (20.0, 800.0, "1.0")
+    assert stats.contentHash == fitHash(fit)
+
+    assert not FitStats().reuse(Fit(7, "Rifter", modules[:1]), "1.0")
+
+
+def test_sourceFits():
+    fit = Fit(8, "Rifter")
+    booster = Fit(9, "Claymore")
+    fit.commandFits = [booster]
+    before = calculationHash(fit), fitHash(fit)
+
+    # What the booster fit has all counts, not only its modules
+    booster.implants.append(Implant(22227, True))
+    assert (calculationHash(fit), fitHash(fit)) != before
+
+    # Fits projected onto each other, or onto themselves, are hashed once
+    booster.projectedFits = [fit, booster]
+    assert fitHash(fit) != fitHash(booster)
+    assert calculationHash(fit) == calculationHash(fit)
@@ -0,0 +1,119 @@
+from collections import namedtuple
+
+from eos.fleetCalculation import FleetCalculation
+
+ProjectionInfo = namedtuple("ProjectionInfo", ("active", "amount"))
+
+
+class Fit(object):
+    """Records what a FleetCalculation asks of it, like eos.saveddata.fit.Fit"""
+    isInvalid = False
+
+    def __init__(self, name, log):
+        self.ID = self.name = name
+        self.log = log
+        self.commandFits = []
+        self.projectedFits = []
+        self.projectedOnto = {}
+        self.isCalculated = False
+
+    def __repr__(self):
+        return self.name
+
+    def getProjectionInfo(self, fitID):
+        return self.projectedOnto.get(fitID)
+
+    def projectOn(self, target, amount=1, active=True):
+        target.projectedFits.append(self)
+        self.projectedOnto[target.ID] = ProjectionInfo(active, amount)
+
+    def clear(self, projected=False):
+        self.isCalculated = False
+
+    def calculateLocal(self):
+        assert not self.isCalculated
+        self.isCalculated = True
+        self.log.append(("calculate", self.name))
+
+    def collectCommandBonuses(self, resolution):
+        assert self.isCalculated
+        resolution.addCommandBonus(len(self.log), 1.0, self.name, None)
+        self.log.append(("boost", self.name))
+
+    def addCommandBonuses(self, resolution):
+        assert not self.isCalculated
+        self.log.append(("bonuses", self.name, sorted(module for _, _, module, _ in resolution.bonuses.values())))
+
+    def projectOnto(self, targetFit, amount):
+        self.log.append(("project", self.name, targetFit.name, amount))
+
+    def projectShadowOnto(self, targetFit, amount):
+        self.log.append(("shadow", self.name, targetFit.name, amount))
+
+
+def test_fleet():
+    log = []
+    booster, logi = Fit("booster", log), Fit("logi", log)
+    fleet = [Fit("dps%d" % i, log) for i in xrange(3)]
+    for fit in fleet:
+        fit.commandFits.append(booster)
+        logi.projectOn(fit, amount=2)
+    logi.commandFits.append(booster)
+
+    calc = FleetCalculation(fleet).run()
+
+    calculated = [entry[1] for entry in log if entry[0] == "calculate"]
+    assert sorted(calculated) == ["booster", "dps0", "dps1", "dps2", "logi"]
+    assert calculated[0] == "booster"
+    assert calc.calculations == 5 and calc.shadows == 0 and calc.cycles == []
+    # Resolved once for everyone boosted by the booster
+    assert log.count(("boost", "booster")) == 1
+    for fit in fleet + [logi]:
+        assert log.index(("bonuses", fit.name, ["booster"])) + 1 == log.index(("calculate", fit.name))
+    assert log[-3:] == [("project", "logi", fit.name, 2) for fit in fleet]
+
+
+def test_inactiveAndSelfProjection():
+    log = []
+    fit, other = Fit("fit", log), Fit("other", log)
+    fit.projectOn(fit)
+    other.projectOn(fit, active=False)
+
+    FleetCalculation([fit, fit]).run()
+    assert log == [("calculate", "fit"), ("shadow", "fit", "fit", 1)]
+
+
+def test_commandCycle():
+    log = []
+    first, second = Fit("first", log), Fit("second", log)
+    first.commandFits.append(second)
+    second.commandFits.append(first)
+
+    calc = FleetCalculation([first, second]).run()
+    assert [kind for kind, _ in calc.cycles] == ["command"]
+    assert calc.calculations == 4
+    # Calculated once more with the bonuses of the whole cycle
+    for fit, booster in ((first, second), (second, first)):
+        last = len(log) - 1 - log[::-1].index(("calculate", fit.name))
+        assert log[last - 1] == ("bonuses", fit.name, [booster.name])
+
+
+def test_projectionOrder():
+    log = []
+    first, second, third = Fit("first", log), Fit("second", log), Fit("third", log)
+    # first projects onto second, which projects onto third: everyone projects before being projected onto
+    first.projectOn(second)
+    second.projectOn(third)
+    calc = FleetCalculation([third, second, first]).run()
+    assert calc.shadows == 0 and calc.cycles == []
+    assert log[-2:] == [("project", "second", "third", 1), ("project", "first", "second", 1)]
+
+    # Projecting onto each other, one of them has to project from its shadow
+    log[:] = []
+    for fit in (first, second, third):
+        fit.clear()
+    third.projectOn(first)
+    calc = FleetCalculation([first, second, third]).run()
+    assert [kind for kind, _ in calc.cycles] == ["projection"]
+    assert calc.shadows == 1
+    assert len([entry for entry in log if entry[0] in ("project", "shadow")]) == 3
@@ -0,0 +1,45 @@
+import eos.config
+import eos.db
+from eos.db.gamedata.indexes import GamedataIndexes, REQUIRED_SKILL_ATTRIBUTES
+from eos.saveddata.module import Module
+
+MODULES = ("200mm AutoCannon II", "Light Missile Launcher II", "Heavy Neutron Blaster II")
+ITEMS = ("Rifter", "Gyrostabilizer II", "Hobgoblin II") + MODULES
+
+
+def databaseRequirements(typeID):
+    values = dict(eos.db.gamedata_engine.execute(
+        "SELECT attributeID, value FROM dgmtypeattribs WHERE typeID = ?", typeID).fetchall())
+    return dict((int(values[skillAttr]), values[levelAttr]) for skillAttr, levelAttr in REQUIRED_SKILL_ATTRIBUTES.iteritems()
+                if skillAttr in values and levelAttr in values)
+
+
+def test_requiredSkills():
+    indexes = GamedataIndexes()
+    for name in ITEMS:
+        item = eos.db.getItem(name)
+        requiredSkills = indexes.getRequiredSkills(item.ID)
+        assert requiredSkills
+        assert dict(requiredSkills) == databaseRequirements(item.ID)
+        assert [(skill.ID, level) for skill, level in item.requiredSkills.iteritems()] == list(requiredSkills.iteritems())
+
+        # Everything required on the way is in the closure, at the level it's required at or higher
+        allRequiredSkills = indexes.getAllRequiredSkills(item.ID)
+        for skillID, level in requiredSkills.iteritems():
+            assert allRequiredSkills[skillID] >= level
+            assert item.ID in indexes.getDependents(skillID)
+            for subSkillID, subLevel in databaseRequirements(skillID).iteritems():
+                assert allRequiredSkills[subSkillID] >= subLevel
+
+
+def test_validCharges(monkeypatch):
+    for name in MODULES:
+        module = Module(eos.db.getItem(name))
+        indexed = module.getValidCharges()
+        assert indexed
+        for charge in indexed:
+            assert module.isValidCharge(charge)
+
+        monkeypatch.setattr(eos.config, "gamedataIndexes", False)
+        assert module.getValidCharges() == indexed
+        monkeypatch.undo()
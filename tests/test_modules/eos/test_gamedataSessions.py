@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+import eos.db
+from eos.gamedata import Item
+
+NAMES = ("Rifter", "200mm AutoCannon II", "Gyrostabilizer II", "Hobgoblin II")
+
+
+def test_sessionPerThread():
+    sessions = {}
+    errors = []
+    # Threads stay alive until all are started, a thread taking over the ident of a finished one gets its session
+    started = threading.Event()
+
+    def read(index):
+        try:
+            session = eos.db.gamedata_session()
+            item = session.query(Item).filter(Item.name == NAMES[index % len(NAMES)]).one()
+            # Every thread gets items of its own from the query cache
+            for name in NAMES:
+                cached = eos.db.getItem(name)
+                assert cached in session
+                assert cached.attributes
+            sessions[index] = session, item
+        except Exception as e:
+            errors.append(e)
+        started.wait()
+
+    threads = [threading.Thread(target=read, args=(index,)) for index in range(6)]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(id(session) for session, _ in sessions.itervalues())) == len(threads)
+    assert all(item in session for session, item in sessions.itervalues())
+
+
+def test_removeSession():
+    loaded = {}
+
+    def read():
+        session = eos.db.gamedata_session()
+        loaded["item"] = session.query(Item).filter(Item.name == NAMES[1]).one()
+        eos.db.removeGamedataSession()
+        loaded["removed"] = not eos.db.gamedata_session.registry.has()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+
+    assert loaded["removed"]
+    # The item of the thread is left behind, this thread loads its own
+    item = eos.db.getItem(NAMES[1])
+    assert item is not loaded["item"]
+    assert item in eos.db.gamedata_session()
+    assert item.group.category.name == "Module"
+
+
+def test_connectionsReleased():
+    pool = eos.db.gamedata_engine.pool
+    if not isinstance(pool, QueuePool):
+        pytest.skip("Only a pool of connections hands them back")
+
+    def read():
+        assert eos.db.getItem(NAMES[2]).group.category.name == "Module"
+
+    threads = [threading.Thread(target=read) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    read()
+
+    # No session holds on to a connection after reading
+    assert pool.checkedout() == 0
+
+
+def test_readOnly():
+    with pytest.raises(OperationalError):
+        eos.db.gamedata_engine.execute("CREATE TABLE readOnlyTest (ID INTEGER)")
@@ -0,0 +1,73 @@
+import threading
+
+import eos.db
+from eos.db.gamedata import snapshot
+
+ITEMS = ("Rifter", "200mm AutoCannon II", "Gyrostabilizer II", "Hobgoblin II", "Republic Fleet EMP S")
+
+
+def databaseRow(name):
+    engine = eos.db.gamedata_engine
+    typeID, groupName = engine.execute(
+        "SELECT t.typeID, g.groupName FROM invtypes t JOIN invgroups g ON t.groupID = g.groupID WHERE t.typeName = ?",
+        name).fetchone()
+    attributes = dict(engine.execute(
+        "SELECT a.attributeName, ta.value FROM dgmtypeattribs ta JOIN dgmattribs a ON ta.attributeID = a.attributeID "
+        "WHERE ta.typeID = ?", typeID).fetchall())
+    effects = set(row[0] for row in engine.execute(
+        "SELECT e.effectName FROM dgmtypeeffects te JOIN dgmeffects e ON te.effectID = e.effectID WHERE te.typeID = ?",
+        typeID).fetchall())
+    return typeID, groupName, attributes, effects
+
+
+def test_snapshotMatchesDatabase(tmpdir):
+    path = str(tmpdir.join("eve.snapshot"))
+    clientBuild = snapshot.build(path)
+    loaded = snapshot.load(path, clientBuild)
+    assert loaded is not None
+
+    for name in ITEMS:
+        typeID, groupName, attributes, effects = databaseRow(name)
+        item = loaded.getItem(name)
+        assert item is loaded.getItem(typeID)
+        assert item.ID == typeID
+        assert item.group.name == groupName
+        assert set(item.effects.keys()) == effects
+        for attrName, value in attributes.iteritems():
+            assert item.getAttribute(attrName) == value
+
+    rows = loaded.directAttributeRequest((587,), (182, 277))
+    assert set(rows) == set(tuple(row) for row in eos.db.gamedata_engine.execute(
+        "SELECT typeID, attributeID, value FROM dgmtypeattribs WHERE typeID = 587 AND attributeID IN (182, 277)"))
+
+    loaded.close()
+
+
+def test_objectsPerThread(tmpdir):
+    path = str(tmpdir.join("eve.snapshot"))
+    loaded = snapshot.load(path, snapshot.build(path))
+    item = loaded.getItem(ITEMS[0])
+    assert item in eos.db.gamedata_session()
+    built = {}
+
+    def read():
+        other = loaded.getItem(ITEMS[0])
+        built["item"] = other
+        built["attached"] = other in eos.db.gamedata_session()
+        eos.db.removeGamedataSession()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+
+    assert built["item"] is not item
+    assert built["item"].ID == item.ID
+    assert built["attached"]
+    loaded.close()
+
+
+def test_staleSnapshot(tmpdir):
+    path = str(tmpdir.join("eve.snapshot"))
+    clientBuild = snapshot.build(path)
+    assert snapshot.load(path, "{0}-old".format(clientBuild)) is None
+    assert snapshot.load(str(tmpdir.join("missing.snapshot")), clientBuild) is None
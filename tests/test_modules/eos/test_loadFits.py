@@ -0,0 +1,72 @@
+from sqlalchemy import event
+
+import eos.db
+from service.fit import Fit
+
+MODULES = ("200mm AutoCannon II", "200mm AutoCannon II", "Damage Control II", "Gyrostabilizer II")
+
+
+def newFit(name):
+    sFit = Fit.getInstance()
+    fitID = sFit.newFit(eos.db.getItem("Rifter").ID, name)
+    for moduleName in MODULES:
+        sFit.appendModule(fitID, eos.db.getItem(moduleName).ID)
+    sFit.addDrone(fitID, eos.db.getItem("Hobgoblin II").ID, 2)
+    sFit.addCargo(fitID, eos.db.getItem("Republic Fleet EMP S").ID, 100)
+    return fitID
+
+
+def countQueries(function, *args):
+    """Result of function, and the number of saveddata queries it made on fits not loaded before"""
+    eos.db.commit()
+    eos.db.saveddata_session.expunge_all()
+    eos.db.cache.invalidate("saveddata.")
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(eos.db.saveddata_engine, "before_cursor_execute", count)
+    try:
+        result = function(*args)
+    finally:
+        event.remove(eos.db.saveddata_engine, "before_cursor_execute", count)
+    return result, len(statements)
+
+
+def useFits(fits):
+    for fit in fits:
+        for thing in (fit.modules, fit.drones, fit.cargo, fit.implants, fit.boosters, fit.fighters,
+                      fit.projectedModules, fit.projectedDrones, fit.projectedFits, fit.commandFits):
+            list(thing)
+        list(fit.character.storedSkills), list(fit.character.implants)
+        fit.damagePattern
+        fit.stats
+
+
+def loadAndUse(fitIDs):
+    fits = eos.db.loadFits(fitIDs)
+    useFits(fits)
+    return fits
+
+
+def test_loadFitsQueryCount():
+    fitIDs = [newFit("Load test {0}".format(i)) for i in range(6)]
+    sFit = Fit.getInstance()
+    # A projection pulls its source in as well
+    sFit.project(fitIDs[0], eos.db.getFit(fitIDs[1]))
+
+    fits, few = countQueries(loadAndUse, fitIDs[:2])
+    assert [fit.ID for fit in fits] == fitIDs[:2]
+    fits, many = countQueries(loadAndUse, fitIDs + [-1])
+    assert [fit.ID for fit in fits] == fitIDs
+    assert all(len(fit.modules) == len(MODULES) and fit.drones and fit.cargo for fit in fits)
+    assert many == few
+
+    # Loading them one by one takes queries for every fit
+    _, oneByOne = countQueries(lambda: useFits([eos.db.getFit(fitID) for fitID in fitIDs]))
+    assert oneByOne > many
+
+    for fitID in fitIDs:
+        sFit.deleteFit(fitID)
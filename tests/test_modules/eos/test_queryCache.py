@@ -0,0 +1,56 @@
+import time
+
+from eos.db.cache import QueryCache, cachedQuery, caches, getStats, invalidate, removeCachedEntry
+
+
+class Thing(object):
+    def __init__(self, ID):
+        self.ID = ID
+
+
+def test_leastRecentlyUsedEviction():
+    cache = QueryCache("test.lru", size=2)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    assert cache.get(1) == (True, "a")
+    cache.set(3, "c")
+
+    assert cache.get(2) == (False, None)
+    assert cache.get(1) == (True, "a")
+    assert cache.get(3) == (True, "c")
+    assert cache.getStats()["evictions"] == 1
+    assert cache.hits == 3 and cache.misses == 1
+
+
+def test_expiry():
+    cache = QueryCache("test.ttl", ttl=0.01)
+    cache.set(1, "a")
+    assert cache.get(1) == (True, "a")
+    time.sleep(0.02)
+    assert cache.get(1) == (False, None)
+    assert cache.expirations == 1
+
+
+def test_cachedQueryInvalidation():
+    calls = []
+
+    @cachedQuery(1, "lookfor", type=Thing, size=10, prefix="test.")
+    def getThing(lookfor):
+        calls.append(lookfor)
+        return Thing(lookfor)
+
+    first = getThing(1)
+    assert getThing(1) is first
+    assert getThing(1, useCache=False) is not first
+    assert len(calls) == 2
+
+    removeCachedEntry(Thing, 1)
+    getThing(1)
+    assert len(calls) == 3
+
+    invalidate("test.")
+    getThing(1)
+    assert len(calls) == 4
+
+    assert getStats("test.")["test.getThing"]["hits"] == 1
+    del caches["test.getThing"]
@@ -0,0 +1,84 @@
+import eos.db
+from eos.db.gamedata.search import getItemSearch
+from eos.searchIndex import SearchIndex, prefixDistance
+from service.fit import Fit
+
+NAMES = {
+    1: (u"Stasis Webifier II", u"Ship Equipment / Electronic Warfare / Stasis Webifiers"),
+    2: (u"Federation Navy Stasis Webifier", u"Ship Equipment / Electronic Warfare / Stasis Webifiers"),
+    3: (u"200mm AutoCannon II", u"Ship Equipment / Turrets & Bays / Projectile Turrets / Autocannons"),
+    4: (u"Rifter", u"Ships / Frigates / Standard Frigates / Minmatar"),
+    5: (u"Small Remote Armor Repairer II", u"Ship Equipment / Hull & Armor / Remote Armor Repairers"),
+}
+
+
+def newIndex():
+    index = SearchIndex()
+    for docID, (name, path) in NAMES.iteritems():
+        index.add(docID, name, path)
+    return index
+
+
+def test_prefixDistance():
+    assert prefixDistance(u"webi", u"webifier", 1) == 0
+    assert prefixDistance(u"wbei", u"webifier", 1) == 1
+    assert prefixDistance(u"wbfi", u"webifier", 1) == 2
+    assert prefixDistance(u"autocanon", u"autocannon", 2) == 1
+
+
+def test_search():
+    index = newIndex()
+
+    # Names before market group paths, shorter names first
+    assert index.search(u"stasis web") == [1, 2]
+    assert index.search(u"webifiers") == [1, 2]
+    assert index.search(u"autocanon") == [3]
+    assert index.search(u"projectile") == [3]
+    assert index.search(u"rep arm") == [5]
+    assert index.search(u"stasis", accept=lambda docID: docID != 1) == [2]
+    assert index.search(u"ship", limit=2) == [1, 3]
+    assert index.search(u"frigate turret") == []
+
+    # Inside words, only when no word starts with the query
+    assert index.search(u"mm") == [3]
+    assert index.search(u"ebifier") == [1, 2]
+
+
+def test_narrowing():
+    index = newIndex()
+    typed = [index.search(u"stasis webifier"[:end]) for end in xrange(1, 16)]
+    fresh = [newIndex().search(u"stasis webifier"[:end]) for end in xrange(1, 16)]
+    assert typed == fresh
+    assert [index.search(text) for text in (u"m", u"mm")] == [[4], [3]]
+
+    # Changes to the index aren't missed by the next narrowing
+    index.add(6, u"Stasis Webifier I")
+    assert index.search(u"stasis webifier") == [6, 1, 2]
+    index.remove(1)
+    assert index.search(u"stasis webifier") == [6, 2]
+
+
+def test_dumpRestore():
+    index = newIndex()
+    assert SearchIndex.restore(index.dump()).search(u"web") == index.search(u"web")
+
+
+def test_itemSearch():
+    search = getItemSearch()
+    assert search.search(u"stasis webi")[0] == eos.db.getItem("Stasis Webifier II").ID
+    assert search.search(u"rifter", categories=("Ship",)) == [eos.db.getItem("Rifter").ID]
+    assert search.search(u"rifter", categories=("Module",)) == []
+    assert eos.db.findItems(u"rifter", categories=("Ship",))[0].name == "Rifter"
+
+
+def test_fitSearch():
+    sFit = Fit.getInstance()
+    fitID = sFit.newFit(eos.db.getItem("Rifter").ID, "Brawling Rifter")
+    assert fitID in [ID for ID, _, _, _, _, _ in sFit.searchFits("brawl")]
+
+    # Renames and deletes reach the index on save
+    sFit.renameFit(fitID, "Kiting Rifter")
+    assert fitID not in [fit.ID for fit in eos.db.findFits("brawl")]
+    assert fitID in [fit.ID for fit in eos.db.findFits("kitin")]
+    sFit.deleteFit(fitID)
+    assert fitID not in [fit.ID for fit in eos.db.findFits("kiting")]
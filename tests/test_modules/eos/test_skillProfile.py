@@ -0,0 +1,110 @@
+from eos.effectHandlerHelpers import HandledList
+from eos.skillProfile import SkillProfile
+
+
+class Effect(object):
+    runTime = "normal"
+    activeByDefault = True
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def isType(self, type):
+        return type == "passive"
+
+
+class Item(object):
+    def __init__(self, name, *handlers):
+        self.name = name
+        self.effects = dict((str(i), Effect(handler)) for i, handler in enumerate(handlers))
+
+
+class Skill(object):
+    def __init__(self, item, level):
+        self.item = item
+        self.level = level
+        self.runs = 0
+
+    def getModifiedItemAttr(self, key):
+        return 5.0
+
+    def isSuppressed(self):
+        return False
+
+    def calculateModifiedAttributes(self, fit, runTime):
+        self.runs += 1
+        for effect in self.item.effects.itervalues():
+            effect.handler(fit, self, ("skill",))
+
+
+class Character(object):
+    def __init__(self, skills):
+        self.skills = skills
+
+
+class Element(object):
+    def __init__(self, fit, group):
+        self.fit = fit
+        self.group = group
+
+    def boostItemAttr(self, attr, value):
+        self.fit.log.append((self.fit.modifier, self.group, attr, value))
+
+
+class Ship(Element):
+    item = "Rifter"
+
+
+class Fit(object):
+    isStructure = False
+
+    def __init__(self):
+        self.log = []
+        self.modifier = None
+        self.ship = Ship(self, "ship")
+        self.modules = HandledList([Element(self, "gun"), Element(self, "armor"), Element(self, "gun")])
+
+    def register(self, modifier):
+        self.modifier = modifier
+
+
+def gunBonus(fit, skill, context):
+    fit.modules.filteredItemBoost(lambda mod: mod.group == "gun", "damage", skill.getModifiedItemAttr("x") * skill.level)
+
+
+def shipBonus(fit, skill, context):
+    fit.ship.boostItemAttr("hp", skill.level)
+
+
+def shipTypeBonus(fit, skill, context):
+    if fit.ship.item == "Rifter":
+        fit.ship.boostItemAttr("speed", skill.level)
+
+
+def calculate(fit, character, profile=None):
+    for skill in character.skills:
+        fit.register(skill)
+        if profile is None:
+            skill.calculateModifiedAttributes(fit, "normal")
+    if profile is not None:
+        for step in profile.getSteps("normal", False):
+            fit.register(step.skill)
+            step.run(fit, "normal")
+    return fit.log
+
+
+def test_sameAsRunningEffects():
+    skills = [Skill(Item("Gunnery", gunBonus, shipBonus), 5), Skill(Item("Unused"), 4),
+              Skill(Item("Frigates", shipTypeBonus), 3)]
+    character = Character(skills)
+    profile = SkillProfile(character)
+
+    expected = calculate(Fit(), character)
+    assert calculate(Fit(), character, profile) == expected
+    assert calculate(Fit(), character, profile) == expected
+
+    steps = profile.getSteps("normal", False)
+    assert [step.skill for step in steps] == [skills[0], skills[2]]
+    # Looks at the ship, so it has to run every time
+    assert steps[1].effects is None
+    assert skills[0].runs == 1 and skills[2].runs == 3
@@ -0,0 +1,34 @@
+import random
+from math import exp
+
+from eos.modifiedAttributeDict import PenaltyGroup
+
+
+def reference(val, multipliers):
+    for l in (filter(lambda m: m > 1, multipliers), filter(lambda m: m < 1, multipliers)):
+        l.sort(key=lambda m: -abs(m - 1))
+        for i in xrange(len(l)):
+            val *= 1 + (l[i] - 1) * exp(- i ** 2 / 7.1289)
+    return val
+
+
+def test_matchesReference():
+    rng = random.Random(42)
+    for _ in xrange(500):
+        multipliers = [rng.choice((1.0, rng.uniform(0.5, 1.5))) for _ in xrange(rng.randint(0, 20))]
+        group = PenaltyGroup()
+        for multiplier in multipliers:
+            group.append(multiplier)
+        expected = reference(100.0, multipliers)
+        assert abs(group.apply(100.0) - expected) <= 1e-12 * expected
+
+
+def test_orderIndependent():
+    first, second = PenaltyGroup(), PenaltyGroup()
+    for multiplier in (1.1, 0.8, 1.3, 0.95, 1.3):
+        first.append(multiplier)
+    for multiplier in (1.3, 0.95, 1.3, 0.8, 1.1):
+        second.append(multiplier)
+    assert first.bonuses == second.bonuses == [1.3, 1.3, 1.1]
+    assert first.maluses == second.maluses == [0.8, 0.95]
+    assert first.apply(1.0) == second.apply(1.0)
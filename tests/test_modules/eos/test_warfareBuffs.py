@@ -0,0 +1,58 @@
+from eos.effectHandlerHelpers import HandledList
+from eos.warfareBuffs import BuffResolution, WARFARE_BUFFS, applyBuff
+
+
+class Named(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Item(object):
+    def __init__(self, group, *skills):
+        self.group = Named(group)
+        self.requiredSkills = [Named(skill) for skill in skills]
+
+    def requiresSkill(self, name):
+        return any(skill.name == name for skill in self.requiredSkills)
+
+
+class Boostable(object):
+    def __init__(self, item=None):
+        self.item = item
+        self.boosts = []
+
+    def boostItemAttr(self, attr, value, stackingPenalties=False):
+        self.boosts.append((attr, value, stackingPenalties))
+
+
+class Fit(object):
+    def __init__(self, *modules):
+        self.ship = Boostable()
+        self.modules = HandledList(modules)
+
+
+def test_strongestWins():
+    resolution = BuffResolution()
+    resolution.addCommandBonus(12, 10.0, "weak", None)
+    resolution.addCommandBonus(12, 25.0, "strong", None)
+    resolution.addCommandBonus(12, -25.0, "tie", None)
+    resolution.addCommandBonus(51, -40.0, "penalty", None)
+    assert resolution.bonuses[12] == ("normal", 25.0, "strong", None)
+    assert resolution.bonuses[51] == ("normal", -40.0, "penalty", None)
+
+
+def test_applyBuff():
+    web = Boostable(Item("Stasis Web", "Propulsion Jamming"))
+    laser = Boostable(Item("Energy Weapon", "Gunnery"))
+    fit = Fit(web, laser)
+
+    applyBuff(fit, 21, 20.0)
+    applyBuff(fit, 12, 10.0)
+    assert web.boosts == [("maxRange", 20.0, True)]
+    assert laser.boosts == []
+    assert fit.ship.boosts == [("shieldCapacity", 10.0, True)]
+
+    # Unknown buffs do nothing
+    applyBuff(fit, 9999, 1.0)
+    assert 9999 not in WARFARE_BUFFS
+    assert len(fit.ship.boosts) == 1
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, event
+from sqlalchemy.orm import mapper, sessionmaker
+
+from eos.db.writeBehind import WriteBehind
+
+
+class Thing(object):
+    def __init__(self, name):
+        self.name = name
+
+
+metadata = MetaData()
+things_table = Table("things", metadata,
+                     Column("ID", Integer, primary_key=True),
+                     Column("name", String))
+mapper(Thing, things_table)
+
+
+def newWriteBehind(path):
+    engine = create_engine("sqlite:///" + path, connect_args={"check_same_thread": False})
+    metadata.create_all(engine)
+    commits = []
+    event.listen(engine, "commit", lambda connection: commits.append(connection))
+    session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    return WriteBehind(session, threading.Lock()), commits
+
+
+def committedNames(path):
+    connection = sqlite3.connect(path)
+    try:
+        return [name for name, in connection.execute("SELECT name FROM things ORDER BY ID")]
+    finally:
+        connection.close()
+
+
+def test_batchedCommits(tmpdir):
+    path = str(tmpdir.join("saveddata.db"))
+    writeBehind, commits = newWriteBehind(path)
+
+    things = []
+    for i in xrange(50):
+        thing = Thing("thing {0}".format(i))
+        writeBehind.session.add(thing)
+        writeBehind.commit(None)
+        things.append(thing)
+
+    # Written and readable through the session, but not committed
+    assert all(thing.ID is not None for thing in things)
+    assert writeBehind.session.query(Thing).count() == 50
+    assert commits == []
+    assert committedNames(path) == []
+
+    writeBehind.sync()
+    assert len(commits) == 1
+    assert committedNames(path) == [thing.name for thing in things]
+
+
+def test_scheduledCommit(tmpdir):
+    path = str(tmpdir.join("saveddata.db"))
+    writeBehind, commits = newWriteBehind(path)
+    scheduled = []
+    writeBehind.schedule = lambda delay, function: scheduled.append((delay, function))
+
+    for name in ("first", "second"):
+        writeBehind.session.add(Thing(name))
+        writeBehind.commit(0.05)
+
+    # One commit for both, made when the scheduler gets to it
+    assert [delay for delay, _ in scheduled] == [0.05]
+    assert committedNames(path) == []
+    scheduled.pop()[1]()
+    assert committedNames(path) == ["first", "second"]
+    assert len(commits) == 1
+
+    # Nothing left to commit after a sync in the meantime
+    writeBehind.session.add(Thing("third"))
+    writeBehind.commit(0.05)
+    writeBehind.sync()
+    scheduled.pop()[1]()
+    assert len(commits) == 2
+
+    # Without a scheduler, commits are made right away
+    writeBehind.schedule = None
+    writeBehind.session.add(Thing("fourth"))
+    writeBehind.commit(0.05)
+    assert committedNames(path) == ["first", "second", "third", "fourth"]
+
+
+def test_failedCommitKeepsChanges(tmpdir):
+    path = str(tmpdir.join("saveddata.db"))
+    writeBehind, commits = newWriteBehind(path)
+    scheduled = []
+    writeBehind.schedule = lambda delay, function: scheduled.append(function)
+    failures = [sqlite3.OperationalError("disk I/O error")]
+
+    def failOnce(connection):
+        if failures:
+            raise failures.pop()
+
+    event.listen(writeBehind.session.bind, "commit", failOnce)
+
+    thing = Thing("kept")
+    writeBehind.session.add(thing)
+    writeBehind.commit(0.05)
+    # Logged, not rolled back
+    scheduled.pop()()
+    assert writeBehind.pending == 1
+    assert thing in writeBehind.session
+    assert committedNames(path) == []
+
+    writeBehind.sync()
+    assert committedNames(path) == ["kept"]
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+import eos.db
+from service.fit import Fit
+
+MODULES = ("200mm AutoCannon II", "Gyrostabilizer II", "Damage Control II")
+
+
+def mainLoop(monkeypatch):
+    """Calls the worker makes on the main thread, the test standing in for the main loop"""
+    if eos.db.saveddataInMemory:
+        pytest.skip("The recalc worker can't read an in memory database")
+    calls = []
+    monkeypatch.setattr("wx.GetApp", lambda: object())
+    monkeypatch.setattr("wx.CallAfter", lambda function, *args: calls.append((function, args)))
+    monkeypatch.setitem(Fit.getInstance().serviceFittingOptions, "backgroundRecalc", True)
+    return calls
+
+
+def newFit(sFit, name):
+    sFit.serviceFittingOptions["backgroundRecalc"] = False
+    fitID = sFit.newFit(eos.db.getItem("Rifter").ID, name)
+    for moduleName in MODULES:
+        sFit.appendModule(fitID, eos.db.getItem(moduleName).ID)
+    sFit.serviceFittingOptions["backgroundRecalc"] = True
+    return sFit.getFit(fitID)
+
+
+def waitForCalls(calls, count):
+    deadline = time.time() + 10
+    while len(calls) < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_backgroundRecalcCoalesces(monkeypatch):
+    calls = mainLoop(monkeypatch)
+    sFit = Fit.getInstance()
+    done = []
+    monkeypatch.setattr(sFit, "recalcCallback", done.append)
+    fit = newFit(sFit, "Recalc worker test")
+
+    # Keep the worker busy with the first request while two more come in
+    started, release = threading.Event(), threading.Event()
+    calculateApart = sFit.calculateApart
+
+    def blockingCalculateApart(*args):
+        started.set()
+        release.wait()
+        return calculateApart(*args)
+
+    monkeypatch.setattr(sFit, "calculateApart", blockingCalculateApart)
+    sFit.requestRecalc(fit)
+    started.wait(10)
+    sFit.requestRecalc(fit)
+    sFit.requestRecalc(fit)
+    assert sFit.isRecalcPending(fit.ID)
+    release.set()
+    waitForCalls(calls, 2)
+
+    # The second request was never calculated, the first one is outdated by the time it's done
+    assert [args[1] for _, args in calls] == [1, 3]
+    for function, args in calls:
+        function(*args)
+    assert done == [fit.ID]
+    assert not sFit.isRecalcPending(fit.ID)
+
+
+def test_backgroundRecalcMatchesRecalc(monkeypatch):
+    calls = mainLoop(monkeypatch)
+    sFit = Fit.getInstance()
+    fit = newFit(sFit, "Recalc worker results test")
+    gyrostabilizer = fit.modules[1]
+    sFit.toggleModulesState(fit.ID, gyrostabilizer, [gyrostabilizer], "ctrl")
+    waitForCalls(calls, 1)
+    # The results are taken over, without falling back to calculating the fit here
+    recalc, recalcs = sFit.recalc, []
+    monkeypatch.setattr(sFit, "recalc", recalcs.append)
+    for function, args in calls:
+        function(*args)
+    assert recalcs == []
+    monkeypatch.setattr(sFit, "recalc", recalc)
+
+    assert not sFit.isRecalcPending(fit.ID)
+    background = dict((mod, dict(mod.itemModifiedAttributes)) for mod in fit.modules)
+    # Affected By refers to the fit and items of the main thread
+    afflictions = [(affectedFit, afflictor) for mod in fit.modules
+                   for key in mod.itemModifiedAttributes.iterAfflictions()
+                   for affectedFit, used in mod.itemModifiedAttributes.getAfflictions(key).iteritems()
+                   for afflictor, _, _, _ in used]
+    assert afflictions
+    for affectedFit, afflictor in afflictions:
+        assert affectedFit is fit
+        assert any(afflictor is thing for thing in fit.modules + fit.character.skills + [fit.ship])
+
+    sFit.recalc(fit)
+    assert background == dict((mod, dict(mod.itemModifiedAttributes)) for mod in fit.modules)
@@ -0,0 +1,43 @@
+from cStringIO import StringIO
+
+import eos.db
+from service.fit import Fit
+from service.port import Port
+
+MODULES = ("200mm AutoCannon II", "Damage Control II")
+
+
+def newFit(name):
+    sFit = Fit.getInstance()
+    fitID = sFit.newFit(eos.db.getItem("Rifter").ID, name)
+    for moduleName in MODULES:
+        sFit.appendModule(fitID, eos.db.getItem(moduleName).ID)
+    sFit.addDrone(fitID, eos.db.getItem("Hobgoblin II").ID, 2)
+    return sFit.getFit(fitID)
+
+
+def test_roundTrip(tmpdir):
+    fits = [newFit(u"Streamed Rifter \u2116%d" % i) for i in xrange(3)]
+    path = str(tmpdir.join("fits.xml"))
+    with open(path, "wb") as backupFile:
+        Port.writeXml(backupFile, iter(fits))
+
+    records = list(Port.iterXml(path))
+    assert [name for name, _, _ in records] == [fit.name for fit in fits]
+    assert all(shipType == "Rifter" for _, shipType, _ in records)
+    assert {"type": "Hobgoblin II", "slot": "drone bay", "qty": "2"} in records[0][2]
+
+    # Chunks are cut at chunkSize, the items of each looked up together
+    chunks = list(Port.iterXmlFits(path, chunkSize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    imported = chunks[0][0]
+    assert sorted(module.item.name for module in imported.modules) == sorted(MODULES)
+    assert imported.drones[0].amount == 2
+
+
+def test_importXml():
+    fit = newFit(u"Imported Rifter")
+    text = Port.exportXml(None, fit)
+    assert Port.importXml(text)[0].name == fit.name
+    assert [imported.ship.item.name for imported in Port.importXml(text)] == ["Rifter"]
+    assert list(Port.iterXml(StringIO("<fittings></fittings>"))) == []